@@ -1,7 +1,6 @@
 """API endpoints для работы с приёмами"""
-import asyncio
 from typing import Optional
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -10,11 +9,15 @@ from app import crud
 from app.schemas import (
     AppointmentListSchema,
     AppointmentDetailSchema,
+    AppointmentWorkspaceSchema,
     MedicalReportSchema,
     MedicalReportCreateUpdateSchema,
-    MISSubmissionResponse
+    JobAcceptedResponse
 )
+from app.pagination import NEXT_CURSOR_HEADER, InvalidCursorError
 from app.pdf_generator import generate_appointment_pdf
+from app.jobs import enqueue_job
+from app.tasks import JOB_SUBMIT_TO_MIS, report_job_key
 from app.logger import get_logger
 
 router = APIRouter(prefix="/api/appointments", tags=["appointments"])
@@ -23,13 +26,26 @@ logger = get_logger(__name__)
 
 @router.get("", response_model=list[AppointmentListSchema])
 async def get_appointments_list(
+    response: Response,
     search: Optional[str] = Query(None, description="Поиск по ФИО пациента"),
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы (заголовок X-Next-Cursor)"),
     db: AsyncSession = Depends(get_db)
 ):
-    """Получить список приёмов"""
-    appointments = await crud.get_appointments(db, search=search, skip=skip, limit=limit)
+    """
+    Получить список приёмов
+    
+    Постраничный обход: передавайте значение заголовка X-Next-Cursor
+    из предыдущего ответа в параметре cursor. Заголовок отсутствует
+    на последней странице.
+    """
+    try:
+        appointments = await crud.get_appointments(db, search=search, skip=skip, limit=limit, cursor=cursor)
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if len(appointments) == limit:
+        response.headers[NEXT_CURSOR_HEADER] = crud.appointment_cursor(appointments[-1])
     return appointments
 
 
@@ -45,6 +61,30 @@ async def get_appointment_detail(
     return appointment
 
 
+@router.get("/{appointment_id}/workspace", response_model=AppointmentWorkspaceSchema)
+async def get_appointment_workspace(
+    appointment_id: int,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Получить данные карточки пациента одним запросом
+    
+    Приём, цифровой портрет пациента, отчёт, аудиофайл и настройки
+    имитации транскрибации - вместо пяти последовательных запросов.
+    """
+    appointment = await crud.get_appointment_workspace(db, appointment_id)
+    if not appointment:
+        raise HTTPException(status_code=404, detail="Приём не найден")
+    
+    return AppointmentWorkspaceSchema(
+        appointment=appointment,
+        patient=appointment.patient,
+        report=appointment.medical_report,
+        audio=appointment.audio_file,
+        mock_settings={"duration": await crud.get_mock_transcription_duration(db)}
+    )
+
+
 @router.get("/{appointment_id}/report", response_model=MedicalReportSchema)
 async def get_medical_report(
     appointment_id: int,
@@ -56,7 +96,7 @@ async def get_medical_report(
     if not appointment:
         raise HTTPException(status_code=404, detail="Приём не найден")
     
-    report = await crud.get_medical_report(db, appointment_id)
+    report = await crud.get_medical_report(db, appointment_id, with_text=True)
     if not report:
         raise HTTPException(status_code=404, detail="Отчёт не найден")
     
@@ -86,46 +126,41 @@ async def create_update_medical_report(
     return report
 
 
-@router.post("/{appointment_id}/submit-to-mis", response_model=MISSubmissionResponse)
+@router.post("/{appointment_id}/submit-to-mis", response_model=JobAcceptedResponse, status_code=202)
 async def submit_to_mis(
     appointment_id: int,
+    response: Response,
     db: AsyncSession = Depends(get_db)
 ):
-    """Имитация отправки отчёта в МИС"""
+    """Поставить отправку отчёта в МИС в очередь фоновых задач"""
     logger.info(f"Начало отправки отчёта в МИС для приёма: appointment_id={appointment_id}")
     
-    try:
-        # Проверяем, существует ли приём
-        appointment = await crud.get_appointment(db, appointment_id)
-        if not appointment:
-            logger.warning(f"Попытка отправки в МИС несуществующего приёма: appointment_id={appointment_id}")
-            raise HTTPException(status_code=404, detail="Приём не найден")
-        
-        # Проверяем, существует ли отчёт
-        report = await crud.get_medical_report(db, appointment_id)
-        if not report:
-            logger.warning(f"Попытка отправки в МИС без отчёта: appointment_id={appointment_id}")
-            raise HTTPException(status_code=404, detail="Отчёт не найден. Сначала создайте отчёт.")
-        
-        # Имитация задержки отправки в МИС (3 секунды)
-        logger.debug(f"Отправка отчёта в МИС (симуляция 3 сек)...")
-        await asyncio.sleep(3)
-        
-        # Обновляем статус отправки
-        report = await crud.submit_report_to_mis(db, appointment_id)
-        
-        logger.info(f"Отчёт успешно отправлен в МИС: appointment_id={appointment_id}")
-        
-        return MISSubmissionResponse(
-            success=True,
-            message="Отчёт успешно передан в МИС (MVP)",
-            submitted_at=report.submitted_at
+    # Проверяем, существует ли приём
+    appointment = await crud.get_appointment(db, appointment_id)
+    if not appointment:
+        logger.warning(f"Попытка отправки в МИС несуществующего приёма: appointment_id={appointment_id}")
+        raise HTTPException(status_code=404, detail="Приём не найден")
+    
+    # Проверяем, существует ли отчёт
+    report = await crud.get_medical_report(db, appointment_id)
+    if not report:
+        logger.warning(f"Попытка отправки в МИС без отчёта: appointment_id={appointment_id}")
+        raise HTTPException(status_code=404, detail="Отчёт не найден. Сначала создайте отчёт.")
+    
+    # Повторное нажатие, пока отправка не завершена, не создаёт вторую задачу
+    job = await crud.get_active_job(db, JOB_SUBMIT_TO_MIS, report_job_key(appointment_id))
+    if job is None:
+        job = await enqueue_job(
+            db, JOB_SUBMIT_TO_MIS, {"appointment_id": appointment_id}, key=report_job_key(appointment_id)
         )
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Ошибка при отправке отчёта в МИС: appointment_id={appointment_id}, error={str(e)}")
-        raise
+    
+    response.headers["Location"] = f"/api/jobs/{job.id}"
+    return JobAcceptedResponse(
+        success=True,
+        message="Отчёт поставлен в очередь на отправку в МИС",
+        job_id=job.id,
+        status=job.status
+    )
 
 
 @router.get("/{appointment_id}/download-pdf")
@@ -149,7 +184,7 @@ async def download_appointment_pdf(
             raise HTTPException(status_code=404, detail="Пациент не найден")
         
         # Получаем медицинский отчёт (если есть)
-        report = await crud.get_medical_report(db, appointment_id)
+        report = await crud.get_medical_report(db, appointment_id, with_text=True)
         
         # Формируем данные для PDF
         appointment_data = {
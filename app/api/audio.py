@@ -1,25 +1,55 @@
 """API endpoints для работы с аудиофайлами"""
 import asyncio
-import os
-import uuid
+from dataclasses import asdict
 from pathlib import Path
-from typing import Optional
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query
-from fastapi.responses import FileResponse
-from sqlalchemy.ext.asyncio import AsyncSession
+from typing import AsyncIterator, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import RedirectResponse
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.exc import IntegrityError
 from pydantic import BaseModel
 
-from app.database import get_db
+from app.database import get_db, get_session_factory
 from app import crud
 from app.config import settings
-from app.models import TranscriptionStatus
+from app.models import AudioFile, TranscriptionStatus
 from app.schemas import (
     AudioFileSchema,
     AudioUploadResponse,
+    AudioWaveformSchema,
+    JobAcceptedResponse,
     TranscriptionResponse,
     MedicalReportSchema
 )
-from app.openai_service import openai_service
+from app.openai_service import ANAMNESIS_FIELDS, openai_service
+from app.tasks import (
+    JOB_TRANSCRIBE_AUDIO,
+    audio_job_key,
+    enqueue_transcode,
+    enqueue_transcription,
+    transcode_pending,
+)
+from app import resumable_uploads
+from app.audio_storage import (
+    InvalidUploadError,
+    UnsupportedFileTypeError,
+    UploadTooLargeError,
+    blob_key,
+    get_upload_dir,
+    receive_multipart_file,
+    remove_blob,
+    remove_file,
+    store_blob,
+    store_lock,
+)
+from app.audio_metadata import extract_metadata
+from app.audio_segmentation import AudioDecodeError
+from app.file_responses import etag_matches, send_file, send_stream
+from app.object_storage import get_storage
+from app.sse import event_stream_response, sse_event, wants_event_stream
+from app.storage_lifecycle import rehydrate_audio
+from app.live_transcription import LIVE_FORMATS, LiveRecording, parse_control_message
+from app.transcription import TranscriptionEngineError, get_engine
 from app.logger import get_logger
 
 router = APIRouter(prefix="/api/audio", tags=["audio"])
@@ -28,75 +58,312 @@ logger = get_logger(__name__)
 # Допустимые типы аудиофайлов
 ALLOWED_AUDIO_TYPES = {"audio/mpeg", "audio/mp3", "audio/wav", "audio/wave"}
 ALLOWED_EXTENSIONS = {".mp3", ".wav"}
+# Запись из браузера (MediaRecorder) - через возобновляемую загрузку
+RECORDING_EXTENSIONS = ALLOWED_EXTENSIONS | {".webm", ".ogg"}
+# Ссылка с версией (?v=<SHA-256>) всегда отдаёт одно и то же содержимое;
+# данные пациента - только в кэше браузера
+AUDIO_CACHE_CONTROL = "private, max-age=31536000, immutable"
+# Ссылка без версии: id переиспользуется после удаления записи, а запись может
+# быть заменена перекодированной версией - кэш сверяется по ETag
+AUDIO_REVALIDATE_CACHE_CONTROL = "private, no-cache"
+# Редирект на временную ссылку S3
+AUDIO_REDIRECT_CACHE_CONTROL = "private, no-store"
 
 
-def get_upload_dir() -> Path:
-    """Получить путь к директории для загрузок"""
-    upload_path = Path(settings.upload_dir)
-    upload_path.mkdir(parents=True, exist_ok=True)
-    return upload_path
+# Схема тела для OpenAPI: тело разбирается вручную (receive_multipart_file)
+UPLOAD_REQUEST_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["file"],
+                    "properties": {"file": {"type": "string", "format": "binary"}},
+                }
+            }
+        },
+    }
+}
 
 
-@router.post("/upload", response_model=AudioUploadResponse)
-async def upload_audio_file(
-    appointment_id: int = Query(..., description="ID приёма"),
-    file: UploadFile = File(...),
-    db: AsyncSession = Depends(get_db)
-):
-    """Загрузить аудиофайл для приёма"""
-    
-    # Проверяем, существует ли приём
+async def check_audio_upload_allowed(db: AsyncSession, appointment_id: int) -> None:
+    """Проверить, что приём существует и аудиофайл для него ещё не загружен"""
     appointment = await crud.get_appointment(db, appointment_id)
     if not appointment:
         raise HTTPException(status_code=404, detail="Приём не найден")
     
-    # Проверяем, не загружен ли уже аудиофайл
     existing_audio = await crud.get_audio_file_by_appointment(db, appointment_id)
     if existing_audio:
         raise HTTPException(status_code=400, detail="Аудиофайл уже загружен для этого приёма")
+
+
+def upload_too_large_error() -> HTTPException:
+    """Ошибка превышения максимального размера аудиофайла"""
+    return HTTPException(
+        status_code=413,
+        detail=f"Файл слишком большой. Максимальный размер: {settings.max_upload_size / 1024 / 1024:.0f}MB"
+    )
+
+
+async def register_audio_file(
+    db: AsyncSession,
+    appointment_id: int,
+    filename: str,
+    partial_path: Path,
+    sha256: str,
+    file_size: int,
+    mime_type: str
+) -> AudioFile:
+    """
+    Перенести принятый файл в хранилище и создать запись AudioFile
+
+    Размещение файла и запись ссылки на него выполняются под блокировкой
+    ключа хранилища, чтобы параллельное удаление последней ссылки на тот же
+    хэш (в том числе на другом узле) не удалило файл между ними. WAV/MP3 затем перекодируются в Opus
+    фоновой задачей. Метаданные и пики волновой формы извлекаются до
+    размещения, пока файл не под блокировкой.
+    """
+    metadata = await asyncio.to_thread(extract_metadata, partial_path)
+    async with store_lock(db, blob_key(sha256)):
+        key, created = await store_blob(partial_path, sha256)
+        try:
+            audio = await crud.create_audio_file(
+                db,
+                appointment_id=appointment_id,
+                filename=filename,
+                filepath=key,
+                file_size=file_size,
+                mime_type=mime_type,
+                sha256=sha256,
+                **asdict(metadata)
+            )
+        except Exception:
+            # Других ссылок на только что созданный файл быть не может
+            if created:
+                await remove_blob(key)
+            raise
+    
+    await enqueue_transcode(db, audio)
+    return audio
+
+
+async def delete_audio_record(db: AsyncSession, audio: AudioFile) -> None:
+    """Удалить запись аудиофайла и файл, если на него больше нет ссылок"""
+    async with store_lock(db, audio.filepath):
+        references = await crud.delete_audio_file(db, audio.id)
+        if not audio.filepath:
+            return
+        if references:
+            logger.info(f"Файл {audio.filepath} оставлен: ещё ссылок - {references}")
+            return
+        try:
+            if await remove_blob(audio.filepath):
+                logger.info(f"Физический файл удалён: {audio.filepath}")
+        except Exception as e:
+            logger.warning(f"Не удалось удалить физический файл: {e}")
+
+
+@router.post("/upload", response_model=AudioUploadResponse, openapi_extra=UPLOAD_REQUEST_BODY)
+async def upload_audio_file(
+    request: Request,
+    appointment_id: int = Query(..., description="ID приёма"),
+    db: AsyncSession = Depends(get_db)
+):
+    """Загрузить аудиофайл для приёма"""
+    
+    # Проверяем приём до чтения тела запроса
+    await check_audio_upload_allowed(db, appointment_id)
     
-    # Проверяем тип файла
-    file_ext = Path(file.filename).suffix.lower()
-    if file_ext not in ALLOWED_EXTENSIONS:
+    # Принимаем файл потоково прямо в каталог загрузок (запись вне event loop,
+    # SHA-256 по ходу записи); тип файла проверяется по заголовкам части
+    try:
+        upload = await receive_multipart_file(
+            request, "file", get_upload_dir(), settings.max_upload_size, ALLOWED_EXTENSIONS
+        )
+    except UnsupportedFileTypeError:
         raise HTTPException(
             status_code=400,
             detail=f"Неподдерживаемый формат файла. Допустимые форматы: {', '.join(ALLOWED_EXTENSIONS)}"
         )
+    except UploadTooLargeError:
+        raise upload_too_large_error()
+    except InvalidUploadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except OSError as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка при загрузке файла: {str(e)}")
     
-    # Генерируем уникальное имя файла
-    unique_filename = f"{uuid.uuid4()}{file_ext}"
-    upload_dir = get_upload_dir()
-    file_path = upload_dir / unique_filename
-    
-    # Сохраняем файл
-    file_size = 0
+    # Переносим файл в хранилище (повторная загрузка не дублируется) и создаём запись в БД
     try:
-        with open(file_path, "wb") as f:
-            while chunk := await file.read(8192):
-                file_size += len(chunk)
-                if file_size > settings.max_upload_size:
-                    # Удаляем частично загруженный файл
-                    f.close()
-                    os.remove(file_path)
-                    raise HTTPException(
-                        status_code=413,
-                        detail=f"Файл слишком большой. Максимальный размер: {settings.max_upload_size / 1024 / 1024:.0f}MB"
-                    )
-                f.write(chunk)
-    except Exception as e:
-        if file_path.exists():
-            os.remove(file_path)
+        audio = await register_audio_file(
+            db,
+            appointment_id=appointment_id,
+            filename=upload.filename,
+            partial_path=upload.path,
+            sha256=upload.sha256,
+            file_size=upload.size,
+            mime_type=upload.content_type or "audio/mpeg"
+        )
+    except OSError as e:
+        await remove_file(str(upload.path))
         raise HTTPException(status_code=500, detail=f"Ошибка при загрузке файла: {str(e)}")
     
-    # Создаём запись в БД
-    audio = await crud.create_audio_file(
-        db,
-        appointment_id=appointment_id,
-        filename=file.filename,
-        filepath=str(file_path),
-        file_size=file_size,
-        mime_type=file.content_type or "audio/mpeg"
+    return AudioUploadResponse(
+        id=audio.id,
+        filename=audio.filename,
+        file_size=audio.file_size,
+        message="Аудиофайл успешно загружен"
     )
+
+
+# Возобновляемая загрузка (tus 1.0: создание, PATCH со смещением, HEAD для статуса)
+# плюс явная фиксация, которая создаёт запись AudioFile
+
+def tus_headers(session: resumable_uploads.UploadSession) -> dict:
+    """Заголовки состояния сессии загрузки"""
+    headers = {
+        "Tus-Resumable": resumable_uploads.TUS_VERSION,
+        "Upload-Offset": str(session.offset),
+        "Cache-Control": "no-store",
+    }
+    if session.length is None:
+        headers["Upload-Defer-Length"] = "1"
+    else:
+        headers["Upload-Length"] = str(session.length)
+    return headers
+
+
+def parse_length_header(value: Optional[str], name: str) -> Optional[int]:
+    """Неотрицательное целое из заголовка"""
+    if value is None:
+        return None
+    if not value.isdigit():
+        raise HTTPException(status_code=400, detail=f"Некорректный заголовок {name}")
+    return int(value)
+
+
+async def get_upload_session_or_404(upload_id: str) -> resumable_uploads.UploadSession:
+    """Сессия загрузки или 404"""
+    session = await resumable_uploads.get_session(upload_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Сессия загрузки не найдена")
+    return session
+
+
+@router.post("/uploads", status_code=201)
+async def create_upload_session(
+    request: Request,
+    response: Response,
+    appointment_id: int = Query(..., description="ID приёма"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Создать сессию возобновляемой загрузки
+
+    Upload-Length - размер файла; при записи, которая ещё идёт, вместо него
+    передаётся Upload-Defer-Length: 1, а размер - в последнем PATCH.
+    Upload-Metadata: filename и filetype в base64 (как в tus).
+    """
+    await check_audio_upload_allowed(db, appointment_id)
+    
+    length = parse_length_header(request.headers.get("upload-length"), "Upload-Length")
+    if length is None and request.headers.get("upload-defer-length") != "1":
+        raise HTTPException(status_code=400, detail="Требуется Upload-Length или Upload-Defer-Length: 1")
+    try:
+        metadata = resumable_uploads.parse_upload_metadata(request.headers.get("upload-metadata"))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    filename = metadata.get("filename") or "recording.webm"
+    if Path(filename).suffix.lower() not in RECORDING_EXTENSIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Неподдерживаемый формат файла. Допустимые форматы: {', '.join(sorted(RECORDING_EXTENSIONS))}"
+        )
+    
+    try:
+        session = await resumable_uploads.create_session(
+            appointment_id, filename, metadata.get("filetype") or "audio/webm", length
+        )
+    except UploadTooLargeError:
+        raise upload_too_large_error()
+    
+    response.headers.update(tus_headers(session))
+    response.headers["Location"] = f"{router.prefix}/uploads/{session.id}"
+    return {"id": session.id, "offset": session.offset}
+
+
+@router.head("/uploads/{upload_id}")
+async def get_upload_status(upload_id: str):
+    """Текущее смещение загрузки: с него клиент продолжает после обрыва"""
+    session = await get_upload_session_or_404(upload_id)
+    return Response(status_code=200, headers=tus_headers(session))
+
+
+@router.patch("/uploads/{upload_id}", status_code=204)
+async def append_upload_chunk(upload_id: str, request: Request):
+    """
+    Дописать порцию данных в сессию загрузки
+
+    Upload-Offset должен совпадать с числом уже принятых байт (иначе 409,
+    актуальное смещение - в заголовке ответа). Тело - application/offset+octet-stream.
+    """
+    session = await get_upload_session_or_404(upload_id)
+    
+    if request.headers.get("content-type") != "application/offset+octet-stream":
+        raise HTTPException(status_code=415, detail="Ожидается Content-Type: application/offset+octet-stream")
+    offset = parse_length_header(request.headers.get("upload-offset"), "Upload-Offset")
+    if offset is None:
+        raise HTTPException(status_code=400, detail="Требуется заголовок Upload-Offset")
+    
+    try:
+        length = parse_length_header(request.headers.get("upload-length"), "Upload-Length")
+        if length is not None:
+            await resumable_uploads.set_length(session, length)
+        await resumable_uploads.append_chunk(session, offset, request.stream())
+    except resumable_uploads.UploadOffsetError:
+        raise HTTPException(status_code=409, detail="Смещение не совпадает с принятыми данными", headers=tus_headers(session))
+    except resumable_uploads.UploadLockedError:
+        raise HTTPException(status_code=423, detail="В сессию уже идёт загрузка")
+    except resumable_uploads.UploadNotFoundError:
+        raise HTTPException(status_code=404, detail="Сессия загрузки не найдена")
+    except UploadTooLargeError:
+        raise upload_too_large_error()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return Response(status_code=204, headers=tus_headers(session))
+
+
+@router.post("/uploads/{upload_id}/commit", response_model=AudioUploadResponse)
+async def commit_upload_session(upload_id: str, db: AsyncSession = Depends(get_db)):
+    """Завершить загрузку и создать запись аудиофайла для приёма"""
+    session = await get_upload_session_or_404(upload_id)
+    await check_audio_upload_allowed(db, session.appointment_id)
+    
+    try:
+        async with resumable_uploads.commit_session(session) as sha256:
+            audio = await register_audio_file(
+                db,
+                appointment_id=session.appointment_id,
+                filename=session.filename,
+                partial_path=session.data_path,
+                sha256=sha256,
+                file_size=session.offset,
+                mime_type=session.mime_type
+            )
+    except resumable_uploads.UploadIncompleteError as e:
+        raise HTTPException(status_code=409, detail=f"Загрузка не завершена: {e}", headers=tus_headers(session))
+    except resumable_uploads.UploadLockedError:
+        raise HTTPException(status_code=423, detail="В сессию уже идёт загрузка")
+    except resumable_uploads.UploadNotFoundError:
+        raise HTTPException(status_code=404, detail="Сессия загрузки не найдена")
+    except IntegrityError:
+        # Параллельная загрузка для того же приёма успела создать запись
+        await db.rollback()
+        raise HTTPException(status_code=400, detail="Аудиофайл уже загружен для этого приёма")
+    except OSError as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка при загрузке файла: {str(e)}")
     
     return AudioUploadResponse(
         id=audio.id,
@@ -106,6 +373,130 @@ async def upload_audio_file(
     )
 
 
+@router.delete("/uploads/{upload_id}", status_code=204)
+async def delete_upload_session(upload_id: str):
+    """Прервать загрузку и удалить принятые данные"""
+    session = await get_upload_session_or_404(upload_id)
+    try:
+        await resumable_uploads.delete_session(session)
+    except resumable_uploads.UploadLockedError:
+        raise HTTPException(status_code=423, detail="В сессию уже идёт загрузка")
+    except resumable_uploads.UploadNotFoundError:
+        raise HTTPException(status_code=404, detail="Сессия загрузки не найдена")
+    return Response(status_code=204, headers={"Tus-Resumable": resumable_uploads.TUS_VERSION})
+
+
+# Распознавание во время записи (app/live_transcription.py)
+
+@router.websocket("/live")
+async def live_transcription(
+    websocket: WebSocket,
+    appointment_id: int = Query(..., description="ID приёма"),
+    format: str = Query("webm", description="Формат потока: webm, ogg или pcm16"),
+    session_factory: async_sessionmaker[AsyncSession] = Depends(get_session_factory)
+):
+    """
+    Запись приёма с распознаванием по ходу записи
+
+    Клиент отправляет части записи бинарными сообщениями и {"type": "stop"}
+    по окончании. Сервер присылает фрагменты стенограммы по мере
+    распознавания ({"type": "partial" | "final", "timestamp", "text", ...}),
+    после stop - {"type": "done", "audio_id", "transcription_text"}.
+    Обрыв соединения до stop отменяет запись. Если запись не удалось
+    сохранить (например, за время записи для приёма загрузили другой файл),
+    стенограмма приходит в {"type": "error", "detail", "transcription_text"}.
+
+    Запись длится весь приём, поэтому соединение с БД берётся только на
+    проверку при подключении и на сохранение в конце.
+    """
+    try:
+        async with session_factory() as db:
+            await check_audio_upload_allowed(db, appointment_id)
+        if format not in LIVE_FORMATS:
+            raise HTTPException(status_code=400, detail=f"Неподдерживаемый формат потока: {format}")
+        engine = get_engine()
+    except HTTPException as e:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=e.detail)
+        return
+    except TranscriptionEngineError as e:
+        await websocket.close(code=status.WS_1011_INTERNAL_ERROR, reason=str(e))
+        return
+    
+    await websocket.accept()
+    recording = LiveRecording(engine, format, get_upload_dir())
+    try:
+        await recording.start()
+    except AudioDecodeError as e:
+        await websocket.send_json({"type": "error", "detail": str(e)})
+        await websocket.close(code=status.WS_1011_INTERNAL_ERROR)
+        return
+    logger.info(f"Запись с распознаванием начата: appointment_id={appointment_id}, format={format}")
+    
+    processor = asyncio.create_task(recording.run(websocket.send_json))
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", status.WS_1000_NORMAL_CLOSURE))
+            if message.get("bytes"):
+                await recording.append(message["bytes"])
+            elif parse_control_message(message.get("text") or "").get("type") == "stop":
+                break
+        recording.stop()
+        await processor
+        upload = await recording.finish(websocket.send_json)
+    except WebSocketDisconnect:
+        logger.warning(f"Соединение записи прервано, запись отменена: appointment_id={appointment_id}")
+        processor.cancel()
+        await recording.discard()
+        return
+    except UploadTooLargeError:
+        processor.cancel()
+        await recording.discard()
+        await websocket.send_json({"type": "error", "detail": upload_too_large_error().detail})
+        await websocket.close(code=status.WS_1009_MESSAGE_TOO_BIG)
+        return
+    except BaseException:
+        processor.cancel()
+        await recording.discard()
+        raise
+    
+    text = recording.session.text
+    try:
+        async with session_factory() as db:
+            # За время записи для приёма могли загрузить другой файл
+            await check_audio_upload_allowed(db, appointment_id)
+            audio = await register_audio_file(
+                db,
+                appointment_id=appointment_id,
+                filename=upload.filename,
+                partial_path=upload.path,
+                sha256=upload.sha256,
+                file_size=upload.size,
+                mime_type=upload.content_type
+            )
+            await crud.update_transcription(db, audio.id, TranscriptionStatus.COMPLETED, text=text)
+    except Exception as e:
+        # Файл уже перенесён в хранилище или ещё лежит во временном каталоге
+        await remove_file(str(upload.path))
+        if isinstance(e, HTTPException):
+            detail, code = e.detail, status.WS_1008_POLICY_VIOLATION
+        else:
+            logger.error(f"Ошибка сохранения записи с распознаванием: appointment_id={appointment_id}, error={str(e)}")
+            detail, code = "Не удалось сохранить запись", status.WS_1011_INTERNAL_ERROR
+        # Стенограмма не теряется: клиент может сохранить её сам
+        await websocket.send_json({"type": "error", "detail": detail, "transcription_text": text})
+        await websocket.close(code=code)
+        return
+    logger.info(
+        f"Запись с распознаванием завершена: audio_id={audio.id}, "
+        f"длительность={recording.session.duration:.0f} с, фрагментов={len(recording.session.segments)}"
+    )
+    
+    await websocket.send_json({"type": "done", "audio_id": audio.id, "transcription_text": text})
+    await websocket.close()
+
+
 class TranscriptionUpdateRequest(BaseModel):
     """Схема запроса на обновление транскрипции"""
     transcription_text: str
@@ -143,12 +534,13 @@ async def update_transcription_text(
     )
 
 
-@router.post("/{audio_id}/transcribe", response_model=TranscriptionResponse)
+@router.post("/{audio_id}/transcribe", response_model=JobAcceptedResponse, status_code=202)
 async def transcribe_audio(
     audio_id: int,
+    response: Response,
     db: AsyncSession = Depends(get_db)
 ):
-    """Имитация транскрибации аудиофайла"""
+    """Поставить транскрибацию аудиофайла в очередь фоновых задач"""
     
     # Получаем аудиофайл
     audio = await crud.get_audio_file(db, audio_id)
@@ -159,64 +551,20 @@ async def transcribe_audio(
     if audio.transcription_status == TranscriptionStatus.COMPLETED:
         raise HTTPException(status_code=400, detail="Аудиофайл уже транскрибирован")
     
-    if audio.transcription_status == TranscriptionStatus.PROCESSING:
-        raise HTTPException(status_code=400, detail="Транскрибация уже выполняется")
+    # Повторное нажатие, пока задача в очереди или выполняется, не создаёт вторую задачу
+    job = await crud.get_active_job(db, JOB_TRANSCRIBE_AUDIO, audio_job_key(audio_id))
+    if job is None:
+        if audio.transcription_status == TranscriptionStatus.PROCESSING:
+            raise HTTPException(status_code=400, detail="Транскрибация уже выполняется")
+        # Статус "обработка" и задача для воркера; результат - GET /api/jobs/{job_id}
+        job = await enqueue_transcription(db, audio_id)
     
-    # Устанавливаем статус "обработка"
-    await crud.update_transcription(db, audio_id, TranscriptionStatus.PROCESSING)
-    
-    # Имитация обработки (5-7 секунд)
-    await asyncio.sleep(6)
-    
-    # Фиктивная транскрипция
-    fake_transcription = """
-    Врач: Здравствуйте! Проходите, присаживайтесь. Что вас беспокоит?
-    
-    Пациент: Добрый день, доктор. Последние несколько дней у меня сильные боли в верхней части живота, особенно усиливаются после приема пищи. Также ощущаю тяжесть и жжение.
-    
-    Врач: Понятно. А когда именно начались эти симптомы? И с чем вы связываете их появление?
-    
-    Пациент: Примерно неделю назад. Может быть связано с тем, что в последнее время часто питаюсь нерегулярно, употребляю много кофе и часто перекусываю на работе острой пищей.
-    
-    Врач: Хорошо. Отмечали ли вы изжогу, отрыжку, тошноту? Были ли эпизоды рвоты?
-    
-    Пациент: Да, изжога беспокоит, особенно по утрам и после еды. Отрыжка тоже периодически бывает. Тошноты нет, рвоты не было.
-    
-    Врач: Принимали ли вы какие-либо препараты для облегчения симптомов?
-    
-    Пациент: Пробовал принимать антациды, немного помогают, но ненадолго.
-    
-    Врач: Ясно. Сейчас я вас осмотрю. Прилягте, пожалуйста, на кушетку. При пальпации отмечается болезненность в эпигастральной области. Напряжения мышц передней брюшной стенки нет. Печень, селезёнка не увеличены.
-    
-    Пациент: Ох, да, здесь как раз болит.
-    
-    Врач: На основании жалоб и осмотра у вас, вероятно, обострение гастрита или начинающаяся язвенная болезнь желудка. Я назначу вам обследование: общий анализ крови, анализ на Helicobacter pylori, а также гастроскопию для уточнения диагноза.
-    
-    Пациент: Хорошо, доктор.
-    
-    Врач: Также рекомендую придерживаться диеты: исключить острое, жирное, копчёное, кофе, алкоголь. Питаться часто, но небольшими порциями. Назначу вам препараты для снижения кислотности и защиты слизистой желудка.
-    
-    Пациент: Спасибо большое! Буду следовать рекомендациям.
-    
-    Врач: Результаты анализов принесёте на повторный приём через неделю. Если состояние ухудшится — сразу обращайтесь. Будьте здоровы!
-    
-    Пациент: Спасибо, до свидания!
-    """
-    
-    # Обновляем статус на "завершено" с текстом транскрипции
-    audio = await crud.update_transcription(
-        db,
-        audio_id,
-        TranscriptionStatus.COMPLETED,
-        text=fake_transcription.strip()
-    )
-    
-    return TranscriptionResponse(
+    response.headers["Location"] = f"/api/jobs/{job.id}"
+    return JobAcceptedResponse(
         success=True,
-        message="Транскрибация завершена (MVP)",
-        transcription_status=audio.transcription_status,
-        transcription_text=audio.transcription_text,
-        transcribed_at=audio.transcribed_at
+        message="Транскрибация поставлена в очередь",
+        job_id=job.id,
+        status=job.status
     )
 
 
@@ -226,7 +574,7 @@ async def get_audio_by_appointment(
     db: AsyncSession = Depends(get_db)
 ):
     """Получить аудиофайл по ID приёма"""
-    audio = await crud.get_audio_file_by_appointment(db, appointment_id)
+    audio = await crud.get_audio_file_by_appointment(db, appointment_id, with_text=True)
     if not audio:
         raise HTTPException(status_code=404, detail="Аудиофайл не найден для этого приёма")
     return audio
@@ -238,39 +586,149 @@ async def get_audio_info(
     db: AsyncSession = Depends(get_db)
 ):
     """Получить информацию об аудиофайле"""
-    audio = await crud.get_audio_file(db, audio_id)
+    audio = await crud.get_audio_file(db, audio_id, with_text=True)
     if not audio:
         raise HTTPException(status_code=404, detail="Аудиофайл не найден")
     return audio
 
 
+@router.get("/{audio_id}/peaks", response_model=AudioWaveformSchema)
+async def get_audio_peaks(
+    audio_id: int,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_db)
+):
+    """Пики волновой формы и длительность записи для плеера (около килобайта вместо всей записи)"""
+    waveform = await crud.get_audio_waveform(db, audio_id)
+    if waveform is None:
+        raise HTTPException(status_code=404, detail="Аудиофайл не найден")
+    duration, peaks, sha256 = waveform
+    if peaks is None:
+        raise HTTPException(status_code=404, detail="Волновая форма записи не построена")
+    
+    # Ссылка без версии: после удаления записи id достаётся новой загрузке,
+    # поэтому кэш сверяется по ETag (версия в ответе - SHA-256 записи)
+    headers = {"Cache-Control": AUDIO_REVALIDATE_CACHE_CONTROL}
+    if sha256:
+        headers["ETag"] = f'"{sha256}"'
+        if etag_matches(request.headers.get("if-none-match", ""), headers["ETag"]):
+            return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return AudioWaveformSchema(duration=duration, peaks=list(peaks), version=sha256)
+
+
+def audio_cache_control(audio: AudioFile, version: Optional[str]) -> str:
+    """
+    Cache-Control записи: неизменяемая только по ссылке с версией текущего
+    содержимого и если не ожидается её перекодирование
+    """
+    if audio.sha256 and version == audio.sha256 and not transcode_pending(audio):
+        return AUDIO_CACHE_CONTROL
+    return AUDIO_REVALIDATE_CACHE_CONTROL
+
+
 @router.get("/{audio_id}/download")
 async def download_audio(
     audio_id: int,
+    request: Request,
+    v: Optional[str] = None,
     db: AsyncSession = Depends(get_db)
 ):
-    """Скачать или проиграть аудиофайл"""
+    """
+    Скачать или проиграть аудиофайл (поддерживаются Range-запросы для перемотки)
+    
+    v - версия записи (SHA-256 из /peaks): с ней ответ кэшируется как неизменяемый.
+    """
     audio = await crud.get_audio_file(db, audio_id)
     if not audio:
         raise HTTPException(status_code=404, detail="Аудиофайл не найден")
+    if not audio.filepath:
+        raise HTTPException(status_code=404, detail="Файл не найден на сервере")
     
-    file_path = Path(audio.filepath)
-    if not file_path.exists():
+    etag = f'"{audio.sha256}"' if audio.sha256 else None
+    cache_control = audio_cache_control(audio, v)
+    try:
+        # Запись из холодного уровня хранилища сначала восстанавливается
+        key = await rehydrate_audio(db, audio.filepath)
+        storage = get_storage(key)
+        local_path = storage.local_path(key)
+        if local_path is not None:
+            return await send_file(
+                request,
+                local_path,
+                media_type=audio.mime_type,
+                filename=audio.filename,
+                etag=etag,
+                cache_control=cache_control,
+                accel_redirect_prefix=settings.audio_accel_redirect,
+                accel_root=get_upload_dir()
+            )
+        if settings.s3_presigned_downloads:
+            # Байты отдаёт хранилище; ссылка временная - редирект не кэшируется
+            url = storage.presigned_url(key, audio.filename, audio.mime_type)
+            return RedirectResponse(url, status_code=307, headers={"Cache-Control": AUDIO_REDIRECT_CACHE_CONTROL})
+        return await send_stream(
+            request,
+            await storage.size(key),
+            lambda start, end: storage.iter_range(key, start, end),
+            media_type=audio.mime_type,
+            filename=audio.filename,
+            etag=etag,
+            cache_control=cache_control
+        )
+    except FileNotFoundError:
         raise HTTPException(status_code=404, detail="Файл не найден на сервере")
+
+
+async def save_generated_conversation(
+    db: AsyncSession,
+    appointment_id: int,
+    existing_audio: Optional[AudioFile],
+    conversation: str
+) -> AudioFile:
+    """Сохранить сгенерированный диалог как стенограмму приёма"""
+    # Если аудиофайла нет, создаём запись
+    if not existing_audio:
+        # Создаём "виртуальный" аудиофайл (без реального файла)
+        audio = await crud.create_audio_file(
+            db,
+            appointment_id=appointment_id,
+            filename="generated_conversation.txt",
+            filepath="",  # Нет реального файла
+            file_size=len(conversation.encode('utf-8')),
+            mime_type="text/plain"
+        )
+    else:
+        audio = existing_audio
     
-    return FileResponse(
-        path=file_path,
-        media_type=audio.mime_type,
-        filename=audio.filename
+    # Обновляем транскрипцию
+    audio = await crud.update_transcription(
+        db,
+        audio.id,
+        TranscriptionStatus.COMPLETED,
+        text=conversation
     )
+    
+    logger.info(f"Mock-разговор успешно сгенерирован и сохранён: appointment_id={appointment_id}, audio_id={audio.id}, text_length={len(conversation)}")
+    
+    return audio
 
 
 @router.post("/generate-mock-conversation")
 async def generate_mock_conversation(
+    request: Request,
     appointment_id: int = Query(..., description="ID приёма"),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    session_factory: async_sessionmaker[AsyncSession] = Depends(get_session_factory)
 ):
-    """Сгенерировать mock-разговор через OpenAI API"""
+    """
+    Сгенерировать mock-разговор через OpenAI API
+    
+    С Accept: text/event-stream реплики приходят по мере генерации
+    (событие line: {"text"}), затем done с тем же телом, что и JSON-ответ,
+    или error: {"detail"}.
+    """
     logger.info(f"Запрос генерации mock-разговора для приёма: appointment_id={appointment_id}")
     
     try:
@@ -287,40 +745,24 @@ async def generate_mock_conversation(
         
         # Проверяем, не создан ли уже аудиофайл с транскрипцией
         existing_audio = await crud.get_audio_file_by_appointment(db, appointment_id)
-        if existing_audio and existing_audio.transcription_text:
+        if existing_audio and existing_audio.transcription_status == TranscriptionStatus.COMPLETED:
             logger.info(f"Для приёма {appointment_id} уже есть транскрипция, перегенерируем")
         
         # Генерируем диалог через OpenAI
         logger.debug(f"Генерация диалога для пациента: {patient.full_name}, возраст: {patient.age}")
-        conversation = await openai_service.generate_conversation(
-            patient_name=patient.full_name,
-            patient_age=patient.age,
-            patient_gender=patient.gender.value if hasattr(patient.gender, 'value') else str(patient.gender)
-        )
+        patient_params = {
+            "patient_name": patient.full_name,
+            "patient_age": patient.age,
+            "patient_gender": patient.gender.value if hasattr(patient.gender, 'value') else str(patient.gender)
+        }
         
-        # Если аудиофайла нет, создаём запись
-        if not existing_audio:
-            # Создаём "виртуальный" аудиофайл (без реального файла)
-            audio = await crud.create_audio_file(
-                db,
-                appointment_id=appointment_id,
-                filename="generated_conversation.txt",
-                filepath="",  # Нет реального файла
-                file_size=len(conversation.encode('utf-8')),
-                mime_type="text/plain"
+        if wants_event_stream(request):
+            return event_stream_response(
+                stream_mock_conversation(session_factory, appointment_id, patient_params)
             )
-        else:
-            audio = existing_audio
         
-        # Обновляем транскрипцию
-        audio = await crud.update_transcription(
-            db,
-            audio.id,
-            TranscriptionStatus.COMPLETED,
-            text=conversation
-        )
-        
-        logger.info(f"Mock-разговор успешно сгенерирован и сохранён: appointment_id={appointment_id}, audio_id={audio.id}, text_length={len(conversation)}")
+        conversation = await openai_service.generate_conversation(**patient_params)
+        audio = await save_generated_conversation(db, appointment_id, existing_audio, conversation)
         
         return TranscriptionResponse(
             success=True,
@@ -340,17 +782,61 @@ async def generate_mock_conversation(
         raise HTTPException(status_code=500, detail=f"Ошибка генерации разговора: {str(e)}")
 
 
+async def stream_mock_conversation(
+    session_factory: async_sessionmaker[AsyncSession],
+    appointment_id: int,
+    patient_params: dict
+) -> AsyncIterator[str]:
+    """
+    События генерации разговора; диалог сохраняется, когда модель закончила
+    
+    Сессия запроса к этому моменту закрыта - сохранение в своей сессии.
+    """
+    try:
+        lines = []
+        async for line in openai_service.stream_conversation(**patient_params):
+            lines.append(line)
+            yield sse_event("line", {"text": line})
+        
+        async with session_factory() as db:
+            existing_audio = await crud.get_audio_file_by_appointment(db, appointment_id)
+            audio = await save_generated_conversation(db, appointment_id, existing_audio, "\n".join(lines))
+        response = TranscriptionResponse(
+            success=True,
+            message="Разговор успешно сгенерирован через OpenAI",
+            transcription_status=audio.transcription_status,
+            transcription_text=audio.transcription_text,
+            transcribed_at=audio.transcribed_at
+        )
+        yield sse_event("done", response.model_dump(mode="json"))
+        
+    except ValueError as e:
+        logger.error(f"Ошибка конфигурации при генерации разговора: {str(e)}")
+        yield sse_event("error", {"detail": str(e)})
+    except Exception as e:
+        logger.error(f"Ошибка при генерации mock-разговора: appointment_id={appointment_id}, error={str(e)}")
+        yield sse_event("error", {"detail": f"Ошибка генерации разговора: {str(e)}"})
+
+
 @router.post("/{audio_id}/extract-anamnesis", response_model=MedicalReportSchema)
 async def extract_anamnesis_from_transcription(
     audio_id: int,
-    db: AsyncSession = Depends(get_db)
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    session_factory: async_sessionmaker[AsyncSession] = Depends(get_session_factory)
 ):
-    """Извлечь данные анамнеза из транскрипции через OpenAI API"""
+    """
+    Извлечь данные анамнеза из транскрипции через OpenAI API
+    
+    С Accept: text/event-stream поля приходят по мере ответа модели
+    (событие field: {"name", "value"}), затем done с сохранённым отчётом
+    или error: {"detail"}.
+    """
     logger.info(f"Запрос извлечения анамнеза из транскрипции: audio_id={audio_id}")
     
     try:
         # Получаем аудиофайл
-        audio = await crud.get_audio_file(db, audio_id)
+        audio = await crud.get_audio_file(db, audio_id, with_text=True)
         if not audio:
             logger.warning(f"Попытка извлечения анамнеза из несуществующего аудио: audio_id={audio_id}")
             raise HTTPException(status_code=404, detail="Аудиофайл не найден")
@@ -360,23 +846,23 @@ async def extract_anamnesis_from_transcription(
             logger.warning(f"Попытка извлечения анамнеза без транскрипции: audio_id={audio_id}")
             raise HTTPException(status_code=400, detail="Транскрипция отсутствует. Сначала создайте транскрипцию.")
         
-        # Извлекаем данные через OpenAI
         logger.debug(f"Извлечение данных анамнеза, длина транскрипции: {len(audio.transcription_text)}")
-        anamnesis_data = await openai_service.extract_anamnesis_data(audio.transcription_text)
+        if wants_event_stream(request):
+            return event_stream_response(stream_anamnesis(session_factory, audio.id))
         
-        # Получаем appointment_id
-        appointment_id = audio.appointment_id
+        # Извлекаем данные через OpenAI
+        anamnesis_data = await openai_service.extract_anamnesis_data(audio.transcription_text, db)
         
         # Создаём или обновляем медицинский отчёт
         report = await crud.create_or_update_medical_report(
             db,
-            appointment_id,
+            audio.appointment_id,
             purpose=anamnesis_data.get("purpose"),
             complaints=anamnesis_data.get("complaints"),
             anamnesis=anamnesis_data.get("anamnesis")
         )
         
-        logger.info(f"Анамнез успешно извлечён и сохранён: audio_id={audio_id}, appointment_id={appointment_id}")
+        logger.info(f"Анамнез успешно извлечён и сохранён: audio_id={audio_id}, appointment_id={audio.appointment_id}")
         
         return report
         
@@ -390,12 +876,58 @@ async def extract_anamnesis_from_transcription(
         raise HTTPException(status_code=500, detail=f"Ошибка извлечения анамнеза: {str(e)}")
 
 
+async def stream_anamnesis(session_factory: async_sessionmaker[AsyncSession], audio_id: int) -> AsyncIterator[str]:
+    """
+    События извлечения анамнеза; отчёт сохраняется, когда пришли все поля
+    
+    Сессия запроса к этому моменту закрыта. Стенограмма и кэш ответов
+    читаются в короткой сессии, ответ модели идёт без сессии, кэш и
+    отчёт сохраняются в новой.
+    """
+    try:
+        async with session_factory() as db:
+            audio = await crud.get_audio_file(db, audio_id, with_text=True)
+            cached = None
+            if audio and audio.transcription_text:
+                cached = await openai_service.get_cached_anamnesis(audio.transcription_text, db)
+        if not audio or not audio.transcription_text:
+            yield sse_event("error", {"detail": "Транскрипция отсутствует. Сначала создайте транскрипцию."})
+            return
+        
+        if cached is not None:
+            anamnesis_data = {field: cached.get(field) for field in ANAMNESIS_FIELDS}
+            for field, value in anamnesis_data.items():
+                yield sse_event("field", {"name": field, "value": value})
+        else:
+            anamnesis_data = {}
+            async for field, value in openai_service.stream_anamnesis_data(audio.transcription_text):
+                anamnesis_data[field] = value
+                yield sse_event("field", {"name": field, "value": value})
+        
+        async with session_factory() as db:
+            if cached is None:
+                await openai_service.cache_anamnesis(db, audio.transcription_text, anamnesis_data)
+            report = await crud.create_or_update_medical_report(db, audio.appointment_id, **anamnesis_data)
+            done = MedicalReportSchema.model_validate(report).model_dump(mode="json")
+        logger.info(f"Анамнез успешно извлечён и сохранён: audio_id={audio_id}, appointment_id={audio.appointment_id}")
+        yield sse_event("done", done)
+        
+    except ValueError as e:
+        logger.error(f"Ошибка конфигурации при извлечении анамнеза: {str(e)}")
+        yield sse_event("error", {"detail": str(e)})
+    except Exception as e:
+        logger.error(f"Ошибка при извлечении анамнеза: audio_id={audio_id}, error={str(e)}")
+        yield sse_event("error", {"detail": f"Ошибка извлечения анамнеза: {str(e)}"})
+
+
 @router.post("/extract-anamnesis-by-appointment", response_model=MedicalReportSchema)
 async def extract_anamnesis_by_appointment(
+    request: Request,
     appointment_id: int = Query(..., description="ID приёма"),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    session_factory: async_sessionmaker[AsyncSession] = Depends(get_session_factory)
 ):
-    """Извлечь анамнез по appointment_id (вспомогательный endpoint)"""
+    """Извлечь анамнез по appointment_id (вспомогательный endpoint, поддерживает text/event-stream)"""
     logger.info(f"Запрос извлечения анамнеза по приёму: appointment_id={appointment_id}")
     
     try:
@@ -406,7 +938,7 @@ async def extract_anamnesis_by_appointment(
             raise HTTPException(status_code=404, detail="Аудиофайл не найден для этого приёма")
         
         # Используем существующую логику
-        return await extract_anamnesis_from_transcription(audio.id, db)
+        return await extract_anamnesis_from_transcription(audio.id, request, db, session_factory)
         
     except HTTPException:
         raise
@@ -428,16 +960,8 @@ async def delete_audio_by_appointment(
     if not audio:
         raise HTTPException(status_code=404, detail="Аудиофайл не найден для этого приёма")
     
-    # Удаляем физический файл, если он существует
-    if audio.filepath and os.path.exists(audio.filepath):
-        try:
-            os.remove(audio.filepath)
-            logger.info(f"Физический файл удалён: {audio.filepath}")
-        except Exception as e:
-            logger.warning(f"Не удалось удалить физический файл: {e}")
-    
-    # Удаляем запись из БД
-    await crud.delete_audio_file(db, audio.id)
+    # Удаляем запись из БД и физический файл, если это была последняя ссылка на него
+    await delete_audio_record(db, audio)
     logger.info(f"Аудиофайл удалён из БД: audio_id={audio.id}, appointment_id={appointment_id}")
     
     return {"success": True, "message": "Аудиофайл успешно удалён"}
@@ -462,7 +986,7 @@ async def create_mock_transcription(
         
         # Сначала пытаемся получить текст из БД (тестовые данные)
         transcription_text = None
-        test_data = await crud.get_test_data(db, key="transcription_text")
+        test_data = await crud.get_test_data(db, key="transcription_text", with_content=True)
         if test_data and test_data.content:
             transcription_text = test_data.content
             logger.info("Использованы тестовые данные из БД")
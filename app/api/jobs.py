@@ -0,0 +1,39 @@
+"""API endpoints для фоновых задач"""
+from fastapi import APIRouter, Depends, HTTPException, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import get_db
+from app import crud
+from app.schemas import JobAcceptedResponse, JobSchema
+from app.tasks import enqueue_storage_sweep
+
+router = APIRouter(prefix="/api/jobs", tags=["jobs"])
+
+
+@router.get("/{job_id}", response_model=JobSchema)
+async def get_job_status(
+    job_id: int,
+    db: AsyncSession = Depends(get_db)
+):
+    """Статус фоновой задачи"""
+    job = await crud.get_job(db, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Задача не найдена")
+    return job
+
+
+@router.post("/storage-sweep", response_model=JobAcceptedResponse, status_code=202)
+async def start_storage_sweep(
+    response: Response,
+    db: AsyncSession = Depends(get_db)
+):
+    """Запустить обслуживание хранилища записей вне расписания; итоги - в результате задачи"""
+    job = await enqueue_storage_sweep(db)
+    
+    response.headers["Location"] = f"/api/jobs/{job.id}"
+    return JobAcceptedResponse(
+        success=True,
+        message="Обслуживание хранилища поставлено в очередь",
+        job_id=job.id,
+        status=job.status
+    )
@@ -1,7 +1,7 @@
 """API endpoints для работы с пациентами"""
 import base64
 from typing import Optional
-from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, UploadFile, File, Form
 from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
 
@@ -9,6 +9,7 @@ from app.database import get_db
 from app import crud
 from app.schemas import PatientListSchema, DigitalPortraitSchema, HealthIndicatorSchema
 from app.openai_service import openai_service
+from app.pagination import NEXT_CURSOR_HEADER, InvalidCursorError
 from app.logger import get_logger
 
 router = APIRouter(prefix="/api/patients", tags=["patients"])
@@ -35,17 +36,28 @@ class BloodPressureUpdateRequest(BaseModel):
 
 @router.get("", response_model=list[PatientListSchema])
 async def get_patients_list(
+    response: Response,
     search: Optional[str] = Query(None, description="Поиск по ФИО"),
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы (заголовок X-Next-Cursor)"),
     db: AsyncSession = Depends(get_db)
 ):
-    """Получить список пациентов"""
-    logger.debug(f"Запрос списка пациентов: search={search}, skip={skip}, limit={limit}")
+    """
+    Получить список пациентов
+    
+    Постраничный обход: передавайте значение заголовка X-Next-Cursor
+    из предыдущего ответа в параметре cursor.
+    """
+    logger.debug(f"Запрос списка пациентов: search={search}, skip={skip}, limit={limit}, cursor={cursor}")
     try:
-        patients = await crud.get_patients(db, search=search, skip=skip, limit=limit)
+        patients = await crud.get_patients(db, search=search, skip=skip, limit=limit, cursor=cursor)
         logger.info(f"Получено {len(patients)} пациентов")
+        if len(patients) == limit:
+            response.headers[NEXT_CURSOR_HEADER] = crud.patient_cursor(patients[-1])
         return patients
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Ошибка при получении списка пациентов: {str(e)}")
         raise
@@ -0,0 +1,300 @@
+"""
+Метаданные и волновая форма записи, извлекаемые при загрузке
+
+Длительность, частота, число каналов и битрейт читаются без декодирования:
+у WAV - из заголовка (чанки fmt и data), у MP3 - сканированием заголовков
+кадров (файл читается блоками, данные кадров пропускаются). Так же
+потоково считаются пики волновой формы 16-битного WAV; остальные форматы
+для пиков декодируются через ffmpeg (iter_pcm), и вывод сводится в пики
+по блокам (PeakAccumulator) - в памяти не держится вся запись.
+
+Пики - WAVEFORM_PEAKS значений 0-255 (максимум модуля отсчётов на
+участке записи), хранятся байтами: плеер рисует волновую форму и
+длительность, не скачивая запись.
+
+Функции синхронные (чтение файла): вызываются в пуле потоков.
+"""
+import struct
+import sys
+from array import array
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Optional
+
+from app.audio_segmentation import AudioDecodeError, iter_pcm
+from app.logger import get_logger
+
+logger = get_logger(__name__)
+
+WAVEFORM_PEAKS = 1000
+READ_BLOCK_SIZE = 1024 * 1024
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+# MPEG Layer III: битрейты (кбит/с) по индексу для MPEG-1 и MPEG-2/2.5
+MP3_BITRATES = {
+    1: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    2: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+MP3_SAMPLE_RATES = {1: (44100, 48000, 32000), 2: (22050, 24000, 16000), 25: (11025, 12000, 8000)}
+
+
+class AudioMetadataError(Exception):
+    """Формат записи не распознан или заголовок повреждён"""
+
+
+@dataclass
+class AudioMetadata:
+    """Метаданные записи (имена полей совпадают со столбцами AudioFile)"""
+    duration: Optional[float] = None  # сек
+    sample_rate: Optional[int] = None
+    channels: Optional[int] = None
+    bitrate: Optional[int] = None  # бит/с, средний
+    waveform_peaks: Optional[bytes] = None
+
+
+@dataclass
+class _WavData:
+    format_tag: int
+    channels: int
+    sample_rate: int
+    bits: int
+    block_align: int
+    offset: int
+    size: int
+
+
+def _peak(samples: array) -> int:
+    return min(255, max(max(samples), -min(samples)) * 255 // 32767) if samples else 0
+
+
+class PeakAccumulator:
+    """
+    Пики волновой формы по отсчётам, поступающим блоками, когда длина
+    записи заранее неизвестна
+
+    Отсчёты сводятся в участки по bucket отсчётов; когда участков набирается
+    2 * count, соседние объединяются попарно, и участок удваивается. Память -
+    не больше 2 * count пиков при любой длине записи.
+    """
+
+    def __init__(self, count: int = WAVEFORM_PEAKS):
+        self.count = count
+        self.bucket = 1
+        self.samples = 0
+        self._peaks = bytearray()
+        self._filled = 0  # отсчётов в последнем, незаполненном участке
+
+    def add(self, samples: array) -> None:
+        self.samples += len(samples)
+        offset = 0
+        while offset < len(samples):
+            take = min(self.bucket - self._filled, len(samples) - offset)
+            peak = _peak(samples[offset:offset + take])
+            if self._filled:
+                self._peaks[-1] = max(self._peaks[-1], peak)
+            else:
+                self._peaks.append(peak)
+            self._filled = (self._filled + take) % self.bucket
+            offset += take
+            if not self._filled and len(self._peaks) >= 2 * self.count:
+                self._peaks = bytearray(map(max, self._peaks[::2], self._peaks[1::2]))
+                self.bucket *= 2
+
+    def peaks(self) -> bytes:
+        """Не больше count пиков: каждый - максимум участков, на которые приходится его доля записи"""
+        if len(self._peaks) <= self.count:
+            return bytes(self._peaks)
+        bounds = [index * self.samples // self.count for index in range(self.count + 1)]
+        return bytes(
+            max(self._peaks[start // self.bucket:(end - 1) // self.bucket + 1])
+            for start, end in zip(bounds, bounds[1:])
+        )
+
+
+def read_wav_header(f: BinaryIO, file_size: int) -> _WavData:
+    """Формат и положение данных WAV (чанки до data пропускаются)"""
+    header = f.read(12)
+    if len(header) < 12 or header[:4] != b"RIFF" or header[8:12] != b"WAVE":
+        raise AudioMetadataError("Не WAV: нет заголовка RIFF/WAVE")
+    fmt = None
+    while chunk := f.read(8):
+        if len(chunk) < 8:
+            break
+        chunk_id, size = struct.unpack("<4sI", chunk)
+        if chunk_id == b"fmt ":
+            data = f.read(size + (size & 1))
+            if len(data) < 16:
+                raise AudioMetadataError("Повреждён чанк fmt")
+            fmt = struct.unpack("<HHIIHH", data[:16])
+        elif chunk_id == b"data":
+            if fmt is None:
+                raise AudioMetadataError("Чанк data до чанка fmt")
+            format_tag, channels, sample_rate, _, block_align, bits = fmt
+            offset = f.tell()
+            # Запись, прерванная до обновления заголовка, или потоковый
+            # заголовок (0xFFFFFFFF): данные - до конца файла
+            size = min(size, file_size - offset)
+            if not channels or not sample_rate or not block_align:
+                raise AudioMetadataError("Повреждён чанк fmt")
+            return _WavData(format_tag, channels, sample_rate, bits, block_align, offset, size)
+        else:
+            f.seek(size + (size & 1), 1)
+    raise AudioMetadataError("В WAV нет чанка data")
+
+
+def _wav_peaks(f: BinaryIO, wav: _WavData, count: int) -> Optional[bytes]:
+    """Пики 16-битного PCM WAV, читая данные блоками по участку записи"""
+    if wav.format_tag not in (WAVE_FORMAT_PCM, WAVE_FORMAT_EXTENSIBLE) or wav.bits != 16:
+        return None
+    frames = wav.size // wav.block_align
+    bucket_bytes = max(1, -(-frames // count)) * wav.block_align
+    f.seek(wav.offset)
+    peaks = bytearray()
+    remaining = frames * wav.block_align
+    while remaining > 0:
+        data = f.read(min(bucket_bytes, remaining))
+        if len(data) < 2:
+            break
+        remaining -= len(data)
+        samples = array("h", data[:len(data) // 2 * 2])
+        if sys.byteorder == "big":
+            samples.byteswap()
+        peaks.append(_peak(samples))
+    return bytes(peaks)
+
+
+def read_wav_metadata(f: BinaryIO, file_size: int, count: int = WAVEFORM_PEAKS) -> AudioMetadata:
+    """Метаданные и пики WAV"""
+    wav = read_wav_header(f, file_size)
+    duration = wav.size / wav.block_align / wav.sample_rate
+    return AudioMetadata(
+        duration=duration,
+        sample_rate=wav.sample_rate,
+        channels=wav.channels,
+        bitrate=wav.sample_rate * wav.block_align * 8,
+        waveform_peaks=_wav_peaks(f, wav, count),
+    )
+
+
+def _skip_id3(f: BinaryIO) -> None:
+    header = f.read(10)
+    if len(header) == 10 and header[:3] == b"ID3":
+        size = (header[6] << 21) | (header[7] << 14) | (header[8] << 7) | header[9]
+        footer = 10 if header[5] & 0x10 else 0
+        f.seek(10 + size + footer)
+    else:
+        f.seek(0)
+
+
+def parse_mp3_frame_header(header: bytes) -> Optional[tuple[int, int, int, int]]:
+    """Заголовок кадра MPEG Layer III: (длина кадра, отсчётов, частота, каналов) или None"""
+    if len(header) < 4 or header[0] != 0xFF or header[1] & 0xE0 != 0xE0:
+        return None
+    version_bits = (header[1] >> 3) & 0x03
+    layer_bits = (header[1] >> 1) & 0x03
+    bitrate_index = header[2] >> 4
+    rate_index = (header[2] >> 2) & 0x03
+    if version_bits == 1 or layer_bits != 1 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    version = {3: 1, 2: 2, 0: 25}[version_bits]
+    bitrate = MP3_BITRATES[1 if version == 1 else 2][bitrate_index] * 1000
+    sample_rate = MP3_SAMPLE_RATES[version][rate_index]
+    samples = 1152 if version == 1 else 576
+    padding = (header[2] >> 1) & 0x01
+    channels = 1 if header[3] >> 6 == 3 else 2
+    return samples // 8 * bitrate // sample_rate + padding, samples, sample_rate, channels
+
+
+def read_mp3_metadata(f: BinaryIO) -> AudioMetadata:
+    """Длительность и средний битрейт MP3 по заголовкам всех кадров"""
+    _skip_id3(f)
+    buffer = b""
+    position = 0
+    first_frame = True
+    total_samples = audio_bytes = 0
+    sample_rate = channels = None
+    while True:
+        if len(buffer) - position < 4:
+            if position > len(buffer):
+                f.seek(position - len(buffer), 1)
+                buffer = b""
+            else:
+                buffer = buffer[position:]
+            position = 0
+            block = f.read(READ_BLOCK_SIZE)
+            if not block:
+                break
+            buffer += block
+            continue
+
+        frame = parse_mp3_frame_header(buffer[position:position + 4])
+        if frame is None:
+            # Мусор между кадрами или тег в конце файла: ищем следующую синхронизацию
+            found = buffer.find(b"\xff", position + 1)
+            position = found if found != -1 else len(buffer)
+            continue
+
+        length, samples, rate, frame_channels = frame
+        if first_frame:
+            first_frame = False
+            head = buffer[position:position + min(length, 64)]
+            if b"Xing" in head or b"Info" in head:
+                # Служебный кадр VBR-заголовка не содержит звука
+                position += length
+                continue
+        total_samples += samples
+        audio_bytes += length
+        sample_rate, channels = rate, frame_channels
+        position += length
+
+    if not total_samples:
+        raise AudioMetadataError("В MP3 не найдено кадров")
+    duration = total_samples / sample_rate
+    return AudioMetadata(
+        duration=duration,
+        sample_rate=sample_rate,
+        channels=channels,
+        bitrate=round(audio_bytes * 8 / duration),
+    )
+
+
+def _decoded_metadata(path: Path, metadata: AudioMetadata, count: int) -> AudioMetadata:
+    """Пики (и длительность, если неизвестна) по записи, декодируемой блоками"""
+    accumulator = PeakAccumulator(count)
+    rate = None
+    try:
+        for samples, rate in iter_pcm(path):
+            accumulator.add(samples)
+    except AudioDecodeError as e:
+        logger.info(f"Волновая форма {path.name} не построена: {e}")
+        return metadata
+    if metadata.duration is None and rate:
+        metadata.duration = accumulator.samples / rate
+    metadata.waveform_peaks = accumulator.peaks()
+    return metadata
+
+
+def extract_metadata(path: Path, count: int = WAVEFORM_PEAKS) -> AudioMetadata:
+    """
+    Метаданные и пики записи; для нераспознанного формата без ffmpeg -
+    пустые метаданные (загрузка от этого не зависит)
+    """
+    file_size = path.stat().st_size
+    with open(path, "rb") as f:
+        magic = f.read(4)
+        f.seek(0)
+        try:
+            if magic == b"RIFF":
+                metadata = read_wav_metadata(f, file_size, count)
+            elif magic[:3] == b"ID3" or parse_mp3_frame_header(magic):
+                metadata = read_mp3_metadata(f)
+            else:
+                metadata = AudioMetadata()
+        except AudioMetadataError as e:
+            logger.warning(f"Метаданные {path.name} не прочитаны: {e}")
+            metadata = AudioMetadata()
+    if metadata.waveform_peaks is None:
+        metadata = _decoded_metadata(path, metadata, count)
+    return metadata
@@ -0,0 +1,232 @@
+"""
+Разбиение записи приёма на фрагменты речи
+
+Запись декодируется в PCM (16 бит, моно): через ffmpeg, если он
+установлен, иначе WAV читается стандартным модулем wave. Детектор
+активности голоса - энергетический: RMS кадров по VAD_FRAME_MS
+сравнивается с порогом, выше уровня шума записи (нижний дециль RMS) в
+VAD_NOISE_RATIO раз. Паузы длиннее VAD_MIN_SILENCE_MS отбрасываются,
+близкие участки речи объединяются во фрагменты не длиннее
+VAD_MAX_CHUNK_SECONDS - их распознают параллельно (app/transcription.py).
+
+Функции синхронные и нагружают CPU: вызываются в процессе пула
+распознавания, поэтому параметры (из настроек VAD_*) передаются явно.
+"""
+import operator
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import wave
+from array import array
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Iterator, Sequence, Union
+
+# Частота PCM при декодировании через ffmpeg (её ожидают модели распознавания)
+SAMPLE_RATE = 16000
+# Блок чтения декодированного PCM, байт
+PCM_BLOCK_SIZE = 256 * 1024
+# Минимальный RMS речи: тишина цифровой записи не должна считаться речью
+MIN_SPEECH_RMS = 100
+# Участки речи с паузой не длиннее этой (сек) распознаются одним фрагментом
+MAX_MERGE_GAP = 2.0
+
+
+class AudioDecodeError(Exception):
+    """Запись не удалось декодировать в PCM"""
+
+
+@dataclass
+class SpeechChunk:
+    """Фрагмент записи: WAV-файл и его положение в исходной записи, сек"""
+    start: float
+    end: float
+    path: Path
+
+
+def iter_pcm(path: Path, block_size: int = PCM_BLOCK_SIZE) -> Iterator[tuple[array, int]]:
+    """
+    Отсчёты записи (16 бит, моно) блоками по block_size байт, с частотой
+    дискретизации
+
+    Запись целиком в память не читается: вывод ffmpeg читается из канала
+    по мере декодирования. Если генератор закрыт раньше, ffmpeg завершается.
+    """
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg:
+        # Сообщения ffmpeg - во временный файл: заполненный канал stderr остановил бы декодирование
+        with tempfile.TemporaryFile() as stderr:
+            process = subprocess.Popen(
+                [ffmpeg, "-nostdin", "-v", "error", "-i", str(path), "-ac", "1", "-ar", str(SAMPLE_RATE),
+                 "-f", "s16le", "-"],
+                stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=stderr,
+            )
+            try:
+                while block := process.stdout.read(block_size):
+                    yield _native_samples(array("h", block[:len(block) // 2 * 2])), SAMPLE_RATE
+                if process.wait() != 0:
+                    stderr.seek(0)
+                    raise AudioDecodeError(stderr.read().decode(errors="replace").strip() or "ffmpeg завершился с ошибкой")
+            finally:
+                if process.poll() is None:
+                    process.kill()
+                process.stdout.close()
+                process.wait()
+        return
+
+    try:
+        wav = wave.open(str(path))
+    except (wave.Error, EOFError) as e:
+        raise AudioDecodeError(f"Для этого формата нужен ffmpeg: {e}")
+    with wav:
+        if wav.getsampwidth() != 2:
+            raise AudioDecodeError("Без ffmpeg поддерживается только 16-битный WAV")
+        channels = wav.getnchannels()
+        rate = wav.getframerate()
+        frames = max(1, block_size // 2 // channels)
+        while block := wav.readframes(frames):
+            samples = array("h", block)
+            if channels > 1:
+                # Первый канал: микрофон врача пишет речь обоих собеседников
+                samples = samples[::channels]
+            yield _native_samples(samples), rate
+
+
+def _native_samples(samples: array) -> array:
+    if sys.byteorder == "big":
+        samples.byteswap()
+    return samples
+
+
+def read_pcm(path: Path) -> tuple[array, int]:
+    """Отсчёты записи (16 бит, моно) и частота дискретизации"""
+    samples = array("h")
+    rate = SAMPLE_RATE
+    for block, rate in iter_pcm(path):
+        samples.extend(block)
+    return samples, rate
+
+
+def frame_energies(samples: array, frame_size: int) -> list[float]:
+    """RMS каждого кадра"""
+    energies = []
+    for offset in range(0, len(samples), frame_size):
+        frame = samples[offset:offset + frame_size]
+        energies.append((sum(map(operator.mul, frame, frame)) / len(frame)) ** 0.5)
+    return energies
+
+
+def speech_threshold(energies: Sequence[float], noise_ratio: float) -> float:
+    """Порог RMS речи: уровень шума (нижний дециль RMS кадров) * noise_ratio"""
+    noise_floor = sorted(energies)[len(energies) // 10]
+    return max(noise_floor * noise_ratio, MIN_SPEECH_RMS)
+
+
+def speech_frames(energies: list[float], threshold: float, max_gap: int) -> list[list[int]]:
+    """Участки речи в кадрах: [[первый кадр, последний кадр + 1]], паузы до max_gap кадров не разделяют"""
+    regions: list[list[int]] = []
+    for index, energy in enumerate(energies):
+        if energy < threshold:
+            continue
+        if regions and index - regions[-1][1] <= max_gap:
+            regions[-1][1] = index + 1
+        else:
+            regions.append([index, index + 1])
+    return regions
+
+
+def detect_speech(
+    samples: array,
+    rate: int,
+    frame_ms: int = 30,
+    noise_ratio: float = 3.0,
+    min_silence_ms: int = 600,
+    min_speech_ms: int = 250,
+    padding_ms: int = 200,
+) -> list[tuple[int, int]]:
+    """Участки речи: [(начальный отсчёт, конечный отсчёт)]"""
+    frame_size = max(1, rate * frame_ms // 1000)
+    energies = frame_energies(samples, frame_size)
+    if not energies:
+        return []
+    regions = speech_frames(energies, speech_threshold(energies, noise_ratio), min_silence_ms // frame_ms)
+
+    padding = rate * padding_ms // 1000
+    min_frames = max(1, min_speech_ms // frame_ms)
+    return [
+        (max(0, start * frame_size - padding), min(len(samples), end * frame_size + padding))
+        for start, end in regions
+        if end - start >= min_frames
+    ]
+
+
+def group_regions(regions: list[tuple[int, int]], max_samples: int, max_gap: int) -> list[tuple[int, int]]:
+    """
+    Объединить соседние участки во фрагменты не длиннее max_samples
+
+    Участки, между которыми пауза длиннее max_gap, не объединяются:
+    тишина внутри фрагмента тоже распознаётся.
+    """
+    chunks: list[tuple[int, int]] = []
+    for start, end in regions:
+        if chunks and start - chunks[-1][1] <= max_gap and end - chunks[-1][0] <= max_samples:
+            chunks[-1] = (chunks[-1][0], end)
+            continue
+        # Участок длиннее фрагмента режется на равные части
+        while end - start > max_samples:
+            chunks.append((start, start + max_samples))
+            start += max_samples
+        chunks.append((start, end))
+    return chunks
+
+
+def write_wav(target: Union[Path, BinaryIO], samples: array, rate: int) -> None:
+    """Записать отсчёты в WAV (файловый объект после записи остаётся открытым)"""
+    if sys.byteorder == "big":
+        samples = array("h", samples)
+        samples.byteswap()
+    with wave.open(str(target) if isinstance(target, Path) else target, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(samples.tobytes())
+
+
+def wav_header(rate: int, data_size: int) -> bytes:
+    """Заголовок WAV (16 бит, моно) для data_size байт отсчётов - для записи данных по частям"""
+    data_size -= data_size % 2
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", 36 + data_size, b"WAVE",
+        b"fmt ", 16, 1, 1, rate, rate * 2, 2, 16,
+        b"data", data_size,
+    )
+
+
+def split_recording(
+    path: str,
+    output_dir: str,
+    frame_ms: int = 30,
+    noise_ratio: float = 3.0,
+    min_silence_ms: int = 600,
+    min_speech_ms: int = 250,
+    padding_ms: int = 200,
+    max_chunk_seconds: float = 30.0,
+) -> tuple[list[SpeechChunk], float]:
+    """
+    Разбить запись на фрагменты речи (WAV в output_dir)
+
+    Returns:
+        Фрагменты по порядку и длительность всей записи, сек
+    """
+    samples, rate = read_pcm(Path(path))
+    regions = detect_speech(samples, rate, frame_ms, noise_ratio, min_silence_ms, min_speech_ms, padding_ms)
+    groups = group_regions(regions, int(max_chunk_seconds * rate), int(MAX_MERGE_GAP * rate))
+    chunks = []
+    for index, (start, end) in enumerate(groups):
+        chunk_path = Path(output_dir) / f"{index:04d}.wav"
+        write_wav(chunk_path, samples[start:end], rate)
+        chunks.append(SpeechChunk(start=start / rate, end=end / rate, path=chunk_path))
+    return chunks, len(samples) / rate
@@ -0,0 +1,476 @@
+"""
+Хранение загруженных аудиофайлов на диске
+
+Файловые операции выполняются в пуле потоков, чтобы медленный диск не
+останавливал event loop. Загрузка пишется во временный файл рядом с
+целевым и переименовывается (os.replace) только после успешной записи:
+по итоговому пути никогда не лежит недописанный файл.
+
+receive_multipart_file разбирает multipart-тело запроса потоково и пишет
+файл сразу в каталог загрузок, минуя промежуточный spool-файл Starlette,
+попутно считая SHA-256 содержимого. Тот же временный файл с подсчётом
+хэша (PartialFile) использует запись с распознаванием
+(app/live_transcription.py).
+
+Хранилище адресуется по содержимому: файл лежит под ключом
+ab/cd/<sha256> (два уровня каталогов по первым байтам хэша, чтобы
+каталоги оставались небольшими), одинаковые загрузки разделяют один
+файл. Где лежат файлы - в каталоге загрузок или в S3 - решает
+app/object_storage.py; принятые файлы до размещения всегда в каталоге
+загрузок. Размещение файла и удаление последней ссылки на него
+выполняются под store_lock: для локального хранилища - межпроцессная
+блокировка каталога загрузок, для общего (S3, несколько узлов) -
+блокировки ключей в общей БД.
+"""
+import asyncio
+import fcntl
+import hashlib
+import os
+import uuid
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import AsyncIterator, BinaryIO, Collection, Optional
+
+from fastapi import Request
+from multipart.exceptions import MultipartParseError
+from multipart.multipart import MultipartParser, parse_options_header
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from app import crud
+from app.config import settings
+from app.logger import get_logger
+from app.object_storage import get_storage
+
+logger = get_logger(__name__)
+
+# Суффикс временных файлов незавершённых загрузок
+PARTIAL_SUFFIX = ".part"
+# Файл межпроцессной блокировки хранилища (в каталоге загрузок)
+STORE_LOCK_FILE = ".store.lock"
+# Интервал повторных попыток занять блокировку ключа в БД, сек
+STORE_LOCK_POLL_INTERVAL = 0.1
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class UploadTooLargeError(Exception):
+    """Размер загружаемого файла превышает лимит"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        super().__init__(f"Файл больше {max_size} байт")
+
+
+class InvalidUploadError(Exception):
+    """Некорректное multipart-тело: нет файла, нет boundary, ошибка разбора"""
+
+
+class UnsupportedFileTypeError(InvalidUploadError):
+    """Расширение загружаемого файла не входит в допустимые"""
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        super().__init__(f"Неподдерживаемый формат файла: {filename}")
+
+
+@dataclass
+class StoredUpload:
+    """
+    Файл, принятый из multipart-запроса
+
+    path - временный файл: его переносит в хранилище store_blob
+    или удаляет remove_file.
+    """
+    filename: str
+    content_type: Optional[str]
+    path: Path
+    size: int
+    sha256: str = ""
+
+
+def get_upload_dir() -> Path:
+    """Получить путь к директории для загрузок"""
+    upload_path = Path(settings.upload_dir)
+    upload_path.mkdir(parents=True, exist_ok=True)
+    return upload_path
+
+
+def new_partial_path(directory: Path) -> Path:
+    """Путь нового временного файла в каталоге (каталог создаётся)"""
+    directory.mkdir(parents=True, exist_ok=True)
+    return directory / f".{uuid.uuid4()}{PARTIAL_SUFFIX}"
+
+
+def _open_partial(directory: Path) -> tuple[Path, BinaryIO]:
+    path = new_partial_path(directory)
+    return path, open(path, "wb")
+
+
+def _sync_close(f: BinaryIO) -> None:
+    f.flush()
+    os.fsync(f.fileno())
+    f.close()
+
+
+def _write_hashed(f: BinaryIO, digest: "hashlib._Hash", data: bytes) -> None:
+    # hashlib отпускает GIL на больших блоках, хэш считается в том же потоке, что и запись
+    digest.update(data)
+    f.write(data)
+
+
+def _discard(f: BinaryIO, partial_path: Path) -> None:
+    f.close()
+    partial_path.unlink(missing_ok=True)
+
+
+class PartialFile:
+    """
+    Временный файл принимаемой записи в каталоге загрузок
+
+    Данные дописываются с подсчётом SHA-256. После close() файл (path)
+    переносится в хранилище через store_blob; discard() удаляет его.
+    Файловые операции выполняются в пуле потоков.
+    """
+
+    def __init__(self, path: Path, file: BinaryIO):
+        self.path = path
+        self.file = file
+        self.digest = hashlib.sha256()
+
+    @classmethod
+    async def create(cls, directory: Path) -> "PartialFile":
+        """Создать временный файл в каталоге (каталог создаётся)"""
+        return cls(*await run_in_threadpool(_open_partial, directory))
+
+    @property
+    def sha256(self) -> str:
+        """SHA-256 записанных через write() данных"""
+        return self.digest.hexdigest()
+
+    async def write(self, data: bytes) -> None:
+        await run_in_threadpool(_write_hashed, self.file, self.digest, data)
+
+    async def close(self) -> None:
+        """Сбросить файл на диск и закрыть"""
+        await run_in_threadpool(_sync_close, self.file)
+
+    async def discard(self) -> None:
+        await run_in_threadpool(self.discard_now)
+
+    def discard_now(self) -> None:
+        """Удалить файл, не дожидаясь пула потоков (при отмене запроса ждать его нельзя)"""
+        _discard(self.file, self.path)
+
+
+async def remove_file(path: str) -> bool:
+    """Удалить файл вне event loop; False, если файла не было"""
+    def _remove() -> bool:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    return await run_in_threadpool(_remove)
+
+
+def blob_key(sha256: str) -> str:
+    """Ключ файла с данным SHA-256 в хранилище: ab/cd/abcd..."""
+    return f"{sha256[:2]}/{sha256[2:4]}/{sha256}"
+
+
+async def hash_file(path: Path, chunk_size: int = HASH_CHUNK_SIZE) -> str:
+    """SHA-256 файла (чтение в пуле потоков)"""
+    def _hash() -> str:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            while chunk := f.read(chunk_size):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    return await run_in_threadpool(_hash)
+
+
+@asynccontextmanager
+async def store_lock(db: AsyncSession, *keys: str) -> AsyncIterator[None]:
+    """
+    Блокировка хранилища на время размещения файла и записи ссылки на него
+    в БД или удаления последней ссылки и самого файла
+
+    keys - ключи хранилища, которые затрагивает вызывающий код. Локальное
+    хранилище блокируется целиком (flock). Общее хранилище (S3) меняют
+    все узлы, поэтому блокируются сами ключи - строками в общей БД.
+    """
+    lock = _key_locks(db, keys) if get_storage().shared else file_lock()
+    async with lock:
+        yield
+
+
+@asynccontextmanager
+async def file_lock(path: Optional[Path] = None, wait: bool = True) -> AsyncIterator[bool]:
+    """
+    flock файла, по умолчанию - блокировки каталога загрузок
+
+    Действует и между воркерами: каждый вход открывает свой дескриптор,
+    ожидание блокировки выполняется в пуле потоков. path - существующий
+    файл, он не создаётся (FileNotFoundError). С wait=False занятая
+    блокировка не ожидается - блок получает False.
+    """
+    def _acquire() -> Optional[int]:
+        if path is None:
+            fd = os.open(get_upload_dir() / STORE_LOCK_FILE, os.O_RDWR | os.O_CREAT, 0o644)
+        else:
+            fd = os.open(path, os.O_RDONLY)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX if wait else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return None
+        except BaseException:
+            os.close(fd)
+            raise
+        return fd
+
+    fd = await run_in_threadpool(_acquire)
+    try:
+        yield fd is not None
+    finally:
+        # Закрытие дескриптора снимает блокировку
+        if fd is not None:
+            os.close(fd)
+
+
+@asynccontextmanager
+async def _key_locks(db: AsyncSession, keys: Collection[str]) -> AsyncIterator[None]:
+    """
+    Блокировки ключей общего хранилища в БД (crud.acquire_storage_lock)
+
+    Ключи занимаются по порядку сортировки, поэтому узлы не блокируют
+    друг друга взаимно. Занятый ключ ожидается опросом; блокировка узла,
+    упавшего с ней, перехватывается через storage_lock_ttl.
+    """
+    owner = uuid.uuid4().hex
+    acquired: list[str] = []
+    try:
+        for key in sorted({key for key in keys if key}):
+            while not await crud.acquire_storage_lock(db, key, owner, settings.storage_lock_ttl):
+                await asyncio.sleep(STORE_LOCK_POLL_INTERVAL)
+            acquired.append(key)
+        yield
+    finally:
+        if acquired:
+            try:
+                await crud.release_storage_locks(db, acquired, owner)
+            except Exception as e:
+                logger.warning(f"Не удалось снять блокировку ключей хранилища {acquired}: {e}")
+
+
+async def store_blob(partial_path: Path, sha256: str) -> tuple[str, bool]:
+    """
+    Перенести принятый файл в хранилище, вернуть (ключ, создан ли файл)
+
+    Если файл с таким содержимым уже есть, временный файл удаляется.
+    Вызывается под store_lock.
+    """
+    key = blob_key(sha256)
+    storage = get_storage()
+    if await storage.exists(key):
+        await remove_file(str(partial_path))
+        logger.info(f"Файл {sha256} уже есть в хранилище, загрузка не дублируется")
+        return key, False
+    await storage.store_file(key, partial_path)
+    return key, True
+
+
+async def remove_blob(key: str) -> bool:
+    """Удалить файл из хранилища; False, если его не было"""
+    return await get_storage(key).delete(key)
+
+
+@asynccontextmanager
+async def local_copy(key: str) -> AsyncIterator[Path]:
+    """
+    Локальный файл записи на время обработки (ffmpeg, распознавание)
+
+    Из локального хранилища - сам файл, из S3 - временная копия в каталоге
+    загрузок, удаляемая после обработки.
+    """
+    storage = get_storage(key)
+    path = storage.local_path(key)
+    if path is not None:
+        yield path
+        return
+
+    path = await run_in_threadpool(new_partial_path, get_upload_dir())
+    try:
+        await storage.download(key, path)
+        yield path
+    finally:
+        await remove_file(str(path))
+
+
+class _MultipartFileReceiver:
+    """
+    Потоковый приёмник одного файлового поля multipart-запроса
+
+    Колбэки python-multipart синхронные, поэтому они только накапливают
+    данные в буфере; запись буфера на диск (в пуле потоков) выполняет
+    receive() между порциями тела запроса.
+    """
+
+    def __init__(
+        self,
+        field_name: str,
+        directory: Path,
+        max_size: int,
+        allowed_extensions: Optional[Collection[str]],
+        chunk_size: int
+    ):
+        self.field_name = field_name
+        self.directory = directory
+        self.max_size = max_size
+        self.allowed_extensions = allowed_extensions
+        self.chunk_size = chunk_size
+
+        self.upload: Optional[StoredUpload] = None
+        self.partial: Optional[PartialFile] = None
+        self.buffer = bytearray()
+        self.finished = False
+
+        self._receiving = False
+        self._disposition = b""
+        self._content_type: Optional[str] = None
+        self._header_name = b""
+        self._header_value = b""
+        self._pending_open = False
+
+    # Колбэки MultipartParser
+
+    def on_part_begin(self) -> None:
+        self._disposition = b""
+        self._content_type = None
+        self._receiving = False
+
+    def on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._header_name += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._header_value += data[start:end]
+
+    def on_header_end(self) -> None:
+        name = self._header_name.lower()
+        if name == b"content-disposition":
+            self._disposition = self._header_value
+        elif name == b"content-type":
+            self._content_type = self._header_value.decode("latin-1")
+        self._header_name = b""
+        self._header_value = b""
+
+    def on_headers_finished(self) -> None:
+        _, options = parse_options_header(self._disposition)
+        name = options.get(b"name", b"").decode("utf-8", errors="replace")
+        if name != self.field_name or b"filename" not in options or self.upload is not None:
+            return
+        filename = options[b"filename"].decode("utf-8", errors="replace")
+        extension = Path(filename).suffix.lower()
+        if self.allowed_extensions is not None and extension not in self.allowed_extensions:
+            raise UnsupportedFileTypeError(filename)
+        self.upload = StoredUpload(
+            filename=filename,
+            content_type=self._content_type,
+            path=self.directory,
+            size=0,
+        )
+        self._receiving = True
+        self._pending_open = True
+
+    def on_part_data(self, data: bytes, start: int, end: int) -> None:
+        if not self._receiving:
+            return
+        self.upload.size += end - start
+        if self.upload.size > self.max_size:
+            raise UploadTooLargeError(self.max_size)
+        self.buffer += data[start:end]
+
+    def on_part_end(self) -> None:
+        if self._receiving:
+            self._receiving = False
+            self.finished = True
+
+    async def flush(self, final: bool = False) -> None:
+        """Записать накопленные данные на диск"""
+        if self._pending_open:
+            self._pending_open = False
+            self.partial = await PartialFile.create(self.directory)
+            self.upload.path = self.partial.path
+        if self.partial is None:
+            return
+        if self.buffer and (final or len(self.buffer) >= self.chunk_size):
+            data = bytes(self.buffer)
+            self.buffer.clear()
+            await self.partial.write(data)
+
+    async def receive(self, request: Request) -> StoredUpload:
+        content_type = request.headers.get("content-type", "")
+        _, params = parse_options_header(content_type)
+        boundary = params.get(b"boundary")
+        if not content_type.startswith("multipart/form-data") or not boundary:
+            raise InvalidUploadError("Ожидается multipart/form-data")
+
+        parser = MultipartParser(boundary, {
+            "on_part_begin": self.on_part_begin,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+        })
+        try:
+            async for chunk in request.stream():
+                try:
+                    parser.write(chunk)
+                except MultipartParseError as e:
+                    raise InvalidUploadError(f"Ошибка разбора multipart: {e}")
+                await self.flush()
+                if self.finished:
+                    # Остальные поля формы не нужны, а тело ограничено middleware
+                    break
+            if not self.finished:
+                raise InvalidUploadError(f"Файл не передан в поле {self.field_name}")
+            await self.flush(final=True)
+            await self.partial.close()
+        except Exception:
+            if self.partial is not None:
+                await self.partial.discard()
+            raise
+        except BaseException:
+            if self.partial is not None:
+                self.partial.discard_now()
+            raise
+        self.upload.sha256 = self.partial.sha256
+        return self.upload
+
+
+async def receive_multipart_file(
+    request: Request,
+    field_name: str,
+    directory: Path,
+    max_size: int,
+    allowed_extensions: Optional[Collection[str]] = None,
+    chunk_size: int = 0
+) -> StoredUpload:
+    """
+    Принять файл из multipart-запроса во временный файл в directory
+
+    Тело читается потоково: данные файла пишутся блоками по chunk_size,
+    SHA-256 считается по ходу записи. Возвращённый временный файл
+    (upload.path) переносится в хранилище через store_blob. Ошибки:
+    UploadTooLargeError, UnsupportedFileTypeError (до записи первого
+    байта), InvalidUploadError; при ошибке временный файл удаляется.
+    """
+    receiver = _MultipartFileReceiver(
+        field_name, directory, max_size, allowed_extensions, chunk_size or settings.upload_chunk_size
+    )
+    return await receiver.receive(request)
@@ -0,0 +1,88 @@
+"""
+Перекодирование загруженных записей в Opus (Ogg)
+
+Браузер пишет WAV примерно 10 МБ в минуту; речь в Opus 32 кбит/с - около
+0.25 МБ в минуту при том же качестве для прослушивания и распознавания.
+Перекодирует ffmpeg в отдельном процессе (задача очереди, app/tasks.py);
+результат проверяется - ffprobe должен прочитать файл, а длительность
+совпасть с исходной, - и только после этого заменяет исходную запись в
+хранилище.
+
+Вывод побайтно воспроизводим (bitexact, фиксированный serial потока Ogg):
+одинаковые записи дают одинаковый файл и разделяют его в хранилище.
+"""
+import asyncio
+import shutil
+from pathlib import Path
+from typing import Optional
+
+from app.logger import get_logger
+
+logger = get_logger(__name__)
+
+OPUS_MIME_TYPE = "audio/ogg"
+OPUS_EXTENSION = ".ogg"
+OPUS_SAMPLE_RATE = 48000  # Opus всегда декодируется в 48 кГц
+OPUS_CHANNELS = 1
+# Типы записей, которые перекодируются (WebM/Ogg из браузера уже в Opus)
+TRANSCODE_MIME_TYPES = {"audio/wav", "audio/wave", "audio/x-wav", "audio/mpeg", "audio/mp3"}
+# Допустимое расхождение длительности перекодированной записи, сек
+DURATION_TOLERANCE = 0.5
+
+
+class TranscodeError(Exception):
+    """Перекодирование не удалось или результат не прошёл проверку"""
+
+
+def needs_transcode(mime_type: str, saved_bytes: Optional[int]) -> bool:
+    """Подлежит ли запись перекодированию (и может ли ещё смениться её файл)"""
+    return saved_bytes is None and mime_type in TRANSCODE_MIME_TYPES
+
+
+def is_available() -> bool:
+    """Установлены ли ffmpeg и ffprobe"""
+    return shutil.which("ffmpeg") is not None and shutil.which("ffprobe") is not None
+
+
+async def _run(*args: str) -> bytes:
+    process = await asyncio.create_subprocess_exec(
+        *args, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+    )
+    stdout, stderr = await process.communicate()
+    if process.returncode != 0:
+        raise TranscodeError(stderr.decode(errors="replace").strip() or f"{args[0]}: код {process.returncode}")
+    return stdout
+
+
+async def probe_duration(path: Path) -> Optional[float]:
+    """Длительность записи по ffprobe, сек (None - формат её не сообщает)"""
+    output = await _run(
+        "ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "default=nw=1:nk=1", str(path)
+    )
+    try:
+        return float(output.strip())
+    except ValueError:
+        return None
+
+
+async def transcode_to_opus(source: Path, target: Path, bitrate: str) -> None:
+    """Перекодировать запись в Opus (моно, битрейт для речи)"""
+    await _run(
+        "ffmpeg", "-nostdin", "-v", "error", "-y", "-i", str(source),
+        "-vn", "-map_metadata", "-1", "-ac", str(OPUS_CHANNELS), "-c:a", "libopus", "-b:a", bitrate,
+        "-application", "voip", "-fflags", "+bitexact", "-flags:a", "+bitexact",
+        "-serial_offset", "1", "-f", "ogg", str(target),
+    )
+
+
+async def verify_transcode(source: Path, target: Path) -> float:
+    """Проверить перекодированную запись, вернуть её длительность"""
+    source_duration = await probe_duration(source)
+    target_duration = await probe_duration(target)
+    if target_duration is None or target_duration <= 0:
+        raise TranscodeError("Перекодированная запись не читается")
+    if source_duration is not None and abs(source_duration - target_duration) > DURATION_TOLERANCE:
+        raise TranscodeError(
+            f"Длительность перекодированной записи {target_duration:.1f} с, исходной - {source_duration:.1f} с"
+        )
+    return target_duration
@@ -0,0 +1,94 @@
+"""
+Сжатое хранение больших текстов (транскрипции, анамнез)
+
+Значение в БД - BLOB: первый байт - версия формата, далее данные.
+Версия 0x00 - текст UTF-8 без сжатия (короткие строки), 0x01 - raw
+deflate (zlib) с общим словарём DICTIONARY_V1. Строки, записанные до
+появления сжатия (TEXT), читаются как есть, поэтому миграция данных
+может идти постепенно - каждая запись пересжимается при сохранении.
+"""
+import zlib
+from typing import Optional, Union
+
+from sqlalchemy import LargeBinary
+from sqlalchemy.types import TypeDecorator
+
+from app.config import settings
+
+FORMAT_PLAIN = 0x00
+FORMAT_ZLIB_V1 = 0x01
+
+# Общий словарь для zlib: частые слова и обороты стенограмм приёма и анамнеза.
+# НЕ ИЗМЕНЯТЬ - им сжаты сохранённые данные. Новый словарь - новая версия формата.
+DICTIONARY_V1 = (
+    "Цель обращения: консультация, профилактический осмотр, повторный приём, "
+    "больничный лист, направление на анализы. "
+    "Рекомендовано: общий анализ крови, общий анализ мочи, биохимический анализ крови, "
+    "ЭКГ, УЗИ органов брюшной полости, рентгенография, консультация специалиста, "
+    "повторный приём через неделю. Назначено: диета, режим, приём препаратов по схеме. "
+    "Объективно: состояние удовлетворительное, сознание ясное, кожные покровы обычной "
+    "окраски, дыхание везикулярное, хрипов нет, тоны сердца ясные, ритмичные, живот мягкий, "
+    "безболезненный при пальпации. Артериальное давление мм рт. ст., пульс уд/мин, "
+    "температура тела. Аллергологический анамнез не отягощён. Вредные привычки отрицает. "
+    "Хронические заболевания: гипертоническая болезнь, сахарный диабет, гастрит. "
+    "Анамнез заболевания: считает себя больным в течение нескольких дней, недель. "
+    "Принимал препараты без эффекта, с временным улучшением. "
+    "Жалобы на головную боль, головокружение, слабость, повышение температуры, кашель, "
+    "насморк, боль в горле, боли в животе, тошноту, изжогу, одышку, боли в спине. "
+    "Скажите, пожалуйста, когда это началось? Как давно? Сколько раз в день? "
+    "Понятно. Хорошо, доктор. Спасибо, до свидания! Что вас беспокоит? "
+    "Здравствуйте! Проходите, присаживайтесь. "
+    "**Врач:** **Пациент:** Врач: Пациент: "
+).encode("utf-8")
+
+# raw deflate без заголовка и контрольной суммы zlib (целостность - на стороне БД)
+_WBITS = -15
+
+
+def compress_text(value: str) -> bytes:
+    """Упаковать текст в формат хранения"""
+    raw = value.encode("utf-8")
+    if len(raw) >= settings.text_compression_min_size:
+        compressor = zlib.compressobj(settings.text_compression_level, zlib.DEFLATED, _WBITS, zdict=DICTIONARY_V1)
+        packed = compressor.compress(raw) + compressor.flush()
+        if len(packed) < len(raw):
+            return bytes([FORMAT_ZLIB_V1]) + packed
+    return bytes([FORMAT_PLAIN]) + raw
+
+
+def decompress_text(value: Union[bytes, str]) -> str:
+    """Распаковать значение из БД (str - строка, сохранённая до сжатия)"""
+    if isinstance(value, str):
+        return value
+    data = bytes(value)
+    if not data:
+        return ""
+    version, payload = data[0], data[1:]
+    if version == FORMAT_PLAIN:
+        return payload.decode("utf-8")
+    if version == FORMAT_ZLIB_V1:
+        decompressor = zlib.decompressobj(_WBITS, zdict=DICTIONARY_V1)
+        return (decompressor.decompress(payload) + decompressor.flush()).decode("utf-8")
+    raise ValueError(f"Неизвестная версия формата сжатого текста: {version}")
+
+
+class CompressedText(TypeDecorator):
+    """
+    Текстовая колонка, хранимая в БД в сжатом виде
+
+    Для кода приложения выглядит как обычная строка. Распаковка происходит
+    при загрузке значения; вместе с deferred-колонками это означает, что
+    текст распаковывается только там, где его явно запросили (undefer).
+    """
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value: Optional[str], dialect) -> Optional[bytes]:
+        if value is None:
+            return None
+        return compress_text(value)
+
+    def process_result_value(self, value: Optional[Union[bytes, str]], dialect) -> Optional[str]:
+        if value is None:
+            return None
+        return decompress_text(value)
@@ -13,15 +13,99 @@ class Settings(BaseSettings):
     
     # Database
     database_url: str = "sqlite+aiosqlite:///./elia.db"
+    db_pool_size: int = 5  # Постоянные соединения в пуле
+    db_max_overflow: int = 10  # Дополнительные соединения сверх pool_size
+    db_pool_timeout: int = 30  # Ожидание свободного соединения, сек
+    db_auto_migrate: bool = False  # Применять миграции при старте вместо проверки ревизии схемы
+    
+    # SQLite storage profile (PRAGMA для каждого соединения пула)
+    sqlite_pragmas_enabled: bool = True
+    sqlite_journal_mode: str = "WAL"  # WAL: читатели не блокируются записью
+    sqlite_synchronous: str = "NORMAL"  # NORMAL безопасен в режиме WAL
+    sqlite_busy_timeout: int = 5000  # мс ожидания блокировки записи
+    sqlite_cache_size: int = -65536  # < 0 — размер в КиБ (64MB)
+    sqlite_mmap_size: int = 268435456  # 256MB memory-mapped I/O
+    sqlite_temp_store: str = "MEMORY"  # DEFAULT, FILE, MEMORY
+    
+    # Очередь записи (один писатель, групповой коммит)
+    write_queue_enabled: bool = False
+    write_queue_max_batch: int = 32  # Максимум операций в одной транзакции
+    write_queue_batch_window_ms: int = 0  # Ожидание для накопления группы, мс
+    
+    # Сжатие транскрипций и текстов отчётов в БД
+    text_compression_level: int = 6  # Уровень zlib (1-9)
+    text_compression_min_size: int = 64  # Байт; более короткие строки хранятся без сжатия
+    
+    # Фоновые задачи (очередь в БД, app/jobs.py)
+    job_workers: int = 2  # Воркеров в процессе; 0 - задачи выполняет другой процесс
+    job_poll_interval: float = 1.0  # Опрос очереди при отсутствии задач, сек
+    job_visibility_timeout: int = 300  # Срок владения задачей без продления, сек
+    job_max_attempts: int = 3
+    job_retry_base_delay: float = 5.0  # Задержка первого повтора, сек (далее удваивается)
+    job_retry_max_delay: float = 300.0
+    mis_submit_delay: float = 3.0  # Имитация отправки отчёта в МИС, сек
+    
+    # Распознавание речи (app/transcription.py)
+    transcription_engine: str = "mock"  # mock, faster-whisper
+    transcription_mock_delay: float = 6.0  # Имитация длительности транскрибации, сек
+    transcription_processes: int = 0  # Процессов распознавания; 0 - ядра / transcription_cpu_threads
+    transcription_cpu_threads: int = 1  # Потоков на одно распознавание
+    whisper_model: str = "small"  # Имя модели или путь к каталогу модели ctranslate2
+    whisper_compute_type: str = "int8"  # int8 - быстрее всего на CPU
+    whisper_download_root: str = "models"  # Каталог скачанных моделей
+    whisper_language: str = "ru"  # Пусто - определять язык автоматически
+    whisper_beam_size: int = 5
+    # Разбиение записи на фрагменты речи для параллельного распознавания (app/audio_segmentation.py)
+    transcription_vad_enabled: bool = True
+    vad_frame_ms: int = 30
+    vad_noise_ratio: float = 3.0  # Порог речи относительно уровня шума записи
+    vad_min_silence_ms: int = 600  # Более короткие паузы не разделяют речь
+    vad_min_speech_ms: int = 250  # Более короткие всплески считаются шумом
+    vad_padding_ms: int = 200  # Запас вокруг участка речи
+    vad_max_chunk_seconds: float = 30.0  # Максимальная длина фрагмента (окно Whisper - 30 с)
+    # Распознавание во время записи (WebSocket /api/audio/live)
+    live_step_seconds: float = 2.0  # Новой записи между проходами распознавания, сек
+    live_partial_results: bool = True  # Присылать предварительный текст незавершённой реплики
     
     # Server
     host: str = "0.0.0.0"
     port: int = 8000
     debug: bool = True
     
+    # Поиск пациентов
+    search_transliterate: bool = True  # Искать латиницу и в транслитерации (ivanov -> иванов)
+    
     # Upload
     upload_dir: str = "static/uploads"
     max_upload_size: int = 52428800  # 50MB
+    max_image_upload_size: int = 10485760  # 10MB, фото тонометра
+    upload_chunk_size: int = 1048576  # Размер блока записи загрузки на диск (1MB)
+    # Префикс internal-location nginx для отдачи аудио через X-Accel-Redirect
+    # (например, /protected-audio/); пусто - файл отдаёт приложение
+    audio_accel_redirect: str = ""
+    # Хранилище записей (app/object_storage.py): local - каталог upload_dir, s3 - S3-совместимое
+    audio_storage: str = "local"
+    s3_endpoint_url: str = ""  # Например, http://minio:9000
+    s3_public_endpoint_url: str = ""  # Адрес для браузера в подписанных ссылках; пусто - s3_endpoint_url
+    s3_bucket: str = ""
+    s3_region: str = "us-east-1"
+    s3_access_key: str = ""
+    s3_secret_key: str = ""
+    s3_part_size: int = 8388608  # Часть multipart-загрузки (8MB, минимум S3 - 5MB)
+    s3_presigned_downloads: bool = True  # Отдавать записи ссылкой на хранилище, а не через приложение
+    s3_presign_expires: int = 3600  # Срок действия ссылки, сек
+    # Блокировка ключа общего хранилища в БД (узлы с S3): снимается сама, если узел упал, сек;
+    # должна покрывать самое долгое размещение файла в хранилище
+    storage_lock_ttl: int = 600
+    # Обслуживание хранилища записей (app/storage_lifecycle.py): фоновая задача по расписанию
+    storage_sweep_interval: int = 3600  # Между запусками, сек; 0 - только вручную (POST /api/jobs/storage-sweep)
+    storage_sweep_batch_size: int = 500  # Файлов или записей за один запрос к БД
+    storage_orphan_grace: int = 86400  # Файлы моложе, сек, не удаляются (загрузка или обработка ещё идёт)
+    audio_retention_days: int = 0  # Удалять файлы записей старше, дней (стенограмма остаётся); 0 - хранить бессрочно
+    audio_cold_after_days: int = 30  # Сжимать несжатые записи (WAV) старше, дней; 0 - не сжимать
+    # Перекодирование загруженных WAV/MP3 в Opus фоновой задачей (app/audio_transcode.py, нужен ffmpeg)
+    audio_transcode_enabled: bool = True
+    audio_opus_bitrate: str = "32k"  # Для речи достаточно 24-32 кбит/с
     
     # Application
     app_name: str = "Elia AI Platform"
@@ -36,6 +120,11 @@ class Settings(BaseSettings):
     openai_api_key: str = ""
     openai_base_url: str = "https://api.openai.com/v1"
     openai_model: str = "gpt-4"
+    # Кэш ответов модели (app/llm_cache.py): в памяти процесса и в таблице llm_responses
+    llm_cache_enabled: bool = True
+    llm_cache_memory_entries: int = 256  # Ответов в памяти процесса (LRU)
+    llm_cache_max_entries: int = 10000  # Ответов в БД, сверх - удаляются самые старые
+    llm_cache_ttl: int = 30 * 86400  # Срок жизни ответа, сек; 0 - бессрочно
 
 
 settings = Settings()
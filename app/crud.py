@@ -1,15 +1,108 @@
 """CRUD операции для работы с базой данных"""
-from datetime import datetime
-from typing import Optional, Sequence
-from sqlalchemy import select, or_
+from datetime import date, datetime, timedelta
+from typing import Any, Optional, Sequence, TypeVar
+from sqlalchemy import String, and_, cast, delete, func, literal, select, or_, update
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import joinedload, selectinload, undefer, undefer_group
+from sqlalchemy.sql.elements import ColumnElement
 
 from app.models import (
     Patient, Appointment, MedicalReport, AudioFile,
     ChronicDisease, RecentDisease, HealthIndicator,
-    TranscriptionStatus, TestData
+    TranscriptionStatus, TestData, Job, JobStatus, LLMResponse, StorageLock
 )
+from app.pagination import InvalidCursorError, decode_cursor, encode_cursor, keyset_condition
+from app.search import patient_search_condition
+from app.write_queue import run_write
+
+T = TypeVar("T")
+
+
+async def _patient_name_filter(db: AsyncSession, search: str) -> ColumnElement[bool]:
+    """Условие поиска пациента по ФИО: FTS5-индекс или ILIKE как запасной вариант"""
+    condition = await patient_search_condition(db, search)
+    if condition is not None:
+        return condition
+    return or_(
+        Patient.first_name.ilike(f"%{search}%"),
+        Patient.last_name.ilike(f"%{search}%"),
+        Patient.middle_name.ilike(f"%{search}%")
+    )
+
+
+def _upsert(
+    session: AsyncSession,
+    model: type[T],
+    values: dict[str, Any],
+    conflict: list[str],
+    set_: dict[str, Any],
+    where: Optional[ColumnElement[bool]] = None
+):
+    """
+    INSERT ... ON CONFLICT (conflict) DO UPDATE SET ... [WHERE ...] RETURNING *
+    
+    Запись создаётся или обновляется одним запросом, без SELECT перед ней
+    и без refresh после коммита. С where существующая строка обновляется
+    только при выполнении условия, иначе запрос ничего не возвращает.
+    Поддерживаются SQLite (3.35+) и PostgreSQL.
+    """
+    dialect = session.get_bind().dialect.name
+    if dialect == "postgresql":
+        insert = postgresql.insert
+    elif dialect == "sqlite":
+        insert = sqlite.insert
+    else:
+        raise NotImplementedError(f"Upsert не поддерживается для {dialect}")
+    return (
+        insert(model)
+        .values(**values)
+        .on_conflict_do_update(index_elements=conflict, set_=set_, where=where)
+        .returning(model)
+    )
+
+
+async def _execute_returning(session: AsyncSession, statement) -> Any:
+    """Выполнить запрос с RETURNING и обновить объект в identity map"""
+    result = await session.scalars(statement, execution_options={"populate_existing": True})
+    return result.one_or_none()
+
+
+# Порядок списков (ключи keyset-пагинации, id - для однозначности)
+PATIENT_ORDER = (Patient.last_name, Patient.first_name, Patient.middle_name, Patient.id)
+APPOINTMENT_ORDER = (Appointment.appointment_date, Appointment.appointment_time_start, Appointment.id)
+
+
+def patient_cursor(patient: Patient) -> str:
+    """Курсор для страницы пациентов, следующей за patient"""
+    return encode_cursor([patient.last_name, patient.first_name, patient.middle_name, patient.id])
+
+
+def appointment_cursor(appointment: Appointment) -> str:
+    """Курсор для страницы приёмов, следующей за appointment"""
+    return encode_cursor([
+        appointment.appointment_date.isoformat(),
+        appointment.appointment_time_start,
+        appointment.id
+    ])
+
+
+def _decode_appointment_cursor(cursor: str) -> list:
+    """Распаковать курсор приёмов с восстановлением типа даты"""
+    appointment_date, time_start, appointment_id = decode_cursor(cursor, len(APPOINTMENT_ORDER))
+    try:
+        return [date.fromisoformat(appointment_date), str(time_start), int(appointment_id)]
+    except (TypeError, ValueError) as e:
+        raise InvalidCursorError("Некорректный курсор") from e
+
+
+def _decode_patient_cursor(cursor: str) -> list:
+    """Распаковать курсор пациентов"""
+    *names, patient_id = decode_cursor(cursor, len(PATIENT_ORDER))
+    try:
+        return [*(str(name) for name in names), int(patient_id)]
+    except (TypeError, ValueError) as e:
+        raise InvalidCursorError("Некорректный курсор") from e
 
 
 # === Patient CRUD ===
@@ -32,20 +125,26 @@ async def get_patients(
     db: AsyncSession, 
     search: Optional[str] = None, 
     skip: int = 0, 
-    limit: int = 100
+    limit: int = 100,
+    cursor: Optional[str] = None
 ) -> Sequence[Patient]:
-    """Получить список пациентов с возможностью поиска"""
+    """
+    Получить список пациентов с возможностью поиска
+    
+    Если передан cursor (см. patient_cursor), страница начинается сразу
+    после него и skip игнорируется. Некорректный курсор - InvalidCursorError.
+    """
     query = select(Patient)
     
     if search:
-        search_filter = or_(
-            Patient.first_name.ilike(f"%{search}%"),
-            Patient.last_name.ilike(f"%{search}%"),
-            Patient.middle_name.ilike(f"%{search}%")
-        )
-        query = query.where(search_filter)
+        query = query.where(await _patient_name_filter(db, search))
     
-    query = query.offset(skip).limit(limit)
+    query = query.order_by(*PATIENT_ORDER)
+    if cursor:
+        query = query.where(keyset_condition(PATIENT_ORDER, _decode_patient_cursor(cursor)))
+    else:
+        query = query.offset(skip)
+    query = query.limit(limit)
     result = await db.execute(query)
     return result.scalars().all()
 
@@ -66,34 +165,75 @@ async def get_appointments(
     db: AsyncSession,
     search: Optional[str] = None,
     skip: int = 0,
-    limit: int = 100
+    limit: int = 100,
+    cursor: Optional[str] = None
 ) -> Sequence[Appointment]:
-    """Получить список приёмов с пациентами"""
+    """
+    Получить список приёмов с пациентами (новые сверху)
+    
+    Если передан cursor (см. appointment_cursor), страница начинается сразу
+    после него и skip игнорируется. Некорректный курсор - InvalidCursorError.
+    """
     query = select(Appointment).options(selectinload(Appointment.patient))
     
     if search:
-        query = query.join(Patient).where(
-            or_(
-                Patient.first_name.ilike(f"%{search}%"),
-                Patient.last_name.ilike(f"%{search}%"),
-                Patient.middle_name.ilike(f"%{search}%")
-            )
-        )
+        query = query.join(Patient).where(await _patient_name_filter(db, search))
     
-    query = query.order_by(Appointment.appointment_date.desc(), Appointment.appointment_time_start.desc())
-    query = query.offset(skip).limit(limit)
+    query = query.order_by(*(col.desc() for col in APPOINTMENT_ORDER))
+    if cursor:
+        query = query.where(
+            keyset_condition(APPOINTMENT_ORDER, _decode_appointment_cursor(cursor), descending=True)
+        )
+    else:
+        query = query.offset(skip)
+    query = query.limit(limit)
     
     result = await db.execute(query)
     return result.scalars().all()
 
 
-# === Medical Report CRUD ===
-
-async def get_medical_report(db: AsyncSession, appointment_id: int) -> Optional[MedicalReport]:
-    """Получить медицинский отчёт для приёма"""
+async def get_appointment_workspace(db: AsyncSession, appointment_id: int) -> Optional[Appointment]:
+    """
+    Получить приём со всем, что нужно карточке пациента
+    
+    Пациент с показателями, отчёт и аудиофайл подтягиваются JOIN-ом
+    в одном запросе, списки заболеваний - двумя запросами selectin.
+    """
     result = await db.execute(
-        select(MedicalReport).where(MedicalReport.appointment_id == appointment_id)
+        select(Appointment)
+        .options(
+            joinedload(Appointment.patient).options(
+                joinedload(Patient.health_indicators),
+                selectinload(Patient.chronic_diseases),
+                selectinload(Patient.recent_diseases)
+            ),
+            joinedload(Appointment.medical_report).undefer_group(REPORT_TEXT),
+            joinedload(Appointment.audio_file).undefer(AudioFile.transcription_text)
+        )
+        .where(Appointment.id == appointment_id)
     )
+    return result.unique().scalar_one_or_none()
+
+
+# === Medical Report CRUD ===
+
+REPORT_TEXT = "report_text"
+
+
+async def get_medical_report(
+    db: AsyncSession,
+    appointment_id: int,
+    with_text: bool = False
+) -> Optional[MedicalReport]:
+    """
+    Получить медицинский отчёт для приёма
+    
+    Текстовые поля (цель, жалобы, анамнез) загружаются только при with_text=True.
+    """
+    query = select(MedicalReport).where(MedicalReport.appointment_id == appointment_id)
+    if with_text:
+        query = query.options(undefer_group(REPORT_TEXT))
+    result = await db.execute(query)
     return result.scalar_one_or_none()
 
 
@@ -104,61 +244,65 @@ async def create_or_update_medical_report(
     complaints: Optional[str] = None,
     anamnesis: Optional[str] = None
 ) -> MedicalReport:
-    """Создать или обновить медицинский отчёт"""
-    report = await get_medical_report(db, appointment_id)
+    """
+    Создать или обновить медицинский отчёт
     
-    if report:
-        # Обновление существующего отчёта
-        if purpose is not None:
-            report.purpose = purpose
-        if complaints is not None:
-            report.complaints = complaints
-        if anamnesis is not None:
-            report.anamnesis = anamnesis
-        report.updated_at = datetime.utcnow()
-    else:
-        # Создание нового отчёта
-        report = MedicalReport(
-            appointment_id=appointment_id,
-            purpose=purpose,
-            complaints=complaints,
-            anamnesis=anamnesis
-        )
-        db.add(report)
+    Одним upsert-запросом; поля со значением None не перезаписываются.
+    """
+    async def unit(session: AsyncSession) -> MedicalReport:
+        now = datetime.utcnow()
+        fields = {
+            name: value
+            for name, value in (("purpose", purpose), ("complaints", complaints), ("anamnesis", anamnesis))
+            if value is not None
+        }
+        statement = _upsert(
+            session,
+            MedicalReport,
+            values={"appointment_id": appointment_id, **fields, "created_at": now, "updated_at": now},
+            conflict=["appointment_id"],
+            set_={**fields, "updated_at": now}
+        ).options(undefer_group(REPORT_TEXT))
+        return await _execute_returning(session, statement)
     
-    await db.commit()
-    await db.refresh(report)
-    return report
+    return await run_write(db, unit, refresh=False)
 
 
 async def submit_report_to_mis(db: AsyncSession, appointment_id: int) -> MedicalReport:
     """Имитация отправки отчёта в МИС"""
-    report = await get_medical_report(db, appointment_id)
-    if not report:
-        raise ValueError("Отчёт не найден")
+    async def unit(session: AsyncSession) -> MedicalReport:
+        report = await get_medical_report(session, appointment_id)
+        if not report:
+            raise ValueError("Отчёт не найден")
+        
+        report.submitted_to_mis = True
+        report.submitted_at = datetime.utcnow()
+        return report
     
-    report.submitted_to_mis = True
-    report.submitted_at = datetime.utcnow()
-    await db.commit()
-    await db.refresh(report)
-    return report
+    return await run_write(db, unit)
 
 
 # === Audio File CRUD ===
 
-async def get_audio_file(db: AsyncSession, audio_id: int) -> Optional[AudioFile]:
-    """Получить аудиофайл по ID"""
-    result = await db.execute(
-        select(AudioFile).where(AudioFile.id == audio_id)
-    )
+async def get_audio_file(db: AsyncSession, audio_id: int, with_text: bool = False) -> Optional[AudioFile]:
+    """Получить аудиофайл по ID (текст транскрипции - только при with_text=True)"""
+    query = select(AudioFile).where(AudioFile.id == audio_id)
+    if with_text:
+        query = query.options(undefer(AudioFile.transcription_text))
+    result = await db.execute(query)
     return result.scalar_one_or_none()
 
 
-async def get_audio_file_by_appointment(db: AsyncSession, appointment_id: int) -> Optional[AudioFile]:
-    """Получить аудиофайл для приёма"""
-    result = await db.execute(
-        select(AudioFile).where(AudioFile.appointment_id == appointment_id)
-    )
+async def get_audio_file_by_appointment(
+    db: AsyncSession,
+    appointment_id: int,
+    with_text: bool = False
+) -> Optional[AudioFile]:
+    """Получить аудиофайл для приёма (текст транскрипции - только при with_text=True)"""
+    query = select(AudioFile).where(AudioFile.appointment_id == appointment_id)
+    if with_text:
+        query = query.options(undefer(AudioFile.transcription_text))
+    result = await db.execute(query)
     return result.scalar_one_or_none()
 
 
@@ -168,21 +312,88 @@ async def create_audio_file(
     filename: str,
     filepath: str,
     file_size: int,
-    mime_type: str
+    mime_type: str,
+    sha256: Optional[str] = None,
+    duration: Optional[float] = None,
+    sample_rate: Optional[int] = None,
+    channels: Optional[int] = None,
+    bitrate: Optional[int] = None,
+    waveform_peaks: Optional[bytes] = None
 ) -> AudioFile:
     """Создать запись об аудиофайле"""
-    audio = AudioFile(
-        appointment_id=appointment_id,
-        filename=filename,
-        filepath=filepath,
-        file_size=file_size,
-        mime_type=mime_type,
-        transcription_status=TranscriptionStatus.PENDING
+    async def unit(session: AsyncSession) -> AudioFile:
+        audio = AudioFile(
+            appointment_id=appointment_id,
+            filename=filename,
+            filepath=filepath,
+            sha256=sha256,
+            file_size=file_size,
+            mime_type=mime_type,
+            duration=duration,
+            sample_rate=sample_rate,
+            channels=channels,
+            bitrate=bitrate,
+            waveform_peaks=waveform_peaks,
+            transcription_status=TranscriptionStatus.PENDING
+        )
+        session.add(audio)
+        return audio
+    
+    return await run_write(db, unit)
+
+
+async def get_audio_waveform(
+    db: AsyncSession, audio_id: int
+) -> Optional[tuple[Optional[float], Optional[bytes], Optional[str]]]:
+    """Длительность, пики волновой формы и SHA-256 аудиофайла (без загрузки записи целиком)"""
+    result = await db.execute(
+        select(AudioFile.duration, AudioFile.waveform_peaks, AudioFile.sha256).where(AudioFile.id == audio_id)
     )
-    db.add(audio)
-    await db.commit()
-    await db.refresh(audio)
-    return audio
+    row = result.one_or_none()
+    return tuple(row) if row else None
+
+
+async def count_audio_file_references(db: AsyncSession, filepath: str) -> int:
+    """Число записей аудиофайлов, ссылающихся на файл хранилища"""
+    result = await db.execute(
+        select(func.count()).select_from(AudioFile).where(AudioFile.filepath == filepath)
+    )
+    return result.scalar_one()
+
+
+async def get_referenced_audio_paths(db: AsyncSession, filepaths: Sequence[str]) -> set[str]:
+    """Какие из файлов хранилища используются записями аудиофайлов"""
+    if not filepaths:
+        return set()
+    result = await db.execute(
+        select(AudioFile.filepath).where(AudioFile.filepath.in_(filepaths)).distinct()
+    )
+    return set(result.scalars().all())
+
+
+async def get_audio_files_uploaded_before(
+    db: AsyncSession,
+    before: datetime,
+    limit: int,
+    after_id: int = 0,
+    mime_types: Optional[Sequence[str]] = None,
+    not_compacted: bool = False
+) -> list[AudioFile]:
+    """
+    Аудиофайлы с файлом в хранилище, загруженные раньше before, по
+    возрастанию ID (следующая пачка - after_id последнего)
+    """
+    query = select(AudioFile).where(
+        AudioFile.id > after_id, AudioFile.uploaded_at < before, AudioFile.filepath != ""
+    )
+    if mime_types is not None:
+        query = query.where(AudioFile.mime_type.in_(mime_types))
+    if not_compacted:
+        query = query.where(AudioFile.compacted_at.is_(None), AudioFile.sha256.is_not(None))
+    result = await db.execute(
+        query.order_by(AudioFile.id).limit(limit).execution_options(populate_existing=True)
+    )
+    return list(result.scalars().all())
 
 
 async def update_transcription(
@@ -191,30 +402,144 @@ async def update_transcription(
     status: TranscriptionStatus,
     text: Optional[str] = None
 ) -> AudioFile:
-    """Обновить статус транскрибации"""
-    audio = await get_audio_file(db, audio_id)
-    if not audio:
-        raise ValueError("Аудиофайл не найден")
+    """Обновить статус транскрибации (UPDATE ... RETURNING)"""
+    async def unit(session: AsyncSession) -> AudioFile:
+        values: dict[str, Any] = {"transcription_status": status}
+        if text:
+            values["transcription_text"] = text
+        if status == TranscriptionStatus.COMPLETED:
+            values["transcribed_at"] = datetime.utcnow()
+        
+        statement = (
+            update(AudioFile)
+            .where(AudioFile.id == audio_id)
+            .values(**values)
+            .returning(AudioFile)
+            .options(undefer(AudioFile.transcription_text))
+        )
+        audio = await _execute_returning(session, statement)
+        if not audio:
+            raise ValueError("Аудиофайл не найден")
+        return audio
+    
+    return await run_write(db, unit, refresh=False)
+
+
+async def replace_audio_file_content(
+    db: AsyncSession,
+    audio_id: int,
+    expected_filepath: str,
+    filename: str,
+    filepath: str,
+    sha256: str,
+    file_size: int,
+    mime_type: str,
+    saved_bytes: int,
+    sample_rate: Optional[int] = None,
+    channels: Optional[int] = None,
+    bitrate: Optional[int] = None
+) -> Optional[int]:
+    """
+    Заменить файл аудиофайла (перекодированная версия), вернуть число
+    оставшихся ссылок на прежний файл в хранилище
+
+    Замена выполняется, только если запись ещё ссылается на expected_filepath;
+    иначе (запись удалена или файл уже заменён) - None.
+    """
+    async def unit(session: AsyncSession) -> Optional[int]:
+        audio = await get_audio_file(session, audio_id)
+        if not audio or audio.filepath != expected_filepath:
+            return None
+        
+        audio.filename = filename
+        audio.filepath = filepath
+        audio.sha256 = sha256
+        audio.file_size = file_size
+        audio.mime_type = mime_type
+        audio.saved_bytes = saved_bytes
+        audio.sample_rate = sample_rate
+        audio.channels = channels
+        audio.bitrate = bitrate
+        await session.flush()
+        return await count_audio_file_references(session, expected_filepath)
     
-    audio.transcription_status = status
-    if text:
-        audio.transcription_text = text
-    if status == TranscriptionStatus.COMPLETED:
-        audio.transcribed_at = datetime.utcnow()
+    return await run_write(db, unit, refresh=False)
+
+
+async def clear_audio_file_content(db: AsyncSession, audio_id: int, expected_filepath: str) -> Optional[int]:
+    """
+    Отвязать запись от файла хранилища (истёк срок хранения), вернуть число
+    оставшихся ссылок на файл
+
+    Запись и стенограмма остаются, filepath становится пустым. None - запись
+    удалена или уже ссылается на другой файл.
+    """
+    async def unit(session: AsyncSession) -> Optional[int]:
+        result = await session.execute(
+            update(AudioFile)
+            .where(AudioFile.id == audio_id, AudioFile.filepath == expected_filepath)
+            .values(filepath="")
+        )
+        if not result.rowcount:
+            return None
+        return await count_audio_file_references(session, expected_filepath)
     
-    await db.commit()
-    await db.refresh(audio)
-    return audio
+    return await run_write(db, unit, refresh=False)
 
 
-async def delete_audio_file(db: AsyncSession, audio_id: int) -> None:
-    """Удалить аудиофайл"""
-    audio = await get_audio_file(db, audio_id)
-    if not audio:
-        raise ValueError("Аудиофайл не найден")
+async def move_audio_files(
+    db: AsyncSession,
+    filepath: str,
+    new_filepath: str,
+    compacted_at: Optional[datetime] = None
+) -> int:
+    """
+    Перевести все записи с файла filepath на new_filepath (другой уровень
+    хранилища), вернуть число записей
+
+    compacted_at - отметка о переносе в холодный уровень (или о том, что
+    сжатие не нужно, если new_filepath совпадает с filepath).
+    """
+    async def unit(session: AsyncSession) -> int:
+        values: dict[str, Any] = {"filepath": new_filepath}
+        if compacted_at is not None:
+            values["compacted_at"] = compacted_at
+        result = await session.execute(
+            update(AudioFile).where(AudioFile.filepath == filepath).values(**values)
+        )
+        return result.rowcount
     
-    await db.delete(audio)
-    await db.commit()
+    return await run_write(db, unit, refresh=False)
+
+
+async def update_audio_saved_bytes(db: AsyncSession, audio_id: int, saved_bytes: int) -> None:
+    """Отметить аудиофайл как обработанный перекодированием без замены файла"""
+    async def unit(session: AsyncSession) -> None:
+        await session.execute(
+            update(AudioFile).where(AudioFile.id == audio_id).values(saved_bytes=saved_bytes)
+        )
+    
+    await run_write(db, unit, refresh=False)
+
+
+async def delete_audio_file(db: AsyncSession, audio_id: int) -> int:
+    """
+    Удалить аудиофайл, вернуть число оставшихся ссылок на его файл в хранилище
+
+    Ссылки считаются в той же транзакции, что и удаление; 0 - файл можно
+    удалять из хранилища.
+    """
+    async def unit(session: AsyncSession) -> int:
+        audio = await get_audio_file(session, audio_id)
+        if not audio:
+            raise ValueError("Аудиофайл не найден")
+        
+        filepath = audio.filepath
+        await session.delete(audio)
+        await session.flush()
+        return await count_audio_file_references(session, filepath)
+    
+    return await run_write(db, unit, refresh=False)
 
 
 # === Health Indicators CRUD ===
@@ -235,58 +560,315 @@ async def update_blood_pressure(
     pulse: Optional[int] = None,
     source: str = "manual"
 ) -> HealthIndicator:
-    """Обновить показатели давления пациента"""
-    indicators = await get_health_indicators(db, patient_id)
-    
-    if not indicators:
-        # Создаём новую запись
-        indicators = HealthIndicator(
-            patient_id=patient_id,
-            systolic_pressure=systolic,
-            diastolic_pressure=diastolic,
-            pulse=pulse,
-            bp_source=source,
-            bp_updated_at=datetime.utcnow()
-        )
-        db.add(indicators)
-    else:
-        # Обновляем существующую
-        indicators.systolic_pressure = systolic
-        indicators.diastolic_pressure = diastolic
+    """Обновить показатели давления пациента (upsert по patient_id)"""
+    async def unit(session: AsyncSession) -> HealthIndicator:
+        fields: dict[str, Any] = {
+            "systolic_pressure": systolic,
+            "diastolic_pressure": diastolic,
+            "bp_source": source,
+            "bp_updated_at": datetime.utcnow()
+        }
         if pulse is not None:
-            indicators.pulse = pulse
-        indicators.bp_source = source
-        indicators.bp_updated_at = datetime.utcnow()
+            fields["pulse"] = pulse
+        statement = _upsert(
+            session,
+            HealthIndicator,
+            values={"patient_id": patient_id, **fields},
+            conflict=["patient_id"],
+            set_=fields
+        )
+        return await _execute_returning(session, statement)
     
-    await db.commit()
-    await db.refresh(indicators)
-    return indicators
+    return await run_write(db, unit, refresh=False)
 
 
 # === Test Data CRUD ===
 
-async def get_test_data(db: AsyncSession, key: str = "transcription_text") -> Optional[TestData]:
-    """Получить тестовые данные по ключу"""
+DEFAULT_MOCK_TRANSCRIPTION_DURATION = 5
+
+async def get_test_data(
+    db: AsyncSession,
+    key: str = "transcription_text",
+    with_content: bool = False
+) -> Optional[TestData]:
+    """Получить тестовые данные по ключу (content - только при with_content=True)"""
+    query = select(TestData).where(TestData.key == key)
+    if with_content:
+        query = query.options(undefer(TestData.content))
+    result = await db.execute(query)
+    return result.scalar_one_or_none()
+
+
+async def get_mock_transcription_duration(db: AsyncSession) -> int:
+    """Время имитации транскрибации в секундах (по умолчанию 5)"""
+    duration_data = await get_test_data(db, key="mock_transcription_duration", with_content=True)
+    if duration_data and duration_data.content:
+        try:
+            return int(duration_data.content)
+        except ValueError:
+            pass
+    return DEFAULT_MOCK_TRANSCRIPTION_DURATION
+
+
+async def create_or_update_test_data(db: AsyncSession, content: str, key: str = "transcription_text") -> TestData:
+    """Создать или обновить тестовые данные (upsert по ключу)"""
+    async def unit(session: AsyncSession) -> TestData:
+        now = datetime.utcnow()
+        statement = _upsert(
+            session,
+            TestData,
+            values={"key": key, "content": content, "created_at": now, "updated_at": now},
+            conflict=["key"],
+            set_={"content": content, "updated_at": now}
+        ).options(undefer(TestData.content))
+        return await _execute_returning(session, statement)
+    
+    return await run_write(db, unit, refresh=False)
+
+
+# === Job CRUD ===
+
+ACTIVE_JOB_STATUSES = (JobStatus.QUEUED, JobStatus.RUNNING)
+
+
+async def create_job(
+    db: AsyncSession,
+    kind: str,
+    payload: dict,
+    max_attempts: int,
+    key: Optional[str] = None
+) -> Job:
+    """Поставить задачу в очередь"""
+    async def unit(session: AsyncSession) -> Job:
+        job = Job(
+            kind=kind,
+            key=key,
+            payload=payload,
+            status=JobStatus.QUEUED,
+            attempts=0,
+            max_attempts=max_attempts,
+            run_at=datetime.utcnow()
+        )
+        session.add(job)
+        return job
+    
+    return await run_write(db, unit)
+
+
+async def get_job(db: AsyncSession, job_id: int) -> Optional[Job]:
+    """Получить задачу по ID"""
+    result = await db.execute(select(Job).where(Job.id == job_id))
+    return result.scalar_one_or_none()
+
+
+async def get_active_job(db: AsyncSession, kind: str, key: str) -> Optional[Job]:
+    """Ожидающая или выполняемая задача данного вида для объекта key"""
     result = await db.execute(
-        select(TestData).where(TestData.key == key)
+        select(Job)
+        .where(Job.kind == kind, Job.key == key, Job.status.in_(ACTIVE_JOB_STATUSES))
+        .order_by(Job.id)
+        .limit(1)
     )
     return result.scalar_one_or_none()
 
 
-async def create_or_update_test_data(db: AsyncSession, content: str, key: str = "transcription_text") -> TestData:
-    """Создать или обновить тестовые данные"""
-    test_data = await get_test_data(db, key)
+async def claim_job(db: AsyncSession, worker_id: str, visibility_timeout: float) -> Optional[Job]:
+    """
+    Взять следующую задачу: ожидающую, срок которой наступил, или
+    выполняемую, владелец которой не продлил таймаут видимости
+
+    Выбор и захват - один UPDATE ... RETURNING, поэтому задачу не
+    возьмут два воркера (в том числе из разных процессов).
+    """
+    async def unit(session: AsyncSession) -> Optional[Job]:
+        now = datetime.utcnow()
+        candidate = (
+            select(Job.id)
+            .where(or_(
+                and_(Job.status == JobStatus.QUEUED, Job.run_at <= now),
+                and_(Job.status == JobStatus.RUNNING, Job.locked_until < now),
+            ))
+            .order_by(Job.run_at, Job.id)
+            .limit(1)
+            .scalar_subquery()
+        )
+        statement = (
+            update(Job)
+            .where(Job.id == candidate)
+            .values(
+                status=JobStatus.RUNNING,
+                attempts=Job.attempts + 1,
+                locked_by=worker_id,
+                locked_until=now + timedelta(seconds=visibility_timeout)
+            )
+            .returning(Job)
+        )
+        return await _execute_returning(session, statement)
     
-    if test_data:
-        # Обновляем существующие данные
-        test_data.content = content
-        test_data.updated_at = datetime.utcnow()
-    else:
-        # Создаём новые данные
-        test_data = TestData(key=key, content=content)
-        db.add(test_data)
+    return await run_write(db, unit, refresh=False)
+
+
+async def _update_owned_job(db: AsyncSession, job_id: int, worker_id: str, **values: Any) -> bool:
+    """Изменить задачу, если ею всё ещё владеет worker_id; False - задачу забрал другой воркер"""
+    async def unit(session: AsyncSession) -> bool:
+        result = await session.execute(
+            update(Job)
+            .where(Job.id == job_id, Job.status == JobStatus.RUNNING, Job.locked_by == worker_id)
+            .values(**values)
+        )
+        return result.rowcount > 0
     
-    await db.commit()
-    await db.refresh(test_data)
-    return test_data
+    return await run_write(db, unit, refresh=False)
+
+
+async def extend_job_lease(db: AsyncSession, job_id: int, worker_id: str, visibility_timeout: float) -> bool:
+    """Продлить владение выполняемой задачей"""
+    return await _update_owned_job(
+        db, job_id, worker_id, locked_until=datetime.utcnow() + timedelta(seconds=visibility_timeout)
+    )
+
+
+async def complete_job(db: AsyncSession, job_id: int, worker_id: str, result: Optional[dict]) -> bool:
+    """Отметить задачу выполненной"""
+    return await _update_owned_job(
+        db, job_id, worker_id,
+        status=JobStatus.COMPLETED, result=result, finished_at=datetime.utcnow(),
+        locked_by=None, locked_until=None
+    )
+
+
+async def retry_job(db: AsyncSession, job_id: int, worker_id: str, error: str, delay: float) -> bool:
+    """Вернуть задачу в очередь для повтора через delay секунд"""
+    return await _update_owned_job(
+        db, job_id, worker_id,
+        status=JobStatus.QUEUED, last_error=error, run_at=datetime.utcnow() + timedelta(seconds=delay),
+        locked_by=None, locked_until=None
+    )
 
+
+async def fail_job(db: AsyncSession, job_id: int, worker_id: str, error: str) -> bool:
+    """Отметить задачу окончательно неуспешной"""
+    return await _update_owned_job(
+        db, job_id, worker_id,
+        status=JobStatus.FAILED, last_error=error, finished_at=datetime.utcnow(),
+        locked_by=None, locked_until=None
+    )
+
+
+async def release_job(db: AsyncSession, job_id: int, worker_id: str) -> bool:
+    """Вернуть прерванную задачу в очередь без расхода попытки (остановка воркера)"""
+    return await _update_owned_job(
+        db, job_id, worker_id,
+        status=JobStatus.QUEUED, attempts=Job.attempts - 1, run_at=datetime.utcnow(),
+        locked_by=None, locked_until=None
+    )
+
+
+async def get_stuck_transcription_ids(db: AsyncSession, kind: str, key_prefix: str) -> list[int]:
+    """
+    ID аудиофайлов в статусе PROCESSING без активной задачи транскрибации
+
+    Ключ задачи - key_prefix + ID аудиофайла. Такие записи остаются после
+    падения процесса, выполнявшего транскрибацию внутри запроса (до
+    появления очереди), или после удаления задачи вручную.
+    """
+    active = select(Job.key).where(Job.kind == kind, Job.status.in_(ACTIVE_JOB_STATUSES))
+    result = await db.execute(
+        select(AudioFile.id).where(
+            AudioFile.transcription_status == TranscriptionStatus.PROCESSING,
+            (literal(key_prefix) + cast(AudioFile.id, String)).not_in(active)
+        )
+    )
+    return list(result.scalars())
+
+
+# === LLM response cache CRUD ===
+
+async def get_llm_response(db: AsyncSession, key: str, created_after: Optional[datetime] = None) -> Optional[LLMResponse]:
+    """Сохранённый ответ модели по ключу; created_after - не старше (срок жизни)"""
+    query = select(LLMResponse).where(LLMResponse.key == key)
+    if created_after is not None:
+        query = query.where(LLMResponse.created_at > created_after)
+    result = await db.execute(query)
+    return result.scalar_one_or_none()
+
+
+async def save_llm_response(
+    db: AsyncSession,
+    key: str,
+    kind: str,
+    model: str,
+    response: dict,
+    max_entries: int,
+    expire_before: Optional[datetime] = None
+) -> int:
+    """
+    Сохранить ответ модели (upsert по ключу) и вытеснить лишние
+
+    Удаляются ответы старше expire_before и самые старые сверх max_entries
+    (0 - без ограничения). Возвращает число удалённых.
+    """
+    async def unit(session: AsyncSession) -> int:
+        now = datetime.utcnow()
+        await session.execute(
+            _upsert(
+                session,
+                LLMResponse,
+                values={"key": key, "kind": kind, "model": model, "response": response, "created_at": now},
+                conflict=["key"],
+                set_={"model": model, "response": response, "created_at": now}
+            )
+        )
+        removed = 0
+        if expire_before is not None:
+            result = await session.execute(delete(LLMResponse).where(LLMResponse.created_at < expire_before))
+            removed += result.rowcount
+        if max_entries > 0:
+            surplus = (
+                select(LLMResponse.id)
+                .order_by(LLMResponse.created_at.desc(), LLMResponse.id.desc())
+                .offset(max_entries)
+            )
+            result = await session.execute(delete(LLMResponse).where(LLMResponse.id.in_(surplus)))
+            removed += result.rowcount
+        return removed
+    
+    return await run_write(db, unit, refresh=False)
+
+
+# === Storage locks CRUD ===
+
+async def acquire_storage_lock(db: AsyncSession, key: str, owner: str, ttl: int) -> bool:
+    """
+    Занять блокировку ключа хранилища на ttl секунд
+
+    Одним запросом: строка создаётся или перехватывается, если срок
+    блокировки истёк. False - ключ заблокирован другим владельцем.
+    """
+    async def unit(session: AsyncSession) -> bool:
+        now = datetime.utcnow()
+        expires_at = now + timedelta(seconds=ttl)
+        lock = await _execute_returning(
+            session,
+            _upsert(
+                session,
+                StorageLock,
+                values={"key": key, "owner": owner, "expires_at": expires_at},
+                conflict=["key"],
+                set_={"owner": owner, "expires_at": expires_at},
+                where=StorageLock.expires_at < now
+            )
+        )
+        return lock is not None
+    
+    return await run_write(db, unit, refresh=False)
+
+
+async def release_storage_locks(db: AsyncSession, keys: Sequence[str], owner: str) -> None:
+    """Снять блокировки ключей, занятые владельцем"""
+    async def unit(session: AsyncSession) -> None:
+        await session.execute(
+            delete(StorageLock).where(StorageLock.key.in_(keys), StorageLock.owner == owner)
+        )
+    
+    await run_write(db, unit, refresh=False)
@@ -1,16 +1,93 @@
 """Настройка базы данных"""
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+from pathlib import Path
+from typing import Optional
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import event, text
+from sqlalchemy.exc import OperationalError, ProgrammingError
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from app.config import settings
 
 
+def is_sqlite_url(database_url: str) -> bool:
+    """Проверить, что URL указывает на SQLite"""
+    return make_url(database_url).get_backend_name() == "sqlite"
+
+
+def is_sqlite_memory_url(database_url: str) -> bool:
+    """Проверить, что URL указывает на SQLite в памяти"""
+    url = make_url(database_url)
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+
+def get_sqlite_pragmas() -> list[str]:
+    """PRAGMA профиля хранения SQLite из настроек"""
+    return [
+        f"PRAGMA journal_mode={settings.sqlite_journal_mode}",
+        f"PRAGMA synchronous={settings.sqlite_synchronous}",
+        f"PRAGMA busy_timeout={int(settings.sqlite_busy_timeout)}",
+        f"PRAGMA cache_size={int(settings.sqlite_cache_size)}",
+        f"PRAGMA mmap_size={int(settings.sqlite_mmap_size)}",
+        f"PRAGMA temp_store={settings.sqlite_temp_store}",
+    ]
+
+
+def configure_sqlite_engine(async_engine: AsyncEngine) -> None:
+    """
+    Применять профиль хранения SQLite к каждому новому соединению пула
+
+    PRAGMA (кроме journal_mode) действуют только в рамках соединения,
+    поэтому они выполняются в обработчике события "connect".
+    """
+    if not is_sqlite_url(str(async_engine.url)):
+        return
+
+    pragmas = get_sqlite_pragmas()
+
+    @event.listens_for(async_engine.sync_engine, "connect")
+    def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+
+def get_engine_options(database_url: str) -> dict:
+    """Параметры create_async_engine с учётом настроек пула"""
+    options = {
+        "echo": settings.debug,
+        "future": True,
+    }
+    # Для SQLite в памяти используется StaticPool, параметры пула к нему неприменимы
+    if not is_sqlite_memory_url(database_url):
+        if is_sqlite_url(database_url):
+            # aiosqlite по умолчанию использует NullPool и открывает файл БД
+            # (и выполняет PRAGMA) на каждую сессию - держим соединения в пуле
+            options["poolclass"] = AsyncAdaptedQueuePool
+        options.update(
+            pool_size=settings.db_pool_size,
+            max_overflow=settings.db_max_overflow,
+            pool_timeout=settings.db_pool_timeout,
+            pool_pre_ping=not is_sqlite_url(database_url),
+        )
+    return options
+
+
 # Создание async engine
 engine = create_async_engine(
     settings.database_url,
-    echo=settings.debug,
-    future=True
+    **get_engine_options(settings.database_url)
 )
 
+if settings.sqlite_pragmas_enabled:
+    configure_sqlite_engine(engine)
+
 # Создание фабрики сессий
 async_session_maker = async_sessionmaker(
     engine,
@@ -24,6 +101,17 @@ class Base(DeclarativeBase):
     pass
 
 
+def get_session_factory() -> async_sessionmaker[AsyncSession]:
+    """
+    Dependency для кода, работающего дольше обработчика запроса
+
+    Сессия get_db закрывается до отправки тела ответа, поэтому поток ответа
+    (StreamingResponse) и WebSocket открывают свои короткие сессии из этой
+    фабрики.
+    """
+    return async_session_maker
+
+
 async def get_db() -> AsyncSession:
     """Dependency для получения сессии БД"""
     async with async_session_maker() as session:
@@ -33,8 +121,67 @@ async def get_db() -> AsyncSession:
             await session.close()
 
 
-async def init_db():
-    """Инициализация базы данных"""
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+# Ревизия схемы, с которой работает код. Обновляется вместе с каждой новой
+# миграцией в app/migrations/versions (тест сверяет её с head Alembic).
+SCHEMA_REVISION = "0009_storage_locks"
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+ALEMBIC_INI = PROJECT_ROOT / "alembic.ini"
+MIGRATIONS_DIR = Path(__file__).resolve().parent / "migrations"
+
+
+class SchemaVersionError(RuntimeError):
+    """Схема БД не соответствует ревизии, ожидаемой кодом"""
+
+
+def get_alembic_config(database_url: Optional[str] = None) -> Config:
+    """
+    Конфигурация Alembic для программного запуска миграций
+
+    alembic.ini необязателен (например, в образе без него): каталог
+    миграций задаётся явно. Без database_url используется URL из настроек.
+    """
+    cfg = Config(str(ALEMBIC_INI)) if ALEMBIC_INI.exists() else Config()
+    cfg.set_main_option("script_location", str(MIGRATIONS_DIR))
+    if database_url:
+        cfg.set_main_option("sqlalchemy.url", database_url.replace("%", "%%"))
+    # Логирование настраивает приложение, а не fileConfig из alembic.ini
+    cfg.attributes["configure_logger"] = False
+    return cfg
+
+
+async def run_migrations(async_engine: AsyncEngine = engine, revision: str = "head") -> None:
+    """Применить миграции Alembic к БД engine (аналог alembic upgrade head)"""
+    def _upgrade(sync_conn) -> None:
+        cfg = get_alembic_config()
+        cfg.attributes["connection"] = sync_conn
+        command.upgrade(cfg, revision)
+
+    async with async_engine.begin() as conn:
+        await conn.run_sync(_upgrade)
+
+
+async def get_schema_revision(async_engine: AsyncEngine = engine) -> Optional[str]:
+    """Текущая ревизия схемы из таблицы alembic_version (None - миграции не применялись)"""
+    try:
+        async with async_engine.connect() as conn:
+            result = await conn.execute(text("SELECT version_num FROM alembic_version"))
+            return result.scalar_one_or_none()
+    except (OperationalError, ProgrammingError):
+        # Таблицы alembic_version нет: пустая БД или БД, созданная через create_all
+        return None
+
+
+async def check_schema_version(async_engine: AsyncEngine = engine) -> None:
+    """
+    Проверить при старте, что схема БД совпадает с SCHEMA_REVISION
 
+    Один SELECT вместо create_all и сравнения метаданных. Миграции
+    выполняются отдельной командой (alembic upgrade head) до запуска приложения.
+    """
+    current = await get_schema_revision(async_engine)
+    if current != SCHEMA_REVISION:
+        raise SchemaVersionError(
+            f"Ревизия схемы БД {current or 'отсутствует'}, ожидается {SCHEMA_REVISION}. "
+            f"Выполните миграции: alembic upgrade head"
+        )
@@ -0,0 +1,277 @@
+"""
+Отдача файлов с поддержкой Range и условных запросов
+
+Starlette FileResponse (0.38) всегда отдаёт файл целиком: перемотка в
+аудиоплеере скачивает запись заново с начала. send_file разбирает
+Range/If-Range (один диапазон, RFC 9110), отвечает 304 на
+If-None-Match и 416 на недостижимый диапазон.
+
+send_stream - то же для объекта во внешнем хранилище (S3): из него
+читается только запрошенный диапазон.
+
+Байты файла отдаются одним из способов:
+- X-Accel-Redirect: при заданном префиксе internal-location приложение
+  возвращает только заголовки, файл (и диапазоны) отдаёт nginx;
+- ASGI-расширение http.response.pathsend для файла целиком, если его
+  поддерживает сервер (sendfile без копирования через Python);
+- чтение блоками вне event loop.
+"""
+import os
+import stat
+from email.utils import formatdate
+from pathlib import Path
+from typing import AsyncIterator, Callable, Optional
+from urllib.parse import quote
+
+import anyio
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.responses import FileResponse, Response, StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+# Заголовки, которые повторяются в 304 (RFC 9110, 15.4.5)
+_NOT_MODIFIED_HEADERS = ("etag", "cache-control", "last-modified", "content-location", "vary", "expires")
+
+
+class RangeNotSatisfiableError(Exception):
+    """Диапазон начинается за концом файла"""
+
+    def __init__(self, size: int):
+        self.size = size
+        super().__init__(f"Диапазон за пределами файла ({size} байт)")
+
+
+def parse_range_header(value: str, size: int) -> Optional[tuple[int, int]]:
+    """
+    Разобрать Range: bytes=start-end, вернуть (start, end) включительно
+
+    None - заголовок не поддерживается (другие единицы, несколько
+    диапазонов, синтаксическая ошибка): файл отдаётся целиком.
+    """
+    unit, _, spec = value.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, dash, last = spec.strip().partition("-")
+    if not dash:
+        return None
+    try:
+        if not first:
+            # bytes=-N: последние N байт
+            suffix = int(last)
+            if suffix <= 0:
+                raise RangeNotSatisfiableError(size)
+            return max(size - suffix, 0), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start < 0 or (last and end < start):
+        return None
+    if start >= size:
+        raise RangeNotSatisfiableError(size)
+    return start, min(end, size - 1)
+
+
+def _entity_tags(header: str) -> list[str]:
+    return [tag.strip() for tag in header.split(",") if tag.strip()]
+
+
+def etag_matches(header: str, etag: str) -> bool:
+    """Слабое сравнение для If-None-Match (W/ не учитывается)"""
+    if header.strip() == "*":
+        return True
+    etag = etag.removeprefix("W/")
+    return any(tag.removeprefix("W/") == etag for tag in _entity_tags(header))
+
+
+def file_etag(stat_result: os.stat_result) -> str:
+    """ETag по размеру и времени изменения файла (для файлов без хэша содержимого)"""
+    return f'"{stat_result.st_size:x}-{stat_result.st_mtime_ns:x}"'
+
+
+def _if_range_matches(header: str, etag: str, last_modified: str) -> bool:
+    # If-Range требует сильного сравнения: слабый ETag диапазон не разрешает
+    header = header.strip()
+    if header.startswith('"') or header.startswith("W/"):
+        return header == etag and not etag.startswith("W/")
+    return header == last_modified
+
+
+def _not_modified(request: Request, headers: dict[str, str]) -> Optional[Response]:
+    """304, если ETag совпадает с If-None-Match"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and "etag" in headers and etag_matches(if_none_match, headers["etag"]):
+        return Response(
+            status_code=304,
+            headers={k: v for k, v in headers.items() if k in _NOT_MODIFIED_HEADERS}
+        )
+    return None
+
+
+def _requested_range(request: Request, size: int, etag: str, last_modified: str) -> Optional[tuple[int, int]]:
+    """Запрошенный диапазон с учётом If-Range; RangeNotSatisfiableError - за концом файла"""
+    range_header = request.headers.get("range")
+    if not range_header or size <= 0:
+        return None
+    if_range = request.headers.get("if-range")
+    if if_range is not None and not _if_range_matches(if_range, etag, last_modified):
+        return None
+    return parse_range_header(range_header, size)
+
+
+class RangeFileResponse(FileResponse):
+    """FileResponse для файла или его диапазона (content_range, включительно)"""
+
+    chunk_size = 256 * 1024
+
+    def __init__(self, path: Path, content_range: Optional[tuple[int, int]] = None, **kwargs):
+        super().__init__(path, **kwargs)
+        self.content_range = content_range
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        size = self.stat_result.st_size
+        start, end = self.content_range or (0, size - 1)
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+
+        extensions = scope.get("extensions") or {}
+        if scope["method"].upper() == "HEAD" or size == 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        elif self.content_range is None and "http.response.pathsend" in extensions:
+            await send({"type": "http.response.pathsend", "path": str(self.path)})
+        else:
+            async with await anyio.open_file(self.path, mode="rb") as file:
+                if start:
+                    await file.seek(start)
+                remaining = end - start + 1
+                while remaining > 0:
+                    chunk = await file.read(min(self.chunk_size, remaining))
+                    if not chunk:
+                        break
+                    remaining -= len(chunk)
+                    await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+                if remaining > 0:
+                    # Файл укоротился во время отдачи: закрываем тело
+                    await send({"type": "http.response.body", "body": b"", "more_body": False})
+        if self.background is not None:
+            await self.background()
+
+
+def content_disposition(filename: str) -> str:
+    """Content-Disposition: attachment с именем файла (RFC 6266, имя в UTF-8 - через filename*)"""
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"attachment; filename*=utf-8''{quoted}"
+    return f'attachment; filename="{filename}"'
+
+
+async def send_file(
+    request: Request,
+    path: Path,
+    media_type: str,
+    filename: Optional[str] = None,
+    etag: Optional[str] = None,
+    cache_control: Optional[str] = None,
+    accel_redirect_prefix: str = "",
+    accel_root: Optional[Path] = None
+) -> Response:
+    """
+    Ответ с файлом с учётом Range, If-Range и If-None-Match
+
+    etag - сильный ETag содержимого (например, по SHA-256); без него
+    строится по размеру и времени изменения файла. Если задан
+    accel_redirect_prefix и файл лежит внутри accel_root, возвращается
+    X-Accel-Redirect на {prefix}{путь относительно accel_root}.
+    FileNotFoundError - файла нет.
+    """
+    stat_result = await run_in_threadpool(os.stat, path)
+    if not stat.S_ISREG(stat_result.st_mode):
+        raise FileNotFoundError(path)
+    etag = etag or file_etag(stat_result)
+    last_modified = formatdate(stat_result.st_mtime, usegmt=True)
+
+    headers = {"etag": etag, "last-modified": last_modified, "accept-ranges": "bytes"}
+    if cache_control:
+        headers["cache-control"] = cache_control
+
+    not_modified = _not_modified(request, headers)
+    if not_modified is not None:
+        return not_modified
+
+    if accel_redirect_prefix and accel_root is not None:
+        try:
+            relative = Path(path).resolve().relative_to(accel_root.resolve())
+        except ValueError:
+            relative = None
+        if relative is not None:
+            # Диапазоны и условные запросы к самому файлу обрабатывает nginx
+            headers["x-accel-redirect"] = accel_redirect_prefix.rstrip("/") + "/" + quote(relative.as_posix())
+            if filename is not None:
+                headers["content-disposition"] = content_disposition(filename)
+            return Response(media_type=media_type, headers=headers)
+
+    size = stat_result.st_size
+    try:
+        content_range = _requested_range(request, size, etag, last_modified)
+    except RangeNotSatisfiableError:
+        return Response(status_code=416, headers={**headers, "content-range": f"bytes */{size}"})
+
+    if content_range is not None:
+        start, end = content_range
+        headers["content-range"] = f"bytes {start}-{end}/{size}"
+        headers["content-length"] = str(end - start + 1)
+    return RangeFileResponse(
+        path,
+        content_range=content_range,
+        status_code=206 if content_range is not None else 200,
+        headers=headers,
+        media_type=media_type,
+        filename=filename,
+        stat_result=stat_result,
+    )
+
+
+async def send_stream(
+    request: Request,
+    size: int,
+    open_range: Callable[[int, int], AsyncIterator[bytes]],
+    media_type: str,
+    filename: Optional[str] = None,
+    etag: Optional[str] = None,
+    cache_control: Optional[str] = None
+) -> Response:
+    """
+    Ответ с объектом внешнего хранилища с учётом Range, If-Range и If-None-Match
+
+    Байты объекта целиком или запрошенного диапазона читает
+    open_range(start, end) (включительно) - из хранилища запрашивается
+    только нужный диапазон.
+    """
+    headers = {"accept-ranges": "bytes"}
+    if etag:
+        headers["etag"] = etag
+    if cache_control:
+        headers["cache-control"] = cache_control
+    if filename is not None:
+        headers["content-disposition"] = content_disposition(filename)
+
+    not_modified = _not_modified(request, headers)
+    if not_modified is not None:
+        return not_modified
+
+    try:
+        content_range = _requested_range(request, size, etag or "", "")
+    except RangeNotSatisfiableError:
+        return Response(status_code=416, headers={**headers, "content-range": f"bytes */{size}"})
+    if size == 0:
+        return Response(media_type=media_type, headers=headers)
+
+    start, end = content_range or (0, size - 1)
+    if content_range is not None:
+        headers["content-range"] = f"bytes {start}-{end}/{size}"
+    headers["content-length"] = str(end - start + 1)
+    return StreamingResponse(
+        open_range(start, end),
+        status_code=206 if content_range is not None else 200,
+        headers=headers,
+        media_type=media_type,
+    )
@@ -3,7 +3,7 @@ import asyncio
 from datetime import date, timedelta
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.database import async_session_maker, init_db
+from app.database import async_session_maker, run_migrations
 from app.models import (
     Patient, ChronicDisease, RecentDisease, HealthIndicator,
     Appointment, GenderEnum, AppointmentStatus
@@ -13,8 +13,8 @@ from app.models import (
 async def load_fixtures():
     """Загрузить тестовые данные в БД"""
     
-    # Инициализируем БД
-    await init_db()
+    # Приводим схему БД к актуальной ревизии
+    await run_migrations()
     
     async with async_session_maker() as session:
         # Проверяем, есть ли уже данные
@@ -0,0 +1,190 @@
+"""
+Фоновые задачи: очередь в таблице jobs и пул воркеров
+
+Эндпоинт ставит задачу (enqueue_job) и сразу отвечает 202 с её ID;
+задачу выполняет воркер - в этом или другом процессе. Очередь в БД
+переживает перезапуск: задача, воркер которой упал, снова становится
+доступной по истечении таймаута видимости (locked_until), пока
+выполняется - воркер продлевает его. Ошибка обработчика - повтор с
+экспоненциальной задержкой, после max_attempts попыток задача
+завершается со статусом FAILED и вызывается on_failure её вида.
+
+Обработчики регистрируются декоратором job_handler (см. app/tasks.py).
+"""
+import asyncio
+import os
+import socket
+import uuid
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app import crud
+from app.config import settings
+from app.database import async_session_maker
+from app.logger import get_logger
+from app.models import Job
+
+logger = get_logger(__name__)
+
+# Обработчик: (сессия, payload) -> результат для Job.result
+JobHandler = Callable[[AsyncSession, dict], Awaitable[Optional[dict]]]
+# Вызывается, когда попытки исчерпаны: (сессия, payload, текст ошибки)
+FailureHandler = Callable[[AsyncSession, dict, str], Awaitable[None]]
+
+
+@dataclass
+class JobType:
+    """Вид задачи"""
+    handler: JobHandler
+    on_failure: Optional[FailureHandler] = None
+
+
+_job_types: dict[str, JobType] = {}
+
+
+def job_handler(kind: str, on_failure: Optional[FailureHandler] = None) -> Callable[[JobHandler], JobHandler]:
+    """Зарегистрировать обработчик задач вида kind"""
+    def decorator(handler: JobHandler) -> JobHandler:
+        _job_types[kind] = JobType(handler=handler, on_failure=on_failure)
+        return handler
+    return decorator
+
+
+def retry_delay(attempts: int) -> float:
+    """Задержка перед повтором после attempts неудачных попыток"""
+    return min(settings.job_retry_base_delay * 2 ** (attempts - 1), settings.job_retry_max_delay)
+
+
+async def enqueue_job(db: AsyncSession, kind: str, payload: dict, key: Optional[str] = None) -> Job:
+    """Поставить задачу в очередь и разбудить воркеры процесса"""
+    if kind not in _job_types:
+        raise ValueError(f"Неизвестный вид задачи: {kind}")
+    job = await crud.create_job(db, kind, payload, max_attempts=settings.job_max_attempts, key=key)
+    logger.info(f"Задача поставлена в очередь: job_id={job.id}, kind={kind}, key={key}")
+    job_pool.notify()
+    return job
+
+
+class JobWorkerPool:
+    """Воркеры, выбирающие задачи из таблицы jobs"""
+
+    def __init__(self, session_factory: async_sessionmaker[AsyncSession] = async_session_maker):
+        self.session_factory = session_factory
+        self._tasks: list[asyncio.Task] = []
+        self._wakeup = asyncio.Event()
+        self._prefix = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+    @property
+    def is_running(self) -> bool:
+        return bool(self._tasks)
+
+    def notify(self) -> None:
+        """Появилась задача: разбудить ожидающие воркеры"""
+        self._wakeup.set()
+
+    async def start(self, workers: int) -> None:
+        """Запустить воркеры"""
+        if self.is_running:
+            return
+        self._wakeup = asyncio.Event()
+        self._tasks = [
+            asyncio.create_task(self._worker(f"{self._prefix}:{n}"), name=f"job-worker-{n}")
+            for n in range(workers)
+        ]
+        logger.info(f"Запущено воркеров фоновых задач: {workers}")
+
+    async def stop(self) -> None:
+        """Остановить воркеры; прерванные задачи возвращаются в очередь"""
+        if not self.is_running:
+            return
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        logger.info("Воркеры фоновых задач остановлены")
+
+    async def run_once(self, worker_id: str) -> bool:
+        """Взять и выполнить одну задачу; False - очередь пуста"""
+        async with self.session_factory() as db:
+            job = await crud.claim_job(db, worker_id, settings.job_visibility_timeout)
+        if job is None:
+            return False
+        await self._execute(job, worker_id)
+        return True
+
+    async def _worker(self, worker_id: str) -> None:
+        while True:
+            try:
+                if await self.run_once(worker_id):
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка воркера {worker_id}: {e}", exc_info=True)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=settings.job_poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def _heartbeat(self, job: Job, worker_id: str) -> None:
+        """Продлевать владение задачей, пока она выполняется"""
+        while True:
+            await asyncio.sleep(settings.job_visibility_timeout / 3)
+            async with self.session_factory() as db:
+                if not await crud.extend_job_lease(db, job.id, worker_id, settings.job_visibility_timeout):
+                    logger.warning(f"Задача {job.id} больше не принадлежит воркеру {worker_id}")
+                    return
+
+    async def _execute(self, job: Job, worker_id: str) -> None:
+        job_type = _job_types.get(job.kind)
+        if job_type is None:
+            async with self.session_factory() as db:
+                await crud.fail_job(db, job.id, worker_id, f"Неизвестный вид задачи: {job.kind}")
+            return
+        if job.attempts > job.max_attempts:
+            # Последняя попытка не завершилась: воркер упал или завис
+            await self._fail(job, job_type, worker_id, "Превышено время выполнения")
+            return
+
+        logger.info(f"Выполнение задачи: job_id={job.id}, kind={job.kind}, попытка {job.attempts}")
+        heartbeat = asyncio.create_task(self._heartbeat(job, worker_id))
+        try:
+            async with self.session_factory() as db:
+                result = await job_type.handler(db, job.payload)
+        except asyncio.CancelledError:
+            heartbeat.cancel()
+            async with self.session_factory() as db:
+                await crud.release_job(db, job.id, worker_id)
+            raise
+        except Exception as e:
+            heartbeat.cancel()
+            error = f"{type(e).__name__}: {e}"
+            if job.attempts >= job.max_attempts:
+                await self._fail(job, job_type, worker_id, error)
+                return
+            delay = retry_delay(job.attempts)
+            logger.warning(f"Задача {job.id} завершилась ошибкой ({error}), повтор через {delay:.0f} с")
+            async with self.session_factory() as db:
+                await crud.retry_job(db, job.id, worker_id, error, delay)
+            return
+        heartbeat.cancel()
+        async with self.session_factory() as db:
+            await crud.complete_job(db, job.id, worker_id, result)
+        logger.info(f"Задача выполнена: job_id={job.id}, kind={job.kind}")
+
+    async def _fail(self, job: Job, job_type: JobType, worker_id: str, error: str) -> None:
+        logger.error(f"Задача {job.id} ({job.kind}) не выполнена после {job.max_attempts} попыток: {error}")
+        async with self.session_factory() as db:
+            if not await crud.fail_job(db, job.id, worker_id, error):
+                return
+            if job_type.on_failure is not None:
+                try:
+                    await job_type.on_failure(db, job.payload, error)
+                except Exception as e:
+                    logger.error(f"Ошибка обработки неуспешной задачи {job.id}: {e}")
+
+
+job_pool = JobWorkerPool()
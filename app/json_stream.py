@@ -0,0 +1,91 @@
+"""Разбор JSON-объекта по частям (ответ модели в потоковом режиме)"""
+import json
+from typing import Any
+
+
+class JsonObjectStream:
+    """
+    Поля JSON-объекта верхнего уровня по мере их поступления
+
+    feed() принимает очередной фрагмент текста и возвращает поля, значения
+    которых завершились в нём. Значение отдаётся целиком (строка - после
+    закрывающей кавычки, вложенный объект - после закрывающей скобки), число -
+    только когда за ним уже пришёл следующий символ. Некорректный JSON -
+    ValueError.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0
+        self._state = "start"  # start, key, colon, value, next, done
+        self._key = ""
+        self._decoder = json.JSONDecoder()
+
+    @property
+    def complete(self) -> bool:
+        """Объект закрыт"""
+        return self._state == "done"
+
+    def _fail(self) -> None:
+        raise ValueError(f"Некорректный JSON в позиции {self._pos}")
+
+    def _decode(self) -> tuple[Any, bool]:
+        """Значение с текущей позиции; (None, False) - пришло не целиком"""
+        try:
+            value, end = self._decoder.raw_decode(self._buffer, self._pos)
+        except json.JSONDecodeError:
+            return None, False
+        if end == len(self._buffer) and not isinstance(value, (str, dict, list)):
+            # Число (или true/null) может продолжиться в следующем фрагменте
+            return None, False
+        self._pos = end
+        return value, True
+
+    def feed(self, chunk: str) -> list[tuple[str, Any]]:
+        """Добавить фрагмент; завершённые в нём поля (ключ, значение)"""
+        self._buffer += chunk
+        fields = []
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos].isspace():
+                self._pos += 1
+            if self._pos >= len(self._buffer):
+                break
+            char = self._buffer[self._pos]
+            if self._state == "done":
+                self._fail()
+            elif self._state == "start":
+                if char != "{":
+                    self._fail()
+                self._pos += 1
+                self._state = "key"
+            elif self._state in ("key", "next") and char == "}":
+                self._pos += 1
+                self._state = "done"
+            elif self._state == "next":
+                if char != ",":
+                    self._fail()
+                self._pos += 1
+                self._state = "key"
+            elif self._state == "key":
+                if char != '"':
+                    self._fail()
+                key, ok = self._decode()
+                if not ok:
+                    break
+                self._key = key
+                self._state = "colon"
+            elif self._state == "colon":
+                if char != ":":
+                    self._fail()
+                self._pos += 1
+                self._state = "value"
+            else:
+                value, ok = self._decode()
+                if not ok:
+                    break
+                fields.append((self._key, value))
+                self._state = "next"
+        # Разобранное начало буфера больше не нужно
+        self._buffer = self._buffer[self._pos:]
+        self._pos = 0
+        return fields
@@ -0,0 +1,347 @@
+"""
+Распознавание речи во время записи приёма (WebSocket /api/audio/live)
+
+Браузер отправляет части записи (MediaRecorder.ondataavailable) по мере
+их появления. Части декодируются в PCM (ffmpeg читает поток WebM/Ogg из
+stdin; формат pcm16 - уже готовые отсчёты 16 кГц) и накапливаются в
+LiveTranscriptionSession. Каждые LIVE_STEP_SECONDS новой записи сессия
+ищет участки речи (app/audio_segmentation.py): участок, после которого
+уже прошла пауза, распознаётся окончательно (final), незавершённый -
+предварительно (partial, текст может измениться). К концу приёма
+распознать остаётся только последнюю реплику.
+
+Исходные байты записи пишутся во временный файл каталога загрузок (pcm16 -
+сразу как данные WAV): после остановки записи он переносится в хранилище
+как обычная загрузка.
+"""
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+from array import array
+from collections import deque
+from pathlib import Path
+from typing import Awaitable, Callable, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from app.audio_storage import PartialFile, StoredUpload, UploadTooLargeError, hash_file
+from app.audio_segmentation import (
+    SAMPLE_RATE,
+    AudioDecodeError,
+    frame_energies,
+    speech_frames,
+    speech_threshold,
+    wav_header,
+    write_wav,
+)
+from app.config import settings
+from app.logger import get_logger
+from app.transcription import (
+    TranscriptionEngine,
+    TranscriptionSegment,
+    format_segments,
+    format_timestamp,
+    shift_segments,
+)
+
+logger = get_logger(__name__)
+
+# Формат потока -> (MIME-тип и расширение сохраняемой записи)
+LIVE_FORMATS = {
+    "webm": ("audio/webm", ".webm"),
+    "ogg": ("audio/ogg", ".ogg"),
+    "pcm16": ("audio/wav", ".wav"),  # 16 бит, моно, 16 кГц, little-endian
+}
+
+# Уровень шума для порога речи - по кадрам за последние NOISE_WINDOW_SECONDS
+NOISE_WINDOW_SECONDS = 120
+
+# Отправка события клиенту
+SendEvent = Callable[[dict], Awaitable[None]]
+
+
+class LiveTranscriptionSession:
+    """
+    Инкрементальное распознавание записи, поступающей частями
+
+    В памяти - только нераспознанный окончательно хвост записи (с отступом
+    VAD_PADDING_MS) и энергии кадров за последние NOISE_WINDOW_SECONDS для
+    уровня шума: приём любой длины не увеличивает расход памяти.
+    """
+
+    def __init__(self, engine: TranscriptionEngine, rate: int = SAMPLE_RATE, partial_results: bool = True):
+        self.engine = engine
+        self.rate = rate
+        self.partial_results = partial_results
+        self.frame_size = max(1, rate * settings.vad_frame_ms // 1000)
+        self.max_gap = settings.vad_min_silence_ms // settings.vad_frame_ms
+        self.min_frames = max(1, settings.vad_min_speech_ms // settings.vad_frame_ms)
+        self.pad_frames = settings.vad_padding_ms // settings.vad_frame_ms
+        self.max_chunk_frames = max(1, int(settings.vad_max_chunk_seconds * 1000) // settings.vad_frame_ms)
+        self.received = 0  # Отсчётов получено за всю запись
+        self.committed = 0  # Кадров, распознанных окончательно
+        self.segments: list[TranscriptionSegment] = []
+        self._samples = array("h")  # Отсчёты начиная с _samples_start
+        self._samples_start = 0
+        self._analysed = 0  # Кадров с посчитанной энергией
+        self._energies: list[float] = []  # Энергии кадров начиная с committed
+        self._noise: deque[float] = deque(maxlen=max(1, NOISE_WINDOW_SECONDS * 1000 // settings.vad_frame_ms))
+        self._odd_byte = b""
+
+    @property
+    def duration(self) -> float:
+        return self.received / self.rate
+
+    @property
+    def text(self) -> str:
+        return format_segments(self.segments)
+
+    def feed(self, pcm: bytes) -> None:
+        """Добавить отсчёты PCM (16 бит, little-endian)"""
+        pcm = self._odd_byte + pcm
+        self._odd_byte = pcm[len(pcm) - len(pcm) % 2:]
+        self._samples.frombytes(pcm[:len(pcm) - len(self._odd_byte)])
+        self.received = self._samples_start + len(self._samples)
+        analysed = self._analysed * self.frame_size - self._samples_start
+        complete = len(self._samples) - (len(self._samples) - analysed) % self.frame_size
+        energies = frame_energies(self._samples[analysed:complete], self.frame_size)
+        self._energies.extend(energies)
+        self._noise.extend(energies)
+        self._analysed += len(energies)
+
+    async def process(self, final: bool = False) -> list[dict]:
+        """
+        Распознать накопленное: завершённые участки речи - окончательно, текущий - предварительно
+
+        final=True - запись закончилась, все участки завершены.
+        """
+        base = self.committed
+        pending = self._energies
+        if not pending:
+            return []
+        threshold = speech_threshold(self._noise, settings.vad_noise_ratio)
+
+        closed: list[tuple[int, int]] = []
+        current: Optional[tuple[int, int]] = None
+        for start, end in speech_frames(pending, threshold, self.max_gap):
+            if final or end + self.max_gap < len(pending):
+                if end - start >= self.min_frames:
+                    closed.append((base + start, base + end))
+            else:
+                current = (base + start, base + end)
+        # Непрерывная речь длиннее фрагмента распознаётся по частям, не дожидаясь паузы
+        while current and current[1] - current[0] >= self.max_chunk_frames:
+            closed.append((current[0], current[0] + self.max_chunk_frames))
+            current = (current[0] + self.max_chunk_frames, current[1])
+        chunks = [
+            (offset, min(end, offset + self.max_chunk_frames))
+            for start, end in closed
+            for offset in range(start, end, self.max_chunk_frames)
+        ]
+
+        if final:
+            committed = self._analysed
+        else:
+            resume = current[0] if current else self._analysed
+            committed = max(base, resume - self.pad_frames, chunks[-1][1] if chunks else base)
+
+        # При ошибке распознавания committed не сдвигается: следующий проход повторит фрагменты
+        results = await asyncio.gather(*(self._transcribe(start, end) for start, end in chunks))
+        self._commit(committed)
+        events = []
+        for segments in results:
+            self.segments.extend(segments)
+            events.extend(segment_event("final", segment) for segment in segments if segment.text)
+        if current and not final and self.partial_results:
+            segments = await self._transcribe(*current)
+            text = " ".join(segment.text for segment in segments if segment.text)
+            if text:
+                events.append(segment_event("partial", TranscriptionSegment(segments[0].start, segments[-1].end, text)))
+        return events
+
+    def _commit(self, committed: int) -> None:
+        """Сдвинуть committed и отбросить распознанное: нужны только отсчёты отступа перед ним"""
+        del self._energies[:committed - self.committed]
+        self.committed = committed
+        keep_from = max(self._samples_start, (committed - self.pad_frames) * self.frame_size)
+        del self._samples[:keep_from - self._samples_start]
+        self._samples_start = keep_from
+
+    async def _transcribe(self, start_frame: int, end_frame: int) -> list[TranscriptionSegment]:
+        padding = self.pad_frames * self.frame_size
+        first = max(self._samples_start, start_frame * self.frame_size - padding)
+        last = min(self.received, end_frame * self.frame_size + padding)
+        samples = self._samples[first - self._samples_start:last - self._samples_start]
+
+        fd, path = tempfile.mkstemp(prefix="elia-live-", suffix=".wav")
+        os.close(fd)
+        try:
+            await asyncio.to_thread(write_wav, Path(path), samples, self.rate)
+            result = await self.engine.transcribe(Path(path))
+        finally:
+            await asyncio.to_thread(Path(path).unlink, True)
+        return shift_segments(result, first / self.rate, len(samples) / self.rate)
+
+
+def segment_event(kind: str, segment: TranscriptionSegment) -> dict:
+    """Событие для клиента: partial или final"""
+    return {
+        "type": kind,
+        "start": round(segment.start, 2),
+        "end": round(segment.end, 2),
+        "timestamp": format_timestamp(segment.start),
+        "speaker": segment.speaker,
+        "text": segment.text,
+    }
+
+
+class FfmpegStreamDecoder:
+    """Декодирование потока WebM/Ogg в PCM процессом ffmpeg"""
+
+    def __init__(self, on_pcm: Callable[[bytes], None]):
+        self.on_pcm = on_pcm
+        self._process: Optional[asyncio.subprocess.Process] = None
+        self._reader: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        ffmpeg = shutil.which("ffmpeg")
+        if ffmpeg is None:
+            raise AudioDecodeError("Для потоковой транскрибации WebM/Ogg нужен ffmpeg (или формат pcm16)")
+        self._process = await asyncio.create_subprocess_exec(
+            ffmpeg, "-nostdin", "-v", "error", "-i", "pipe:0",
+            "-ac", "1", "-ar", str(SAMPLE_RATE), "-f", "s16le", "pipe:1",
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+        self._reader = asyncio.create_task(self._read())
+
+    async def _read(self) -> None:
+        while chunk := await self._process.stdout.read(65536):
+            self.on_pcm(chunk)
+
+    async def write(self, data: bytes) -> None:
+        self._process.stdin.write(data)
+        await self._process.stdin.drain()
+
+    async def close(self) -> None:
+        """Дождаться декодирования всего переданного"""
+        if self._process is None:
+            return
+        self._process.stdin.close()
+        await self._reader
+        await self._process.wait()
+
+    def kill(self) -> None:
+        if self._process is not None and self._process.returncode is None:
+            self._process.kill()
+        if self._reader is not None:
+            self._reader.cancel()
+
+
+class LiveRecording:
+    """Запись, поступающая по WebSocket: сохранение, декодирование и распознавание"""
+
+    def __init__(self, engine: TranscriptionEngine, fmt: str, upload_dir: Path):
+        self.format = fmt
+        self.mime_type, self.extension = LIVE_FORMATS[fmt]
+        self.upload_dir = upload_dir
+        self.session = LiveTranscriptionSession(engine, partial_results=settings.live_partial_results)
+        self.size = 0
+        self._decoder: Optional[FfmpegStreamDecoder] = None
+        self._partial: Optional[PartialFile] = None
+        self._new_audio = asyncio.Event()
+        self._stopping = False
+
+    async def start(self) -> None:
+        if self.format != "pcm16":
+            self._decoder = FfmpegStreamDecoder(self._on_pcm)
+            await self._decoder.start()
+        self._partial = await PartialFile.create(self.upload_dir)
+        if self._decoder is None:
+            # pcm16 сохраняется как WAV: размер данных в заголовке - в finish()
+            await self._partial.write(wav_header(self.session.rate, 0))
+
+    def _on_pcm(self, pcm: bytes) -> None:
+        self.session.feed(pcm)
+        self._new_audio.set()
+
+    async def append(self, data: bytes) -> None:
+        """Часть записи от клиента"""
+        self.size += len(data)
+        if self.size > settings.max_upload_size:
+            raise UploadTooLargeError(settings.max_upload_size)
+        await self._partial.write(data)
+        if self._decoder is None:
+            self._on_pcm(data)
+            return
+        await self._decoder.write(data)
+
+    async def run(self, send: SendEvent) -> None:
+        """Распознавать запись по мере поступления, пока не вызван stop()"""
+        step = int(settings.live_step_seconds * self.session.rate)
+        processed = 0
+        while not self._stopping:
+            await self._new_audio.wait()
+            self._new_audio.clear()
+            if self._stopping or self.session.received - processed < step:
+                continue
+            processed = self.session.received
+            try:
+                for event in await self.session.process():
+                    await send(event)
+            except Exception as e:
+                # Нераспознанное будет распознано следующим проходом или в finish()
+                logger.warning(f"Ошибка распознавания во время записи: {e}")
+
+    def stop(self) -> None:
+        """Запись окончена: завершить цикл run() после текущего прохода"""
+        self._stopping = True
+        self._new_audio.set()
+
+    async def finish(self, send: SendEvent) -> StoredUpload:
+        """Распознать остаток записи; возвращает файл записи для переноса в хранилище"""
+        if self._decoder is not None:
+            await self._decoder.close()
+        for event in await self.session.process(final=True):
+            await send(event)
+
+        if self._decoder is None:
+            await run_in_threadpool(self._write_wav_header)
+        await self._partial.close()
+        path = self._partial.path
+        # Заголовок WAV переписан после подсчёта SHA-256 - хэш считается заново
+        sha256 = await hash_file(path) if self._decoder is None else self._partial.sha256
+        size = await run_in_threadpool(os.path.getsize, path)
+        return StoredUpload(
+            filename=f"live{self.extension}",
+            content_type=self.mime_type,
+            path=path,
+            size=size,
+            sha256=sha256,
+        )
+
+    def _write_wav_header(self) -> None:
+        f = self._partial.file
+        f.seek(0)
+        f.write(wav_header(self.session.rate, self.size))
+        f.seek(0, os.SEEK_END)
+
+    async def discard(self) -> None:
+        """Запись прервана: удалить временный файл и остановить декодер"""
+        self.stop()
+        if self._decoder is not None:
+            self._decoder.kill()
+        if self._partial is not None:
+            await self._partial.discard()
+
+
+def parse_control_message(text: str) -> dict:
+    """Текстовое сообщение клиента: {"type": "stop"}"""
+    try:
+        message = json.loads(text)
+    except json.JSONDecodeError:
+        return {}
+    return message if isinstance(message, dict) else {}
@@ -0,0 +1,133 @@
+"""
+Кэш ответов модели OpenAI
+
+Два уровня: LRU в памяти процесса и таблица llm_responses (общая для
+процессов и переживает перезапуск). Ключ - SHA-256 от вида запроса, версии
+промпта, модели, температуры и нормализованного текста: повторное
+извлечение анамнеза из неизменившейся стенограммы не обращается к API.
+Промпт меняется - меняется версия, старые ответы перестают находиться и
+вытесняются по сроку жизни или размеру.
+"""
+import hashlib
+import json
+import time
+import unicodedata
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import crud
+from app.config import settings
+from app.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def normalize_text(text: str) -> str:
+    """Текст для ключа: NFC, без различий в пробелах и переводах строк"""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def cache_key(kind: str, text: str, prompt_version: str, model: str, temperature: float) -> str:
+    """Ключ ответа (hex SHA-256)"""
+    params = json.dumps([kind, prompt_version, model, temperature], ensure_ascii=False)
+    digest = hashlib.sha256(params.encode())
+    digest.update(b"\0")
+    digest.update(normalize_text(text).encode())
+    return digest.hexdigest()
+
+
+@dataclass
+class CacheStats:
+    """Счётчики кэша с момента запуска процесса"""
+    memory_hits: int = 0
+    db_hits: int = 0
+    misses: int = 0
+    stores: int = 0
+    evictions: int = 0  # Вытеснено из памяти и из БД
+
+    @property
+    def hit_ratio(self) -> float:
+        lookups = self.memory_hits + self.db_hits + self.misses
+        return (self.memory_hits + self.db_hits) / lookups if lookups else 0.0
+
+    def as_dict(self) -> dict:
+        return {**asdict(self), "hit_ratio": round(self.hit_ratio, 3)}
+
+
+class LLMCache:
+    """
+    Двухуровневый кэш ответов
+
+    В памяти хранится ответ и момент его сохранения в БД (time.time()), так
+    что срок жизни на обоих уровнях отсчитывается одинаково. Ответы -
+    изменяемые dict, наружу отдаются копии.
+    """
+
+    def __init__(self, memory_entries: int, max_entries: int, ttl: float):
+        self.memory_entries = memory_entries
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self._memory: OrderedDict[str, tuple[dict, float]] = OrderedDict()
+
+    def _expired(self, stored_at: float) -> bool:
+        return self.ttl > 0 and time.time() - stored_at >= self.ttl
+
+    def _remember(self, key: str, response: dict, stored_at: float) -> None:
+        if self.memory_entries <= 0:
+            return
+        self._memory[key] = (response, stored_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+            self.stats.evictions += 1
+
+    async def get(self, db: AsyncSession, key: str) -> Optional[dict]:
+        """Ответ по ключу или None"""
+        entry = self._memory.get(key)
+        if entry is not None:
+            response, stored_at = entry
+            if not self._expired(stored_at):
+                self._memory.move_to_end(key)
+                self.stats.memory_hits += 1
+                return dict(response)
+            del self._memory[key]
+            self.stats.evictions += 1
+
+        created_after = datetime.utcnow() - timedelta(seconds=self.ttl) if self.ttl > 0 else None
+        row = await crud.get_llm_response(db, key, created_after=created_after)
+        if row is None:
+            self.stats.misses += 1
+            return None
+        stored_at = time.time() - (datetime.utcnow() - row.created_at).total_seconds()
+        self._remember(key, row.response, stored_at)
+        self.stats.db_hits += 1
+        return dict(row.response)
+
+    async def put(self, db: AsyncSession, key: str, kind: str, model: str, response: dict) -> None:
+        """Сохранить ответ на обоих уровнях"""
+        expire_before = datetime.utcnow() - timedelta(seconds=self.ttl) if self.ttl > 0 else None
+        removed = await crud.save_llm_response(
+            db, key, kind, model, response,
+            max_entries=self.max_entries, expire_before=expire_before
+        )
+        self._remember(key, dict(response), time.time())
+        self.stats.stores += 1
+        self.stats.evictions += removed
+        if removed:
+            logger.info(f"Из кэша ответов модели вытеснено записей: {removed}")
+
+    def clear(self) -> None:
+        """Очистить уровень в памяти (таблица не затрагивается)"""
+        self._memory.clear()
+
+
+llm_cache = LLMCache(
+    memory_entries=settings.llm_cache_memory_entries,
+    max_entries=settings.llm_cache_max_entries,
+    ttl=settings.llm_cache_ttl
+)
@@ -1,4 +1,5 @@
 """Главное приложение FastAPI"""
+import asyncio
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, Depends, Body
 from fastapi.staticfiles import StaticFiles
@@ -9,11 +10,19 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from pathlib import Path
 
 from app.config import settings
-from app.database import init_db, get_db
-from app.api import patients, appointments, audio
+from app.database import check_schema_version, get_db, run_migrations
+from app.api import patients, appointments, audio, jobs
 from app import crud
 from app.logger import setup_logging, get_logger
-from app.middleware import LoggingMiddleware, ErrorLoggingMiddleware
+from app.middleware import BodySizeLimitMiddleware, LoggingMiddleware, ErrorLoggingMiddleware, MULTIPART_OVERHEAD
+from app.pagination import NEXT_CURSOR_HEADER
+from app.resumable_uploads import TUS_EXPOSE_HEADERS
+from app.write_queue import write_queue
+from app.jobs import job_pool
+from app.llm_cache import llm_cache
+from app.object_storage import close_storage, get_storage
+from app.tasks import recover_stuck_transcriptions, schedule_storage_sweeps
+from app.transcription import get_engine, shutdown_engine
 
 # Настройка логирования
 setup_logging(app_name="elia", log_level=settings.log_level)
@@ -24,8 +33,17 @@ logger = get_logger(__name__)
 async def lifespan(app: FastAPI):
     """Lifecycle события приложения"""
     # Startup
-    logger.info("Инициализация базы данных...")
-    await init_db()
+    if settings.db_auto_migrate:
+        logger.info("Применение миграций базы данных...")
+        await run_migrations()
+    else:
+        await check_schema_version()
+    
+    if settings.write_queue_enabled:
+        await write_queue.start()
+    
+    # Ошибка настройки хранилища записей - при старте, а не при первой загрузке
+    get_storage()
     
     # Инициализация тестовых данных из файла, если их нет в БД
     try:
@@ -43,11 +61,31 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.warning(f"Не удалось инициализировать тестовые данные: {e}")
     
+    # Фоновые задачи: возвращаем в очередь транскрибации, прерванные падением
+    if settings.job_workers > 0:
+        # Ошибка настройки движка распознавания - при старте, а не в задаче
+        get_engine()
+        from app.database import async_session_maker
+        async with async_session_maker() as db:
+            await recover_stuck_transcriptions(db)
+        await job_pool.start(settings.job_workers)
+    
+    # Обслуживание хранилища записей по расписанию (выполняют воркеры задач)
+    sweep_schedule = None
+    if settings.job_workers > 0 and settings.storage_sweep_interval > 0:
+        sweep_schedule = asyncio.create_task(schedule_storage_sweeps(), name="storage-sweep-schedule")
+    
     logger.info(f"{settings.app_name} запущен!")
     
     yield
     
     # Shutdown
+    if sweep_schedule is not None:
+        sweep_schedule.cancel()
+    await job_pool.stop()
+    shutdown_engine()
+    await close_storage()
+    await write_queue.stop()
     logger.info(f"{settings.app_name} остановлен")
 
 
@@ -59,7 +97,18 @@ app = FastAPI(
     lifespan=lifespan
 )
 
-# Middleware для логирования (добавляем первым)
+# Лимит тела для загрузок: отклонение до чтения тела (добавляем первым -
+# ближе всего к приложению, чтобы 413 попадали в логи и получали CORS-заголовки)
+app.add_middleware(
+    BodySizeLimitMiddleware,
+    limits=[
+        (r"^/api/audio/upload$", settings.max_upload_size + MULTIPART_OVERHEAD),
+        (r"^/api/audio/uploads/[0-9a-f]+$", settings.max_upload_size),
+        (r"^/api/patients/\d+/recognize-tonometer$", settings.max_image_upload_size + MULTIPART_OVERHEAD),
+    ],
+)
+
+# Middleware для логирования
 app.add_middleware(ErrorLoggingMiddleware)
 app.add_middleware(LoggingMiddleware)
 
@@ -70,12 +119,14 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, *TUS_EXPOSE_HEADERS],
 )
 
 # Подключение роутеров API
 app.include_router(patients.router)
 app.include_router(appointments.router)
 app.include_router(audio.router)
+app.include_router(jobs.router)
 
 # Статические файлы
 app.mount("/static", StaticFiles(directory="static"), name="static")
@@ -155,14 +206,15 @@ async def health_check():
     return {
         "status": "ok",
         "app": settings.app_name,
-        "version": settings.version
+        "version": settings.version,
+        "llm_cache": llm_cache.stats.as_dict()
     }
 
 
 @app.get("/api/test-data")
 async def get_test_data(db: AsyncSession = Depends(get_db)):
     """Получить тестовые данные (стенограмма)"""
-    test_data = await crud.get_test_data(db)
+    test_data = await crud.get_test_data(db, with_content=True)
     if test_data:
         return {"content": test_data.content}
     # Если данных нет, читаем из файла как fallback
@@ -190,13 +242,7 @@ async def save_test_data(
 @app.get("/api/mock-settings")
 async def get_mock_settings(db: AsyncSession = Depends(get_db)):
     """Получить настройки имитации транскрибации"""
-    duration_data = await crud.get_test_data(db, key="mock_transcription_duration")
-    duration = 5  # По умолчанию 5 секунд
-    if duration_data and duration_data.content:
-        try:
-            duration = int(duration_data.content)
-        except ValueError:
-            pass
+    duration = await crud.get_mock_transcription_duration(db)
     return {"duration": duration}
 
 
@@ -1,16 +1,22 @@
 """Middleware для логирования запросов"""
+import re
 import time
 import json
-from typing import Callable
+from typing import Callable, Optional
 from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers
 from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.types import ASGIApp
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 from app.logger import get_logger, get_access_logger
 
 logger = get_logger(__name__)
 access_logger = get_access_logger()
 
+# Запас на заголовки частей и boundary multipart сверх лимита размера файла
+MULTIPART_OVERHEAD = 64 * 1024
+
 
 class LoggingMiddleware(BaseHTTPMiddleware):
     """Middleware для логирования HTTP запросов и ответов"""
@@ -141,3 +147,86 @@ class ErrorLoggingMiddleware(BaseHTTPMiddleware):
             )
             raise
 
+
+
+class BodySizeLimitMiddleware:
+    """
+    Ограничение размера тела запроса для эндпоинтов загрузки
+
+    Чистый ASGI-middleware: запрос с Content-Length больше лимита
+    отклоняется с 413 до чтения тела; тело без Content-Length (chunked)
+    обрывается, как только превысит лимит. limits - пары
+    (регулярное выражение пути, лимит в байтах).
+    """
+    
+    def __init__(self, app: ASGIApp, limits: list[tuple[str, int]]):
+        self.app = app
+        self.limits = [(re.compile(pattern), limit) for pattern, limit in limits]
+    
+    def get_limit(self, path: str) -> Optional[int]:
+        """Лимит тела для пути (None - без ограничения)"""
+        for pattern, limit in self.limits:
+            if pattern.match(path):
+                return limit
+        return None
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        limit = self.get_limit(scope["path"])
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+        
+        content_length = Headers(scope=scope).get("content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > limit:
+            logger.warning(f"Тело запроса {scope['path']} больше лимита: {content_length} > {limit}")
+            await self._reject(scope, receive, send, limit)
+            return
+        
+        received = 0
+        exceeded = False
+        response_started = False
+        
+        async def limited_receive() -> Message:
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    exceeded = True
+                    # Для приложения это обрыв соединения: чтение тела прекращается
+                    return {"type": "http.disconnect"}
+            return message
+        
+        async def guarded_send(message: Message) -> None:
+            nonlocal response_started
+            if exceeded and not response_started:
+                # Ответ приложения на оборванное тело заменяется на 413
+                response_started = True
+                await self._reject(scope, receive, send, limit)
+                return
+            if exceeded:
+                return
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+        
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except Exception:
+            if not exceeded:
+                raise
+            if not response_started:
+                await self._reject(scope, receive, send, limit)
+    
+    @staticmethod
+    async def _reject(scope: Scope, receive: Receive, send: Send, limit: int) -> None:
+        response = JSONResponse(
+            status_code=413,
+            content={"detail": f"Тело запроса слишком большое. Максимальный размер: {limit / 1024 / 1024:.0f}MB"},
+            headers={"Connection": "close"},
+        )
+        await response(scope, receive, send)
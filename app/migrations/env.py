@@ -0,0 +1,94 @@
+"""
+Окружение Alembic
+
+URL базы данных берётся из настроек приложения. Если в конфигурацию
+передано готовое соединение (config.attributes["connection"], см.
+app.database.run_migrations), миграции выполняются в нём.
+"""
+import asyncio
+from logging.config import fileConfig
+
+from sqlalchemy import pool
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from alembic import context
+
+from app import models  # noqa: F401 - регистрация моделей в метаданных
+from app.config import settings
+from app.database import Base, is_sqlite_url
+from app.search import PATIENT_SEARCH_TABLE
+
+config = context.config
+
+if config.config_file_name is not None and config.attributes.get("configure_logger", True):
+    fileConfig(config.config_file_name, disable_existing_loggers=False)
+
+target_metadata = Base.metadata
+
+
+def include_object(obj, name, type_, reflected, compare_to) -> bool:
+    """Не сравнивать с моделями служебные таблицы полнотекстового поиска"""
+    if type_ == "table" and name.startswith(PATIENT_SEARCH_TABLE):
+        return False
+    return True
+
+
+def get_url() -> str:
+    """URL БД: из alembic.ini (если задан) или из настроек приложения"""
+    return config.get_main_option("sqlalchemy.url") or settings.database_url
+
+
+def run_migrations_offline() -> None:
+    """Сгенерировать SQL миграций без подключения к БД (alembic upgrade --sql)"""
+    url = get_url()
+    context.configure(
+        url=url,
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+        render_as_batch=is_sqlite_url(url),
+        include_object=include_object,
+    )
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def do_run_migrations(connection: Connection) -> None:
+    """Выполнить миграции в переданном соединении"""
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        # SQLite не умеет большинство ALTER TABLE - пересоздание таблиц
+        render_as_batch=connection.dialect.name == "sqlite",
+        include_object=include_object,
+    )
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+async def run_async_migrations() -> None:
+    """Подключиться к БД и выполнить миграции"""
+    connectable = create_async_engine(get_url(), poolclass=pool.NullPool)
+
+    async with connectable.connect() as connection:
+        await connection.run_sync(do_run_migrations)
+
+    await connectable.dispose()
+
+
+def run_migrations_online() -> None:
+    """Выполнить миграции на подключённой БД"""
+    connection = config.attributes.get("connection")
+    if connection is not None:
+        do_run_migrations(connection)
+    else:
+        asyncio.run(run_async_migrations())
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,163 @@
+"""Базовая схема
+
+Схема на момент перехода с create_all на миграции. Миграция идемпотентна:
+для БД, созданных через create_all до появления Alembic, существующие
+таблицы и индексы пропускаются, недостающие - создаются.
+
+Revision ID: 0001_baseline
+Revises:
+Create Date: 2026-10-18 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.compressed_text import CompressedText
+from app.search import install_patient_search
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0001_baseline"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+GENDER = sa.Enum("MALE", "FEMALE", name="genderenum")
+APPOINTMENT_STATUS = sa.Enum(
+    "SCHEDULED", "ANALYSIS", "HEADACHE", "COLD", "REFERRAL", "MONONUCLEOSIS", "ANEMIA",
+    name="appointmentstatus"
+)
+TRANSCRIPTION_STATUS = sa.Enum("PENDING", "PROCESSING", "COMPLETED", "FAILED", name="transcriptionstatus")
+
+
+def upgrade() -> None:
+    op.create_table(
+        "patients",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("first_name", sa.String(length=100), nullable=False),
+        sa.Column("last_name", sa.String(length=100), nullable=False),
+        sa.Column("middle_name", sa.String(length=100), nullable=False),
+        sa.Column("date_of_birth", sa.Date(), nullable=False),
+        sa.Column("gender", GENDER, nullable=False),
+        sa.Column("medical_organization", sa.String(length=255), nullable=False),
+        sa.Column("medical_area", sa.String(length=50), nullable=False),
+        sa.Column("last_visit_date", sa.Date(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        if_not_exists=True,
+    )
+    op.create_index(
+        "ix_patients_full_name", "patients", ["last_name", "first_name", "middle_name"], if_not_exists=True
+    )
+
+    for table in ("chronic_diseases", "recent_diseases"):
+        op.create_table(
+            table,
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("patient_id", sa.Integer(), nullable=False),
+            sa.Column("name", sa.String(length=255), nullable=False),
+            sa.ForeignKeyConstraint(["patient_id"], ["patients.id"]),
+            sa.PrimaryKeyConstraint("id"),
+            if_not_exists=True,
+        )
+        op.create_index(f"ix_{table}_patient_id", table, ["patient_id"], if_not_exists=True)
+
+    op.create_table(
+        "health_indicators",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("patient_id", sa.Integer(), nullable=False),
+        sa.Column("hemoglobin", sa.Float(), nullable=True),
+        sa.Column("cholesterol", sa.Float(), nullable=True),
+        sa.Column("bmi", sa.Float(), nullable=True),
+        sa.Column("heart_rate", sa.Integer(), nullable=True),
+        sa.Column("systolic_pressure", sa.Integer(), nullable=True),
+        sa.Column("diastolic_pressure", sa.Integer(), nullable=True),
+        sa.Column("pulse", sa.Integer(), nullable=True),
+        sa.Column("bp_source", sa.String(length=20), nullable=True),
+        sa.Column("bp_updated_at", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(["patient_id"], ["patients.id"]),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("patient_id"),
+        if_not_exists=True,
+    )
+
+    op.create_table(
+        "appointments",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("patient_id", sa.Integer(), nullable=False),
+        sa.Column("appointment_date", sa.Date(), nullable=False),
+        sa.Column("appointment_time_start", sa.String(length=5), nullable=False),
+        sa.Column("appointment_time_end", sa.String(length=5), nullable=False),
+        sa.Column("status", APPOINTMENT_STATUS, nullable=False),
+        sa.Column("is_active", sa.Boolean(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(["patient_id"], ["patients.id"]),
+        sa.PrimaryKeyConstraint("id"),
+        if_not_exists=True,
+    )
+    op.create_index("ix_appointments_patient_id", "appointments", ["patient_id"], if_not_exists=True)
+    op.create_index(
+        "ix_appointments_date_time", "appointments", ["appointment_date", "appointment_time_start"],
+        if_not_exists=True
+    )
+
+    op.create_table(
+        "medical_reports",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("appointment_id", sa.Integer(), nullable=False),
+        sa.Column("purpose", CompressedText(), nullable=True),
+        sa.Column("complaints", CompressedText(), nullable=True),
+        sa.Column("anamnesis", CompressedText(), nullable=True),
+        sa.Column("submitted_to_mis", sa.Boolean(), nullable=False),
+        sa.Column("submitted_at", sa.DateTime(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(["appointment_id"], ["appointments.id"]),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("appointment_id"),
+        if_not_exists=True,
+    )
+
+    op.create_table(
+        "audio_files",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("appointment_id", sa.Integer(), nullable=False),
+        sa.Column("filename", sa.String(length=255), nullable=False),
+        sa.Column("filepath", sa.String(length=512), nullable=False),
+        sa.Column("file_size", sa.Integer(), nullable=False),
+        sa.Column("mime_type", sa.String(length=50), nullable=False),
+        sa.Column("transcription_status", TRANSCRIPTION_STATUS, nullable=False),
+        sa.Column("transcription_text", CompressedText(), nullable=True),
+        sa.Column("uploaded_at", sa.DateTime(), nullable=False),
+        sa.Column("transcribed_at", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(["appointment_id"], ["appointments.id"]),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("appointment_id"),
+        if_not_exists=True,
+    )
+
+    op.create_table(
+        "test_data",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("key", sa.String(length=50), nullable=False),
+        sa.Column("content", sa.Text(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("key"),
+        if_not_exists=True,
+    )
+
+    # Полнотекстовый поиск пациентов (только SQLite; перестраивается для старых БД)
+    install_patient_search(op.get_bind())
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS patients_fts")
+    for table in (
+        "test_data", "audio_files", "medical_reports", "appointments",
+        "health_indicators", "recent_diseases", "chronic_diseases", "patients",
+    ):
+        op.drop_table(table)
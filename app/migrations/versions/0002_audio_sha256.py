@@ -0,0 +1,33 @@
+"""Хэш содержимого аудиофайла
+
+Аудиофайлы хранятся по SHA-256 содержимого, одинаковые записи разделяют
+один файл. Для существующих записей sha256 остаётся пустым.
+
+Revision ID: 0002_audio_sha256
+Revises: 0001_baseline
+Create Date: 2026-10-18 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002_audio_sha256"
+down_revision: Union[str, None] = "0001_baseline"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("audio_files") as batch_op:
+        batch_op.add_column(sa.Column("sha256", sa.String(length=64), nullable=True))
+        batch_op.create_index("ix_audio_files_sha256", ["sha256"])
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("audio_files") as batch_op:
+        batch_op.drop_index("ix_audio_files_sha256")
+        batch_op.drop_column("sha256")
@@ -0,0 +1,31 @@
+"""Экономия места от перекодирования аудиофайла в Opus
+
+Записи WAV/MP3 после загрузки перекодируются в Opus (app/audio_transcode.py);
+saved_bytes - разница размеров исходного и перекодированного файла.
+
+Revision ID: 0004_audio_saved_bytes
+Revises: 0003_jobs
+Create Date: 2026-10-18 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0004_audio_saved_bytes"
+down_revision: Union[str, None] = "0003_jobs"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("audio_files") as batch_op:
+        batch_op.add_column(sa.Column("saved_bytes", sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("audio_files") as batch_op:
+        batch_op.drop_column("saved_bytes")
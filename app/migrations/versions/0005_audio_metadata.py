@@ -0,0 +1,39 @@
+"""Метаданные и волновая форма аудиофайла
+
+Длительность, частота, каналы, битрейт и пики волновой формы извлекаются
+при загрузке (app/audio_metadata.py). Для существующих записей - пусто.
+
+Revision ID: 0005_audio_metadata
+Revises: 0004_audio_saved_bytes
+Create Date: 2026-10-18 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0005_audio_metadata"
+down_revision: Union[str, None] = "0004_audio_saved_bytes"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("audio_files") as batch_op:
+        batch_op.add_column(sa.Column("duration", sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column("sample_rate", sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column("channels", sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column("bitrate", sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column("waveform_peaks", sa.LargeBinary(), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("audio_files") as batch_op:
+        batch_op.drop_column("waveform_peaks")
+        batch_op.drop_column("bitrate")
+        batch_op.drop_column("channels")
+        batch_op.drop_column("sample_rate")
+        batch_op.drop_column("duration")
@@ -0,0 +1,52 @@
+"""Ключи хранилища в AudioFile.filepath
+
+Запись адресуется ключом в хранилище (app/object_storage.py), а не путём
+на диске: filepath записей с sha256 становится ключом ab/cd/<sha256>.
+Путь записей без sha256 (загруженных до хранилища по содержимому)
+становится абсолютным - такие файлы остаются на локальном диске.
+
+Revision ID: 0006_audio_storage_keys
+Revises: 0005_audio_metadata
+Create Date: 2026-10-18 00:00:00
+
+"""
+import os
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.config import settings
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0006_audio_storage_keys"
+down_revision: Union[str, None] = "0005_audio_metadata"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(
+        "UPDATE audio_files "
+        "SET filepath = substr(sha256, 1, 2) || '/' || substr(sha256, 3, 2) || '/' || sha256 "
+        "WHERE sha256 IS NOT NULL"
+    )
+    connection = op.get_bind()
+    rows = connection.execute(sa.text(
+        "SELECT id, filepath FROM audio_files WHERE sha256 IS NULL AND filepath != ''"
+    )).all()
+    for audio_id, filepath in rows:
+        if not os.path.isabs(filepath):
+            connection.execute(
+                sa.text("UPDATE audio_files SET filepath = :filepath WHERE id = :id"),
+                {"filepath": os.path.abspath(filepath), "id": audio_id}
+            )
+
+
+def downgrade() -> None:
+    op.execute(
+        sa.text(
+            "UPDATE audio_files SET filepath = :prefix || filepath WHERE sha256 IS NOT NULL"
+        ).bindparams(prefix=settings.upload_dir.rstrip("/") + "/")
+    )
@@ -0,0 +1,33 @@
+"""Обслуживание хранилища записей
+
+Ссылки на файл хранилища считаются по filepath (индекс), compacted_at -
+отметка о сжатии записи в холодный уровень (app/storage_lifecycle.py).
+
+Revision ID: 0007_audio_storage_lifecycle
+Revises: 0006_audio_storage_keys
+Create Date: 2026-10-18 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0007_audio_storage_lifecycle"
+down_revision: Union[str, None] = "0006_audio_storage_keys"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("audio_files") as batch_op:
+        batch_op.add_column(sa.Column("compacted_at", sa.DateTime(), nullable=True))
+        batch_op.create_index("ix_audio_files_filepath", ["filepath"])
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("audio_files") as batch_op:
+        batch_op.drop_index("ix_audio_files_filepath")
+        batch_op.drop_column("compacted_at")
@@ -0,0 +1,40 @@
+"""Кэш ответов модели
+
+Таблица llm_responses - сохранённые ответы OpenAI по хэшу запроса
+(app/llm_cache.py).
+
+Revision ID: 0008_llm_responses
+Revises: 0007_audio_storage_lifecycle
+Create Date: 2026-10-18 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0008_llm_responses"
+down_revision: Union[str, None] = "0007_audio_storage_lifecycle"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "llm_responses",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("key", sa.String(length=64), nullable=False),
+        sa.Column("kind", sa.String(length=50), nullable=False),
+        sa.Column("model", sa.String(length=100), nullable=False),
+        sa.Column("response", sa.JSON(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("key"),
+    )
+    op.create_index("ix_llm_responses_created_at", "llm_responses", ["created_at"])
+
+
+def downgrade() -> None:
+    op.drop_table("llm_responses")
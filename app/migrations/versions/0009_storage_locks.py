@@ -0,0 +1,35 @@
+"""Блокировки ключей общего хранилища
+
+Таблица storage_locks - блокировки ключей хранилища записей между узлами
+с общим S3 (store_lock в app/audio_storage.py).
+
+Revision ID: 0009_storage_locks
+Revises: 0008_llm_responses
+Create Date: 2026-10-18 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0009_storage_locks"
+down_revision: Union[str, None] = "0008_llm_responses"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "storage_locks",
+        sa.Column("key", sa.String(length=512), nullable=False),
+        sa.Column("owner", sa.String(length=32), nullable=False),
+        sa.Column("expires_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("key"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("storage_locks")
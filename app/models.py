@@ -1,10 +1,11 @@
 """SQLAlchemy модели"""
 from datetime import datetime, date
 from typing import Optional
-from sqlalchemy import String, Integer, Float, DateTime, Date, Text, ForeignKey, Enum
+from sqlalchemy import JSON, String, Integer, Float, DateTime, Date, Text, ForeignKey, Enum, Index, LargeBinary
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 import enum
 
+from app.compressed_text import CompressedText
 from app.database import Base
 
 
@@ -33,9 +34,21 @@ class TranscriptionStatus(str, enum.Enum):
     FAILED = "failed"
 
 
+class JobStatus(str, enum.Enum):
+    """Статус фоновой задачи"""
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
 class Patient(Base):
     """Модель пациента"""
     __tablename__ = "patients"
+    __table_args__ = (
+        # Сортировка списка пациентов по ФИО и поиск по имени
+        Index("ix_patients_full_name", "last_name", "first_name", "middle_name"),
+    )
     
     id: Mapped[int] = mapped_column(primary_key=True)
     first_name: Mapped[str] = mapped_column(String(100))
@@ -74,7 +87,7 @@ class ChronicDisease(Base):
     __tablename__ = "chronic_diseases"
     
     id: Mapped[int] = mapped_column(primary_key=True)
-    patient_id: Mapped[int] = mapped_column(ForeignKey("patients.id"))
+    patient_id: Mapped[int] = mapped_column(ForeignKey("patients.id"), index=True)
     name: Mapped[str] = mapped_column(String(255))
     
     patient: Mapped["Patient"] = relationship(back_populates="chronic_diseases")
@@ -85,7 +98,7 @@ class RecentDisease(Base):
     __tablename__ = "recent_diseases"
     
     id: Mapped[int] = mapped_column(primary_key=True)
-    patient_id: Mapped[int] = mapped_column(ForeignKey("patients.id"))
+    patient_id: Mapped[int] = mapped_column(ForeignKey("patients.id"), index=True)
     name: Mapped[str] = mapped_column(String(255))
     
     patient: Mapped["Patient"] = relationship(back_populates="recent_diseases")
@@ -117,9 +130,13 @@ class HealthIndicator(Base):
 class Appointment(Base):
     """Приём пациента"""
     __tablename__ = "appointments"
+    __table_args__ = (
+        # Список приёмов: ORDER BY appointment_date DESC, appointment_time_start DESC, id DESC
+        Index("ix_appointments_date_time", "appointment_date", "appointment_time_start"),
+    )
     
     id: Mapped[int] = mapped_column(primary_key=True)
-    patient_id: Mapped[int] = mapped_column(ForeignKey("patients.id"))
+    patient_id: Mapped[int] = mapped_column(ForeignKey("patients.id"), index=True)
     appointment_date: Mapped[date] = mapped_column(Date)
     appointment_time_start: Mapped[str] = mapped_column(String(5))  # HH:MM
     appointment_time_end: Mapped[str] = mapped_column(String(5))  # HH:MM
@@ -134,14 +151,19 @@ class Appointment(Base):
 
 
 class MedicalReport(Base):
-    """Медицинский отчёт (анамнез)"""
+    """
+    Медицинский отчёт (анамнез)
+    
+    Текстовые поля не загружаются по умолчанию (группа "report_text"),
+    обращение к ним без undefer_group вызывает ошибку.
+    """
     __tablename__ = "medical_reports"
     
     id: Mapped[int] = mapped_column(primary_key=True)
     appointment_id: Mapped[int] = mapped_column(ForeignKey("appointments.id"), unique=True)
-    purpose: Mapped[Optional[str]] = mapped_column(Text, nullable=True)  # Цель обращения
-    complaints: Mapped[Optional[str]] = mapped_column(Text, nullable=True)  # Жалобы пациента
-    anamnesis: Mapped[Optional[str]] = mapped_column(Text, nullable=True)  # Анамнез
+    purpose: Mapped[Optional[str]] = mapped_column(CompressedText, nullable=True, deferred=True, deferred_group="report_text", deferred_raiseload=True)  # Цель обращения
+    complaints: Mapped[Optional[str]] = mapped_column(CompressedText, nullable=True, deferred=True, deferred_group="report_text", deferred_raiseload=True)  # Жалобы пациента
+    anamnesis: Mapped[Optional[str]] = mapped_column(CompressedText, nullable=True, deferred=True, deferred_group="report_text", deferred_raiseload=True)  # Анамнез
     submitted_to_mis: Mapped[bool] = mapped_column(default=False)
     submitted_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
@@ -151,33 +173,117 @@ class MedicalReport(Base):
 
 
 class AudioFile(Base):
-    """Аудиофайл приёма"""
+    """
+    Аудиофайл приёма
+    
+    transcription_text (до часа речи) и waveform_peaks не загружаются по
+    умолчанию, обращение к ним без undefer вызывает ошибку. filepath - ключ
+    файла в хранилище (app/object_storage.py), общий для записей с одинаковым
+    содержимым; пустой - файла нет (истёк срок хранения). Записи без sha256
+    (загруженные до хранилища по содержимому) владеют своим файлом единолично.
+    """
     __tablename__ = "audio_files"
     
     id: Mapped[int] = mapped_column(primary_key=True)
     appointment_id: Mapped[int] = mapped_column(ForeignKey("appointments.id"), unique=True)
     filename: Mapped[str] = mapped_column(String(255))
-    filepath: Mapped[str] = mapped_column(String(512))
+    filepath: Mapped[str] = mapped_column(String(512), index=True)
+    # SHA-256 содержимого: файл в хранилище общий для всех записей с этим хэшем
+    sha256: Mapped[Optional[str]] = mapped_column(String(64), nullable=True, index=True)
     file_size: Mapped[int] = mapped_column(Integer)  # bytes
     mime_type: Mapped[str] = mapped_column(String(50))
     transcription_status: Mapped[TranscriptionStatus] = mapped_column(
         Enum(TranscriptionStatus), 
         default=TranscriptionStatus.PENDING
     )
-    transcription_text: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    transcription_text: Mapped[Optional[str]] = mapped_column(CompressedText, nullable=True, deferred=True, deferred_raiseload=True)
     uploaded_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     transcribed_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    # Сколько байт сэкономило перекодирование в Opus (None - не перекодировался)
+    saved_bytes: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    # Метаданные, извлечённые при загрузке (app/audio_metadata.py); None - не определены
+    duration: Mapped[Optional[float]] = mapped_column(Float, nullable=True)  # сек
+    sample_rate: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    channels: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    bitrate: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)  # бит/с
+    # Пики волновой формы, байт на участок записи (0-255)
+    waveform_peaks: Mapped[Optional[bytes]] = mapped_column(LargeBinary, nullable=True, deferred=True, deferred_raiseload=True)
+    # Когда запись сжата в холодный уровень хранилища (app/storage_lifecycle.py) или
+    # признана несжимаемой; после восстановления остаётся заполненным
+    compacted_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
     
     appointment: Mapped["Appointment"] = relationship(back_populates="audio_file")
 
 
 class TestData(Base):
-    """Тестовые данные (стенограмма для mock-транскрипции)"""
+    """Тестовые данные (стенограмма для mock-транскрипции); content загружается через undefer"""
     __tablename__ = "test_data"
     
     id: Mapped[int] = mapped_column(primary_key=True)
     key: Mapped[str] = mapped_column(String(50), unique=True, default="transcription_text")  # Ключ для идентификации данных
-    content: Mapped[str] = mapped_column(Text)  # Содержимое (текст стенограммы)
+    content: Mapped[str] = mapped_column(Text, deferred=True, deferred_raiseload=True)  # Содержимое (текст стенограммы)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
+
+
+class Job(Base):
+    """
+    Фоновая задача (очередь в БД, см. app/jobs.py)
+
+    Воркер, взявший задачу, владеет ею до locked_until (таймаут
+    видимости) и продлевает его, пока задача выполняется. Задачу с
+    истёкшим locked_until (воркер упал) забирает другой воркер.
+    """
+    __tablename__ = "jobs"
+    __table_args__ = (
+        Index("ix_jobs_status_run_at", "status", "run_at"),
+    )
+    
+    id: Mapped[int] = mapped_column(primary_key=True)
+    kind: Mapped[str] = mapped_column(String(50))
+    key: Mapped[Optional[str]] = mapped_column(String(100), nullable=True, index=True)  # Объект задачи, например audio:5
+    payload: Mapped[dict] = mapped_column(JSON, default=dict)
+    status: Mapped[JobStatus] = mapped_column(Enum(JobStatus), default=JobStatus.QUEUED)
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    max_attempts: Mapped[int] = mapped_column(Integer)
+    run_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)  # Не раньше (задержка повтора)
+    locked_by: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
+    locked_until: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    last_error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    result: Mapped[Optional[dict]] = mapped_column(JSON, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    finished_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+
+
+class LLMResponse(Base):
+    """
+    Сохранённый ответ модели (кэш app/llm_cache.py)
+
+    key - SHA-256 от вида запроса, версии промпта, модели, температуры и
+    нормализованного текста; сам текст запроса не хранится.
+    """
+    __tablename__ = "llm_responses"
+    
+    id: Mapped[int] = mapped_column(primary_key=True)
+    key: Mapped[str] = mapped_column(String(64), unique=True)
+    kind: Mapped[str] = mapped_column(String(50))  # Например anamnesis
+    model: Mapped[str] = mapped_column(String(100))
+    response: Mapped[dict] = mapped_column(JSON)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
+
+
+class StorageLock(Base):
+    """
+    Блокировка ключа общего хранилища записей (store_lock в app/audio_storage.py)
+
+    С S3 и несколькими узлами размещение файла и запись ссылки на него,
+    удаление последней ссылки и самого файла согласуются через эту таблицу:
+    строка с ключом - блокировка занята узлом owner. Строка с истёкшим
+    expires_at (узел упал, не сняв блокировку) считается свободной.
+    """
+    __tablename__ = "storage_locks"
+    
+    key: Mapped[str] = mapped_column(String(512), primary_key=True)
+    owner: Mapped[str] = mapped_column(String(32))
+    expires_at: Mapped[datetime] = mapped_column(DateTime)
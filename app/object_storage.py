@@ -0,0 +1,546 @@
+"""
+Хранилище аудиозаписей: локальный каталог или S3-совместимое хранилище
+
+Запись адресуется ключом (ab/cd/<sha256>, см. app/audio_storage.py),
+AudioFile.filepath хранит ключ. Абсолютный путь в filepath - запись,
+загруженная до появления хранилищ: она лежит на локальном диске, и
+get_storage(key) отдаёт для неё LocalStorage при любом выбранном хранилище.
+
+- LocalStorage - каталог загрузок (settings.upload_dir); запись отдаёт
+  приложение или nginx (X-Accel-Redirect).
+- S3Storage - бакет S3-совместимого хранилища (MinIO, Ceph, AWS S3):
+  загрузка multipart-частями, чтение диапазонов, подписанные ссылки на
+  скачивание - браузер получает запись из хранилища напрямую. Записи
+  доступны всем узлам приложения без общего диска.
+
+S3-клиент - httpx с подписью AWS Signature V4: нужны только PUT, GET,
+HEAD, DELETE и multipart-загрузка, boto3 для этого не требуется.
+
+Принятые, но ещё не размещённые файлы и временные копии для ffmpeg и
+распознавания остаются в локальном каталоге загрузок.
+"""
+import hashlib
+import hmac
+import os
+import shutil
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import AsyncIterator, Optional
+from urllib.parse import quote, urlsplit
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+
+import anyio
+import httpx
+from starlette.concurrency import run_in_threadpool
+
+from app.config import settings
+from app.file_responses import content_disposition
+from app.logger import get_logger
+
+logger = get_logger(__name__)
+
+STREAM_CHUNK_SIZE = 256 * 1024
+# Минимальный размер части multipart-загрузки в S3 (кроме последней)
+MIN_PART_SIZE = 5 * 1024 * 1024
+UNSIGNED_PAYLOAD = "UNSIGNED-PAYLOAD"
+
+
+class StorageError(Exception):
+    """Ошибка хранилища записей (ответ S3 с ошибкой, неверная настройка)"""
+
+
+# === AWS Signature V4 ===
+
+def _uri_encode(value: str, safe: str = "-_.~") -> str:
+    return quote(value, safe=safe)
+
+
+def _canonical_query(params: dict[str, str]) -> str:
+    return "&".join(f"{_uri_encode(k)}={_uri_encode(v)}" for k, v in sorted(params.items()))
+
+
+def _hmac(key: bytes, message: str) -> bytes:
+    return hmac.new(key, message.encode(), hashlib.sha256).digest()
+
+
+def _signature(
+    method: str,
+    url: str,
+    params: dict[str, str],
+    headers: dict[str, str],
+    payload_hash: str,
+    secret_key: str,
+    region: str,
+    amz_date: str
+) -> tuple[str, str]:
+    """Подпись запроса и её область (scope); headers - подписываемые заголовки в нижнем регистре"""
+    date = amz_date[:8]
+    canonical_headers = "".join(f"{name}:{' '.join(headers[name].split())}\n" for name in sorted(headers))
+    canonical_request = "\n".join([
+        method,
+        urlsplit(url).path or "/",
+        _canonical_query(params),
+        canonical_headers,
+        ";".join(sorted(headers)),
+        payload_hash,
+    ])
+    scope = f"{date}/{region}/s3/aws4_request"
+    string_to_sign = "\n".join([
+        "AWS4-HMAC-SHA256", amz_date, scope, hashlib.sha256(canonical_request.encode()).hexdigest()
+    ])
+    key = _hmac(f"AWS4{secret_key}".encode(), date)
+    for part in (region, "s3", "aws4_request"):
+        key = _hmac(key, part)
+    return hmac.new(key, string_to_sign.encode(), hashlib.sha256).hexdigest(), scope
+
+
+def _amz_date(now: Optional[datetime]) -> str:
+    return (now or datetime.now(timezone.utc)).strftime("%Y%m%dT%H%M%SZ")
+
+
+def sign_headers(
+    method: str,
+    url: str,
+    params: dict[str, str],
+    headers: dict[str, str],
+    payload_hash: str,
+    access_key: str,
+    secret_key: str,
+    region: str,
+    now: Optional[datetime] = None
+) -> dict[str, str]:
+    """Заголовки запроса с подписью SigV4 (Authorization); url - без строки запроса"""
+    amz_date = _amz_date(now)
+    signed = {name.lower(): str(value) for name, value in headers.items()}
+    signed.update({"host": urlsplit(url).netloc, "x-amz-date": amz_date, "x-amz-content-sha256": payload_hash})
+    signature, scope = _signature(method, url, params, signed, payload_hash, secret_key, region, amz_date)
+    signed["authorization"] = (
+        f"AWS4-HMAC-SHA256 Credential={access_key}/{scope}, "
+        f"SignedHeaders={';'.join(sorted(signed))}, Signature={signature}"
+    )
+    return signed
+
+
+def presign_url(
+    method: str,
+    url: str,
+    access_key: str,
+    secret_key: str,
+    region: str,
+    expires: int,
+    params: Optional[dict[str, str]] = None,
+    now: Optional[datetime] = None
+) -> str:
+    """Подписанная ссылка (подпись в строке запроса), действует expires секунд"""
+    amz_date = _amz_date(now)
+    query = dict(params or {})
+    query.update({
+        "X-Amz-Algorithm": "AWS4-HMAC-SHA256",
+        "X-Amz-Credential": f"{access_key}/{amz_date[:8]}/{region}/s3/aws4_request",
+        "X-Amz-Date": amz_date,
+        "X-Amz-Expires": str(expires),
+        "X-Amz-SignedHeaders": "host",
+    })
+    signature, _ = _signature(
+        method, url, query, {"host": urlsplit(url).netloc}, UNSIGNED_PAYLOAD, secret_key, region, amz_date
+    )
+    return f"{url}?{_canonical_query(query)}&X-Amz-Signature={signature}"
+
+
+def _xml_text(content: bytes, tag: str) -> Optional[str]:
+    """Текст первого элемента tag в ответе S3 (без учёта пространства имён)"""
+    try:
+        root = ElementTree.fromstring(content)
+    except ElementTree.ParseError:
+        return None
+    for element in root.iter():
+        if element.tag == tag or element.tag.endswith("}" + tag):
+            return element.text
+    return None
+
+
+def _xml_elements(content: bytes, tag: str) -> list[ElementTree.Element]:
+    """Все элементы tag в ответе S3 (без учёта пространства имён)"""
+    root = ElementTree.fromstring(content)
+    return [element for element in root.iter() if element.tag == tag or element.tag.endswith("}" + tag)]
+
+
+def _child_text(element: ElementTree.Element, tag: str) -> Optional[str]:
+    for child in element:
+        if child.tag == tag or child.tag.endswith("}" + tag):
+            return child.text
+    return None
+
+
+# === Хранилища ===
+
+@dataclass
+class StoredObject:
+    """Объект хранилища при обходе (iter_objects)"""
+    key: str
+    size: int
+    modified: float  # Время изменения, Unix time
+
+
+class ObjectStorage(ABC):
+    """
+    Хранилище записей по ключу
+
+    shared - хранилище общее для нескольких узлов приложения: изменения
+    ключей согласуются блокировками в БД (store_lock в app/audio_storage.py).
+    """
+
+    name: str = ""
+    shared: bool = True
+
+    @abstractmethod
+    async def store_file(self, key: str, path: Path) -> None:
+        """Поместить принятый локальный файл под ключом (локальный файл не сохраняется)"""
+
+    @abstractmethod
+    async def exists(self, key: str) -> bool:
+        """Есть ли объект с ключом"""
+
+    @abstractmethod
+    async def size(self, key: str) -> int:
+        """Размер объекта; FileNotFoundError - объекта нет"""
+
+    @abstractmethod
+    async def delete(self, key: str) -> bool:
+        """Удалить объект; False, если его не было (если хранилище это сообщает)"""
+
+    @abstractmethod
+    def iter_range(self, key: str, start: int, end: int) -> AsyncIterator[bytes]:
+        """Байты объекта с start по end включительно; FileNotFoundError - объекта нет"""
+
+    @abstractmethod
+    async def download(self, key: str, path: Path) -> None:
+        """Скачать объект в локальный файл; FileNotFoundError - объекта нет"""
+
+    @abstractmethod
+    def iter_objects(self, prefix: str = "") -> AsyncIterator[StoredObject]:
+        """Объекты с ключами, начинающимися с prefix (порядок не гарантируется)"""
+
+    def local_path(self, key: str) -> Optional[Path]:
+        """Путь объекта на локальном диске (None - объект не на диске)"""
+        return None
+
+    def presigned_url(self, key: str, filename: Optional[str] = None, content_type: Optional[str] = None) -> Optional[str]:
+        """Ссылка на скачивание объекта в обход приложения (None - не поддерживается)"""
+        return None
+
+    async def close(self) -> None:
+        """Освободить соединения"""
+
+
+class LocalStorage(ObjectStorage):
+    """Каталог загрузок на локальном диске"""
+
+    name = "local"
+    shared = False
+
+    def __init__(self, root: Optional[Path] = None):
+        self._root = root
+
+    @property
+    def root(self) -> Path:
+        return self._root or Path(settings.upload_dir)
+
+    def local_path(self, key: str) -> Path:
+        path = Path(key)
+        return path if path.is_absolute() else self.root / path
+
+    async def store_file(self, key: str, path: Path) -> None:
+        target = self.local_path(key)
+
+        def _store() -> None:
+            target.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(path, target)
+
+        await run_in_threadpool(_store)
+
+    async def exists(self, key: str) -> bool:
+        return await run_in_threadpool(self.local_path(key).is_file)
+
+    async def size(self, key: str) -> int:
+        return (await run_in_threadpool(os.stat, self.local_path(key))).st_size
+
+    async def delete(self, key: str) -> bool:
+        def _remove() -> bool:
+            try:
+                os.remove(self.local_path(key))
+            except FileNotFoundError:
+                return False
+            return True
+
+        return await run_in_threadpool(_remove)
+
+    async def iter_range(self, key: str, start: int, end: int) -> AsyncIterator[bytes]:
+        async with await anyio.open_file(self.local_path(key), mode="rb") as file:
+            await file.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = await file.read(min(STREAM_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+    async def download(self, key: str, path: Path) -> None:
+        await run_in_threadpool(shutil.copyfile, self.local_path(key), path)
+
+    async def iter_objects(self, prefix: str = "") -> AsyncIterator[StoredObject]:
+        root = self.root
+
+        def _scan(directory: Path) -> tuple[list[StoredObject], list[Path]]:
+            files, directories = [], []
+            try:
+                entries = list(os.scandir(directory))
+            except FileNotFoundError:
+                return files, directories
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    directories.append(Path(entry.path))
+                elif entry.is_file(follow_symlinks=False):
+                    key = Path(entry.path).relative_to(root).as_posix()
+                    if key.startswith(prefix):
+                        stat_result = entry.stat()
+                        files.append(StoredObject(key, stat_result.st_size, stat_result.st_mtime))
+            return files, directories
+
+        # Каталог за каталогом: в памяти не весь список файлов хранилища
+        pending = [root]
+        while pending:
+            files, directories = await run_in_threadpool(_scan, pending.pop())
+            pending.extend(directories)
+            for stored in files:
+                yield stored
+
+
+class S3Storage(ObjectStorage):
+    """
+    Бакет S3-совместимого хранилища (адресация path-style: {endpoint}/{bucket}/{key})
+
+    public_endpoint_url - адрес хранилища для браузера в подписанных
+    ссылках, если приложение обращается к нему по внутреннему адресу.
+    """
+
+    name = "s3"
+
+    def __init__(
+        self,
+        endpoint_url: str,
+        bucket: str,
+        access_key: str,
+        secret_key: str,
+        region: str = "us-east-1",
+        part_size: int = 8 * 1024 * 1024,
+        public_endpoint_url: str = "",
+        presign_expires: int = 3600,
+        transport: Optional[httpx.AsyncBaseTransport] = None
+    ):
+        if not endpoint_url or not bucket:
+            raise StorageError("Для хранилища s3 нужны S3_ENDPOINT_URL и S3_BUCKET")
+        self.endpoint_url = endpoint_url.rstrip("/")
+        self.public_endpoint_url = (public_endpoint_url or endpoint_url).rstrip("/")
+        self.bucket = bucket
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+        self.part_size = max(part_size, MIN_PART_SIZE)
+        self.presign_expires = presign_expires
+        self.client = httpx.AsyncClient(transport=transport, timeout=httpx.Timeout(60.0))
+
+    def _url(self, key: str, endpoint_url: Optional[str] = None) -> str:
+        url = f"{endpoint_url or self.endpoint_url}/{_uri_encode(self.bucket)}"
+        return f"{url}/{_uri_encode(key, safe='-_.~/')}" if key else url
+
+    async def _request(
+        self,
+        method: str,
+        key: str,
+        params: Optional[dict[str, str]] = None,
+        headers: Optional[dict[str, str]] = None,
+        content: bytes = b"",
+        expected: tuple[int, ...] = (200,),
+        stream: bool = False
+    ) -> httpx.Response:
+        url = self._url(key)
+        params = params or {}
+        signed = sign_headers(
+            method, url, params, headers or {}, hashlib.sha256(content).hexdigest(),
+            self.access_key, self.secret_key, self.region
+        )
+        if params:
+            url = f"{url}?{_canonical_query(params)}"
+        request = self.client.build_request(method, url, headers=signed, content=content)
+        response = await self.client.send(request, stream=stream)
+        if response.status_code in expected:
+            return response
+        body = await response.aread()
+        await response.aclose()
+        if response.status_code == 404:
+            raise FileNotFoundError(key)
+        raise StorageError(
+            f"S3 {method} {key}: HTTP {response.status_code} {_xml_text(body, 'Code') or ''}".rstrip()
+        )
+
+    async def store_file(self, key: str, path: Path) -> None:
+        size = (await run_in_threadpool(os.stat, path)).st_size
+        if size <= self.part_size:
+            data = await run_in_threadpool(path.read_bytes)
+            await self._request("PUT", key, content=data)
+        else:
+            await self._multipart_upload(key, path)
+        await run_in_threadpool(path.unlink)
+
+    async def _multipart_upload(self, key: str, path: Path) -> None:
+        """Загрузка частями по part_size: в памяти не больше одной части"""
+        response = await self._request("POST", key, params={"uploads": ""})
+        upload_id = _xml_text(response.content, "UploadId")
+        if not upload_id:
+            raise StorageError(f"S3 не вернул UploadId для {key}")
+
+        f = await run_in_threadpool(open, path, "rb")
+        try:
+            parts = []
+            while data := await run_in_threadpool(f.read, self.part_size):
+                number = len(parts) + 1
+                response = await self._request(
+                    "PUT", key, params={"partNumber": str(number), "uploadId": upload_id}, content=data
+                )
+                parts.append(f"<Part><PartNumber>{number}</PartNumber><ETag>{escape(response.headers['etag'])}</ETag></Part>")
+            body = f"<CompleteMultipartUpload>{''.join(parts)}</CompleteMultipartUpload>".encode()
+            response = await self._request("POST", key, params={"uploadId": upload_id}, content=body)
+            # Ошибка завершения может прийти в теле ответа 200
+            if _xml_text(response.content, "Code"):
+                raise StorageError(f"S3 не завершил загрузку {key}: {_xml_text(response.content, 'Code')}")
+        except BaseException:
+            try:
+                await self._request("DELETE", key, params={"uploadId": upload_id}, expected=(200, 204))
+            except Exception as e:
+                logger.warning(f"Не удалось отменить multipart-загрузку {key}: {e}")
+            raise
+        finally:
+            await run_in_threadpool(f.close)
+
+    async def exists(self, key: str) -> bool:
+        try:
+            await self._request("HEAD", key)
+        except FileNotFoundError:
+            return False
+        return True
+
+    async def size(self, key: str) -> int:
+        response = await self._request("HEAD", key)
+        return int(response.headers["content-length"])
+
+    async def delete(self, key: str) -> bool:
+        try:
+            await self._request("DELETE", key, expected=(200, 204))
+        except FileNotFoundError:
+            return False
+        return True
+
+    async def iter_range(self, key: str, start: int, end: int) -> AsyncIterator[bytes]:
+        response = await self._request(
+            "GET", key, headers={"range": f"bytes={start}-{end}"}, expected=(206,), stream=True
+        )
+        try:
+            async for chunk in response.aiter_bytes(STREAM_CHUNK_SIZE):
+                yield chunk
+        finally:
+            await response.aclose()
+
+    async def download(self, key: str, path: Path) -> None:
+        response = await self._request("GET", key, stream=True)
+        f = await run_in_threadpool(open, path, "wb")
+        try:
+            async for chunk in response.aiter_bytes(STREAM_CHUNK_SIZE):
+                await run_in_threadpool(f.write, chunk)
+        finally:
+            await run_in_threadpool(f.close)
+            await response.aclose()
+
+    async def iter_objects(self, prefix: str = "") -> AsyncIterator[StoredObject]:
+        """ListObjectsV2 постранично (до 1000 ключей на запрос)"""
+        params = {"list-type": "2", "prefix": prefix}
+        while True:
+            response = await self._request("GET", "", params=params)
+            for element in _xml_elements(response.content, "Contents"):
+                modified = datetime.fromisoformat(_child_text(element, "LastModified"))
+                yield StoredObject(_child_text(element, "Key"), int(_child_text(element, "Size")), modified.timestamp())
+            token = _xml_text(response.content, "NextContinuationToken")
+            if _xml_text(response.content, "IsTruncated") != "true" or not token:
+                return
+            params = {**params, "continuation-token": token}
+
+    def presigned_url(self, key: str, filename: Optional[str] = None, content_type: Optional[str] = None) -> str:
+        params = {}
+        if content_type:
+            params["response-content-type"] = content_type
+        if filename:
+            params["response-content-disposition"] = content_disposition(filename)
+        return presign_url(
+            "GET", self._url(key, self.public_endpoint_url), self.access_key, self.secret_key,
+            self.region, self.presign_expires, params
+        )
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+STORAGES = (LocalStorage.name, S3Storage.name)
+
+_storage: Optional[ObjectStorage] = None
+_legacy_storage = LocalStorage()
+
+
+def create_storage(name: str) -> ObjectStorage:
+    """Создать хранилище по имени из настроек"""
+    if name == LocalStorage.name:
+        return LocalStorage()
+    if name == S3Storage.name:
+        return S3Storage(
+            endpoint_url=settings.s3_endpoint_url,
+            bucket=settings.s3_bucket,
+            access_key=settings.s3_access_key,
+            secret_key=settings.s3_secret_key,
+            region=settings.s3_region,
+            part_size=settings.s3_part_size,
+            public_endpoint_url=settings.s3_public_endpoint_url,
+            presign_expires=settings.s3_presign_expires,
+        )
+    raise StorageError(f"Неизвестное хранилище записей: {name} (доступны: {', '.join(STORAGES)})")
+
+
+def is_legacy_key(key: str) -> bool:
+    """Абсолютный путь вместо ключа - запись, загруженная до появления хранилищ"""
+    return Path(key).is_absolute()
+
+
+def get_storage(key: Optional[str] = None) -> ObjectStorage:
+    """
+    Хранилище, выбранное в настройках (создаётся при первом обращении)
+
+    С key - хранилище этого ключа: записи со старыми абсолютными путями
+    остаются на локальном диске и при хранилище S3 читаются и удаляются
+    через LocalStorage.
+    """
+    global _storage
+    if _storage is None:
+        _storage = create_storage(settings.audio_storage)
+    if key is not None and is_legacy_key(key) and _storage.local_path(key) is None:
+        return _legacy_storage
+    return _storage
+
+
+async def close_storage() -> None:
+    """Закрыть соединения хранилища (при остановке приложения)"""
+    global _storage
+    if _storage is not None:
+        await _storage.close()
+        _storage = None
@@ -1,12 +1,21 @@
 """Сервис для работы с OpenAI API"""
 import json
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, AsyncIterator
 from openai import AsyncOpenAI
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.config import settings
+from app.json_stream import JsonObjectStream
+from app.llm_cache import cache_key, llm_cache
 from app.logger import get_logger
 
 logger = get_logger(__name__)
 
+# Версия промпта извлечения анамнеза - часть ключа кэша ответов.
+# Увеличить при изменении промпта или разбора ответа.
+ANAMNESIS_PROMPT_VERSION = "1"
+ANAMNESIS_TEMPERATURE = 0.3
+ANAMNESIS_FIELDS = ("purpose", "complaints", "anamnesis")
+
 
 class OpenAIService:
     """Сервис для работы с OpenAI API"""
@@ -22,21 +31,8 @@ class OpenAIService:
                 base_url=settings.openai_base_url
             )
     
-    async def generate_conversation(self, patient_name: str, patient_age: int, patient_gender: str) -> str:
-        """
-        Генерация диалога врач-пациент с временными метками
-        
-        Args:
-            patient_name: ФИО пациента
-            patient_age: Возраст пациента
-            patient_gender: Пол пациента (male/female)
-        
-        Returns:
-            Транскрипция диалога с временными метками
-        """
-        if not self.client:
-            raise ValueError("OpenAI API key не настроен. Проверьте файл .env")
-        
+    def _conversation_request(self, patient_name: str, patient_age: int, patient_gender: str) -> Dict[str, Any]:
+        """Параметры запроса генерации диалога"""
         gender_ru = "мужчина" if patient_gender == "male" else "женщина"
         
         system_prompt = """Ты - эксперт по созданию медицинских транскрипций. 
@@ -65,20 +61,35 @@ class OpenAIService:
 Создай реалистичный медицинский диалог с конкретной проблемой со здоровьем. 
 Диалог должен включать жалобы пациента, сбор анамнеза, осмотр и рекомендации врача."""
 
+        return {
+            "model": settings.openai_model,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            "max_tokens": 2000,
+            "temperature": 0.8
+        }
+    
+    async def generate_conversation(self, patient_name: str, patient_age: int, patient_gender: str) -> str:
+        """
+        Генерация диалога врач-пациент с временными метками
+        
+        Args:
+            patient_name: ФИО пациента
+            patient_age: Возраст пациента
+            patient_gender: Пол пациента (male/female)
+        
+        Returns:
+            Транскрипция диалога с временными метками
+        """
+        if not self.client:
+            raise ValueError("OpenAI API key не настроен. Проверьте файл .env")
+        
         try:
             logger.info(f"Запрос генерации диалога для пациента: {patient_name}")
             
-            # Формируем параметры запроса
-            request_params = {
-                "model": settings.openai_model,
-                "messages": [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                "max_tokens": 2000,
-                "temperature": 0.8
-            }
-            
+            request_params = self._conversation_request(patient_name, patient_age, patient_gender)
             response = await self.client.chat.completions.create(**request_params)
             
             conversation = response.choices[0].message.content.strip()
@@ -91,19 +102,55 @@ class OpenAIService:
             logger.error(f"Ошибка при генерации диалога: {str(e)}")
             raise
     
-    async def extract_anamnesis_data(self, transcription: str) -> Dict[str, Optional[str]]:
+    async def stream_conversation(
+        self,
+        patient_name: str,
+        patient_age: int,
+        patient_gender: str
+    ) -> AsyncIterator[str]:
         """
-        Извлечение структурированных данных из транскрипции для анамнеза
+        Генерация диалога с выдачей реплик по мере ответа модели
         
-        Args:
-            transcription: Текст транскрипции диалога
+        Тот же запрос, что generate_conversation, в потоковом режиме API.
         
-        Returns:
-            Словарь с полями: purpose, complaints, anamnesis
+        Yields:
+            Строки диалога (без перевода строки, пустые пропускаются)
         """
         if not self.client:
             raise ValueError("OpenAI API key не настроен. Проверьте файл .env")
         
+        try:
+            logger.info(f"Запрос потоковой генерации диалога для пациента: {patient_name}")
+            
+            request_params = self._conversation_request(patient_name, patient_age, patient_gender)
+            buffer = ""
+            lines = 0
+            async for delta in self._stream_content(request_params):
+                buffer += delta
+                *complete, buffer = buffer.split("\n")
+                for line in complete:
+                    if line.strip():
+                        lines += 1
+                        yield line.strip()
+            if buffer.strip():
+                lines += 1
+                yield buffer.strip()
+            
+            logger.info(f"Диалог успешно сгенерирован, реплик: {lines}")
+            
+        except Exception as e:
+            logger.error(f"Ошибка при генерации диалога: {str(e)}")
+            raise
+    
+    async def _stream_content(self, request_params: Dict[str, Any]) -> AsyncIterator[str]:
+        """Фрагменты текста ответа модели (stream=True)"""
+        stream = await self.client.chat.completions.create(**request_params, stream=True)
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    
+    def _anamnesis_request(self, transcription: str) -> Dict[str, Any]:
+        """Параметры запроса извлечения анамнеза"""
         system_prompt = """Ты - медицинский ассистент, специализирующийся на структурировании медицинской информации.
 Твоя задача - проанализировать транскрипцию диалога врача с пациентом и извлечь структурированные данные для медицинской карты.
 
@@ -127,21 +174,73 @@ class OpenAIService:
 
 Верни данные в формате JSON."""
 
+        return {
+            "model": settings.openai_model,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            "max_tokens": 1500,
+            "temperature": ANAMNESIS_TEMPERATURE,
+            "response_format": {"type": "json_object"}
+        }
+    
+    def _anamnesis_cache_key(self, transcription: str) -> str:
+        return cache_key(
+            "anamnesis", transcription, ANAMNESIS_PROMPT_VERSION,
+            settings.openai_model, ANAMNESIS_TEMPERATURE
+        )
+    
+    async def get_cached_anamnesis(self, transcription: str, db: AsyncSession) -> Optional[Dict[str, Optional[str]]]:
+        """Данные анамнеза из кэша ответов (app/llm_cache.py); None - нет в кэше или кэш выключен"""
+        if not settings.llm_cache_enabled:
+            return None
+        cached = await llm_cache.get(db, self._anamnesis_cache_key(transcription))
+        if cached is not None:
+            logger.info("Данные анамнеза взяты из кэша ответов")
+        return cached
+    
+    async def cache_anamnesis(self, db: AsyncSession, transcription: str, result: Dict[str, Optional[str]]) -> None:
+        """Сохранить данные анамнеза в кэш ответов"""
+        if not settings.llm_cache_enabled:
+            return
+        try:
+            await llm_cache.put(
+                db, self._anamnesis_cache_key(transcription), "anamnesis", settings.openai_model,
+                {field: result.get(field) for field in ANAMNESIS_FIELDS}
+            )
+        except Exception as e:
+            # Ответ уже получен: без кэша следующий запрос просто уйдёт в API
+            logger.warning(f"Не удалось сохранить ответ в кэш: {str(e)}")
+    
+    async def extract_anamnesis_data(
+        self,
+        transcription: str,
+        db: Optional[AsyncSession] = None
+    ) -> Dict[str, Optional[str]]:
+        """
+        Извлечение структурированных данных из транскрипции для анамнеза
+        
+        Args:
+            transcription: Текст транскрипции диалога
+            db: Сессия БД для кэша ответов (app/llm_cache.py); без неё
+                запрос всегда уходит в API
+        
+        Returns:
+            Словарь с полями: purpose, complaints, anamnesis
+        """
+        if db is not None:
+            cached = await self.get_cached_anamnesis(transcription, db)
+            if cached is not None:
+                return cached
+        
+        if not self.client:
+            raise ValueError("OpenAI API key не настроен. Проверьте файл .env")
+        
         try:
             logger.info("Запрос извлечения данных анамнеза из транскрипции")
             
-            # Формируем параметры запроса
-            request_params = {
-                "model": settings.openai_model,
-                "messages": [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                "max_tokens": 1500,
-                "temperature": 0.3,
-                "response_format": {"type": "json_object"}
-            }
-            
+            request_params = self._anamnesis_request(transcription)
             response = await self.client.chat.completions.create(**request_params)
             
             content = response.choices[0].message.content.strip()
@@ -150,22 +249,63 @@ class OpenAIService:
             data = json.loads(content)
             
             # Проверяем наличие обязательных полей
-            result = {
-                "purpose": data.get("purpose"),
-                "complaints": data.get("complaints"),
-                "anamnesis": data.get("anamnesis")
-            }
+            result = {field: data.get(field) for field in ANAMNESIS_FIELDS}
             
             logger.info("Данные анамнеза успешно извлечены")
             
-            return result
-            
         except json.JSONDecodeError as e:
             logger.error(f"Ошибка парсинга JSON ответа: {str(e)}")
             raise ValueError("Не удалось распарсить ответ от OpenAI")
         except Exception as e:
             logger.error(f"Ошибка при извлечении данных анамнеза: {str(e)}")
             raise
+        
+        if db is not None:
+            await self.cache_anamnesis(db, transcription, result)
+        return result
+    
+    async def stream_anamnesis_data(self, transcription: str) -> AsyncIterator[tuple[str, Optional[str]]]:
+        """
+        Извлечение данных анамнеза с выдачей полей по мере ответа модели
+        
+        JSON ответа разбирается по частям (app/json_stream.py): поле
+        отдаётся, как только модель закончила его значение. Поля, которых нет
+        в ответе, отдаются в конце со значением None - итог тот же, что у
+        extract_anamnesis_data. Кэш ответов проверяет и пополняет вызывающий
+        (get_cached_anamnesis, cache_anamnesis): ответ идёт десятки секунд,
+        и сессию БД на это время держать нельзя.
+        
+        Yields:
+            (поле, значение) для purpose, complaints, anamnesis
+        """
+        if not self.client:
+            raise ValueError("OpenAI API key не настроен. Проверьте файл .env")
+        
+        try:
+            logger.info("Потоковый запрос извлечения данных анамнеза из транскрипции")
+            
+            parser = JsonObjectStream()
+            result: Dict[str, Optional[str]] = {}
+            async for delta in self._stream_content(self._anamnesis_request(transcription)):
+                for field, value in parser.feed(delta):
+                    if field in ANAMNESIS_FIELDS and field not in result:
+                        result[field] = value
+                        yield field, value
+            if not parser.complete:
+                raise ValueError("Ответ оборван")
+            for field in ANAMNESIS_FIELDS:
+                if field not in result:
+                    result[field] = None
+                    yield field, None
+            
+            logger.info("Данные анамнеза успешно извлечены")
+            
+        except ValueError as e:
+            logger.error(f"Ошибка парсинга JSON ответа: {str(e)}")
+            raise ValueError("Не удалось распарсить ответ от OpenAI")
+        except Exception as e:
+            logger.error(f"Ошибка при извлечении данных анамнеза: {str(e)}")
+            raise
 
 
     async def recognize_tonometer_reading(self, image_base64: str) -> Dict[str, Any]:
@@ -0,0 +1,56 @@
+"""Keyset-пагинация списков по непрозрачному курсору"""
+import base64
+import binascii
+import json
+from typing import Any, Sequence
+
+from sqlalchemy import and_, or_
+from sqlalchemy.sql.elements import ColumnElement
+
+# Заголовок ответа с курсором следующей страницы
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class InvalidCursorError(ValueError):
+    """Курсор повреждён или получен от другого списка"""
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """Упаковать значения ключа сортировки последней строки в курсор"""
+    payload = json.dumps(list(values), ensure_ascii=False, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> list[Any]:
+    """Распаковать курсор и проверить число значений ключа"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (binascii.Error, UnicodeError, ValueError) as e:
+        raise InvalidCursorError("Некорректный курсор") from e
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidCursorError("Некорректный курсор")
+    return values
+
+
+def keyset_condition(
+    columns: Sequence[ColumnElement],
+    values: Sequence[Any],
+    descending: bool = False
+) -> ColumnElement[bool]:
+    """
+    Условие "строка идёт после курсора" для сортировки по columns
+
+    Сравнение кортежей раскрывается в цепочку OR/AND:
+    (a > x) OR (a = x AND b > y) OR ... Отдельное условие a >= x
+    позволяет SQLite начать просмотр индекса с позиции курсора,
+    поэтому стоимость страницы не зависит от её номера.
+    """
+    terms = []
+    for i, (col, value) in enumerate(zip(columns, values)):
+        step = col < value if descending else col > value
+        equal = [c == v for c, v in zip(columns[:i], values[:i])]
+        terms.append(and_(*equal, step) if equal else step)
+    first, first_value = columns[0], values[0]
+    bound = first <= first_value if descending else first >= first_value
+    return and_(bound, or_(*terms))
@@ -0,0 +1,326 @@
+"""
+Возобновляемая загрузка аудио (по мотивам протокола tus 1.0)
+
+Сессия загрузки - пара файлов в каталоге {upload_dir}/incoming:
+{id}.part с уже принятыми байтами и {id}.json с метаданными. Смещение
+сессии - размер .part-файла, поэтому после обрыва соединения или
+перезапуска сервера загрузка продолжается с последнего записанного байта.
+Запись AudioFile создаётся только при фиксации (commit): для принятых
+данных считается SHA-256, и файл переносится в хранилище (store_blob).
+Метаданные сессии удаляются, только когда запись создана: при ошибке
+до переноса файла фиксацию можно повторить.
+
+Запрос, который пишет в сессию или фиксирует её, держит flock .part-файла
+(audio_storage.file_lock): параллельный запрос, в том числе в другом
+воркере, получает UploadLockedError, а смещение (Upload-Offset)
+проверяется уже под блокировкой.
+"""
+import base64
+import json
+import os
+import re
+import time
+import uuid
+from contextlib import AsyncExitStack, asynccontextmanager
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import AsyncIterator, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from app.audio_storage import PARTIAL_SUFFIX, UploadTooLargeError, file_lock, get_upload_dir, hash_file
+from app.config import settings
+from app.logger import get_logger
+
+logger = get_logger(__name__)
+
+TUS_VERSION = "1.0.0"
+# Заголовки ответа, которые должны быть доступны скрипту браузера (CORS)
+TUS_EXPOSE_HEADERS = ["Location", "Tus-Resumable", "Upload-Offset", "Upload-Length", "Upload-Defer-Length"]
+INCOMING_DIR = "incoming"
+
+_UPLOAD_ID = re.compile(r"^[0-9a-f]{32}$")
+
+# Сессии, занятые запросами этого процесса
+_active: set[str] = set()
+
+
+class UploadOffsetError(Exception):
+    """Смещение в запросе не совпадает с числом принятых байт"""
+
+    def __init__(self, expected: int):
+        self.expected = expected
+        super().__init__(f"Ожидается смещение {expected}")
+
+
+class UploadLockedError(Exception):
+    """В сессию уже идёт запись другим запросом"""
+
+
+class UploadIncompleteError(Exception):
+    """Фиксация сессии, в которую приняты не все байты"""
+
+
+class UploadNotFoundError(Exception):
+    """Сессия удалена или зафиксирована другим запросом"""
+
+
+@dataclass
+class UploadSession:
+    """Сессия возобновляемой загрузки"""
+    id: str
+    appointment_id: int
+    filename: str
+    mime_type: str
+    length: Optional[int]
+    created_at: str
+    offset: int = 0
+
+    @property
+    def data_path(self) -> Path:
+        return get_incoming_dir() / f"{self.id}{PARTIAL_SUFFIX}"
+
+    @property
+    def info_path(self) -> Path:
+        return get_incoming_dir() / f"{self.id}.json"
+
+    @property
+    def extension(self) -> str:
+        return Path(self.filename).suffix.lower()
+
+
+def get_incoming_dir() -> Path:
+    """Каталог незавершённых загрузок"""
+    path = get_upload_dir() / INCOMING_DIR
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def parse_upload_metadata(header: Optional[str]) -> dict[str, str]:
+    """Разобрать заголовок Upload-Metadata: "key base64value,key2 base64value2" """
+    metadata = {}
+    for pair in (header or "").split(","):
+        parts = pair.strip().split(" ", 1)
+        if not parts[0]:
+            continue
+        value = ""
+        if len(parts) == 2:
+            try:
+                value = base64.b64decode(parts[1], validate=True).decode("utf-8")
+            except (ValueError, UnicodeDecodeError):
+                raise ValueError(f"Некорректное значение Upload-Metadata для {parts[0]}")
+        metadata[parts[0]] = value
+    return metadata
+
+
+def _write_info(session: UploadSession) -> None:
+    info = asdict(session)
+    info.pop("offset")
+    tmp_path = session.info_path.with_suffix(".json.tmp")
+    tmp_path.write_text(json.dumps(info, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp_path, session.info_path)
+
+
+def _read_session(upload_id: str) -> Optional[UploadSession]:
+    incoming = get_incoming_dir()
+    try:
+        info = json.loads((incoming / f"{upload_id}.json").read_text(encoding="utf-8"))
+        offset = (incoming / f"{upload_id}{PARTIAL_SUFFIX}").stat().st_size
+    except FileNotFoundError:
+        return None
+    return UploadSession(**info, offset=offset)
+
+
+async def create_session(
+    appointment_id: int,
+    filename: str,
+    mime_type: str,
+    length: Optional[int]
+) -> UploadSession:
+    """Создать сессию загрузки (length=None - размер станет известен позже)"""
+    if length is not None and length > settings.max_upload_size:
+        raise UploadTooLargeError(settings.max_upload_size)
+    session = UploadSession(
+        id=uuid.uuid4().hex,
+        appointment_id=appointment_id,
+        filename=filename,
+        mime_type=mime_type,
+        length=length,
+        created_at=datetime.utcnow().isoformat(),
+    )
+
+    def _create() -> None:
+        session.data_path.touch(exist_ok=False)
+        _write_info(session)
+
+    await run_in_threadpool(_create)
+    logger.info(f"Создана сессия загрузки {session.id}: appointment_id={appointment_id}, length={length}")
+    return session
+
+
+async def get_session(upload_id: str) -> Optional[UploadSession]:
+    """Сессия с текущим смещением; None - нет такой сессии"""
+    if not _UPLOAD_ID.match(upload_id):
+        return None
+    return await run_in_threadpool(_read_session, upload_id)
+
+
+async def set_length(session: UploadSession, length: int) -> None:
+    """Задать размер загрузки, отложенный при создании (Upload-Defer-Length)"""
+    if session.length is not None:
+        if session.length != length:
+            raise ValueError("Размер загрузки уже задан")
+        return
+    if length > settings.max_upload_size:
+        raise UploadTooLargeError(settings.max_upload_size)
+    if length < session.offset:
+        raise ValueError("Размер загрузки меньше уже принятых данных")
+    session.length = length
+    await run_in_threadpool(_write_info, session)
+
+
+@asynccontextmanager
+async def _locked(session: UploadSession) -> AsyncIterator[None]:
+    """
+    Сессия занята запросом (запись данных, фиксация, удаление) до выхода
+    из блока: внутри процесса - _active, между воркерами - flock .part-файла
+    """
+    if session.id in _active:
+        raise UploadLockedError()
+    _active.add(session.id)
+    try:
+        async with AsyncExitStack() as stack:
+            try:
+                locked = await stack.enter_async_context(file_lock(session.data_path, wait=False))
+            except FileNotFoundError:
+                raise UploadNotFoundError()
+            if not locked:
+                raise UploadLockedError()
+            yield
+    finally:
+        _active.discard(session.id)
+
+
+async def append_chunk(
+    session: UploadSession,
+    offset: int,
+    stream: AsyncIterator[bytes],
+    chunk_size: int = 0
+) -> int:
+    """
+    Дописать тело PATCH-запроса в сессию, вернуть новое смещение
+
+    Данные пишутся блоками в пуле потоков. При обрыве соединения уже
+    полученные байты сохраняются - клиент продолжит с нового смещения.
+    """
+    async with _locked(session):
+        # Смещение перечитывается под блокировкой: сессию мог дописать другой запрос
+        session.offset = await run_in_threadpool(os.path.getsize, session.data_path)
+        if offset != session.offset:
+            raise UploadOffsetError(session.offset)
+        limit = session.length if session.length is not None else settings.max_upload_size
+        chunk_size = chunk_size or settings.upload_chunk_size
+        f = await run_in_threadpool(open, session.data_path, "ab")
+        buffer = bytearray()
+
+        def _flush() -> None:
+            f.write(buffer)
+            f.flush()
+            os.fsync(f.fileno())
+            f.close()
+            session.offset += len(buffer)
+
+        try:
+            async for data in stream:
+                if session.offset + len(buffer) + len(data) > limit:
+                    raise UploadTooLargeError(limit)
+                buffer += data
+                if len(buffer) >= chunk_size:
+                    await run_in_threadpool(f.write, bytes(buffer))
+                    session.offset += len(buffer)
+                    buffer.clear()
+        except Exception:
+            # Принятое до ошибки или обрыва соединения сохраняется
+            await run_in_threadpool(_flush)
+            raise
+        except BaseException:
+            _flush()
+            raise
+        else:
+            await run_in_threadpool(_flush)
+    return session.offset
+
+
+@asynccontextmanager
+async def commit_session(session: UploadSession) -> AsyncIterator[str]:
+    """
+    Фиксация загрузки: блок получает SHA-256 принятых данных
+
+    В блоке вызывающий код переносит session.data_path в хранилище
+    (store_blob) и создаёт запись. Всё это время сессия занята: PATCH и
+    повторная фиксация получают UploadLockedError. Метаданные сессии
+    удаляются после успешного блока или если файл уже перенесён; пока
+    .part-файл на месте, фиксацию после ошибки можно повторить.
+    """
+    if session.length is None or session.offset != session.length:
+        raise UploadIncompleteError(
+            f"Принято {session.offset} из {session.length if session.length is not None else '?'} байт"
+        )
+    async with _locked(session):
+        # Сессию могла зафиксировать или удалить предыдущая фиксация
+        if await run_in_threadpool(_read_session, session.id) is None:
+            raise UploadNotFoundError()
+        # Хэш считается при фиксации: PATCH-запросы могут идти в разные воркеры
+        sha256 = await hash_file(session.data_path)
+        try:
+            yield sha256
+        except BaseException:
+            # Файл уже перенесён в хранилище - повторять фиксацию нечего
+            if not session.data_path.exists():
+                session.info_path.unlink(missing_ok=True)
+            raise
+        await run_in_threadpool(session.info_path.unlink, True)
+    logger.info(f"Загрузка {session.id} завершена: {session.offset} байт, sha256={sha256}")
+
+
+async def delete_session(session: UploadSession) -> None:
+    """Прервать загрузку и удалить принятые данные"""
+    def _delete() -> None:
+        session.data_path.unlink(missing_ok=True)
+        session.info_path.unlink(missing_ok=True)
+
+    async with _locked(session):
+        await run_in_threadpool(_delete)
+
+
+async def expire_sessions(max_age: float) -> tuple[int, int]:
+    """
+    Удалить брошенные сессии - без записи дольше max_age секунд; вернуть
+    (число сессий, байт принятых данных)
+    """
+    def _expire() -> tuple[int, int]:
+        cutoff = time.time() - max_age
+        sessions: dict[str, list[os.DirEntry]] = {}
+        for entry in os.scandir(get_incoming_dir()):
+            if entry.is_file(follow_symlinks=False):
+                sessions.setdefault(entry.name.split(".", 1)[0], []).append(entry)
+
+        expired = reclaimed = 0
+        for upload_id, entries in sessions.items():
+            stats = [entry.stat() for entry in entries]
+            if upload_id in _active or max(s.st_mtime for s in stats) >= cutoff:
+                continue
+            for entry, stat_result in zip(entries, stats):
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    continue
+                reclaimed += stat_result.st_size
+            expired += 1
+        return expired, reclaimed
+
+    expired, reclaimed = await run_in_threadpool(_expire)
+    if expired:
+        logger.info(f"Удалены брошенные сессии загрузки: {expired}, {reclaimed} байт")
+    return expired, reclaimed
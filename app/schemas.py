@@ -1,9 +1,9 @@
 """Pydantic схемы для валидации данных"""
 from datetime import datetime, date
-from typing import Optional
+from typing import Any, Optional
 from pydantic import BaseModel, ConfigDict
 
-from app.models import GenderEnum, AppointmentStatus, TranscriptionStatus
+from app.models import GenderEnum, AppointmentStatus, JobStatus, TranscriptionStatus
 
 
 # === Patient Schemas ===
@@ -118,13 +118,6 @@ class MedicalReportCreateUpdateSchema(BaseModel):
     anamnesis: Optional[str] = None
 
 
-class MISSubmissionResponse(BaseModel):
-    """Ответ на отправку в МИС"""
-    success: bool
-    message: str
-    submitted_at: datetime
-
-
 # === Audio File Schemas ===
 
 class AudioFileSchema(BaseModel):
@@ -139,6 +132,18 @@ class AudioFileSchema(BaseModel):
     transcription_text: Optional[str] = None
     uploaded_at: datetime
     transcribed_at: Optional[datetime] = None
+    saved_bytes: Optional[int] = None
+    duration: Optional[float] = None
+    sample_rate: Optional[int] = None
+    channels: Optional[int] = None
+    bitrate: Optional[int] = None
+
+
+class AudioWaveformSchema(BaseModel):
+    """Пики волновой формы записи (0-255), её длительность и версия (SHA-256) для ссылки на запись"""
+    duration: Optional[float] = None
+    peaks: list[int]
+    version: Optional[str] = None
 
 
 class AudioUploadResponse(BaseModel):
@@ -158,6 +163,22 @@ class TranscriptionResponse(BaseModel):
     transcribed_at: Optional[datetime] = None
 
 
+# === Workspace Schemas ===
+
+class MockSettingsSchema(BaseModel):
+    """Настройки имитации транскрибации"""
+    duration: int
+
+
+class AppointmentWorkspaceSchema(BaseModel):
+    """Всё, что нужно для открытия карточки пациента, одним ответом"""
+    appointment: AppointmentDetailSchema
+    patient: DigitalPortraitSchema
+    report: Optional[MedicalReportSchema] = None
+    audio: Optional[AudioFileSchema] = None
+    mock_settings: MockSettingsSchema
+
+
 # === Generic Responses ===
 
 class ErrorResponse(BaseModel):
@@ -170,3 +191,27 @@ class SuccessResponse(BaseModel):
     success: bool
     message: str
 
+
+# === Job Schemas ===
+
+class JobSchema(BaseModel):
+    """Схема фоновой задачи"""
+    model_config = ConfigDict(from_attributes=True)
+    
+    id: int
+    kind: str
+    status: JobStatus
+    attempts: int
+    max_attempts: int
+    last_error: Optional[str] = None
+    result: Optional[dict[str, Any]] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+
+
+class JobAcceptedResponse(BaseModel):
+    """Ответ 202: задача поставлена в очередь (статус - GET /api/jobs/{job_id})"""
+    success: bool
+    message: str
+    job_id: int
+    status: JobStatus
@@ -0,0 +1,190 @@
+"""Полнотекстовый поиск пациентов по ФИО (SQLite FTS5, триграммы)"""
+import re
+from typing import Optional
+
+from sqlalchemy import Integer, column, event, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql.elements import ColumnElement
+
+from app.config import settings
+from app.database import Base
+from app.logger import get_logger
+from app.models import Patient
+
+logger = get_logger(__name__)
+
+PATIENT_SEARCH_TABLE = "patients_fts"
+
+# Минимальная длина слова для триграммного индекса
+MIN_TOKEN_LENGTH = 3
+
+# Нормализация ФИО в SQL: "ё" индексируется как "е" (регистр сворачивает сам FTS5)
+_NAME_EXPRESSION = (
+    "replace(replace({p}.last_name || ' ' || {p}.first_name || ' ' || {p}.middle_name, "
+    "'ё', 'е'), 'Ё', 'Е')"
+)
+
+PATIENT_SEARCH_DDL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {PATIENT_SEARCH_TABLE} "
+    "USING fts5(name, tokenize='trigram case_sensitive 0')",
+    f"""CREATE TRIGGER IF NOT EXISTS {PATIENT_SEARCH_TABLE}_ai AFTER INSERT ON patients BEGIN
+        INSERT INTO {PATIENT_SEARCH_TABLE}(rowid, name) VALUES (new.id, {_NAME_EXPRESSION.format(p="new")});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {PATIENT_SEARCH_TABLE}_au
+    AFTER UPDATE OF last_name, first_name, middle_name ON patients BEGIN
+        DELETE FROM {PATIENT_SEARCH_TABLE} WHERE rowid = old.id;
+        INSERT INTO {PATIENT_SEARCH_TABLE}(rowid, name) VALUES (new.id, {_NAME_EXPRESSION.format(p="new")});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {PATIENT_SEARCH_TABLE}_ad AFTER DELETE ON patients BEGIN
+        DELETE FROM {PATIENT_SEARCH_TABLE} WHERE rowid = old.id;
+    END""",
+]
+
+PATIENT_SEARCH_REBUILD = [
+    f"DELETE FROM {PATIENT_SEARCH_TABLE}",
+    f"INSERT INTO {PATIENT_SEARCH_TABLE}(rowid, name) "
+    f"SELECT id, {_NAME_EXPRESSION.format(p='patients')} FROM patients",
+]
+
+# Транслитерация латиницы в кириллицу (сначала многобуквенные сочетания)
+_TRANSLIT_MULTI = [
+    ("shch", "щ"), ("sch", "щ"), ("zh", "ж"), ("kh", "х"), ("ts", "ц"),
+    ("ch", "ч"), ("sh", "ш"), ("yu", "ю"), ("ya", "я"), ("yo", "е"), ("ye", "е"),
+]
+_TRANSLIT_SINGLE = {
+    "a": "а", "b": "б", "v": "в", "g": "г", "d": "д", "e": "е", "z": "з",
+    "i": "и", "j": "й", "k": "к", "l": "л", "m": "м", "n": "н", "o": "о",
+    "p": "п", "r": "р", "s": "с", "t": "т", "u": "у", "f": "ф", "h": "х",
+    "c": "к", "w": "в", "x": "кс", "q": "к",
+}
+_VOWELS = set("аеиоуыэюяaeiouy")
+_LATIN = re.compile(r"[a-z]")
+
+# Кэш наличия индекса для каждой БД (URL engine -> bool)
+_search_index_available: dict[str, bool] = {}
+
+
+def install_patient_search(sync_conn) -> bool:
+    """
+    Создать FTS5-таблицу поиска пациентов и триггеры синхронизации
+
+    Операция идемпотентна. Если индекс рассинхронизирован с таблицей
+    пациентов (например, БД создана до появления поиска), он перестраивается.
+    Возвращает False, если БД не SQLite или FTS5 с триграммами недоступен.
+    """
+    if sync_conn.dialect.name != "sqlite":
+        return False
+    try:
+        for statement in PATIENT_SEARCH_DDL:
+            sync_conn.exec_driver_sql(statement)
+    except OperationalError as e:
+        logger.warning(f"Полнотекстовый поиск пациентов недоступен: {e}")
+        return False
+
+    indexed = sync_conn.exec_driver_sql(f"SELECT count(*) FROM {PATIENT_SEARCH_TABLE}").scalar()
+    patients = sync_conn.exec_driver_sql("SELECT count(*) FROM patients").scalar()
+    if indexed != patients:
+        logger.info(f"Перестроение индекса поиска пациентов: {patients} записей")
+        for statement in PATIENT_SEARCH_REBUILD:
+            sync_conn.exec_driver_sql(statement)
+
+    _search_index_available[str(sync_conn.engine.url)] = True
+    return True
+
+
+@event.listens_for(Base.metadata, "after_create")
+def _install_after_create(target, connection, **kw):
+    """Создавать поисковый индекс вместе со схемой (create_all)"""
+    install_patient_search(connection)
+
+
+async def is_search_index_available(db: AsyncSession) -> bool:
+    """Проверить (с кэшированием) наличие поискового индекса в БД сессии"""
+    bind = db.get_bind()
+    key = str(bind.url)
+    if key not in _search_index_available:
+        if bind.dialect.name != "sqlite":
+            _search_index_available[key] = False
+        else:
+            result = await db.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                {"name": PATIENT_SEARCH_TABLE}
+            )
+            _search_index_available[key] = result.scalar() is not None
+    return _search_index_available[key]
+
+
+def normalize_search_text(value: str) -> str:
+    """Свернуть регистр (включая кириллицу) и заменить "ё" на "е" """
+    return value.casefold().replace("ё", "е")
+
+
+def transliterate(word: str) -> str:
+    """Транслитерировать латиницу в кириллицу (ivanov -> иванов)"""
+    result = []
+    i = 0
+    while i < len(word):
+        for latin, cyrillic in _TRANSLIT_MULTI:
+            if word.startswith(latin, i):
+                result.append(cyrillic)
+                i += len(latin)
+                break
+        else:
+            char = word[i]
+            if char == "y":
+                # "й" после гласной (Dmitriy), иначе "ы" (Kryukov)
+                result.append("й" if result and result[-1] in _VOWELS else "ы")
+            else:
+                result.append(_TRANSLIT_SINGLE.get(char, char))
+            i += 1
+    return "".join(result)
+
+
+def _quote(token: str) -> str:
+    """Экранировать слово как строку FTS5"""
+    return '"' + token.replace('"', '""') + '"'
+
+
+def build_match_expression(search: str, transliterate_latin: Optional[bool] = None) -> Optional[str]:
+    """
+    Построить выражение MATCH для поиска по ФИО
+
+    Каждое слово запроса должно встречаться в ФИО как подстрока (AND).
+    Слово на латинице дополнительно ищется в транслитерации (OR).
+    Возвращает None, если в запросе нет слов длиной от трёх символов -
+    триграммный индекс их не находит.
+    """
+    if transliterate_latin is None:
+        transliterate_latin = settings.search_transliterate
+
+    groups = []
+    for word in normalize_search_text(search).split():
+        variants = [word]
+        if transliterate_latin and _LATIN.search(word):
+            variants.append(transliterate(word))
+        variants = [v for v in dict.fromkeys(variants) if len(v) >= MIN_TOKEN_LENGTH]
+        if variants:
+            groups.append("(" + " OR ".join(_quote(v) for v in variants) + ")")
+
+    if not groups:
+        return None
+    return " AND ".join(groups)
+
+
+async def patient_search_condition(db: AsyncSession, search: str) -> Optional[ColumnElement[bool]]:
+    """
+    Условие WHERE для поиска пациентов через FTS5
+
+    Возвращает None, если индекс недоступен или запрос слишком короткий -
+    тогда вызывающий код использует поиск через ILIKE.
+    """
+    if not await is_search_index_available(db):
+        return None
+    match = build_match_expression(search)
+    if match is None:
+        return None
+    matched_ids = text(
+        f"SELECT rowid FROM {PATIENT_SEARCH_TABLE} WHERE {PATIENT_SEARCH_TABLE} MATCH :patient_search"
+    ).bindparams(patient_search=match).columns(column("rowid", Integer))
+    return Patient.id.in_(matched_ids)
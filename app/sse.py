@@ -0,0 +1,32 @@
+"""
+Ответы Server-Sent Events (text/event-stream)
+
+Эндпоинты, долго ждущие ответа модели, отдают результат по частям, если
+клиент прислал Accept: text/event-stream; иначе отвечают JSON как раньше.
+Клиент читает поток через fetch (static/js/event-stream.js): EventSource
+не умеет POST.
+"""
+import json
+from typing import Any, AsyncIterator
+
+from fastapi import Request
+from starlette.responses import StreamingResponse
+
+EVENT_STREAM = "text/event-stream"
+# nginx по умолчанию буферизует ответ приложения - события пришли бы разом в конце
+EVENT_STREAM_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def wants_event_stream(request: Request) -> bool:
+    """Клиент запросил поток событий"""
+    return EVENT_STREAM in request.headers.get("accept", "")
+
+
+def sse_event(event: str, data: Any) -> str:
+    """Событие потока: имя и данные в JSON (одной строкой)"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def event_stream_response(events: AsyncIterator[str]) -> StreamingResponse:
+    """Ответ text/event-stream из готовых событий sse_event"""
+    return StreamingResponse(events, media_type=EVENT_STREAM, headers=EVENT_STREAM_HEADERS)
@@ -0,0 +1,344 @@
+"""
+Обслуживание хранилища записей: сборка мусора, срок хранения, холодный уровень
+
+sweep_storage выполняет фоновая задача по расписанию (app/tasks.py):
+- осиротевшие файлы - объекты хранилища с ключом по содержимому, на
+  которые не ссылается ни одна запись (сбой между размещением файла и
+  созданием записи, запись удалена без файла), удаляются. Хранилище
+  сверяется с audio_files пачками по storage_sweep_batch_size ключей.
+  Файлы с другими именами (загруженные до хранилища по содержимому) не
+  трогаются;
+- временные .part-файлы и брошенные сессии возобновляемой загрузки в
+  каталоге загрузок узла удаляются;
+- у записей старше audio_retention_days удаляется файл, запись и
+  стенограмма остаются;
+- несжатые записи (WAV) старше audio_cold_after_days сжимаются xz в
+  холодный уровень: ключ cold/ab/cd/<sha256>.xz. Opus, MP3 и WebM уже
+  сжаты, xz их не уменьшает. Запись из холодного уровня восстанавливается
+  при скачивании или обработке (rehydrate_audio) и остаётся в горячем.
+
+Файлы моложе storage_orphan_grace не удаляются: их загрузка или обработка
+может ещё идти. Удаление файла перепроверяет ссылки под store_lock.
+Итоги (SweepStats) пишутся в лог и в результат задачи (GET /api/jobs/{id}).
+"""
+import hashlib
+import lzma
+import os
+import re
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from app import crud, resumable_uploads
+from app.audio_metadata import AudioMetadataError, read_wav_header
+from app.audio_storage import (
+    PARTIAL_SUFFIX,
+    get_upload_dir,
+    local_copy,
+    new_partial_path,
+    remove_blob,
+    remove_file,
+    store_blob,
+    store_lock,
+)
+from app.config import settings
+from app.logger import get_logger
+from app.object_storage import ObjectStorage, StorageError, StoredObject, get_storage, is_legacy_key
+
+logger = get_logger(__name__)
+
+COLD_PREFIX = "cold/"
+COLD_SUFFIX = ".xz"
+# Несжатые форматы: остальные записи обобщённый компрессор не уменьшает
+COLD_MIME_TYPES = ("audio/wav", "audio/wave", "audio/x-wav")
+# Холодная копия должна быть меньше исходной хотя бы на эту долю
+COLD_MIN_SAVING = 0.1
+XZ_PRESET = 6
+COMPRESS_CHUNK_SIZE = 1024 * 1024
+
+_HOT_KEY = re.compile(r"^[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}$")
+_COLD_KEY = re.compile(r"^cold/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.xz$")
+
+
+@dataclass
+class SweepStats:
+    """Итоги обслуживания хранилища"""
+    orphan_files: int = 0
+    orphan_bytes: int = 0
+    stale_uploads: int = 0  # .part-файлы и сессии возобновляемой загрузки
+    stale_upload_bytes: int = 0
+    expired_recordings: int = 0
+    expired_bytes: int = 0
+    compacted_recordings: int = 0
+    compacted_bytes: int = 0  # Сэкономлено сжатием
+
+    @property
+    def reclaimed_bytes(self) -> int:
+        return self.orphan_bytes + self.stale_upload_bytes + self.expired_bytes + self.compacted_bytes
+
+    def as_dict(self) -> dict:
+        return {**asdict(self), "reclaimed_bytes": self.reclaimed_bytes}
+
+
+def cold_key(key: str) -> str:
+    """Ключ сжатой копии файла в холодном уровне"""
+    return f"{COLD_PREFIX}{key}{COLD_SUFFIX}"
+
+
+def is_cold(key: str) -> bool:
+    return key.startswith(COLD_PREFIX)
+
+
+def hot_key(key: str) -> str:
+    """Ключ файла, восстановленного из холодного уровня"""
+    return key[len(COLD_PREFIX):-len(COLD_SUFFIX)]
+
+
+def _xz_filters(path: Path) -> list[dict]:
+    """Дельта-фильтр по размеру кадра WAV перед LZMA2: соседние отсчёты близки"""
+    try:
+        with open(path, "rb") as f:
+            distance = read_wav_header(f, path.stat().st_size).block_align
+    except AudioMetadataError:
+        distance = 2
+    return [
+        {"id": lzma.FILTER_DELTA, "dist": min(max(distance, 1), 256)},
+        {"id": lzma.FILTER_LZMA2, "preset": XZ_PRESET},
+    ]
+
+
+def compress_file(source: Path, target: Path) -> int:
+    """Сжать файл в xz, вернуть размер сжатого"""
+    compressor = lzma.LZMACompressor(format=lzma.FORMAT_XZ, filters=_xz_filters(source))
+    with open(source, "rb") as src, open(target, "wb") as dst:
+        while chunk := src.read(COMPRESS_CHUNK_SIZE):
+            dst.write(compressor.compress(chunk))
+        dst.write(compressor.flush())
+        dst.flush()
+        os.fsync(dst.fileno())
+        return dst.tell()
+
+
+def decompress_file(source: Path, target: Path) -> str:
+    """Распаковать xz, вернуть SHA-256 распакованного"""
+    digest = hashlib.sha256()
+    with lzma.open(source, "rb") as src, open(target, "wb") as dst:
+        while chunk := src.read(COMPRESS_CHUNK_SIZE):
+            digest.update(chunk)
+            dst.write(chunk)
+        dst.flush()
+        os.fsync(dst.fileno())
+    return digest.hexdigest()
+
+
+async def _object_size(storage: ObjectStorage, key: str) -> int:
+    try:
+        return await storage.size(key)
+    except FileNotFoundError:
+        return 0
+
+
+# === Осиротевшие файлы ===
+
+async def _remove_orphans(db: AsyncSession, batch: list[StoredObject], stats: SweepStats) -> None:
+    referenced = await crud.get_referenced_audio_paths(db, [stored.key for stored in batch])
+    for stored in batch:
+        if stored.key in referenced:
+            continue
+        async with store_lock(db, stored.key):
+            # Перепроверка под блокировкой: загрузка могла сослаться на файл после первой проверки
+            if await crud.count_audio_file_references(db, stored.key):
+                continue
+            if await remove_blob(stored.key):
+                stats.orphan_files += 1
+                stats.orphan_bytes += stored.size
+                logger.info(f"Удалён осиротевший файл хранилища: {stored.key}, {stored.size} байт")
+
+
+async def sweep_orphans(db: AsyncSession, stats: SweepStats) -> None:
+    """Удалить файлы хранилища, на которые не ссылается ни одна запись"""
+    cutoff = time.time() - settings.storage_orphan_grace
+    batch: list[StoredObject] = []
+    async for stored in get_storage().iter_objects():
+        if stored.modified >= cutoff or not (_HOT_KEY.match(stored.key) or _COLD_KEY.match(stored.key)):
+            continue
+        batch.append(stored)
+        if len(batch) >= settings.storage_sweep_batch_size:
+            await _remove_orphans(db, batch, stats)
+            batch = []
+    if batch:
+        await _remove_orphans(db, batch, stats)
+
+
+async def sweep_stale_uploads(stats: SweepStats) -> None:
+    """Удалить незавершённые загрузки узла: .part-файлы и брошенные сессии"""
+    cutoff = time.time() - settings.storage_orphan_grace
+
+    def _sweep() -> tuple[int, int]:
+        removed = reclaimed = 0
+        for entry in os.scandir(get_upload_dir()):
+            if not entry.name.endswith(PARTIAL_SUFFIX) or not entry.is_file(follow_symlinks=False):
+                continue
+            stat_result = entry.stat()
+            if stat_result.st_mtime >= cutoff:
+                continue
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                continue
+            removed += 1
+            reclaimed += stat_result.st_size
+        return removed, reclaimed
+
+    removed, reclaimed = await run_in_threadpool(_sweep)
+    sessions, session_bytes = await resumable_uploads.expire_sessions(settings.storage_orphan_grace)
+    stats.stale_uploads += removed + sessions
+    stats.stale_upload_bytes += reclaimed + session_bytes
+
+
+# === Срок хранения ===
+
+async def expire_recordings(db: AsyncSession, stats: SweepStats) -> None:
+    """Удалить файлы записей старше audio_retention_days"""
+    if settings.audio_retention_days <= 0:
+        return
+    before = datetime.utcnow() - timedelta(days=settings.audio_retention_days)
+    after_id = 0
+    while audios := await crud.get_audio_files_uploaded_before(
+        db, before, settings.storage_sweep_batch_size, after_id=after_id
+    ):
+        # Значения записей читаются до изменений: объекты сессии обновляются записью
+        candidates = [(audio.id, audio.filepath) for audio in audios]
+        after_id = candidates[-1][0]
+        for audio_id, key in candidates:
+            async with store_lock(db, key):
+                size = await _object_size(get_storage(key), key)
+                references = await crud.clear_audio_file_content(db, audio_id, key)
+                if references is None:
+                    continue
+                stats.expired_recordings += 1
+                if references == 0 and await remove_blob(key):
+                    stats.expired_bytes += size
+            logger.info(f"Истёк срок хранения записи: audio_id={audio_id}, файл {key}")
+
+
+# === Холодный уровень ===
+
+async def compact_file(db: AsyncSession, key: str, stats: SweepStats) -> None:
+    """Сжать файл в холодный уровень и перевести на него все записи"""
+    storage = get_storage()
+    target = await run_in_threadpool(new_partial_path, get_upload_dir())
+    try:
+        async with local_copy(key) as source:
+            size = (await run_in_threadpool(os.stat, source)).st_size
+            compressed = await run_in_threadpool(compress_file, source, target)
+    except FileNotFoundError:
+        await remove_file(str(target))
+        logger.warning(f"Файл записи не найден в хранилище, сжатие пропущено: {key}")
+        return
+    except BaseException:
+        await remove_file(str(target))
+        raise
+
+    now = datetime.utcnow()
+    if compressed > size * (1 - COLD_MIN_SAVING):
+        await remove_file(str(target))
+        await crud.move_audio_files(db, key, key, compacted_at=now)
+        logger.info(f"Запись не сжимается ({size} -> {compressed} байт), оставлена: {key}")
+        return
+
+    cold = cold_key(key)
+    async with store_lock(db, key, cold):
+        if await storage.exists(cold):
+            # Осталась от прерванного переноса
+            await remove_file(str(target))
+        else:
+            await storage.store_file(cold, target)
+        if await crud.move_audio_files(db, key, cold, compacted_at=now):
+            await remove_blob(key)
+        elif not await crud.count_audio_file_references(db, cold):
+            # Записи удалены во время сжатия
+            await remove_blob(cold)
+            return
+    stats.compacted_recordings += 1
+    stats.compacted_bytes += size - compressed
+    logger.info(f"Запись сжата в холодный уровень: {key}, {size} -> {compressed} байт")
+
+
+async def compact_recordings(db: AsyncSession, stats: SweepStats) -> None:
+    """Сжать несжатые записи старше audio_cold_after_days"""
+    if settings.audio_cold_after_days <= 0:
+        return
+    before = datetime.utcnow() - timedelta(days=settings.audio_cold_after_days)
+    after_id = 0
+    while audios := await crud.get_audio_files_uploaded_before(
+        db, before, settings.storage_sweep_batch_size,
+        after_id=after_id, mime_types=COLD_MIME_TYPES, not_compacted=True
+    ):
+        after_id = audios[-1].id
+        # Записи с одинаковым содержимым разделяют файл: он сжимается один раз
+        for key in dict.fromkeys(audio.filepath for audio in audios):
+            # Файлы со старыми абсолютными путями не адресуются по SHA-256:
+            # восстановить их из холодного уровня с проверкой нельзя
+            if is_cold(key) or is_legacy_key(key):
+                continue
+            await compact_file(db, key, stats)
+
+
+async def rehydrate_audio(db: AsyncSession, key: str) -> str:
+    """
+    Вернуть файл из холодного уровня, вернуть ключ файла для чтения
+
+    Для файла в горячем уровне - сам key. Восстановленный файл проверяется
+    по SHA-256, все записи переводятся на него, сжатая копия удаляется.
+    """
+    if not is_cold(key):
+        return key
+    storage = get_storage()
+    hot = hot_key(key)
+    sha256 = hot.rsplit("/", 1)[-1]
+    target = await run_in_threadpool(new_partial_path, get_upload_dir())
+    try:
+        async with local_copy(key) as source:
+            digest = await run_in_threadpool(decompress_file, source, target)
+        if digest != sha256:
+            raise StorageError(f"Сжатая копия {key} повреждена: SHA-256 не совпадает")
+    except FileNotFoundError:
+        await remove_file(str(target))
+        # Запись уже восстановлена параллельным запросом
+        if await storage.exists(hot):
+            return hot
+        raise
+    except BaseException:
+        await remove_file(str(target))
+        raise
+
+    async with store_lock(db, key, hot):
+        hot, _ = await store_blob(target, sha256)
+        await crud.move_audio_files(db, key, hot)
+        if not await crud.count_audio_file_references(db, key):
+            await remove_blob(key)
+    logger.info(f"Запись восстановлена из холодного уровня: {hot}")
+    return hot
+
+
+async def sweep_storage(db: AsyncSession, stats: Optional[SweepStats] = None) -> SweepStats:
+    """Обслуживание хранилища целиком (см. описание модуля)"""
+    stats = stats or SweepStats()
+    started = time.perf_counter()
+    await expire_recordings(db, stats)
+    await compact_recordings(db, stats)
+    await sweep_orphans(db, stats)
+    await sweep_stale_uploads(stats)
+    logger.info(
+        f"Обслуживание хранилища за {time.perf_counter() - started:.1f} с: "
+        f"осиротевших файлов {stats.orphan_files}, незавершённых загрузок {stats.stale_uploads}, "
+        f"истёк срок у {stats.expired_recordings}, сжато {stats.compacted_recordings}; "
+        f"освобождено {stats.reclaimed_bytes} байт"
+    )
+    return stats
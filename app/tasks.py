@@ -0,0 +1,247 @@
+"""
+Обработчики фоновых задач (очередь app/jobs.py)
+
+Задачи ставят эндпоинты; здесь - их выполнение вне HTTP-запроса.
+"""
+import asyncio
+import time
+from pathlib import Path
+from typing import Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import audio_transcode, crud
+from app.audio_storage import (
+    blob_key,
+    get_upload_dir,
+    hash_file,
+    local_copy,
+    new_partial_path,
+    remove_blob,
+    remove_file,
+    store_blob,
+    store_lock,
+)
+from app.config import settings
+from app.database import async_session_maker
+from app.jobs import enqueue_job, job_handler
+from app.logger import get_logger
+from app.models import AudioFile, Job, TranscriptionStatus
+from app.storage_lifecycle import rehydrate_audio, sweep_storage
+from app.transcription import get_engine
+
+logger = get_logger(__name__)
+
+JOB_TRANSCRIBE_AUDIO = "transcribe_audio"
+JOB_SUBMIT_TO_MIS = "submit_to_mis"
+JOB_TRANSCODE_AUDIO = "transcode_audio"
+JOB_SWEEP_STORAGE = "sweep_storage"
+STORAGE_SWEEP_JOB_KEY = "storage"
+AUDIO_JOB_KEY_PREFIX = "audio:"
+
+
+def audio_job_key(audio_id: int) -> str:
+    return f"{AUDIO_JOB_KEY_PREFIX}{audio_id}"
+
+
+def report_job_key(appointment_id: int) -> str:
+    return f"report:{appointment_id}"
+
+
+def transcode_job_key(audio_id: int) -> str:
+    return f"transcode:{audio_id}"
+
+
+async def checkout_source(db: AsyncSession, filepath: str) -> str:
+    """
+    Ключ файла записи для долгой обработки (транскрибация, перекодирование)
+
+    Транзакция чтения завершается до и после восстановления из холодного
+    уровня: иначе на всё время обработки заняты соединение из пула и снимок
+    чтения SQLite WAL, который не даёт выполнить checkpoint.
+    """
+    await db.commit()
+    key = await rehydrate_audio(db, filepath)
+    await db.commit()
+    return key
+
+
+async def mark_transcription_failed(db: AsyncSession, payload: dict, error: str) -> None:
+    """Попытки транскрибации исчерпаны: статус FAILED, чтобы её можно было запустить снова"""
+    if await crud.get_audio_file(db, payload["audio_id"]):
+        await crud.update_transcription(db, payload["audio_id"], TranscriptionStatus.FAILED)
+
+
+@job_handler(JOB_TRANSCRIBE_AUDIO, on_failure=mark_transcription_failed)
+async def transcribe_audio_job(db: AsyncSession, payload: dict) -> Optional[dict]:
+    """Транскрибация аудиофайла движком из настроек (app/transcription.py)"""
+    audio_id = payload["audio_id"]
+    audio = await crud.get_audio_file(db, audio_id)
+    if not audio:
+        logger.info(f"Аудиофайл удалён до транскрибации: audio_id={audio_id}")
+        return None
+    
+    source = await checkout_source(db, audio.filepath)
+    engine = get_engine()
+    started = time.perf_counter()
+    async with local_copy(source) as path:
+        result = await engine.transcribe_recording(path)
+    elapsed = time.perf_counter() - started
+    logger.info(
+        f"Транскрибация завершена: audio_id={audio_id}, engine={engine.name}, "
+        f"длительность записи={result.duration}, обработка={elapsed:.1f} с"
+    )
+    
+    await crud.update_transcription(db, audio_id, TranscriptionStatus.COMPLETED, text=result.text)
+    return {"audio_id": audio_id, "engine": engine.name, "duration": result.duration}
+
+
+@job_handler(JOB_TRANSCODE_AUDIO)
+async def transcode_audio_job(db: AsyncSession, payload: dict) -> Optional[dict]:
+    """
+    Перекодирование записи в Opus (app/audio_transcode.py)
+
+    Исходный файл заменяется только проверенной перекодированной версией и
+    удаляется из хранилища, если на него больше нет ссылок. Если запись
+    удалили или заменили во время перекодирования, результат отбрасывается.
+    """
+    audio_id = payload["audio_id"]
+    audio = await crud.get_audio_file(db, audio_id)
+    if not audio or not audio_transcode.needs_transcode(audio.mime_type, audio.saved_bytes):
+        return None
+    
+    # Запись в сессии обновляется заменой файла - исходные значения сохраняются заранее
+    source_size = audio.file_size
+    filename = Path(audio.filename).with_suffix(audio_transcode.OPUS_EXTENSION).name
+    source = await checkout_source(db, audio.filepath)
+    target = await asyncio.to_thread(new_partial_path, get_upload_dir())
+    started = time.perf_counter()
+    try:
+        async with local_copy(source) as source_path:
+            await audio_transcode.transcode_to_opus(source_path, target, settings.audio_opus_bitrate)
+            duration = await audio_transcode.verify_transcode(source_path, target)
+        file_size = (await asyncio.to_thread(target.stat)).st_size
+    except BaseException:
+        await remove_file(str(target))
+        raise
+    elapsed = time.perf_counter() - started
+    
+    saved_bytes = source_size - file_size
+    if saved_bytes <= 0:
+        # Исходный файл и так компактнее (например, MP3 с низким битрейтом)
+        await remove_file(str(target))
+        await crud.update_audio_saved_bytes(db, audio_id, 0)
+        logger.info(f"Перекодирование не уменьшило файл: audio_id={audio_id}, оставлен исходный")
+        return {"audio_id": audio_id, "saved_bytes": 0}
+    
+    sha256 = await hash_file(target)
+    async with store_lock(db, blob_key(sha256), source):
+        key, created = await store_blob(target, sha256)
+        try:
+            references = await crud.replace_audio_file_content(
+                db,
+                audio_id,
+                expected_filepath=source,
+                filename=filename,
+                filepath=key,
+                sha256=sha256,
+                file_size=file_size,
+                mime_type=audio_transcode.OPUS_MIME_TYPE,
+                saved_bytes=saved_bytes,
+                sample_rate=audio_transcode.OPUS_SAMPLE_RATE,
+                channels=audio_transcode.OPUS_CHANNELS,
+                bitrate=round(file_size * 8 / duration)
+            )
+        except Exception:
+            if created:
+                await remove_blob(key)
+            raise
+        if references is None:
+            if created:
+                await remove_blob(key)
+            logger.info(f"Аудиофайл удалён или заменён во время перекодирования: audio_id={audio_id}")
+            return None
+        if references == 0:
+            await remove_blob(source)
+    
+    logger.info(
+        f"Запись перекодирована в Opus: audio_id={audio_id}, {source_size} -> {file_size} байт, "
+        f"длительность={duration:.1f} с, обработка={elapsed:.1f} с"
+    )
+    return {"audio_id": audio_id, "saved_bytes": saved_bytes}
+
+
+@job_handler(JOB_SUBMIT_TO_MIS)
+async def submit_to_mis_job(db: AsyncSession, payload: dict) -> Optional[dict]:
+    """Имитация отправки отчёта в МИС"""
+    appointment_id = payload["appointment_id"]
+    
+    # Имитация задержки отправки в МИС
+    await asyncio.sleep(settings.mis_submit_delay)
+    
+    report = await crud.submit_report_to_mis(db, appointment_id)
+    logger.info(f"Отчёт отправлен в МИС: appointment_id={appointment_id}")
+    return {"submitted_at": report.submitted_at.isoformat()}
+
+
+@job_handler(JOB_SWEEP_STORAGE)
+async def sweep_storage_job(db: AsyncSession, payload: dict) -> Optional[dict]:
+    """Обслуживание хранилища записей (app/storage_lifecycle.py); результат - итоги SweepStats"""
+    stats = await sweep_storage(db)
+    return stats.as_dict()
+
+
+async def enqueue_transcription(db: AsyncSession, audio_id: int) -> Job:
+    """Отметить аудиофайл как обрабатываемый и поставить задачу транскрибации"""
+    await crud.update_transcription(db, audio_id, TranscriptionStatus.PROCESSING)
+    return await enqueue_job(db, JOB_TRANSCRIBE_AUDIO, {"audio_id": audio_id}, key=audio_job_key(audio_id))
+
+
+def transcode_pending(audio: AudioFile) -> bool:
+    """Будет ли запись заменена перекодированной версией (перекодирование включено и доступно)"""
+    return (
+        settings.audio_transcode_enabled
+        and audio_transcode.needs_transcode(audio.mime_type, audio.saved_bytes)
+        and audio_transcode.is_available()
+    )
+
+
+async def enqueue_transcode(db: AsyncSession, audio: AudioFile) -> Optional[Job]:
+    """Поставить перекодирование записи в Opus, если оно включено и возможно"""
+    if not transcode_pending(audio):
+        return None
+    return await enqueue_job(db, JOB_TRANSCODE_AUDIO, {"audio_id": audio.id}, key=transcode_job_key(audio.id))
+
+
+async def enqueue_storage_sweep(db: AsyncSession) -> Job:
+    """Поставить обслуживание хранилища, если оно ещё не в очереди"""
+    job = await crud.get_active_job(db, JOB_SWEEP_STORAGE, STORAGE_SWEEP_JOB_KEY)
+    if job is None:
+        job = await enqueue_job(db, JOB_SWEEP_STORAGE, {}, key=STORAGE_SWEEP_JOB_KEY)
+    return job
+
+
+async def schedule_storage_sweeps() -> None:
+    """Ставить обслуживание хранилища в очередь раз в storage_sweep_interval секунд"""
+    while True:
+        await asyncio.sleep(settings.storage_sweep_interval)
+        try:
+            async with async_session_maker() as db:
+                await enqueue_storage_sweep(db)
+        except Exception as e:
+            logger.error(f"Не удалось поставить обслуживание хранилища: {e}")
+
+
+async def recover_stuck_transcriptions(db: AsyncSession) -> int:
+    """
+    Поставить в очередь транскрибации, оставшиеся в PROCESSING без задачи
+
+    Вызывается при старте; задачи, воркер которых упал, возвращаются в
+    очередь сами по истечении таймаута видимости.
+    """
+    audio_ids = await crud.get_stuck_transcription_ids(db, JOB_TRANSCRIBE_AUDIO, key_prefix=AUDIO_JOB_KEY_PREFIX)
+    for audio_id in audio_ids:
+        await enqueue_job(db, JOB_TRANSCRIBE_AUDIO, {"audio_id": audio_id}, key=audio_job_key(audio_id))
+    if audio_ids:
+        logger.warning(f"Восстановлены зависшие транскрибации: {audio_ids}")
+    return len(audio_ids)
@@ -0,0 +1,322 @@
+"""
+Движки распознавания речи
+
+Задача транскрибации (app/tasks.py) получает движок через get_engine();
+какой именно - задаёт TRANSCRIPTION_ENGINE:
+- mock - фиктивный диалог после задержки (демо и тесты);
+- faster-whisper - локальная модель Whisper на CPU (ctranslate2, int8),
+  работает без сети, если модель уже скачана в WHISPER_DOWNLOAD_ROOT
+  или WHISPER_MODEL указывает на каталог модели.
+
+Распознавание на CPU занимает ядро на время, сравнимое с длительностью
+записи, поэтому CPU-движки выполняют его в пуле процессов: event loop
+не блокируется, а несколько записей распознаются параллельно. Модель
+загружается в каждом процессе пула один раз - при первой записи.
+"""
+import asyncio
+import functools
+import importlib.util
+import multiprocessing
+import os
+import shutil
+import tempfile
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+from app.audio_segmentation import SpeechChunk, split_recording
+from app.config import settings
+from app.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Фиктивная транскрипция (MVP)
+MOCK_TRANSCRIPTION = """
+    Врач: Здравствуйте! Проходите, присаживайтесь. Что вас беспокоит?
+    
+    Пациент: Добрый день, доктор. Последние несколько дней у меня сильные боли в верхней части живота, особенно усиливаются после приема пищи. Также ощущаю тяжесть и жжение.
+    
+    Врач: Понятно. А когда именно начались эти симптомы? И с чем вы связываете их появление?
+    
+    Пациент: Примерно неделю назад. Может быть связано с тем, что в последнее время часто питаюсь нерегулярно, употребляю много кофе и часто перекусываю на работе острой пищей.
+    
+    Врач: Хорошо. Отмечали ли вы изжогу, отрыжку, тошноту? Были ли эпизоды рвоты?
+    
+    Пациент: Да, изжога беспокоит, особенно по утрам и после еды. Отрыжка тоже периодически бывает. Тошноты нет, рвоты не было.
+    
+    Врач: Принимали ли вы какие-либо препараты для облегчения симптомов?
+    
+    Пациент: Пробовал принимать антациды, немного помогают, но ненадолго.
+    
+    Врач: Ясно. Сейчас я вас осмотрю. Прилягте, пожалуйста, на кушетку. При пальпации отмечается болезненность в эпигастральной области. Напряжения мышц передней брюшной стенки нет. Печень, селезёнка не увеличены.
+    
+    Пациент: Ох, да, здесь как раз болит.
+    
+    Врач: На основании жалоб и осмотра у вас, вероятно, обострение гастрита или начинающаяся язвенная болезнь желудка. Я назначу вам обследование: общий анализ крови, анализ на Helicobacter pylori, а также гастроскопию для уточнения диагноза.
+    
+    Пациент: Хорошо, доктор.
+    
+    Врач: Также рекомендую придерживаться диеты: исключить острое, жирное, копчёное, кофе, алкоголь. Питаться часто, но небольшими порциями. Назначу вам препараты для снижения кислотности и защиты слизистой желудка.
+    
+    Пациент: Спасибо большое! Буду следовать рекомендациям.
+    
+    Врач: Результаты анализов принесёте на повторный приём через неделю. Если состояние ухудшится — сразу обращайтесь. Будьте здоровы!
+    
+    Пациент: Спасибо, до свидания!
+    """.strip()
+
+
+class TranscriptionEngineError(Exception):
+    """Движок распознавания не настроен или недоступен"""
+
+
+@dataclass
+class TranscriptionSegment:
+    """Фрагмент распознанной речи, время - в секундах от начала записи"""
+    start: float
+    end: float
+    text: str
+    speaker: Optional[str] = None  # "Врач", "Пациент" - если движок различает собеседников
+
+
+@dataclass
+class TranscriptionResult:
+    """Результат распознавания записи"""
+    text: str
+    duration: Optional[float] = None  # Длительность записи, сек (если движок её знает)
+    segments: list[TranscriptionSegment] = field(default_factory=list)
+
+
+def format_timestamp(seconds: float) -> str:
+    """Метка времени MM:SS (минуты не ограничены 59)"""
+    total = int(seconds)
+    return f"{total // 60:02d}:{total % 60:02d}"
+
+
+def format_segments(segments: list[TranscriptionSegment]) -> str:
+    """Текст транскрипции: по строке "MM:SS - Врач: текст" (или "MM:SS - текст") на фрагмент"""
+    lines = []
+    for segment in segments:
+        if not segment.text:
+            continue
+        speaker = f"{segment.speaker}: " if segment.speaker else ""
+        lines.append(f"{format_timestamp(segment.start)} - {speaker}{segment.text}")
+    return "\n\n".join(lines)
+
+
+def shift_segments(result: TranscriptionResult, offset: float, length: float) -> list[TranscriptionSegment]:
+    """Фрагменты результата распознавания куска записи длиной length, начинающегося в offset"""
+    parts = result.segments or [TranscriptionSegment(0, length, result.text.strip())]
+    return [
+        TranscriptionSegment(offset + part.start, offset + part.end, part.text, part.speaker) for part in parts
+    ]
+
+
+def stitch_chunks(
+    chunks: list[SpeechChunk], results: list[TranscriptionResult], duration: float
+) -> TranscriptionResult:
+    """Собрать результаты фрагментов в транскрипцию записи, сдвинув метки времени"""
+    segments = []
+    for chunk, result in zip(chunks, results):
+        segments.extend(shift_segments(result, chunk.start, chunk.end - chunk.start))
+    return TranscriptionResult(text=format_segments(segments), duration=duration, segments=segments)
+
+
+def available_cpus() -> int:
+    """Число ядер, доступных процессу (с учётом CPU affinity контейнера)"""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+class TranscriptionEngine(ABC):
+    """Движок распознавания речи"""
+
+    name: str
+
+    @abstractmethod
+    async def transcribe(self, path: Path) -> TranscriptionResult:
+        """Распознать запись"""
+
+    async def transcribe_recording(self, path: Path) -> TranscriptionResult:
+        """Распознать запись приёма целиком (движок может разбить её на фрагменты)"""
+        return await self.transcribe(path)
+
+    def close(self) -> None:
+        """Освободить ресурсы движка"""
+
+
+class MockTranscriptionEngine(TranscriptionEngine):
+    """Фиктивный диалог после задержки TRANSCRIPTION_MOCK_DELAY"""
+
+    name = "mock"
+
+    async def transcribe(self, path: Path) -> TranscriptionResult:
+        await asyncio.sleep(settings.transcription_mock_delay)
+        return TranscriptionResult(text=MOCK_TRANSCRIPTION)
+
+
+class ProcessPoolEngine(TranscriptionEngine):
+    """
+    CPU-движок: распознавание в пуле процессов
+
+    Подкласс возвращает из recognizer() функцию уровня модуля (её
+    передают в процесс пула через pickle), принимающую путь к записи.
+    Пул создаётся при первой записи: процессов - по числу доступных
+    ядер, делённому на потоки одного распознавания.
+
+    Запись приёма (5-20 минут) распознаётся по фрагментам речи
+    (app/audio_segmentation.py): паузы отбрасываются, фрагменты
+    распознаются параллельно во всех процессах пула, так что время
+    ожидания определяется числом ядер, а не длиной записи.
+    """
+
+    def __init__(self, processes: int = 0, cpu_threads: int = 1):
+        self.cpu_threads = max(1, cpu_threads)
+        self.processes = processes or max(1, available_cpus() // self.cpu_threads)
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    @abstractmethod
+    def recognizer(self) -> Callable[[str], TranscriptionResult]:
+        """Функция распознавания, выполняемая в процессе пула"""
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn: дочерний процесс не наследует потоки и event loop приложения
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.processes, mp_context=multiprocessing.get_context("spawn")
+            )
+            logger.info(f"Пул распознавания {self.name}: процессов {self.processes}, потоков {self.cpu_threads}")
+        return self._executor
+
+    async def transcribe(self, path: Path) -> TranscriptionResult:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_executor(), self.recognizer(), str(path))
+
+    async def transcribe_recording(self, path: Path) -> TranscriptionResult:
+        if not settings.transcription_vad_enabled:
+            return await self.transcribe(path)
+
+        loop = asyncio.get_running_loop()
+        output_dir = tempfile.mkdtemp(prefix="elia-vad-")
+        try:
+            split = functools.partial(
+                split_recording,
+                str(path),
+                output_dir,
+                frame_ms=settings.vad_frame_ms,
+                noise_ratio=settings.vad_noise_ratio,
+                min_silence_ms=settings.vad_min_silence_ms,
+                min_speech_ms=settings.vad_min_speech_ms,
+                padding_ms=settings.vad_padding_ms,
+                max_chunk_seconds=settings.vad_max_chunk_seconds,
+            )
+            chunks, duration = await loop.run_in_executor(self._get_executor(), split)
+            speech = sum(chunk.end - chunk.start for chunk in chunks)
+            logger.info(f"Запись {path.name}: {duration:.0f} с, речь {speech:.0f} с во фрагментах: {len(chunks)}")
+            results = await asyncio.gather(*(self.transcribe(chunk.path) for chunk in chunks))
+        finally:
+            await asyncio.to_thread(shutil.rmtree, output_dir, True)
+        return stitch_chunks(chunks, list(results), duration)
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# Модели, загруженные в процессе пула: (модель, compute_type, потоки, каталог) -> WhisperModel
+_whisper_models: dict[tuple, Any] = {}
+
+
+def _faster_whisper_transcribe(
+    model_name: str,
+    compute_type: str,
+    cpu_threads: int,
+    download_root: str,
+    language: str,
+    beam_size: int,
+    path: str,
+) -> TranscriptionResult:
+    """Распознавание faster-whisper (выполняется в процессе пула)"""
+    from faster_whisper import WhisperModel
+
+    key = (model_name, compute_type, cpu_threads, download_root)
+    model = _whisper_models.get(key)
+    if model is None:
+        model = WhisperModel(
+            model_name,
+            device="cpu",
+            compute_type=compute_type,
+            cpu_threads=cpu_threads,
+            download_root=download_root or None,
+        )
+        _whisper_models[key] = model
+
+    segments, info = model.transcribe(path, language=language or None, beam_size=beam_size)
+    result = [TranscriptionSegment(start=s.start, end=s.end, text=s.text.strip()) for s in segments]
+    return TranscriptionResult(text=format_segments(result), duration=info.duration, segments=result)
+
+
+class FasterWhisperEngine(ProcessPoolEngine):
+    """Локальный Whisper (faster-whisper / ctranslate2) на CPU"""
+
+    name = "faster-whisper"
+
+    def __init__(self, processes: int = 0, cpu_threads: int = 1):
+        if importlib.util.find_spec("faster_whisper") is None:
+            raise TranscriptionEngineError(
+                "Для TRANSCRIPTION_ENGINE=faster-whisper установите пакет: pip install faster-whisper"
+            )
+        super().__init__(processes, cpu_threads)
+
+    def recognizer(self) -> Callable[[str], TranscriptionResult]:
+        return functools.partial(
+            _faster_whisper_transcribe,
+            settings.whisper_model,
+            settings.whisper_compute_type,
+            self.cpu_threads,
+            settings.whisper_download_root,
+            settings.whisper_language,
+            settings.whisper_beam_size,
+        )
+
+
+ENGINES: dict[str, type[TranscriptionEngine]] = {
+    MockTranscriptionEngine.name: MockTranscriptionEngine,
+    FasterWhisperEngine.name: FasterWhisperEngine,
+}
+
+_engine: Optional[TranscriptionEngine] = None
+
+
+def create_engine(name: str) -> TranscriptionEngine:
+    """Создать движок по имени из ENGINES"""
+    engine_class = ENGINES.get(name)
+    if engine_class is None:
+        raise TranscriptionEngineError(
+            f"Неизвестный движок распознавания: {name} (доступны: {', '.join(ENGINES)})"
+        )
+    if issubclass(engine_class, ProcessPoolEngine):
+        return engine_class(
+            processes=settings.transcription_processes, cpu_threads=settings.transcription_cpu_threads
+        )
+    return engine_class()
+
+
+def get_engine() -> TranscriptionEngine:
+    """Движок, выбранный в настройках (создаётся при первом обращении)"""
+    global _engine
+    if _engine is None:
+        _engine = create_engine(settings.transcription_engine)
+    return _engine
+
+
+def shutdown_engine() -> None:
+    """Остановить пул процессов движка (при остановке приложения)"""
+    global _engine
+    if _engine is not None:
+        _engine.close()
+        _engine = None
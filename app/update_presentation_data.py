@@ -5,7 +5,7 @@ from sqlalchemy import delete, select
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
-from app.database import async_session_maker, init_db
+from app.database import async_session_maker, run_migrations
 from app.models import (
     Patient, ChronicDisease, RecentDisease, HealthIndicator,
     Appointment, MedicalReport, AudioFile,
@@ -16,8 +16,8 @@ from app.models import (
 async def update_presentation_data():
     """Обновить тестовые данные для презентации"""
     
-    # Инициализируем БД
-    await init_db()
+    # Приводим схему БД к актуальной ревизии
+    await run_migrations()
     
     async with async_session_maker() as session:
         # Удаляем все старые данные
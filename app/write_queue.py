@@ -0,0 +1,263 @@
+"""Очередь записи в БД с одним писателем и групповым коммитом"""
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Optional, TypeVar
+
+from sqlalchemy import event, inspect
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app.config import settings
+from app.database import configure_sqlite_engine, is_sqlite_url
+from app.logger import get_logger
+
+logger = get_logger(__name__)
+
+T = TypeVar("T")
+
+# Единица записи: корутина, выполняющая изменения в переданной сессии.
+# Коммит выполняет вызывающий код (run_write) или писатель очереди.
+WriteUnit = Callable[[AsyncSession], Awaitable[T]]
+
+_STOP = object()
+
+
+def create_writer_engine(database_url: str) -> AsyncEngine:
+    """
+    Создать engine с единственным соединением для писателя
+
+    Для SQLite транзакция открывается через BEGIN IMMEDIATE: блокировка записи
+    берётся сразу, а SAVEPOINT внутри группы работают корректно (драйвер
+    sqlite3 не управляет транзакциями сам).
+    """
+    writer_engine = create_async_engine(
+        database_url,
+        echo=False,
+        future=True,
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=1,
+        max_overflow=0,
+    )
+
+    if is_sqlite_url(database_url):
+        if settings.sqlite_pragmas_enabled:
+            configure_sqlite_engine(writer_engine)
+
+        @event.listens_for(writer_engine.sync_engine, "connect")
+        def _disable_driver_transactions(dbapi_connection, connection_record):
+            dbapi_connection.isolation_level = None
+
+        @event.listens_for(writer_engine.sync_engine, "begin")
+        def _begin_immediate(conn):
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+    return writer_engine
+
+
+class WriteQueue:
+    """
+    Сериализация записи через одну задачу-писателя
+
+    Вызывающий код передаёт единицу записи и ожидает свой результат.
+    Писатель забирает из очереди до max_batch единиц, выполняет каждую
+    в отдельном SAVEPOINT и фиксирует группу одним COMMIT. Ошибка одной
+    единицы откатывает только её SAVEPOINT и возвращается её вызывающему.
+    После начала остановки новые единицы не принимаются; единицы, которые
+    писатель не выполнил (остановка, сбой писателя), завершаются ошибкой.
+    """
+
+    def __init__(
+        self,
+        database_url: str,
+        max_batch: int = 32,
+        batch_window_ms: int = 0
+    ):
+        self.database_url = database_url
+        self.max_batch = max(1, max_batch)
+        self.batch_window = max(0, batch_window_ms) / 1000
+        self._engine: Optional[AsyncEngine] = None
+        self._session_factory: Optional[async_sessionmaker[AsyncSession]] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+        # Метрики
+        self.batches_committed = 0
+        self.units_committed = 0
+        self.units_failed = 0
+
+    @property
+    def is_running(self) -> bool:
+        """Принимает ли очередь записи: писатель запущен и не останавливается"""
+        return self._task is not None and not self._task.done() and not self._stopping
+
+    async def start(self) -> None:
+        """Запустить задачу-писателя"""
+        if self.is_running:
+            return
+        self._engine = create_writer_engine(self.database_url)
+        self._session_factory = async_sessionmaker(
+            self._engine,
+            class_=AsyncSession,
+            expire_on_commit=False
+        )
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run(), name="db-writer")
+        logger.info(
+            f"Очередь записи запущена: max_batch={self.max_batch}, "
+            f"batch_window={self.batch_window * 1000:.0f}ms"
+        )
+
+    async def stop(self) -> None:
+        """Дождаться обработки очереди и остановить писателя"""
+        if self._task is None or self._stopping:
+            return
+        # Записи, начатые после этого, выполняются без очереди (run_write)
+        self._stopping = True
+        try:
+            if not self._task.done():
+                await self._queue.put(_STOP)
+            # Сбой писателя уже передан ожидающим единицам
+            await asyncio.gather(self._task, return_exceptions=True)
+        finally:
+            self._task = None
+            self._stopping = False
+            await self._engine.dispose()
+        logger.info(
+            f"Очередь записи остановлена: групп={self.batches_committed}, "
+            f"записей={self.units_committed}, ошибок={self.units_failed}"
+        )
+
+    async def submit(self, unit: WriteUnit[T]) -> T:
+        """Поставить единицу записи в очередь и дождаться результата"""
+        if not self.is_running:
+            raise RuntimeError("Очередь записи не запущена или останавливается")
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        await self._queue.put((unit, future))
+        return await future
+
+    async def _collect_batch(self, first: Any) -> tuple[list, bool]:
+        """Собрать группу единиц, уже ожидающих в очереди"""
+        batch = [first]
+        stop = False
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.max_batch:
+            try:
+                if self.batch_window:
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                else:
+                    item = self._queue.get_nowait()
+            except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                break
+            if item is _STOP:
+                stop = True
+                break
+            batch.append(item)
+        return batch, stop
+
+    async def _run(self) -> None:
+        """Основной цикл писателя"""
+        batch: list = []
+        try:
+            while True:
+                first = await self._queue.get()
+                if first is _STOP:
+                    return
+                batch, stop = await self._collect_batch(first)
+                await self._commit_batch(batch)
+                batch = []
+                if stop:
+                    return
+        finally:
+            # Писатель завершён (остановка, отмена или сбой): невыполненные
+            # единицы не должны ждать результата вечно
+            pending = [future for _, future in batch]
+            while not self._queue.empty():
+                item = self._queue.get_nowait()
+                if item is not _STOP:
+                    pending.append(item[1])
+            error = RuntimeError("Очередь записи остановлена")
+            for future in pending:
+                if not future.done():
+                    future.set_exception(error)
+
+    async def _commit_batch(self, batch: list) -> None:
+        """Выполнить группу единиц в одной транзакции"""
+        done: list[tuple[asyncio.Future, Any]] = []
+        try:
+            async with self._session_factory() as session:
+                for unit, future in batch:
+                    if future.cancelled():
+                        continue
+                    try:
+                        async with session.begin_nested():
+                            result = await unit(session)
+                    except Exception as e:
+                        self.units_failed += 1
+                        if not future.done():
+                            future.set_exception(e)
+                    else:
+                        done.append((future, result))
+                await session.commit()
+        except Exception as e:
+            logger.error(f"Ошибка группового коммита ({len(done)} записей): {e}")
+            self.units_failed += len(done)
+            for future, _ in done:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.batches_committed += 1
+        self.units_committed += len(done)
+        for future, result in done:
+            if not future.done():
+                future.set_result(result)
+
+
+write_queue = WriteQueue(
+    settings.database_url,
+    max_batch=settings.write_queue_max_batch,
+    batch_window_ms=settings.write_queue_batch_window_ms
+)
+
+
+async def run_write(db: AsyncSession, unit: WriteUnit[T], refresh: bool = True) -> T:
+    """
+    Выполнить единицу записи
+
+    Если очередь записи запущена, единица выполняется писателем в групповой
+    транзакции, а записанный объект переносится в сессию вызывающего кода.
+    Иначе - в сессии вызывающего кода с собственным коммитом.
+    refresh=False - для единиц, которые сами получают строку через RETURNING
+    и не нуждаются в повторном SELECT после коммита.
+    """
+    if write_queue.is_running:
+        result = await write_queue.submit(unit)
+        return await _adopt_result(db, result, refresh)
+
+    result = await unit(db)
+    await db.commit()
+    if refresh and result is not None:
+        await db.refresh(result)
+    return result
+
+
+async def _adopt_result(db: AsyncSession, result: T, refresh: bool) -> T:
+    """
+    Перенести объект, записанный писателем очереди, в сессию вызывающего кода
+
+    Сессия писателя закрыта, а копия строки в identity map вызывающего кода
+    устарела: merge обновляет её записанными значениями (без SELECT) и
+    возвращает объект этой сессии. Результаты, не являющиеся объектами ORM,
+    и удалённые объекты возвращаются как есть.
+    """
+    state = inspect(result, raiseerr=False)
+    if getattr(state, "key", None) is None or state.was_deleted:
+        return result
+    adopted = await db.merge(result, load=False)
+    if refresh:
+        await db.refresh(adopted)
+    return adopted
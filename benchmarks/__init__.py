@@ -0,0 +1 @@
+"""Бенчмарки производительности Elia AI Platform"""
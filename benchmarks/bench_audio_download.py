@@ -0,0 +1,140 @@
+"""
+Бенчмарк отдачи аудиозаписи: перемотка, полная загрузка, ревалидация
+
+Сервер (uvicorn, отдельный процесс) отдаёт одну запись прежним способом
+(FileResponse без Range) и через send_file. Замеры:
+- перемотка: чтение 256 КБ с случайной позиции. Без Range плеер получает
+  поток с начала файла и дочитывает его до нужной позиции;
+- полная загрузка файла;
+- повторный запрос с If-None-Match (304 против полной отдачи).
+
+Запуск:
+    python -m benchmarks.bench_audio_download --size-mb 50 --seeks 30
+"""
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import FileResponse
+
+from app.file_responses import send_file
+from benchmarks.bench_upload import free_port
+from benchmarks.common import summarize_ms
+
+SEEK_SIZE = 256 * 1024
+
+
+def create_app() -> FastAPI:
+    """Приложение сервера бенчмарка (путь к записи - из переменной окружения)"""
+    path = Path(os.environ["BENCH_AUDIO_PATH"])
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    @app.get("/legacy")
+    async def legacy():
+        return FileResponse(path, media_type="audio/mpeg", filename="visit.mp3")
+
+    @app.get("/ranged")
+    async def ranged(request: Request):
+        return await send_file(
+            request, path, media_type="audio/mpeg", filename="visit.mp3",
+            cache_control="private, max-age=31536000, immutable"
+        )
+
+    return app
+
+
+async def read_at(client: httpx.AsyncClient, mode: str, offset: int) -> int:
+    """Прочитать SEEK_SIZE байт с позиции offset, вернуть число полученных байт"""
+    if mode == "ranged":
+        response = await client.get("/ranged", headers={"Range": f"bytes={offset}-{offset + SEEK_SIZE - 1}"})
+        assert response.status_code == 206
+        return len(response.content)
+
+    received = 0
+    async with client.stream("GET", "/legacy") as response:
+        async for chunk in response.aiter_raw():
+            received += len(chunk)
+            if received >= offset + SEEK_SIZE:
+                break
+    return received
+
+
+async def run(args: argparse.Namespace, path: Path) -> None:
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "--factory", "benchmarks.bench_audio_download:create_app",
+         "--port", str(port), "--log-level", "warning"],
+        env=dict(os.environ, BENCH_AUDIO_PATH=str(path)),
+    )
+    size = path.stat().st_size
+    offsets = [random.Random(42).randrange(0, size - SEEK_SIZE) for _ in range(args.seeks)]
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=None) as client:
+            while True:
+                try:
+                    await client.get("/ping")
+                    break
+                except httpx.TransportError:
+                    await asyncio.sleep(0.1)
+
+            for mode in ("legacy", "ranged"):
+                latencies = []
+                transferred = 0
+                for offset in offsets:
+                    started = time.perf_counter()
+                    transferred += await read_at(client, mode, offset)
+                    latencies.append(time.perf_counter() - started)
+                print(
+                    f"[seek {mode:6s}] {summarize_ms(latencies)}  "
+                    f"передано {transferred / len(offsets) / 1024 / 1024:.1f} МБ на перемотку"
+                )
+
+            for mode in ("legacy", "ranged"):
+                latencies = []
+                for _ in range(args.downloads):
+                    started = time.perf_counter()
+                    response = await client.get(f"/{mode}")
+                    assert len(response.content) == size
+                    latencies.append(time.perf_counter() - started)
+                print(f"[full {mode:6s}] {summarize_ms(latencies)}")
+
+            etag = (await client.get("/ranged", headers={"Range": "bytes=0-0"})).headers["etag"]
+            latencies = []
+            for _ in range(args.downloads):
+                started = time.perf_counter()
+                response = await client.get("/ranged", headers={"If-None-Match": etag})
+                assert response.status_code == 304
+                latencies.append(time.perf_counter() - started)
+            print(f"[304 ranged ] {summarize_ms(latencies)}")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=50, help="Размер записи, МБ")
+    parser.add_argument("--seeks", type=int, default=30, help="Перемоток")
+    parser.add_argument("--downloads", type=int, default=5, help="Полных загрузок")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "visit.mp3"
+        path.write_bytes(os.urandom(args.size_mb * 1024 * 1024))
+        asyncio.run(run(args, path))
+
+
+if __name__ == "__main__":
+    main()
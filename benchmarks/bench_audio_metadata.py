@@ -0,0 +1,79 @@
+"""
+Бенчмарк метаданных записи: время извлечения при загрузке и объём для плеера
+
+Замеряет извлечение метаданных и пиков (extract_metadata) для WAV и MP3
+заданной длительности и сравнивает объём, который карточка приёма
+скачивает для показа длительности и волновой формы: вся запись (декодирование
+в браузере) против ответа /api/audio/{id}/peaks.
+
+MP3 генерируется из пустых кадров 128 кбит/с: сканирование заголовков
+от содержимого кадров не зависит. Пики MP3 требуют ffmpeg - без него
+замеряются только метаданные.
+
+Запуск:
+    python -m benchmarks.bench_audio_metadata --minutes 10 --repeat 5
+"""
+import argparse
+import json
+import math
+import struct
+import tempfile
+import time
+import wave
+from pathlib import Path
+
+from app.audio_metadata import extract_metadata
+from benchmarks.common import summarize_ms
+
+RATE = 16000
+MP3_FRAME = bytes([0xFF, 0xFB, 0x90, 0xC4]) + bytes(413)  # 128 кбит/с, 44.1 кГц, 1152 отсчёта
+
+
+def generate_wav(path: Path, minutes: float) -> Path:
+    """Тон 220 Гц с паузами, 16 кГц моно"""
+    second = b"".join(struct.pack("<h", int(6000 * math.sin(2 * math.pi * 220 * n / RATE))) for n in range(RATE))
+    with wave.open(str(path), "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(RATE)
+        for index in range(int(minutes * 60)):
+            wav.writeframes(second if index % 4 else bytes(2 * RATE))
+    return path
+
+
+def generate_mp3(path: Path, minutes: float) -> Path:
+    path.write_bytes(MP3_FRAME * math.ceil(minutes * 60 * 44100 / 1152))
+    return path
+
+
+def run(path: Path, repeat: int) -> None:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        metadata = extract_metadata(path)
+        timings.append(time.perf_counter() - started)
+
+    size = path.stat().st_size
+    peaks = metadata.waveform_peaks
+    response = json.dumps({"duration": metadata.duration, "peaks": list(peaks)}).encode() if peaks else b""
+    waveform = f"пики {len(response) / 1024:.1f} КБ" if peaks else "пики не построены (нужен ffmpeg)"
+    print(
+        f"[{path.suffix[1:]}] {metadata.duration:.0f} с, {size / 1024 / 1024:.1f} МБ: "
+        f"извлечение {summarize_ms(timings)}; для плеера: запись {size / 1024:.0f} КБ -> {waveform}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--minutes", type=float, default=10, help="Длительность записи, мин")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp_path = Path(tmp)
+        run(generate_wav(tmp_path / "visit.wav", args.minutes), args.repeat)
+        run(generate_mp3(tmp_path / "visit.mp3", args.minutes), args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Бенчмарк хранилища аудио по содержимому
+
+Три замера:
+- стоимость SHA-256 при потоковой записи загрузки (запись блоками
+  с хэшированием и без);
+- плоский каталог {uuid}{ext} против раскладки ab/cd/<sha256>: создание
+  файлов, поиск (stat) случайных файлов и чтение корневого каталога
+  (обход при резервном копировании и очистке) при большом числе файлов;
+- экономия места на повторных загрузках одной записи.
+
+Запуск:
+    python -m benchmarks.bench_audio_store --files 100000 --size-mb 200 --duplicates 0.3
+"""
+import argparse
+import hashlib
+import os
+import random
+import tempfile
+import uuid
+from pathlib import Path
+
+from benchmarks.common import Timer, percentile
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def bench_hashing(directory: Path, size_mb: int) -> None:
+    """Запись файла блоками с хэшированием и без"""
+    chunk = os.urandom(CHUNK_SIZE)
+    for mode in ("write", "write+sha256"):
+        digest = hashlib.sha256()
+        path = directory / f"hash-{mode}"
+        with Timer() as timer:
+            with open(path, "wb") as f:
+                for _ in range(size_mb):
+                    if mode == "write+sha256":
+                        digest.update(chunk)
+                    f.write(chunk)
+                f.flush()
+                os.fsync(f.fileno())
+        path.unlink()
+        print(f"[{mode:12s}] {size_mb / timer.elapsed:.0f} МБ/с")
+
+
+def flat_path(root: Path, name: str) -> Path:
+    return root / f"{name}.mp3"
+
+
+def fanout_path(root: Path, name: str) -> Path:
+    return root / name[:2] / name[2:4] / name
+
+
+def bench_layout(directory: Path, files: int, lookups: int) -> None:
+    """Создание файлов и поиск случайных файлов в двух раскладках"""
+    names = [hashlib.sha256(uuid.uuid4().bytes).hexdigest() for _ in range(files)]
+    sample = random.Random(42).sample(names, min(lookups, files))
+
+    for layout, make_path in (("flat", flat_path), ("fan-out", fanout_path)):
+        root = directory / layout
+        root.mkdir()
+        with Timer() as create_timer:
+            for name in names:
+                path = make_path(root, name)
+                if layout == "fan-out":
+                    path.parent.mkdir(parents=True, exist_ok=True)
+                path.touch()
+
+        latencies = []
+        for name in sample:
+            with Timer() as timer:
+                make_path(root, name).stat()
+            latencies.append(timer.elapsed)
+        with Timer() as list_timer:
+            entries = len(os.listdir(root))
+        print(
+            f"[{layout:8s}] создание: {files / create_timer.elapsed:.0f} файлов/с  "
+            f"stat: p50={percentile(latencies, 50) * 1e6:.1f}мкс p99={percentile(latencies, 99) * 1e6:.1f}мкс  "
+            f"listdir корня: {list_timer.elapsed * 1000:.1f}ms ({entries} записей)"
+        )
+
+
+def bench_dedupe(uploads: int, duplicates: float, size_mb: float) -> None:
+    """Место на диске для загрузок с долей повторов"""
+    rnd = random.Random(42)
+    recordings: list[str] = []
+    stored: set[str] = set()
+    for _ in range(uploads):
+        if recordings and rnd.random() < duplicates:
+            sha256 = rnd.choice(recordings)
+        else:
+            sha256 = uuid.uuid4().hex
+            recordings.append(sha256)
+        stored.add(sha256)
+    print(
+        f"[dedupe  ] {uploads} загрузок, повторов {duplicates:.0%}: "
+        f"{uploads * size_mb:.0f} МБ -> {len(stored) * size_mb:.0f} МБ"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=100_000, help="Файлов в хранилище")
+    parser.add_argument("--lookups", type=int, default=5_000, help="Поисков случайного файла")
+    parser.add_argument("--size-mb", type=int, default=200, help="Объём записи для замера хэширования, МБ")
+    parser.add_argument("--duplicates", type=float, default=0.3, help="Доля повторных загрузок")
+    parser.add_argument("--uploads", type=int, default=1000, help="Загрузок для оценки дедупликации")
+    parser.add_argument("--recording-mb", type=float, default=15, help="Средний размер записи, МБ")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = Path(tmp)
+        bench_hashing(directory, args.size_mb)
+        bench_layout(directory, args.files, args.lookups)
+    bench_dedupe(args.uploads, args.duplicates, args.recording_mb)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Бенчмарк перекодирования записей в Opus: экономия места и время
+
+Для каждой записи (или сгенерированного WAV) замеряются размер исходного
+и перекодированного файла, время перекодирования с проверкой длительности
+(как в фоновой задаче) и скорость относительно реального времени.
+Экономия трафика при прослушивании пропорциональна экономии места.
+
+Без файлов перекодируется сгенерированный WAV 16 кГц моно (тон с паузами);
+записи браузера обычно 44.1-48 кГц, их экономия заметно выше.
+
+Запуск:
+    python -m benchmarks.bench_audio_transcode --minutes 10 --bitrate 32k
+    python -m benchmarks.bench_audio_transcode visit1.wav visit2.mp3
+"""
+import argparse
+import asyncio
+import math
+import struct
+import tempfile
+import time
+import wave
+from pathlib import Path
+
+from app import audio_transcode
+
+
+def generate_wav(path: Path, minutes: float, rate: int = 16000) -> Path:
+    """Тон 220 Гц: три секунды звука, секунда тишины"""
+    with wave.open(str(path), "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        for second in range(int(minutes * 60)):
+            if second % 4 == 3:
+                wav.writeframes(bytes(2 * rate))
+                continue
+            wav.writeframes(b"".join(
+                struct.pack("<h", int(6000 * math.sin(2 * math.pi * 220 * n / rate))) for n in range(rate)
+            ))
+    return path
+
+
+async def measure(source: Path, target: Path, bitrate: str) -> None:
+    started = time.perf_counter()
+    await audio_transcode.transcode_to_opus(source, target, bitrate)
+    duration = await audio_transcode.verify_transcode(source, target)
+    elapsed = time.perf_counter() - started
+
+    source_size = source.stat().st_size
+    target_size = target.stat().st_size
+    print(
+        f"{source.name}: {duration / 60:.1f} мин, {source_size / 1024 / 1024:.1f} МБ -> "
+        f"{target_size / 1024 / 1024:.2f} МБ (в {source_size / target_size:.1f} раз меньше, "
+        f"экономия {(source_size - target_size) / 1024 / 1024:.1f} МБ); "
+        f"перекодирование {elapsed:.1f} с ({duration / elapsed:.0f}x реального времени)"
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="*", type=Path, help="Записи WAV/MP3")
+    parser.add_argument("--minutes", type=float, default=10, help="Длительность сгенерированной записи, мин")
+    parser.add_argument("--bitrate", default="32k", help="Битрейт Opus")
+    args = parser.parse_args()
+
+    if not audio_transcode.is_available():
+        print("ffmpeg/ffprobe не найдены - бенчмарк пропущен")
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp_path = Path(tmp)
+        files = args.files or [generate_wav(tmp_path / "generated.wav", args.minutes)]
+        print(f"Opus {args.bitrate}")
+        for source in files:
+            await measure(source, tmp_path / f"{source.stem}.ogg", args.bitrate)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,113 @@
+"""
+Бенчмарк сжатого хранения транскрипций
+
+Синтетический корпус: стенограммы из фраз data/talk.md в случайном
+порядке с подставленными числами (около часа речи каждая). Сравниваются
+размер файла БД и скорость чтения транскрипций через ORM для строк,
+записанных обычным TEXT (как до сжатия), и строк в формате CompressedText.
+
+Запуск:
+    python -m benchmarks.bench_compressed_text --files 300
+"""
+import argparse
+import asyncio
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from sqlalchemy import select, text
+from sqlalchemy.orm import undefer
+
+from app.database import configure_sqlite_engine
+from app.models import AudioFile, TranscriptionStatus
+from benchmarks.common import create_schema, make_engine, make_session_factory, seed_appointments
+
+TALK_FILE = Path(__file__).resolve().parent.parent / "data" / "talk.md"
+
+
+def make_corpus(count: int, phrases_per_text: int, seed: int = 3) -> list[str]:
+    """Сгенерировать стенограммы из фраз talk.md"""
+    phrases = [line.strip() for line in TALK_FILE.read_text(encoding="utf-8").splitlines() if line.strip()]
+    rnd = random.Random(seed)
+    corpus = []
+    for _ in range(count):
+        lines = []
+        for _ in range(phrases_per_text):
+            phrase = rnd.choice(phrases)
+            lines.append(phrase.replace("10", str(rnd.randint(2, 30))).replace("6-7", f"{rnd.randint(1, 9)}"))
+        corpus.append("\n\n".join(lines))
+    return corpus
+
+
+async def run_mode(mode: str, corpus: list[str]) -> None:
+    """Записать корпус в одном формате и замерить размер и чтение"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / f"{mode}.db"
+        engine = make_engine(db_path, pool_size=1, max_overflow=0)
+        configure_sqlite_engine(engine)
+        session_factory = make_session_factory(engine)
+        await create_schema(engine)
+        appointment_ids = await seed_appointments(session_factory, len(corpus), 1)
+
+        async with session_factory() as session:
+            if mode == "compressed":
+                session.add_all(
+                    AudioFile(
+                        appointment_id=appointment_id,
+                        filename="recording.webm",
+                        filepath="",
+                        file_size=0,
+                        mime_type="audio/webm",
+                        transcription_status=TranscriptionStatus.COMPLETED,
+                        transcription_text=transcript,
+                    )
+                    for appointment_id, transcript in zip(appointment_ids, corpus)
+                )
+            else:
+                # Как писала прежняя схема: строка TEXT без сжатия
+                await session.execute(
+                    text(
+                        "INSERT INTO audio_files (appointment_id, filename, filepath, file_size, mime_type, "
+                        "transcription_status, transcription_text, uploaded_at) "
+                        "VALUES (:id, 'recording.webm', '', 0, 'audio/webm', 'COMPLETED', :text, CURRENT_TIMESTAMP)"
+                    ),
+                    [{"id": a, "text": t} for a, t in zip(appointment_ids, corpus)]
+                )
+            await session.commit()
+
+        async with engine.connect() as conn:
+            await conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+            await conn.exec_driver_sql("VACUUM")
+        size = db_path.stat().st_size
+
+        started = time.perf_counter()
+        chars = 0
+        async with session_factory() as session:
+            result = await session.execute(select(AudioFile).options(undefer(AudioFile.transcription_text)))
+            for audio in result.scalars():
+                chars += len(audio.transcription_text)
+        elapsed = time.perf_counter() - started
+        await engine.dispose()
+
+    print(
+        f"[{mode:10s}] размер БД: {size / 1024 / 1024:6.2f} МБ  "
+        f"чтение: {len(corpus) / elapsed:7.0f} транскрипций/с ({chars / elapsed / 1024 / 1024:.0f} Мсимв/с)"
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=300, help="Число транскрипций")
+    parser.add_argument("--phrases", type=int, default=400, help="Фраз в одной транскрипции")
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.files, args.phrases)
+    total = sum(len(t.encode("utf-8")) for t in corpus)
+    print(f"Корпус: {args.files} транскрипций, {total / 1024 / 1024:.1f} МБ текста UTF-8")
+    for mode in ("plain", "compressed"):
+        await run_mode(mode, corpus)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,88 @@
+"""
+Бенчмарк отложенной загрузки транскрипций
+
+Заполняет БД аудиофайлами с транскрипциями длиной около часа речи и
+сравнивает задержку и пиковую память проверки статуса (как в
+transcribe_audio / delete_audio_by_appointment) с загрузкой текста и без неё.
+
+Запуск:
+    python -m benchmarks.bench_deferred_text --files 200
+"""
+import argparse
+import asyncio
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from app import crud
+from app.database import configure_sqlite_engine
+from app.models import AudioFile, TranscriptionStatus
+from benchmarks.common import (
+    create_schema,
+    make_engine,
+    make_session_factory,
+    seed_appointments,
+    summarize_ms,
+)
+
+# Около 9000 слов - час разговора врача с пациентом
+PHRASE = "Пациент: последние несколько дней беспокоят боли в верхней части живота после еды. "
+HOUR_OF_SPEECH = PHRASE * 800
+
+
+async def measure(session_factory, audio_ids: list[int], with_text: bool) -> tuple[list[float], int]:
+    """Задержка каждой проверки и пиковая память за весь проход"""
+    latencies = []
+    tracemalloc.start()
+    for audio_id in audio_ids:
+        async with session_factory() as session:
+            started = time.perf_counter()
+            audio = await crud.get_audio_file(session, audio_id, with_text=with_text)
+            assert audio.transcription_status == TranscriptionStatus.COMPLETED
+            latencies.append(time.perf_counter() - started)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return latencies, peak
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=200, help="Число аудиофайлов")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = make_engine(Path(tmp) / "deferred.db", pool_size=1, max_overflow=0)
+        configure_sqlite_engine(engine)
+        session_factory = make_session_factory(engine)
+        await create_schema(engine)
+        appointment_ids = await seed_appointments(session_factory, args.files, 1)
+
+        async with session_factory() as session:
+            session.add_all(
+                AudioFile(
+                    appointment_id=appointment_id,
+                    filename="recording.webm",
+                    filepath="",
+                    file_size=0,
+                    mime_type="audio/webm",
+                    transcription_status=TranscriptionStatus.COMPLETED,
+                    transcription_text=HOUR_OF_SPEECH,
+                )
+                for appointment_id in appointment_ids
+            )
+            await session.commit()
+        async with session_factory() as session:
+            audio_ids = [(await crud.get_audio_file_by_appointment(session, a)).id for a in appointment_ids]
+
+        print(f"Аудиофайлов: {len(audio_ids)}, транскрипция: {len(HOUR_OF_SPEECH.encode('utf-8')) / 1024:.0f} КБ")
+        for with_text in (True, False):
+            latencies, peak = await measure(session_factory, audio_ids, with_text)
+            label = "с текстом " if with_text else "без текста"
+            print(f"[{label}] {summarize_ms(latencies)}  пик памяти: {peak / 1024:.0f} КБ")
+
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,141 @@
+"""
+Бенчмарк очереди фоновых задач
+
+Сравнивает прежнюю транскрибацию внутри запроса (статус PROCESSING,
+sleep, результат - запрос ждёт всё это время) с постановкой задачи в
+очередь (ответ 202) и выполнением воркерами. Замеры:
+- время ответа эндпоинта при параллельных запросах;
+- время до готовности всех транскрипций при разном числе воркеров;
+- накладные расходы очереди: задач в секунду без имитации работы.
+
+Запуск:
+    python -m benchmarks.bench_jobs --requests 20 --delay 0.5 --workers 1 2 4 8
+"""
+import argparse
+import asyncio
+import tempfile
+import time
+from pathlib import Path
+
+from sqlalchemy import select
+
+from app import crud
+from app.config import settings
+from app.database import configure_sqlite_engine, run_migrations
+from app.jobs import JobWorkerPool
+from app.models import AudioFile, JobStatus, TranscriptionStatus
+from app.tasks import enqueue_transcription
+from app.transcription import MOCK_TRANSCRIPTION
+from benchmarks.common import make_engine, make_session_factory, seed_appointments, summarize_ms
+
+
+async def create_audio_files(session_factory, appointment_ids: list[int]) -> list[int]:
+    async with session_factory() as session:
+        for appointment_id in appointment_ids:
+            session.add(AudioFile(
+                appointment_id=appointment_id, filename="visit.mp3", filepath="", file_size=1, mime_type="audio/mpeg"
+            ))
+        await session.commit()
+        result = await session.execute(select(AudioFile.id).where(AudioFile.appointment_id.in_(appointment_ids)))
+        return list(result.scalars())
+
+
+async def inline_request(session_factory, audio_id: int) -> None:
+    """Прежний эндпоинт: обработка внутри запроса"""
+    async with session_factory() as db:
+        await crud.update_transcription(db, audio_id, TranscriptionStatus.PROCESSING)
+        await asyncio.sleep(settings.transcription_mock_delay)
+        await crud.update_transcription(db, audio_id, TranscriptionStatus.COMPLETED, text=MOCK_TRANSCRIPTION)
+
+
+async def queued_request(session_factory, audio_id: int) -> None:
+    """Новый эндпоинт: задача в очередь, ответ 202"""
+    async with session_factory() as db:
+        await enqueue_transcription(db, audio_id)
+
+
+async def timed(coro) -> float:
+    started = time.perf_counter()
+    await coro
+    return time.perf_counter() - started
+
+
+async def wait_all_done(session_factory) -> None:
+    while True:
+        async with session_factory() as db:
+            result = await db.execute(
+                select(AudioFile.id).where(AudioFile.transcription_status != TranscriptionStatus.COMPLETED).limit(1)
+            )
+            if result.first() is None:
+                return
+        await asyncio.sleep(0.02)
+
+
+async def run_round(engine_path: Path, args, workers: int, mode: str) -> None:
+    engine = make_engine(engine_path)
+    configure_sqlite_engine(engine)
+    await run_migrations(engine)
+    session_factory = make_session_factory(engine)
+    appointment_ids = await seed_appointments(session_factory, args.requests, 1)
+    audio_ids = await create_audio_files(session_factory, appointment_ids)
+
+    pool = JobWorkerPool(session_factory=session_factory)
+    if mode == "queue":
+        await pool.start(workers)
+    started = time.perf_counter()
+    request = inline_request if mode == "inline" else queued_request
+    latencies = await asyncio.gather(*(timed(request(session_factory, audio_id)) for audio_id in audio_ids))
+    await wait_all_done(session_factory)
+    total = time.perf_counter() - started
+    await pool.stop()
+    await engine.dispose()
+    engine_path.unlink()
+
+    label = "inline" if mode == "inline" else f"queue x{workers}"
+    print(f"[{label:9s}] ответ: {summarize_ms(list(latencies))}  все готовы через {total:.2f} с")
+
+
+async def run_overhead(engine_path: Path, jobs: int, workers: int) -> None:
+    engine = make_engine(engine_path)
+    configure_sqlite_engine(engine)
+    await run_migrations(engine)
+    session_factory = make_session_factory(engine)
+    appointment_ids = await seed_appointments(session_factory, jobs, 1)
+    audio_ids = await create_audio_files(session_factory, appointment_ids)
+    for audio_id in audio_ids:
+        await queued_request(session_factory, audio_id)
+
+    pool = JobWorkerPool(session_factory=session_factory)
+    started = time.perf_counter()
+    await pool.start(workers)
+    await wait_all_done(session_factory)
+    elapsed = time.perf_counter() - started
+    await pool.stop()
+    async with session_factory() as db:
+        completed = await db.scalar(select(crud.func.count()).where(crud.Job.status == JobStatus.COMPLETED))
+    await engine.dispose()
+    engine_path.unlink()
+    print(f"[overhead ] {completed} задач без задержки, воркеров {workers}: {completed / elapsed:.0f} задач/с")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20, help="Параллельных запросов транскрибации")
+    parser.add_argument("--delay", type=float, default=0.5, help="Длительность одной транскрибации, сек")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8], help="Число воркеров")
+    parser.add_argument("--overhead-jobs", type=int, default=500, help="Задач для замера накладных расходов")
+    args = parser.parse_args()
+
+    settings.transcription_mock_delay = args.delay
+    settings.job_poll_interval = 0.05
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "jobs.db"
+        await run_round(db_path, args, 0, "inline")
+        for workers in args.workers:
+            await run_round(db_path, args, workers, "queue")
+        settings.transcription_mock_delay = 0
+        await run_overhead(db_path, args.overhead_jobs, max(args.workers))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,126 @@
+"""
+Бенчмарк распознавания во время записи: ожидание стенограммы после приёма
+
+Сравнивает время от окончания записи до готовой стенограммы:
+- batch: запись загружается после приёма и распознаётся целиком
+  (фрагменты речи параллельно на --cores ядрах);
+- live: части записи распознаются по ходу приёма (LiveTranscriptionSession),
+  после остановки остаётся распознать последнюю реплику.
+
+Движок имитируется: распознавание фрагмента занимает его длительность * --rtf
+(при --cores одновременных распознаваниях). Время ускорено в --speedup раз:
+запись поступает и распознаётся быстрее реального времени в одинаковой
+пропорции, результаты пересчитываются в реальные секунды.
+
+Запуск:
+    python -m benchmarks.bench_live_transcription --minutes 10 --rtf 0.3 --cores 4 --speedup 60
+"""
+import argparse
+import asyncio
+import math
+import random
+import struct
+import tempfile
+import time
+import wave
+from array import array
+from pathlib import Path
+
+from app.audio_segmentation import MAX_MERGE_GAP, detect_speech, group_regions, write_wav
+from app.config import settings
+from app.live_transcription import LiveTranscriptionSession
+from app.transcription import TranscriptionEngine, TranscriptionResult
+
+RATE = 16000
+
+
+class SimulatedEngine(TranscriptionEngine):
+    """Распознавание за длительность * rtf, не более cores одновременно"""
+
+    name = "simulated"
+
+    def __init__(self, rtf: float, cores: int, speedup: float):
+        self.rtf = rtf
+        self.speedup = speedup
+        self.slots = asyncio.Semaphore(cores)
+
+    async def transcribe(self, path: Path) -> TranscriptionResult:
+        with wave.open(str(path)) as wav:
+            duration = wav.getnframes() / wav.getframerate()
+        async with self.slots:
+            await asyncio.sleep(duration * self.rtf / self.speedup)
+        return TranscriptionResult(text="...", duration=duration)
+
+
+def generate_consultation(minutes: float) -> bytes:
+    """Реплики 2-15 с с паузами 0.8-3 с"""
+    rng = random.Random(7)
+    frames = bytearray()
+    total = int(minutes * 60 * RATE)
+    while len(frames) // 2 < total:
+        for n in range(int(rng.uniform(2, 15) * RATE)):
+            frames += struct.pack("<h", int(6000 * math.sin(2 * math.pi * 220 * n / RATE)))
+        frames += bytes(2 * int(rng.uniform(0.8, 3.0) * RATE))
+    return bytes(frames[:total * 2])
+
+
+async def run_batch(pcm: bytes, engine: SimulatedEngine, tmp: Path) -> tuple[float, float]:
+    """Разбиение на фрагменты (реальные секунды) и распознавание (ускоренные секунды)"""
+    started = time.perf_counter()
+    samples = array("h", pcm)
+    regions = detect_speech(samples, RATE)
+    groups = group_regions(regions, int(settings.vad_max_chunk_seconds * RATE), int(MAX_MERGE_GAP * RATE))
+    paths = []
+    for index, (start, end) in enumerate(groups):
+        path = tmp / f"batch-{index}.wav"
+        write_wav(path, samples[start:end], RATE)
+        paths.append(path)
+    split = time.perf_counter() - started
+
+    started = time.perf_counter()
+    await asyncio.gather(*(engine.transcribe(path) for path in paths))
+    return split, time.perf_counter() - started
+
+
+async def run_live(pcm: bytes, engine: SimulatedEngine, speedup: float, piece_seconds: float = 1.0) -> float:
+    session = LiveTranscriptionSession(engine, partial_results=False)
+    piece = int(piece_seconds * RATE) * 2
+    step = int(settings.live_step_seconds * RATE)
+    processed = 0
+    pass_task = None
+    for offset in range(0, len(pcm), piece):
+        session.feed(pcm[offset:offset + piece])
+        if len(session.samples) - processed >= step and (pass_task is None or pass_task.done()):
+            processed = len(session.samples)
+            pass_task = asyncio.create_task(session.process())
+        await asyncio.sleep(piece_seconds / speedup)
+
+    started = time.perf_counter()
+    if pass_task is not None:
+        await pass_task
+    await session.process(final=True)
+    return time.perf_counter() - started
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--minutes", type=float, default=10, help="Длительность приёма, мин")
+    parser.add_argument("--rtf", type=float, default=0.3, help="RTF движка на одном ядре")
+    parser.add_argument("--cores", type=int, default=4, help="Одновременных распознаваний")
+    parser.add_argument("--speedup", type=float, default=60, help="Ускорение времени")
+    args = parser.parse_args()
+
+    pcm = generate_consultation(args.minutes)
+    print(f"Приём {args.minutes:.0f} мин, RTF={args.rtf}, ядер {args.cores}")
+    with tempfile.TemporaryDirectory() as tmp:
+        split, batch = await run_batch(pcm, SimulatedEngine(args.rtf, args.cores, args.speedup), Path(tmp))
+    live = await run_live(pcm, SimulatedEngine(args.rtf, args.cores, args.speedup), args.speedup)
+    print(
+        f"[batch] стенограмма через {split + batch * args.speedup:.1f} с после окончания записи "
+        f"(разбиение {split:.1f} с, без времени загрузки)"
+    )
+    print(f"[live ] стенограмма через {live * args.speedup:.1f} с после окончания записи")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
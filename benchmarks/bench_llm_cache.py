@@ -0,0 +1,119 @@
+"""
+Бенчмарк кэша ответов модели при извлечении анамнеза
+
+Стенограмма часового приёма, повторные извлечения: промах (запрос к API,
+имитируется задержкой --api-latency), попадание в таблицу llm_responses
+(новый процесс) и попадание в память. Сохранение ответа с вытеснением
+замеряется на заполненной таблице (--entries).
+
+Запуск:
+    python -m benchmarks.bench_llm_cache --requests 500 --entries 10000 --api-latency 8
+"""
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+from app.config import settings
+from app.database import configure_sqlite_engine
+from app.llm_cache import LLMCache, cache_key
+from app.models import LLMResponse
+from app.openai_service import ANAMNESIS_PROMPT_VERSION, ANAMNESIS_TEMPERATURE
+from benchmarks.common import create_schema, make_engine, make_session_factory, summarize_ms
+
+RESPONSE = {
+    "purpose": "Головная боль",
+    "complaints": "Давящая головная боль в затылке третий день, хуже к вечеру. " * 5,
+    "anamnesis": "Началось после переохлаждения. АД 150/95. Назначено: контроль АД, осмотр невролога. " * 10,
+}
+
+
+def transcript(n: int) -> str:
+    """Стенограмма часового приёма (~40 тыс. символов)"""
+    return "\n".join(
+        f"{minute:02d}:{second:02d} - {'Врач' if line % 2 else 'Пациент'}: реплика {line} приёма {n}, жалобы и ответы"
+        for line, (minute, second) in enumerate((m, s) for m in range(60) for s in range(0, 60, 5))
+    )
+
+
+class FakeAPI:
+    """Запрос к модели: задержка и JSON-ответ"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    async def create(self, **params):
+        await asyncio.sleep(self.latency)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=json.dumps(RESPONSE)))])
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500, help="Число извлечений на режим")
+    parser.add_argument("--entries", type=int, default=10_000, help="Ответов в таблице до замера")
+    parser.add_argument("--api-latency", type=float, default=8.0, help="Задержка ответа модели, сек")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = make_engine(Path(tmp) / "llm_cache.db")
+        configure_sqlite_engine(engine)
+        session_factory = make_session_factory(engine)
+        await create_schema(engine)
+        async with session_factory() as session:
+            session.add_all(
+                LLMResponse(key=f"{n:064x}", kind="anamnesis", model="gpt-4", response=RESPONSE)
+                for n in range(args.entries)
+            )
+            await session.commit()
+
+        texts = [transcript(n) for n in range(args.requests)]
+        cache = LLMCache(memory_entries=args.requests, max_entries=args.entries, ttl=30 * 86400)
+        api = FakeAPI(args.api_latency)
+
+        def key(text: str) -> str:
+            return cache_key("anamnesis", text, ANAMNESIS_PROMPT_VERSION, settings.openai_model, ANAMNESIS_TEMPERATURE)
+
+        started = time.perf_counter()
+        key(texts[0])
+        print(f"Ключ стенограммы {len(texts[0]) // 1000} тыс. символов: {(time.perf_counter() - started) * 1000:.2f}ms")
+
+        # Промах: запрос к модели (параллельно, как от разных врачей) и сохранение с вытеснением
+        miss, store = [], []
+        # Запись - по одной, как через очередь записи приложения
+        write_lock = asyncio.Lock()
+
+        async def extract(text: str) -> None:
+            async with session_factory() as session:
+                started = time.perf_counter()
+                assert await cache.get(session, key(text)) is None
+                await api.create()
+                async with write_lock:
+                    stored = time.perf_counter()
+                    await cache.put(session, key(text), "anamnesis", settings.openai_model, RESPONSE)
+                    store.append(time.perf_counter() - stored)
+                miss.append(time.perf_counter() - started)
+
+        await asyncio.gather(*(extract(text) for text in texts))
+        print(f"[промах       ] {summarize_ms(miss)}")
+        print(f"[  сохранение ] {summarize_ms(store)}")
+
+        for name in ("таблица", "память"):
+            if name == "таблица":
+                cache.clear()
+            latencies = []
+            async with session_factory() as session:
+                for text in texts:
+                    started = time.perf_counter()
+                    assert await cache.get(session, key(text)) == RESPONSE
+                    latencies.append(time.perf_counter() - started)
+            print(f"[{name:13s}] {summarize_ms(latencies)}")
+
+        print(f"Счётчики: {cache.stats.as_dict()}")
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
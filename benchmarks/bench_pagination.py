@@ -0,0 +1,76 @@
+"""
+Бенчмарк пагинации списка приёмов: OFFSET против курсора
+
+Заполняет БД приёмами и замеряет стоимость страницы на разной глубине
+списка при постраничном обходе через skip и через X-Next-Cursor.
+
+Запуск:
+    python -m benchmarks.bench_pagination --patients 20000 --per-patient 5
+"""
+import argparse
+import asyncio
+import tempfile
+import time
+from pathlib import Path
+
+from app import crud
+from app.database import configure_sqlite_engine
+from benchmarks.common import (
+    create_schema,
+    make_engine,
+    make_session_factory,
+    seed_appointments,
+    summarize_ms,
+)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--patients", type=int, default=20_000, help="Число пациентов")
+    parser.add_argument("--per-patient", type=int, default=5, help="Приёмов на пациента")
+    parser.add_argument("--limit", type=int, default=100, help="Размер страницы")
+    parser.add_argument("--repeats", type=int, default=10, help="Повторов на страницу")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = make_engine(Path(tmp) / "pagination.db", pool_size=2, max_overflow=0)
+        configure_sqlite_engine(engine)
+        session_factory = make_session_factory(engine)
+        await create_schema(engine)
+        total = len(await seed_appointments(session_factory, args.patients, args.per_patient))
+        print(f"Приёмов: {total}, страница: {args.limit}")
+
+        # Курсоры для нужных глубин получаем одним проходом по списку
+        depths = [0, total // 4, total // 2, total - args.limit]
+        cursors = {}
+        cursor = None
+        async with session_factory() as session:
+            for page_start in range(0, total, args.limit):
+                if page_start in depths:
+                    cursors[page_start] = cursor
+                page = await crud.get_appointments(session, limit=args.limit, cursor=cursor)
+                if not page:
+                    break
+                cursor = crud.appointment_cursor(page[-1])
+
+        for depth in depths:
+            depth = depth - depth % args.limit
+            offset_lat, cursor_lat = [], []
+            for _ in range(args.repeats):
+                async with session_factory() as session:
+                    started = time.perf_counter()
+                    await crud.get_appointments(session, skip=depth, limit=args.limit)
+                    offset_lat.append(time.perf_counter() - started)
+                async with session_factory() as session:
+                    started = time.perf_counter()
+                    await crud.get_appointments(session, limit=args.limit, cursor=cursors.get(depth))
+                    cursor_lat.append(time.perf_counter() - started)
+            print(f"\nСтраница с позиции {depth}")
+            print(f"  OFFSET: {summarize_ms(offset_lat)}")
+            print(f"  cursor: {summarize_ms(cursor_lat)}")
+
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,119 @@
+"""
+Бенчмарк поиска пациентов: ILIKE '%...%' против FTS5 (триграммы)
+
+Заполняет БД заданным числом пациентов (по умолчанию 100 000) и замеряет
+задержку crud.get_patients с поиском через полнотекстовый индекс и через
+прежний фильтр ILIKE по трём колонкам.
+
+Запуск:
+    python -m benchmarks.bench_patient_search --patients 100000
+"""
+import argparse
+import asyncio
+import random
+import tempfile
+import time
+from datetime import date
+from pathlib import Path
+
+from sqlalchemy import or_, select
+
+from app import crud, search
+from app.database import configure_sqlite_engine
+from app.models import Patient
+from benchmarks.common import (
+    FIRST_NAMES,
+    LAST_NAMES,
+    MIDDLE_NAMES,
+    create_schema,
+    make_engine,
+    make_session_factory,
+    summarize_ms,
+)
+
+QUERIES = ["Иванов", "петров", "Козлова Анна", "ivanov", "Сидор", "Несуществующий"]
+
+
+async def seed_patients(engine, count: int) -> None:
+    """Быстрая вставка пациентов пакетами через executemany"""
+    rnd = random.Random(7)
+    # Разнообразим фамилии, чтобы выборки по подстроке были реалистичного размера
+    suffixes = ["", "а", "ский", "ская", "ович", "енко", "ин", "ина"]
+    rows = []
+    for i in range(count):
+        rows.append((
+            rnd.choice(FIRST_NAMES),
+            rnd.choice(LAST_NAMES).rstrip("в").rstrip("о") + rnd.choice(suffixes) + str(i % 997),
+            rnd.choice(MIDDLE_NAMES),
+            date(1950 + i % 50, 1 + i % 12, 1 + i % 28).isoformat(),
+            "MALE" if i % 2 else "FEMALE",
+            "ГБУЗ Поликлиника №1",
+            "Терапевтический 1",
+            "2025-01-01 00:00:00",
+        ))
+    async with engine.begin() as conn:
+        await conn.exec_driver_sql(
+            "INSERT INTO patients (first_name, last_name, middle_name, date_of_birth, gender, "
+            "medical_organization, medical_area, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+
+
+async def ilike_search(session, query: str, limit: int):
+    """Прежняя реализация поиска (leading-wildcard ILIKE)"""
+    stmt = select(Patient).where(or_(
+        Patient.first_name.ilike(f"%{query}%"),
+        Patient.last_name.ilike(f"%{query}%"),
+        Patient.middle_name.ilike(f"%{query}%"),
+    )).order_by(Patient.last_name, Patient.first_name, Patient.middle_name, Patient.id).limit(limit)
+    return (await session.execute(stmt)).scalars().all()
+
+
+async def measure(session_factory, fn, query: str, repeats: int) -> tuple[list[float], int]:
+    """Замерить задержку запроса"""
+    latencies = []
+    found = 0
+    for _ in range(repeats):
+        async with session_factory() as session:
+            started = time.perf_counter()
+            result = await fn(session, query)
+            latencies.append(time.perf_counter() - started)
+            found = len(result)
+    return latencies, found
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--patients", type=int, default=100_000, help="Число пациентов")
+    parser.add_argument("--repeats", type=int, default=20, help="Повторов на запрос")
+    parser.add_argument("--limit", type=int, default=100, help="Размер страницы")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = make_engine(Path(tmp) / "search.db", pool_size=2, max_overflow=0)
+        configure_sqlite_engine(engine)
+        session_factory = make_session_factory(engine)
+        await create_schema(engine)
+
+        started = time.perf_counter()
+        await seed_patients(engine, args.patients)
+        print(f"Заполнено {args.patients} пациентов за {time.perf_counter() - started:.1f}с (с индексом FTS5)")
+
+        async def fts(session, query):
+            return await crud.get_patients(session, search=query, limit=args.limit)
+
+        async def ilike(session, query):
+            return await ilike_search(session, query, args.limit)
+
+        for query in QUERIES:
+            fts_lat, fts_found = await measure(session_factory, fts, query, args.repeats)
+            ilike_lat, ilike_found = await measure(session_factory, ilike, query, args.repeats)
+            print(f"\n'{query}' (выражение MATCH: {search.build_match_expression(query)})")
+            print(f"  FTS5 : найдено {fts_found:4d}  {summarize_ms(fts_lat)}")
+            print(f"  ILIKE: найдено {ilike_found:4d}  {summarize_ms(ilike_lat)}")
+
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
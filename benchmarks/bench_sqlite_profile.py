@@ -0,0 +1,103 @@
+"""
+Бенчмарк профиля хранения SQLite: конкурентные чтения и запись
+
+Сравнивает engine без PRAGMA (rollback journal) и engine с профилем
+из app.config (WAL, synchronous=NORMAL, mmap, cache_size, busy_timeout).
+Читатели запрашивают список приёмов (как /api/appointments), писатели
+автосохраняют отчёты через crud.create_or_update_medical_report.
+
+Запуск:
+    python -m benchmarks.bench_sqlite_profile --duration 10 --readers 8 --writers 4
+"""
+import argparse
+import asyncio
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from sqlalchemy.exc import OperationalError
+
+from app import crud
+from app.database import configure_sqlite_engine
+from benchmarks.common import (
+    create_schema,
+    make_engine,
+    make_session_factory,
+    seed_appointments,
+    summarize_ms,
+)
+
+
+async def run_profile(name: str, tuned: bool, args: argparse.Namespace) -> None:
+    """Прогнать нагрузку на одном профиле"""
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = make_engine(
+            Path(tmp) / f"{name}.db",
+            pool_size=args.readers + args.writers,
+            max_overflow=0,
+        )
+        if tuned:
+            configure_sqlite_engine(engine)
+        session_factory = make_session_factory(engine)
+
+        await create_schema(engine)
+        appointment_ids = await seed_appointments(session_factory, args.patients, 5)
+
+        read_latencies: list[float] = []
+        write_latencies: list[float] = []
+        errors = {"read": 0, "write": 0}
+        deadline = time.perf_counter() + args.duration
+
+        async def reader():
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                try:
+                    async with session_factory() as session:
+                        await crud.get_appointments(session, limit=50)
+                    read_latencies.append(time.perf_counter() - started)
+                except OperationalError:
+                    errors["read"] += 1
+
+        async def writer(seed: int):
+            rnd = random.Random(seed)
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                try:
+                    async with session_factory() as session:
+                        await crud.create_or_update_medical_report(
+                            session,
+                            rnd.choice(appointment_ids),
+                            purpose="Плановый осмотр",
+                            complaints="Жалобы " * rnd.randint(10, 100),
+                            anamnesis="Анамнез " * rnd.randint(50, 500),
+                        )
+                    write_latencies.append(time.perf_counter() - started)
+                except OperationalError:
+                    errors["write"] += 1
+
+        await asyncio.gather(
+            *(reader() for _ in range(args.readers)),
+            *(writer(i) for i in range(args.writers)),
+        )
+        await engine.dispose()
+
+    print(f"[{name}]")
+    print(f"  чтения: {len(read_latencies) / args.duration:8.1f} оп/с  {summarize_ms(read_latencies)}  ошибок: {errors['read']}")
+    print(f"  записи: {len(write_latencies) / args.duration:8.1f} оп/с  {summarize_ms(write_latencies)}  ошибок: {errors['write']}")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=10.0, help="Длительность прогона, сек")
+    parser.add_argument("--readers", type=int, default=8, help="Число конкурентных читателей")
+    parser.add_argument("--writers", type=int, default=4, help="Число конкурентных писателей")
+    parser.add_argument("--patients", type=int, default=500, help="Число пациентов в БД")
+    args = parser.parse_args()
+
+    await run_profile("default", tuned=False, args=args)
+    await run_profile("tuned", tuned=True, args=args)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,66 @@
+"""
+Бенчмарк шага инициализации БД при старте приложения
+
+Сравнивает прежний init_db (create_all с проверкой каждой таблицы и
+индекса, установка поискового индекса) с проверкой ревизии схемы по
+таблице alembic_version. Каждый замер - новый engine, как при запуске процесса.
+
+Запуск:
+    python -m benchmarks.bench_startup --patients 2000 --runs 30
+"""
+import argparse
+import asyncio
+import tempfile
+import time
+from pathlib import Path
+
+from app.database import Base, check_schema_version, configure_sqlite_engine, run_migrations
+from benchmarks.common import make_engine, make_session_factory, seed_appointments, summarize_ms
+
+
+async def legacy_init_db(engine) -> None:
+    """Инициализация БД до перехода на миграции"""
+    def _create(sync_conn) -> None:
+        Base.metadata.create_all(sync_conn)
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(sync_conn, checkfirst=True)
+
+    async with engine.begin() as conn:
+        await conn.run_sync(_create)
+
+
+async def measure(db_path: Path, step, runs: int) -> list[float]:
+    """Время шага инициализации на новом engine"""
+    latencies = []
+    for _ in range(runs):
+        engine = make_engine(db_path)
+        configure_sqlite_engine(engine)
+        started = time.perf_counter()
+        await step(engine)
+        latencies.append(time.perf_counter() - started)
+        await engine.dispose()
+    return latencies
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--patients", type=int, default=2000, help="Число пациентов в БД")
+    parser.add_argument("--runs", type=int, default=30, help="Число замеров")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "startup.db"
+        engine = make_engine(db_path)
+        configure_sqlite_engine(engine)
+        await run_migrations(engine)
+        await seed_appointments(make_session_factory(engine), args.patients, 3)
+        await engine.dispose()
+
+        print(f"Пациентов: {args.patients}, замеров: {args.runs}")
+        for label, step in (("init_db", legacy_init_db), ("ревизия схемы", check_schema_version)):
+            print(f"[{label:13s}] {summarize_ms(await measure(db_path, step, args.runs))}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,151 @@
+"""
+Бенчмарк обслуживания хранилища записей
+
+Два замера:
+- сверка хранилища с audio_files (sweep_orphans): обход каталога загрузок
+  и проверка ссылок пачками разного размера, доля осиротевших файлов
+  задаётся; важна скорость на большом числе файлов;
+- сжатие WAV в холодный уровень: xz с дельта-фильтром по кадру против
+  xz без фильтра - степень сжатия и скорость сжатия и восстановления.
+
+Без файлов сжимается сгенерированный WAV 16 кГц моно (тон переменной
+громкости с паузами и шумом); на реальной речи степень сжатия ниже.
+
+Запуск:
+    python -m benchmarks.bench_storage_sweep --files-count 20000 --orphans 0.05 --minutes 10
+    python -m benchmarks.bench_storage_sweep --files-count 0 --minutes 0 visit.wav
+"""
+import argparse
+import asyncio
+import hashlib
+import lzma
+import math
+import os
+import random
+import struct
+import tempfile
+import wave
+from pathlib import Path
+
+from app import crud, storage_lifecycle
+from app.audio_storage import blob_key
+from app.config import settings
+from app.models import AudioFile
+from benchmarks.common import Timer, create_schema, make_engine, make_session_factory, seed_appointments
+
+
+def generate_wav(path: Path, minutes: float, rate: int = 16000) -> Path:
+    """Тон с медленно меняющейся громкостью и шумом; каждая четвёртая секунда - тишина"""
+    rnd = random.Random(42)
+    with wave.open(str(path), "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        for second in range(int(minutes * 60)):
+            loud = second % 4 != 3
+            wav.writeframes(b"".join(
+                struct.pack("<h", int(
+                    (6000 * math.sin(n / rate * 3) * math.sin(2 * math.pi * 180 * n / rate) if loud else 0)
+                    + rnd.gauss(0, 60)
+                ))
+                for n in range(rate)
+            ))
+    return path
+
+
+async def bench_orphans(directory: Path, files: int, orphan_share: float, batch_sizes: list[int]) -> None:
+    """Сверка каталога загрузок с БД при разном размере пачки"""
+    engine = make_engine(directory / "bench.db")
+    await create_schema(engine)
+    session_factory = make_session_factory(engine)
+    referenced = int(files * (1 - orphan_share))
+    appointment_ids = await seed_appointments(session_factory, patients=referenced // 10 + 1, appointments_per_patient=10)
+
+    uploads = directory / "uploads"
+    keys = [blob_key(hashlib.sha256(str(n).encode()).hexdigest()) for n in range(files)]
+    for key in keys:
+        path = uploads / key
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"x")
+        # Старше storage_orphan_grace
+        os.utime(path, (0, 0))
+    async with session_factory() as session:
+        session.add_all(
+            AudioFile(appointment_id=appointment_id, filename="visit.wav", filepath=key, file_size=1, mime_type="audio/wav")
+            for appointment_id, key in zip(appointment_ids, keys[:referenced])
+        )
+        await session.commit()
+
+    settings.upload_dir = str(uploads)
+    print(f"Файлов: {files}, со ссылкой: {referenced}")
+    for batch_size in batch_sizes:
+        # Сухой прогон: удалённые файлы вернулись бы в следующий замер
+        settings.storage_sweep_batch_size = batch_size
+        original = storage_lifecycle._remove_orphans
+        found = 0
+
+        async def count_orphans(db, batch, stats):
+            nonlocal found
+            referenced_keys = await crud.get_referenced_audio_paths(db, [s.key for s in batch])
+            found += len(batch) - len(referenced_keys)
+
+        storage_lifecycle._remove_orphans = count_orphans
+        try:
+            async with session_factory() as db:
+                with Timer() as timer:
+                    await storage_lifecycle.sweep_orphans(db, storage_lifecycle.SweepStats())
+        finally:
+            storage_lifecycle._remove_orphans = original
+        print(
+            f"[пачка {batch_size:5d}] {timer.elapsed:.2f} с, {files / timer.elapsed:.0f} файлов/с, "
+            f"осиротевших найдено: {found}"
+        )
+    await engine.dispose()
+
+
+def bench_compression(source: Path, directory: Path) -> None:
+    """xz с дельта-фильтром (как в холодном уровне) против xz без фильтра"""
+    size = source.stat().st_size
+    target = directory / "cold.xz"
+    with Timer() as timer:
+        compressed = storage_lifecycle.compress_file(source, target)
+    restored = directory / "restored.wav"
+    with Timer() as restore_timer:
+        storage_lifecycle.decompress_file(target, restored)
+    print(
+        f"[xz delta] {size / 1024 / 1024:.1f} МБ -> {compressed / 1024 / 1024:.1f} МБ "
+        f"(экономия {1 - compressed / size:.0%}); сжатие {size / 1024 / 1024 / timer.elapsed:.1f} МБ/с, "
+        f"восстановление {size / 1024 / 1024 / restore_timer.elapsed:.1f} МБ/с"
+    )
+
+    with Timer() as timer:
+        plain = len(lzma.compress(source.read_bytes(), preset=storage_lifecycle.XZ_PRESET))
+    print(
+        f"[xz      ] {size / 1024 / 1024:.1f} МБ -> {plain / 1024 / 1024:.1f} МБ "
+        f"(экономия {1 - plain / size:.0%}); сжатие {size / 1024 / 1024 / timer.elapsed:.1f} МБ/с"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="*", type=Path, help="Записи WAV для замера сжатия")
+    parser.add_argument("--files-count", dest="count", type=int, default=20_000, help="Файлов в хранилище")
+    parser.add_argument("--orphans", type=float, default=0.05, help="Доля осиротевших файлов")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[100, 500, 2000], help="Размеры пачки")
+    parser.add_argument("--minutes", type=float, default=10, help="Длительность сгенерированного WAV, мин")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = Path(tmp)
+        if args.count:
+            asyncio.run(bench_orphans(directory, args.count, args.orphans, args.batch_sizes))
+        sources = list(args.files)
+        if args.minutes:
+            sources.append(generate_wav(directory / "generated.wav", args.minutes))
+        for source in sources:
+            print(source.name)
+            bench_compression(source, directory)
+
+
+if __name__ == "__main__":
+    main()
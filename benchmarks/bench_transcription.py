@@ -0,0 +1,117 @@
+"""
+Бенчмарк распознавания речи: коэффициент реального времени (RTF)
+
+RTF = время распознавания / длительность записи; меньше 1 - быстрее
+реального времени. Замеры:
+- RTF каждой записи при последовательной обработке (первая запись
+  включает загрузку модели в процесс пула - она выводится отдельно);
+- та же запись с разбиением на фрагменты речи (transcribe_recording):
+  паузы отбрасываются, фрагменты распознаются параллельно во всех
+  процессах пула - время должно зависеть от числа ядер, а не от длины;
+- пропускная способность пула: все записи одновременно, суммарная
+  длительность аудио / общее время (сколько "секунд аудио в секунду").
+
+Без файлов распознаётся сгенерированный WAV (тон с паузами) - этого
+достаточно для оценки скорости, но не качества распознавания.
+
+Запуск:
+    python -m benchmarks.bench_transcription --engine faster-whisper visit1.mp3 visit2.wav
+    python -m benchmarks.bench_transcription --engine faster-whisper --generate-seconds 120 --copies 4
+"""
+import argparse
+import asyncio
+import math
+import struct
+import tempfile
+import time
+import wave
+from pathlib import Path
+from typing import Optional
+
+from app.config import settings
+from app.transcription import available_cpus, create_engine
+from benchmarks.common import summarize_ms
+
+
+def generate_wav(path: Path, seconds: float, rate: int = 16000) -> Path:
+    """Тон 440 Гц: секунда звука, секунда тишины"""
+    frames = bytearray()
+    for n in range(int(seconds * rate)):
+        sample = 0.3 * math.sin(2 * math.pi * 440 * n / rate) if (n // rate) % 2 == 0 else 0.0
+        frames += struct.pack("<h", int(sample * 32767))
+    with wave.open(str(path), "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(bytes(frames))
+    return path
+
+
+def wav_duration(path: Path) -> Optional[float]:
+    try:
+        with wave.open(str(path)) as wav:
+            return wav.getnframes() / wav.getframerate()
+    except (wave.Error, EOFError):
+        return None
+
+
+def format_rtf(elapsed: float, duration: Optional[float]) -> str:
+    return f"RTF={elapsed / duration:.3f}" if duration else "RTF=н/д (движок не сообщил длительность)"
+
+
+async def run(args: argparse.Namespace, files: list[Path]) -> None:
+    engine = create_engine(args.engine)
+    processes = getattr(engine, "processes", None)
+    print(f"Движок: {engine.name}, процессов: {processes or '-'}, ядер доступно: {available_cpus()}")
+    try:
+        durations: dict[Path, Optional[float]] = {}
+        latencies = []
+        for index, path in enumerate(files):
+            started = time.perf_counter()
+            result = await engine.transcribe(path)
+            elapsed = time.perf_counter() - started
+            durations[path] = result.duration or wav_duration(path)
+            if index > 0:
+                latencies.append(elapsed)
+            note = " (с загрузкой модели)" if index == 0 else ""
+            print(f"[serial] {path.name}: {elapsed:.2f} с, {format_rtf(elapsed, durations[path])}{note}")
+        if latencies:
+            print(f"[serial] без первой записи: {summarize_ms(latencies)}")
+
+        for path in dict.fromkeys(files):
+            started = time.perf_counter()
+            result = await engine.transcribe_recording(path)
+            elapsed = time.perf_counter() - started
+            print(f"[vad   ] {path.name}: {elapsed:.2f} с, {format_rtf(elapsed, durations[path])}, "
+                  f"сегментов: {len(result.segments) or '-'}")
+
+        started = time.perf_counter()
+        await asyncio.gather(*(engine.transcribe(path) for path in files))
+        elapsed = time.perf_counter() - started
+        total_audio = sum(d for d in durations.values() if d)
+        print(f"[pool  ] {len(files)} записей одновременно: {elapsed:.2f} с, {format_rtf(elapsed, total_audio)}")
+        if total_audio:
+            print(f"[pool  ] пропускная способность: {total_audio / elapsed:.1f} с аудио в секунду")
+    finally:
+        engine.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="*", type=Path, help="Записи WAV/MP3")
+    parser.add_argument("--engine", default=settings.transcription_engine, help="Движок (mock, faster-whisper)")
+    parser.add_argument("--processes", type=int, default=settings.transcription_processes, help="0 - по ядрам")
+    parser.add_argument("--cpu-threads", type=int, default=settings.transcription_cpu_threads)
+    parser.add_argument("--generate-seconds", type=float, default=30, help="Длительность сгенерированной записи")
+    parser.add_argument("--copies", type=int, default=3, help="Сколько раз распознать каждую запись")
+    args = parser.parse_args()
+
+    settings.transcription_processes = args.processes
+    settings.transcription_cpu_threads = args.cpu_threads
+    with tempfile.TemporaryDirectory() as tmp:
+        files = args.files or [generate_wav(Path(tmp) / "tone.wav", args.generate_seconds)]
+        asyncio.run(run(args, files * args.copies))
+
+
+if __name__ == "__main__":
+    main()
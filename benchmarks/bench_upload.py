@@ -0,0 +1,266 @@
+"""
+Бенчмарк загрузки аудио: влияние на задержку остальных запросов
+
+Сервер (uvicorn, отдельный процесс) принимает параллельные загрузки
+больших файлов, а отдельный клиент опрашивает лёгкий эндпоинт по
+расписанию и замеряет его задержку. Сравниваются прежняя запись
+(синхронный open/write блоками по 8 КБ в event loop), запись
+UploadFile в пуле потоков и потоковый разбор multipart
+прямо в каталог загрузок (receive_multipart_file). Медленный диск
+имитируется ограниченной скоростью записи и периодическими остановками
+(сброс грязных страниц), во время которых write() блокируется.
+
+Отдельно замеряется время ответа на загрузку больше лимита: проверка
+после разбора тела против BodySizeLimitMiddleware.
+
+Запуск:
+    python -m benchmarks.bench_upload --uploaders 4 --size-mb 20 --disk-mb-s 200 --stall-ms 100
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+
+import httpx
+from fastapi import FastAPI, File, HTTPException, Request, UploadFile
+from starlette.concurrency import run_in_threadpool
+
+from app import audio_storage
+from app.config import settings
+from app.middleware import BodySizeLimitMiddleware
+from benchmarks.common import summarize_ms
+
+LEGACY_CHUNK_SIZE = 8192
+PING_INTERVAL = 0.01
+STALL_EVERY = 8 * 1024 * 1024
+REJECT_LIMIT = 50 * 1024 * 1024
+
+
+class SlowDisk:
+    """Модель медленного диска: скорость записи и остановка каждые STALL_EVERY байт"""
+
+    def __init__(self, bytes_per_second: float, stall_seconds: float):
+        self.bytes_per_second = bytes_per_second
+        self.stall_seconds = stall_seconds
+        self.written = 0
+        self._lock = threading.Lock()
+
+    def write(self, size: int) -> None:
+        with self._lock:
+            before = self.written
+            self.written += size
+            stalled = self.written // STALL_EVERY != before // STALL_EVERY
+        time.sleep(size / self.bytes_per_second + (self.stall_seconds if stalled else 0))
+
+
+class SlowFile:
+    """Файл на медленном диске"""
+
+    def __init__(self, f, disk: SlowDisk):
+        self._f = f
+        self._disk = disk
+
+    def write(self, data: bytes) -> int:
+        self._disk.write(len(data))
+        return self._f.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self._f, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._f.close()
+        return False
+
+
+def create_app() -> FastAPI:
+    """Приложение сервера бенчмарка (параметры диска - из переменных окружения)"""
+    upload_dir = Path(os.environ["BENCH_UPLOAD_DIR"])
+    disk = SlowDisk(float(os.environ["BENCH_DISK_MB_S"]) * 1024 * 1024, float(os.environ["BENCH_STALL_MS"]) / 1000)
+
+    def slow_open(path, mode="r", *args, **kwargs):
+        return SlowFile(open(path, mode, *args, **kwargs), disk)
+
+    audio_storage.open = slow_open
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    @app.post("/upload/legacy")
+    async def upload_legacy(file: UploadFile = File(...)):
+        path = upload_dir / f"{uuid.uuid4()}.mp3"
+        size = 0
+        with slow_open(path, "wb") as f:
+            while chunk := await file.read(LEGACY_CHUNK_SIZE):
+                size += len(chunk)
+                f.write(chunk)
+        os.remove(path)
+        return {"size": size}
+
+    @app.post("/upload/threadpool")
+    async def upload_threadpool(file: UploadFile = File(...)):
+        # Прежняя запись UploadFile: блоки и fsync - в пуле потоков
+        path = upload_dir / f"{uuid.uuid4()}.mp3"
+        size = 0
+        with slow_open(path, "wb") as f:
+            while chunk := await file.read(settings.upload_chunk_size):
+                size += len(chunk)
+                await run_in_threadpool(f.write, chunk)
+            await run_in_threadpool(f.flush)
+            await run_in_threadpool(os.fsync, f.fileno())
+        await audio_storage.remove_file(str(path))
+        return {"size": size}
+
+    @app.post("/upload/streaming")
+    async def upload_streaming(request: Request):
+        upload = await audio_storage.receive_multipart_file(request, "file", upload_dir, max_size=1 << 40)
+        await audio_storage.remove_file(str(upload.path))
+        return {"size": upload.size}
+
+    @app.post("/reject/after-parse")
+    async def reject_after_parse(file: UploadFile = File(...)):
+        # Как раньше: лимит проверяется, когда тело уже разобрано в spool-файл
+        if file.size > REJECT_LIMIT:
+            raise HTTPException(status_code=413)
+        return {"size": file.size}
+
+    @app.post("/reject/middleware")
+    async def reject_middleware(file: UploadFile = File(...)):
+        return {"size": file.size}
+
+    app.add_middleware(BodySizeLimitMiddleware, limits=[(r"^/reject/middleware$", REJECT_LIMIT)])
+    return app
+
+
+def free_port() -> int:
+    """Свободный TCP-порт для сервера бенчмарка"""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def ping_loop(base_url: str, stop: threading.Event, latencies: list[float]) -> None:
+    """
+    Запросы к /ping по расписанию в отдельном потоке
+
+    Задержка считается от запланированного момента, поэтому время, пока
+    event loop сервера занят, попадает в замер.
+    """
+    with httpx.Client(base_url=base_url) as client:
+        scheduled = time.perf_counter()
+        while not stop.is_set():
+            time.sleep(max(0.0, scheduled - time.perf_counter()))
+            client.get("/ping")
+            latencies.append(time.perf_counter() - scheduled)
+            scheduled = max(scheduled + PING_INTERVAL, time.perf_counter())
+
+
+class BenchServer:
+    """uvicorn с приложением бенчмарка в отдельном процессе"""
+
+    def __init__(self, args: argparse.Namespace, upload_dir: str):
+        self.base_url = f"http://127.0.0.1:{free_port()}"
+        self.env = dict(
+            os.environ,
+            BENCH_UPLOAD_DIR=upload_dir,
+            BENCH_DISK_MB_S=str(args.disk_mb_s),
+            BENCH_STALL_MS=str(args.stall_ms),
+        )
+
+    async def __aenter__(self) -> httpx.AsyncClient:
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "--factory", "benchmarks.bench_upload:create_app",
+             "--port", self.base_url.rsplit(":", 1)[1], "--log-level", "warning"],
+            env=self.env,
+        )
+        self.client = httpx.AsyncClient(base_url=self.base_url, timeout=None)
+        while True:
+            try:
+                await self.client.get("/ping")
+                return self.client
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+
+    async def __aexit__(self, *exc) -> None:
+        await self.client.aclose()
+        self.process.terminate()
+        self.process.wait()
+
+
+async def run_mode(mode: str, args: argparse.Namespace, payload: bytes) -> None:
+    """Загрузки в одном режиме и задержка /ping во время них"""
+    with tempfile.TemporaryDirectory() as tmp:
+        async with BenchServer(args, tmp) as client:
+            async def uploader():
+                for _ in range(args.uploads):
+                    response = await client.post(
+                        f"/upload/{mode}", files={"file": ("audio.mp3", payload, "audio/mpeg")}
+                    )
+                    assert response.json()["size"] == len(payload)
+
+            latencies: list[float] = []
+            stop = threading.Event()
+            pinger = threading.Thread(target=ping_loop, args=(str(client.base_url), stop, latencies))
+            pinger.start()
+            started = time.perf_counter()
+            await asyncio.gather(*(uploader() for _ in range(args.uploaders)))
+            elapsed = time.perf_counter() - started
+            stop.set()
+            pinger.join()
+
+    total_mb = len(payload) * args.uploads * args.uploaders / 1024 / 1024
+    print(
+        f"[{mode:10s}] /ping: {summarize_ms(latencies)} max={max(latencies) * 1000:.0f}ms  "
+        f"загрузки: {total_mb / elapsed:.0f} МБ/с"
+    )
+
+
+async def run_reject(args: argparse.Namespace) -> None:
+    """Время до ответа 413 на загрузку больше лимита"""
+    payload = os.urandom(REJECT_LIMIT + 10 * 1024 * 1024)
+    with tempfile.TemporaryDirectory() as tmp:
+        async with BenchServer(args, tmp) as client:
+            for mode in ("after-parse", "middleware"):
+                latencies = []
+                for _ in range(3):
+                    started = time.perf_counter()
+                    try:
+                        response = await client.post(
+                            f"/reject/{mode}", files={"file": ("audio.mp3", payload, "audio/mpeg")}
+                        )
+                        assert response.status_code == 413
+                    except httpx.TransportError:
+                        # Сервер ответил 413 и закрыл соединение, не дочитав тело
+                        pass
+                    latencies.append(time.perf_counter() - started)
+                print(f"[413 {mode:11s}] {summarize_ms(latencies)}")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uploaders", type=int, default=4, help="Параллельных загрузок")
+    parser.add_argument("--uploads", type=int, default=2, help="Загрузок на клиента")
+    parser.add_argument("--size-mb", type=int, default=20, help="Размер файла, МБ")
+    parser.add_argument("--disk-mb-s", type=float, default=200, help="Скорость записи диска, МБ/с")
+    parser.add_argument("--stall-ms", type=float, default=100, help="Остановка диска каждые 8 МБ записи, мс")
+    args = parser.parse_args()
+
+    payload = os.urandom(args.size_mb * 1024 * 1024)
+    for mode in ("legacy", "threadpool", "streaming"):
+        await run_mode(mode, args, payload)
+    await run_reject(args)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,77 @@
+"""
+Бенчмарк автосохранения отчёта: SELECT -> изменение -> COMMIT -> refresh
+против одного INSERT ... ON CONFLICT DO UPDATE ... RETURNING
+
+Запуск:
+    python -m benchmarks.bench_upserts --saves 2000
+"""
+import argparse
+import asyncio
+import random
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+from sqlalchemy import select
+
+from app import crud
+from app.database import configure_sqlite_engine
+from app.models import MedicalReport
+from benchmarks.common import (
+    create_schema,
+    make_engine,
+    make_session_factory,
+    seed_appointments,
+    summarize_ms,
+)
+
+
+async def legacy_save(session, appointment_id: int, complaints: str) -> MedicalReport:
+    """Прежняя реализация: три обращения к БД на сохранение"""
+    result = await session.execute(select(MedicalReport).where(MedicalReport.appointment_id == appointment_id))
+    report = result.scalar_one_or_none()
+    if report:
+        report.complaints = complaints
+        report.updated_at = datetime.utcnow()
+    else:
+        report = MedicalReport(appointment_id=appointment_id, complaints=complaints)
+        session.add(report)
+    await session.commit()
+    await session.refresh(report)
+    return report
+
+
+async def upsert_save(session, appointment_id: int, complaints: str) -> MedicalReport:
+    """Текущая реализация (crud): один upsert с RETURNING"""
+    return await crud.create_or_update_medical_report(session, appointment_id, complaints=complaints)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--saves", type=int, default=2000, help="Число сохранений на режим")
+    parser.add_argument("--appointments", type=int, default=50, help="Число приёмов")
+    args = parser.parse_args()
+
+    for name, save in (("select+refresh", legacy_save), ("upsert", upsert_save)):
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = make_engine(Path(tmp) / "upserts.db", pool_size=1, max_overflow=0)
+            configure_sqlite_engine(engine)
+            session_factory = make_session_factory(engine)
+            await create_schema(engine)
+            appointment_ids = await seed_appointments(session_factory, args.appointments, 1)
+
+            rnd = random.Random(1)
+            latencies = []
+            async with session_factory() as session:
+                for i in range(args.saves):
+                    started = time.perf_counter()
+                    await save(session, rnd.choice(appointment_ids), f"Жалобы, правка {i}")
+                    latencies.append(time.perf_counter() - started)
+            await engine.dispose()
+
+        print(f"[{name:14s}] {summarize_ms(latencies)}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
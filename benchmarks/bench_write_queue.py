@@ -0,0 +1,100 @@
+"""
+Бенчмарк очереди записи: отдельные сессии против одного писателя
+
+Много конкурентных "врачей" автосохраняют отчёты. В режиме "sessions"
+каждая запись коммитится в своей сессии и конкурирует за блокировку
+записи SQLite. В режиме "queue" записи идут через WriteQueue и
+фиксируются группами.
+
+Запуск:
+    python -m benchmarks.bench_write_queue --users 32 --writes 20
+"""
+import argparse
+import asyncio
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from app import crud
+from app import write_queue as write_queue_module
+from app.database import configure_sqlite_engine
+from app.write_queue import WriteQueue
+from benchmarks.common import (
+    create_schema,
+    make_engine,
+    make_session_factory,
+    seed_appointments,
+    summarize_ms,
+)
+
+
+async def run_mode(mode: str, args: argparse.Namespace) -> None:
+    """Прогнать нагрузку в одном режиме"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / f"{mode}.db"
+        engine = make_engine(db_path, pool_size=args.users, max_overflow=0)
+        configure_sqlite_engine(engine)
+        session_factory = make_session_factory(engine)
+        await create_schema(engine)
+        appointment_ids = await seed_appointments(session_factory, args.users, 2)
+
+        queue = None
+        if mode == "queue":
+            queue = WriteQueue(f"sqlite+aiosqlite:///{db_path}", max_batch=args.batch)
+            await queue.start()
+            write_queue_module.write_queue = queue
+
+        latencies: list[float] = []
+        errors = 0
+
+        async def user(seed: int):
+            nonlocal errors
+            rnd = random.Random(seed)
+            for _ in range(args.writes):
+                started = time.perf_counter()
+                try:
+                    async with session_factory() as session:
+                        await crud.create_or_update_medical_report(
+                            session,
+                            rnd.choice(appointment_ids),
+                            complaints="Жалобы " * rnd.randint(10, 50),
+                            anamnesis="Анамнез " * rnd.randint(50, 200),
+                        )
+                    latencies.append(time.perf_counter() - started)
+                except (OperationalError, IntegrityError):
+                    # "database is locked" или гонка SELECT -> INSERT между сессиями
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(user(i) for i in range(args.users)))
+        elapsed = time.perf_counter() - started
+
+        batches = ""
+        if queue is not None:
+            batches = f"  групп: {queue.batches_committed} (в среднем {queue.units_committed / max(queue.batches_committed, 1):.1f} записей)"
+            await queue.stop()
+        await engine.dispose()
+
+    print(f"[{mode}] {len(latencies) / elapsed:8.1f} записей/с  {summarize_ms(latencies)}  ошибок: {errors}{batches}")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=32, help="Число конкурентных пользователей")
+    parser.add_argument("--writes", type=int, default=20, help="Записей на пользователя")
+    parser.add_argument("--batch", type=int, default=32, help="Максимальный размер группы")
+    args = parser.parse_args()
+
+    original_queue = write_queue_module.write_queue
+    try:
+        await run_mode("sessions", args)
+        await run_mode("queue", args)
+    finally:
+        write_queue_module.write_queue = original_queue
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
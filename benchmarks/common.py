@@ -0,0 +1,105 @@
+"""Общие утилиты бенчмарков"""
+import random
+import statistics
+import time
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Iterable
+
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app.database import Base
+from app.models import Appointment, AppointmentStatus, GenderEnum, Patient
+
+
+FIRST_NAMES = ["Иван", "Пётр", "Анна", "Мария", "Сергей", "Ольга", "Алексей", "Елена", "Дмитрий", "Наталья"]
+LAST_NAMES = ["Иванов", "Петров", "Сидоров", "Смирнов", "Кузнецов", "Попов", "Волков", "Соколов", "Лебедев", "Козлов"]
+MIDDLE_NAMES = ["Иванович", "Петрович", "Сергеевич", "Алексеевич", "Дмитриевич", "Андреевич"]
+
+
+def make_engine(db_path: Path, **kwargs) -> AsyncEngine:
+    """Создать engine для файла БД бенчмарка"""
+    if "pool_size" in kwargs:
+        kwargs.setdefault("poolclass", AsyncAdaptedQueuePool)
+    return create_async_engine(f"sqlite+aiosqlite:///{db_path}", echo=False, **kwargs)
+
+
+def make_session_factory(engine: AsyncEngine) -> async_sessionmaker[AsyncSession]:
+    """Фабрика сессий с теми же параметрами, что и в приложении"""
+    return async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+
+async def create_schema(engine: AsyncEngine) -> None:
+    """Создать таблицы в БД бенчмарка"""
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+
+async def seed_appointments(
+    session_factory: async_sessionmaker[AsyncSession],
+    patients: int,
+    appointments_per_patient: int,
+    seed: int = 42
+) -> list[int]:
+    """Заполнить БД пациентами и приёмами, вернуть ID приёмов"""
+    rnd = random.Random(seed)
+    start = date(2025, 1, 1)
+    async with session_factory() as session:
+        for i in range(patients):
+            patient = Patient(
+                first_name=rnd.choice(FIRST_NAMES),
+                last_name=rnd.choice(LAST_NAMES),
+                middle_name=rnd.choice(MIDDLE_NAMES),
+                date_of_birth=date(1950 + i % 50, 1 + i % 12, 1 + i % 28),
+                gender=GenderEnum.MALE if i % 2 else GenderEnum.FEMALE,
+                medical_organization="ГБУЗ Поликлиника №1",
+                medical_area=f"Терапевтический {i % 10}",
+            )
+            for j in range(appointments_per_patient):
+                minutes = rnd.randrange(8 * 60, 18 * 60, 20)
+                patient.appointments.append(Appointment(
+                    appointment_date=start + timedelta(days=rnd.randrange(365)),
+                    appointment_time_start=f"{minutes // 60:02d}:{minutes % 60:02d}",
+                    appointment_time_end=f"{(minutes + 20) // 60:02d}:{(minutes + 20) % 60:02d}",
+                    status=AppointmentStatus.SCHEDULED,
+                ))
+            session.add(patient)
+        await session.commit()
+
+        from sqlalchemy import select
+        result = await session.execute(select(Appointment.id))
+        return list(result.scalars().all())
+
+
+def percentile(values: Iterable[float], pct: float) -> float:
+    """Перцентиль выборки (в тех же единицах, что и значения)"""
+    data = sorted(values)
+    if not data:
+        return 0.0
+    index = min(len(data) - 1, int(round(pct / 100 * (len(data) - 1))))
+    return data[index]
+
+
+def summarize_ms(latencies: list[float]) -> str:
+    """Краткая сводка задержек в миллисекундах"""
+    if not latencies:
+        return "n/a"
+    return (
+        f"p50={percentile(latencies, 50) * 1000:.1f}ms "
+        f"p95={percentile(latencies, 95) * 1000:.1f}ms "
+        f"p99={percentile(latencies, 99) * 1000:.1f}ms "
+        f"mean={statistics.mean(latencies) * 1000:.1f}ms"
+    )
+
+
+class Timer:
+    """Контекстный менеджер для замера времени"""
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.start
+        return False
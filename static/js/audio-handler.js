@@ -12,13 +12,23 @@ const AudioHandler = {
     
     /**
      * Инициализация
+     * 
+     * preloaded - данные из /api/appointments/{id}/workspace
+     * ({audio, mockDuration}); без них аудио и настройки загружаются отдельно
      */
-    init(appointmentId) {
+    init(appointmentId, preloaded = null) {
         this.appointmentId = appointmentId;
         this.isRecording = false;
         this.recordingStartTime = null;
         this._settingsLoaded = false;
         
+        if (preloaded) {
+            this.mockDuration = preloaded.mockDuration || 5;
+            this._settingsLoaded = true;
+            this.showAudioData(preloaded.audio);
+            return;
+        }
+        
         // Загружаем настройки времени имитации
         this.loadMockSettings().then(() => {
             this._settingsLoaded = true;
@@ -54,19 +64,8 @@ const AudioHandler = {
     async loadFromDatabase() {
         try {
             const audioResponse = await fetch(`/api/audio/by-appointment/${this.appointmentId}`);
-            
-            if (audioResponse.ok) {
-                const audioData = await audioResponse.json();
-                
-                // Если есть транскрипция - показываем её
-                if (audioData.transcription_text && audioData.transcription_status === 'completed') {
-                    this.displayTranscriptionResult(audioData.transcription_text, audioData.id);
-                    return;
-                }
-            }
-            
-            // Если транскрипции нет - показываем кнопку записи
-            this.renderRecordingUI();
+            const audioData = audioResponse.ok ? await audioResponse.json() : null;
+            this.showAudioData(audioData);
             
         } catch (error) {
             console.error('AudioHandler: ошибка загрузки из БД:', error);
@@ -74,6 +73,20 @@ const AudioHandler = {
         }
     },
     
+    /**
+     * Показать сохранённую транскрипцию или UI записи
+     */
+    showAudioData(audioData) {
+        // Если есть транскрипция - показываем её
+        if (audioData && audioData.transcription_text && audioData.transcription_status === 'completed') {
+            this.displayTranscriptionResult(audioData.transcription_text, audioData.id);
+            return;
+        }
+        
+        // Если транскрипции нет - показываем кнопку записи
+        this.renderRecordingUI();
+    },
+    
     /**
      * Отрендерить UI записи
      */
@@ -391,6 +404,16 @@ const AudioHandler = {
                     <span class="badge badge-cyan">Распознано</span>
                 </div>
                 
+                <!-- Плеер записи: волновая форма по пикам, запись загружается только при воспроизведении -->
+                <div id="audio-player" class="hidden mb-4">
+                    <div class="flex items-center justify-between text-sm text-gray-500 mb-2">
+                        <span>Запись приёма</span>
+                        <span id="audio-duration" class="font-mono"></span>
+                    </div>
+                    <canvas id="waveform-canvas" class="w-full h-16 cursor-pointer"></canvas>
+                    <audio id="audio-element" class="w-full mt-2" controls preload="none"></audio>
+                </div>
+                
                 <!-- Редактируемая транскрипция -->
                 <div class="mb-4">
                     <textarea 
@@ -447,6 +470,91 @@ const AudioHandler = {
                 await this.extractAnamnesis();
             }
         });
+        
+        this.renderPlayer(audioId);
+    },
+    
+    /**
+     * Показать плеер записи
+     * 
+     * Длительность и волновая форма берутся из /api/audio/{id}/peaks
+     * (около килобайта); саму запись браузер загружает только при воспроизведении
+     */
+    async renderPlayer(audioId) {
+        if (!audioId) {
+            return;
+        }
+        
+        let waveform;
+        try {
+            const response = await fetch(`/api/audio/${audioId}/peaks`);
+            if (!response.ok) {
+                return;
+            }
+            waveform = await response.json();
+        } catch (error) {
+            console.warn('AudioHandler: волновая форма недоступна:', error);
+            return;
+        }
+        
+        const audio = document.getElementById('audio-element');
+        const canvas = document.getElementById('waveform-canvas');
+        if (!audio || !canvas) {
+            return;
+        }
+        // Ссылка с версией кэшируется браузером надолго: после удаления
+        // записи и новой загрузки под тем же id версия будет другой
+        const version = waveform.version ? `?v=${waveform.version}` : '';
+        audio.src = `/api/audio/${audioId}/download${version}`;
+        $('#audio-duration').text(this.formatDuration(waveform.duration));
+        $('#audio-player').removeClass('hidden');
+        
+        const draw = () => {
+            const progress = waveform.duration ? audio.currentTime / waveform.duration : 0;
+            this.drawWaveform(canvas, waveform.peaks, progress);
+        };
+        draw();
+        audio.addEventListener('timeupdate', draw);
+        
+        // Перемотка кликом по волновой форме
+        canvas.addEventListener('click', (event) => {
+            if (!waveform.duration) {
+                return;
+            }
+            const rect = canvas.getBoundingClientRect();
+            audio.currentTime = (event.clientX - rect.left) / rect.width * waveform.duration;
+            audio.play();
+        });
+    },
+    
+    /**
+     * Нарисовать волновую форму; прослушанная часть выделяется цветом
+     */
+    drawWaveform(canvas, peaks, progress) {
+        const ratio = window.devicePixelRatio || 1;
+        const width = canvas.width = canvas.clientWidth * ratio;
+        const height = canvas.height = canvas.clientHeight * ratio;
+        const context = canvas.getContext('2d');
+        const barWidth = width / peaks.length;
+        
+        context.clearRect(0, 0, width, height);
+        peaks.forEach((peak, index) => {
+            const barHeight = Math.max(ratio, peak / 255 * height);
+            context.fillStyle = index / peaks.length < progress ? '#8b5cf6' : '#d1d5db';
+            context.fillRect(index * barWidth, (height - barHeight) / 2, Math.max(1, barWidth), barHeight);
+        });
+    },
+    
+    /**
+     * Длительность в формате ММ:СС
+     */
+    formatDuration(seconds) {
+        if (!seconds) {
+            return '';
+        }
+        const total = Math.round(seconds);
+        const minutes = String(Math.floor(total / 60)).padStart(2, '0');
+        return `${minutes}:${String(total % 60).padStart(2, '0')}`;
     },
     
     /**
@@ -567,16 +675,24 @@ const AudioHandler = {
         `);
         
         try {
-            const response = await fetch(`/api/audio/extract-anamnesis-by-appointment?appointment_id=${this.appointmentId}`, {
-                method: 'POST'
-            });
-            
-            if (!response.ok) {
-                const error = await response.json();
-                throw new Error(error.detail || 'Ошибка извлечения анамнеза');
-            }
-            
-            const report = await response.json();
+            // Поля приходят по мере ответа модели и сразу попадают в форму анамнеза
+            const fieldTitles = { purpose: 'цель обращения', complaints: 'жалобы', anamnesis: 'анамнез' };
+            const received = [];
+            PatientCard.reportData = { ...(PatientCard.reportData || {}) };
+            const report = await EventStream.post(
+                `/api/audio/extract-anamnesis-by-appointment?appointment_id=${this.appointmentId}`,
+                {
+                    field: ({ name, value }) => {
+                        PatientCard.reportData[name] = value;
+                        $(`#${name}-field`).val(value || '');
+                        received.push(fieldTitles[name] || name);
+                        btn.html(`
+                            <div class="spinner mr-2"></div>
+                            <span>Получено: ${received.join(', ')}...</span>
+                        `);
+                    }
+                }
+            );
             
             // Обновляем данные отчёта в PatientCard
             PatientCard.reportData = report;
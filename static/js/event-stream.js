@@ -0,0 +1,83 @@
+/**
+ * Запросы с ответом по частям (Server-Sent Events, text/event-stream)
+ *
+ * EventSource не умеет POST, поэтому поток читается через fetch.
+ * Сервер присылает события с данными в JSON; done - итог запроса,
+ * error - {detail}. Если сервер ответил обычным JSON (старая версия
+ * или прокси), он и возвращается как итог.
+ *
+ * Пример:
+ *   const report = await EventStream.post(url, {
+ *       field: (data) => fillField(data.name, data.value)
+ *   });
+ */
+
+const EventStream = {
+    /**
+     * Отправить POST и вызывать handlers[событие](данные) по мере прихода;
+     * возвращает данные события done
+     */
+    async post(url, handlers = {}) {
+        const response = await fetch(url, {
+            method: 'POST',
+            headers: { Accept: 'text/event-stream' }
+        });
+
+        if (!response.ok) {
+            const error = await response.json().catch(() => ({}));
+            throw new Error(error.detail || `Ошибка запроса: ${response.status}`);
+        }
+        if (!(response.headers.get('content-type') || '').startsWith('text/event-stream')) {
+            return response.json();
+        }
+
+        const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+        let buffer = '';
+        let result;
+        for (;;) {
+            const { value, done } = await reader.read();
+            if (done) {
+                break;
+            }
+            buffer += value.replace(/\r\n/g, '\n');
+            let end;
+            while ((end = buffer.indexOf('\n\n')) !== -1) {
+                const message = this.parse(buffer.slice(0, end));
+                buffer = buffer.slice(end + 2);
+                if (!message) {
+                    continue;
+                }
+                if (message.event === 'error') {
+                    reader.cancel();
+                    throw new Error(message.data.detail || 'Ошибка на сервере');
+                }
+                if (message.event === 'done') {
+                    result = message.data;
+                } else if (handlers[message.event]) {
+                    handlers[message.event](message.data);
+                }
+            }
+        }
+
+        if (result === undefined) {
+            throw new Error('Соединение с сервером прервано');
+        }
+        return result;
+    },
+
+    /**
+     * Разобрать одно событие: строки "event: ..." и "data: ..."
+     */
+    parse(block) {
+        let event = 'message';
+        const data = [];
+        for (const line of block.split('\n')) {
+            if (line.startsWith('event:')) {
+                event = line.slice(6).trim();
+            } else if (line.startsWith('data:')) {
+                data.push(line.slice(5).replace(/^ /, ''));
+            }
+        }
+        return data.length ? { event, data: JSON.parse(data.join('\n')) } : null;
+    }
+};
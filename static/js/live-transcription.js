@@ -0,0 +1,130 @@
+/**
+ * Распознавание речи во время записи приёма (WebSocket /api/audio/live)
+ *
+ * Части записи MediaRecorder отправляются на сервер по мере появления,
+ * фрагменты стенограммы приходят обратно по ходу приёма: partial -
+ * предварительный текст текущей реплики, final - окончательный. После
+ * stop() сервер распознаёт остаток, сохраняет запись и стенограмму и
+ * возвращает {audio_id, transcription_text}. Если запись сохранить не
+ * удалось, stop() отклоняется ошибкой с полем transcriptionText.
+ *
+ * Пример:
+ *   const live = await LiveTranscription.start(appointmentId, {
+ *       onPartial: (segment) => showDraft(segment.text),
+ *       onFinal: (segment) => appendLine(`${segment.timestamp} - ${segment.text}`)
+ *   });
+ *   // ... приём ...
+ *   const result = await live.stop();
+ */
+
+const LiveTranscription = {
+    CHUNK_INTERVAL_MS: 1000,
+
+    /**
+     * Поддерживает ли браузер запись с отправкой по частям
+     */
+    isSupported() {
+        return Boolean(window.MediaRecorder && navigator.mediaDevices && window.WebSocket);
+    },
+
+    /**
+     * Формат записи, который умеют и браузер, и сервер
+     */
+    pickFormat() {
+        if (MediaRecorder.isTypeSupported('audio/webm;codecs=opus')) {
+            return { mimeType: 'audio/webm;codecs=opus', format: 'webm' };
+        }
+        return { mimeType: 'audio/ogg;codecs=opus', format: 'ogg' };
+    },
+
+    /**
+     * Начать запись с микрофона и распознавание
+     */
+    async start(appointmentId, handlers = {}) {
+        const stream = await navigator.mediaDevices.getUserMedia({ audio: true });
+        const { mimeType, format } = this.pickFormat();
+        const protocol = location.protocol === 'https:' ? 'wss:' : 'ws:';
+        const socket = new WebSocket(
+            `${protocol}//${location.host}/api/audio/live?appointment_id=${appointmentId}&format=${format}`
+        );
+        socket.binaryType = 'arraybuffer';
+
+        const live = Object.create(this.session);
+        live.stream = stream;
+        live.socket = socket;
+        live.handlers = handlers;
+        live.recorder = new MediaRecorder(stream, { mimeType });
+        live.done = new Promise((resolve, reject) => {
+            live.resolveDone = resolve;
+            live.rejectDone = reject;
+        });
+
+        socket.onmessage = (event) => live.handleMessage(JSON.parse(event.data));
+        socket.onclose = (event) => {
+            live.release();
+            live.rejectDone(new Error(event.reason || 'Соединение с сервером распознавания прервано'));
+        };
+
+        await new Promise((resolve, reject) => {
+            socket.onopen = resolve;
+            socket.onerror = () => reject(new Error('Не удалось подключиться к серверу распознавания'));
+        });
+
+        live.recorder.ondataavailable = (event) => {
+            if (event.data.size > 0 && socket.readyState === WebSocket.OPEN) {
+                socket.send(event.data);
+            }
+        };
+        live.recorder.start(this.CHUNK_INTERVAL_MS);
+        return live;
+    },
+
+    /**
+     * Методы сессии записи
+     */
+    session: {
+        handleMessage(message) {
+            if (message.type === 'partial' && this.handlers.onPartial) {
+                this.handlers.onPartial(message);
+            } else if (message.type === 'final' && this.handlers.onFinal) {
+                this.handlers.onFinal(message);
+            } else if (message.type === 'done') {
+                this.resolveDone(message);
+            } else if (message.type === 'error') {
+                // Запись не сохранена, но стенограмма могла успеть распознаться
+                const error = new Error(message.detail);
+                error.transcriptionText = message.transcription_text;
+                this.rejectDone(error);
+            }
+        },
+
+        /**
+         * Закончить запись; возвращает {audio_id, transcription_text}
+         */
+        async stop() {
+            await new Promise((resolve) => {
+                this.recorder.onstop = resolve;
+                this.recorder.stop();
+            });
+            // Последняя часть записи отправлена в ondataavailable до onstop
+            this.socket.send(JSON.stringify({ type: 'stop' }));
+            this.release();
+            return this.done;
+        },
+
+        /**
+         * Отменить запись (сервер ничего не сохраняет)
+         */
+        cancel() {
+            if (this.recorder.state !== 'inactive') {
+                this.recorder.stop();
+            }
+            this.socket.close();
+            this.release();
+        },
+
+        release() {
+            this.stream.getTracks().forEach((track) => track.stop());
+        }
+    }
+};
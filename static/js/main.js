@@ -195,6 +195,26 @@ const Utils = {
         }
         
         return age;
+    },
+    
+    /**
+     * Дождаться завершения фоновой задачи (ответ 202 с job_id)
+     */
+    async waitForJob(jobId, interval = 1000) {
+        while (true) {
+            const response = await fetch(`/api/jobs/${jobId}`);
+            if (!response.ok) {
+                throw new Error(`Ошибка получения статуса задачи: ${response.status}`);
+            }
+            const job = await response.json();
+            if (job.status === 'completed') {
+                return job;
+            }
+            if (job.status === 'failed') {
+                throw new Error(job.last_error || 'Задача завершилась ошибкой');
+            }
+            await new Promise(resolve => setTimeout(resolve, interval));
+        }
     }
 };
 
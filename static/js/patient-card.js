@@ -7,6 +7,7 @@ const PatientCard = {
     appointmentData: null,
     patientData: null,
     reportData: null,
+    audioPreload: null,
     
     /**
      * Инициализация
@@ -23,29 +24,21 @@ const PatientCard = {
         container.html(Utils.showLoader('Загрузка данных пациента...'));
         
         try {
-            // Загружаем данные приёма
-            const appointmentResponse = await fetch(`/api/appointments/${appointmentId}`);
-            if (!appointmentResponse.ok) {
+            // Приём, цифровой портрет, отчёт, аудио и настройки - одним запросом
+            const response = await fetch(`/api/appointments/${appointmentId}/workspace`);
+            if (!response.ok) {
                 throw new Error('Ошибка загрузки приёма');
             }
-            this.appointmentData = await appointmentResponse.json();
-            
-            // Загружаем цифровой портрет пациента
-            const patientResponse = await fetch(`/api/patients/${this.appointmentData.patient.id}/digital-portrait`);
-            if (!patientResponse.ok) {
-                throw new Error('Ошибка загрузки пациента');
-            }
-            this.patientData = await patientResponse.json();
+            const workspace = await response.json();
             
-            // Пытаемся загрузить отчёт (может не существовать)
-            try {
-                const reportResponse = await fetch(`/api/appointments/${appointmentId}/report`);
-                if (reportResponse.ok) {
-                    this.reportData = await reportResponse.json();
-                }
-            } catch (e) {
-                this.reportData = null;
-            }
+            this.appointmentData = workspace.appointment;
+            this.patientData = workspace.patient;
+            this.reportData = workspace.report;
+            // Передаётся в AudioHandler при первом открытии стенограммы
+            this.audioPreload = {
+                audio: workspace.audio,
+                mockDuration: workspace.mock_settings.duration
+            };
             
             this.render();
             
@@ -174,7 +167,9 @@ const PatientCard = {
                 break;
             case 'stenogram':
                 content.html(this.renderStenogram());
-                AudioHandler.init(this.appointmentData.id);
+                AudioHandler.init(this.appointmentData.id, this.audioPreload);
+                // Далее аудио могло измениться - загружаем заново
+                this.audioPreload = null;
                 break;
         }
     },
@@ -460,8 +455,10 @@ const PatientCard = {
                     throw new Error('Ошибка отправки в МИС');
                 }
                 
+                // Отправка выполняется фоновой задачей
                 const result = await response.json();
-                Utils.showToast(result.message, 'success');
+                await Utils.waitForJob(result.job_id);
+                Utils.showToast('Отчёт успешно передан в МИС', 'success');
                 
                 // Перезагружаем отчёт
                 const reportResponse = await fetch(`/api/appointments/${self.appointmentData.id}/report`);
@@ -0,0 +1,167 @@
+/**
+ * Возобновляемая загрузка записи приёма (/api/audio/uploads, протокол tus 1.0)
+ *
+ * Части записи (например, из MediaRecorder.ondataavailable) отправляются
+ * по мере появления. При обрыве соединения загрузка продолжается со
+ * смещения, которое вернёт сервер, а не с нуля. Запись AudioFile
+ * создаётся только вызовом finish().
+ *
+ * Пример:
+ *   const upload = await ResumableUpload.create(appointmentId, 'visit.webm', 'audio/webm');
+ *   recorder.ondataavailable = (e) => upload.append(e.data);
+ *   recorder.onstop = async () => { const audio = await upload.finish(); };
+ */
+
+const ResumableUpload = {
+    RETRY_DELAYS: [1000, 3000, 5000, 10000, 20000],
+
+    /**
+     * Создать сессию загрузки; размер станет известен в finish()
+     */
+    async create(appointmentId, filename, mimeType) {
+        const response = await fetch(`/api/audio/uploads?appointment_id=${appointmentId}`, {
+            method: 'POST',
+            headers: {
+                'Tus-Resumable': '1.0.0',
+                'Upload-Defer-Length': '1',
+                'Upload-Metadata': `filename ${this.encode(filename)},filetype ${this.encode(mimeType)}`
+            }
+        });
+        if (!response.ok) {
+            const error = await response.json().catch(() => ({}));
+            throw new Error(error.detail || `Ошибка создания загрузки: ${response.status}`);
+        }
+
+        const upload = Object.create(this.session);
+        upload.url = response.headers.get('Location');
+        upload.offset = 0;   // Принято сервером
+        upload.sent = 0;     // Размер частей, полностью подтверждённых сервером
+        upload.size = 0;     // Размер всех добавленных частей
+        upload.pending = [];
+        upload.queue = Promise.resolve();
+        return upload;
+    },
+
+    /**
+     * base64 для Upload-Metadata (с поддержкой кириллицы)
+     */
+    encode(value) {
+        return btoa(unescape(encodeURIComponent(value)));
+    },
+
+    /**
+     * Методы сессии загрузки
+     */
+    session: {
+        /**
+         * Добавить часть записи; части отправляются строго по порядку
+         */
+        append(blob) {
+            this.pending.push(blob);
+            this.size += blob.size;
+            this.queue = this.queue.then(() => this.flush());
+            return this.queue;
+        },
+
+        /**
+         * Дождаться отправки всех частей, передать размер и зафиксировать загрузку
+         */
+        async finish() {
+            await this.queue;
+            await this.flush(true);
+
+            const response = await fetch(`${this.url}/commit`, { method: 'POST' });
+            if (!response.ok) {
+                const error = await response.json().catch(() => ({}));
+                throw new Error(error.detail || `Ошибка завершения загрузки: ${response.status}`);
+            }
+            return response.json();
+        },
+
+        /**
+         * Прервать загрузку
+         */
+        async abort() {
+            await fetch(this.url, { method: 'DELETE', headers: { 'Tus-Resumable': '1.0.0' } });
+        },
+
+        /**
+         * Отправить неотправленные данные с повторами при обрыве соединения
+         */
+        async flush(final = false) {
+            // Части, добавленные во время отправки, уйдут следующим вызовом
+            const parts = this.pending.splice(0);
+            const blob = new Blob(parts);
+            const sent = this.sent;
+
+            for (let attempt = 0; ; attempt++) {
+                // Сервер мог принять часть данных до обрыва
+                const data = blob.slice(this.offset - sent);
+                if (data.size === 0 && !final) {
+                    break;
+                }
+                const headers = {
+                    'Tus-Resumable': '1.0.0',
+                    'Content-Type': 'application/offset+octet-stream',
+                    'Upload-Offset': String(this.offset)
+                };
+                if (final) {
+                    headers['Upload-Length'] = String(this.size);
+                }
+
+                let response = null;
+                try {
+                    response = await fetch(this.url, { method: 'PATCH', headers, body: data });
+                } catch (error) {
+                    if (!(error instanceof TypeError)) {
+                        throw error;
+                    }
+                }
+
+                if (response && (response.status === 204 || response.status === 409)) {
+                    // 409 - сервер принял другое число байт: продолжаем с его смещения
+                    this.offset = Number(response.headers.get('Upload-Offset'));
+                    if (response.status === 204) {
+                        break;
+                    }
+                    continue;
+                }
+                if (response && response.status < 500 && response.status !== 423) {
+                    this.pending.unshift(...parts);
+                    const error = await response.json().catch(() => ({}));
+                    throw new Error(error.detail || `Ошибка загрузки: ${response.status}`);
+                }
+                if (attempt >= ResumableUpload.RETRY_DELAYS.length) {
+                    this.pending.unshift(...parts);
+                    throw new Error('Не удалось отправить запись: сервер недоступен');
+                }
+
+                await this.sleep(ResumableUpload.RETRY_DELAYS[attempt]);
+                if (!response) {
+                    // Сетевая ошибка: узнаём, сколько сервер успел принять
+                    await this.refreshOffset();
+                }
+            }
+
+            this.sent += blob.size;
+        },
+
+        /**
+         * Текущее смещение на сервере
+         */
+        async refreshOffset() {
+            try {
+                const response = await fetch(this.url, { method: 'HEAD', headers: { 'Tus-Resumable': '1.0.0' } });
+                if (response.ok) {
+                    this.offset = Number(response.headers.get('Upload-Offset'));
+                }
+            } catch (error) {
+                console.warn('ResumableUpload: сервер недоступен, повтор позже');
+            }
+        },
+
+        sleep(ms) {
+            return new Promise(resolve => setTimeout(resolve, ms));
+        }
+    }
+};
@@ -1,14 +1,20 @@
 """Конфигурация pytest и фикстуры"""
 import pytest
 import asyncio
+import io
+import math
 import os
+import struct
+import wave
 from pathlib import Path
 from typing import AsyncGenerator
 from httpx import AsyncClient
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 
 from app.main import app
-from app.database import Base, get_db
+from app.config import settings
+from app.database import Base, get_db, get_session_factory, configure_sqlite_engine
+from app.jobs import JobWorkerPool
 from app.models import Patient, Appointment, GenderEnum, AppointmentStatus, MedicalReport, AudioFile
 from datetime import date
 
@@ -23,6 +29,8 @@ test_engine = create_async_engine(
     echo=False,
     future=True
 )
+# Тесты работают с тем же профилем хранения SQLite, что и приложение
+configure_sqlite_engine(test_engine)
 
 test_async_session = async_sessionmaker(
     test_engine,
@@ -31,6 +39,33 @@ test_async_session = async_sessionmaker(
 )
 
 
+def tone_pcm(
+    pattern: list[tuple[float, bool]],
+    rate: int = 16000,
+    frequency: float = 300,
+    amplitude: int = 8000,
+    channels: int = 1
+) -> bytes:
+    """PCM 16 бит из участков тона и тишины: [(секунды, тон?)]"""
+    samples = []
+    for seconds, tone in pattern:
+        for n in range(int(seconds * rate)):
+            sample = int(amplitude * math.sin(2 * math.pi * frequency * n / rate)) if tone else 0
+            samples.extend([sample] * channels)
+    return struct.pack(f"<{len(samples)}h", *samples)
+
+
+def wav_bytes(pcm: bytes, rate: int = 16000, channels: int = 1) -> bytes:
+    """WAV-файл с данными PCM 16 бит"""
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(channels)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(pcm)
+    return buffer.getvalue()
+
+
 @pytest.fixture(scope="session")
 def event_loop():
     """Создать event loop для всех тестов"""
@@ -105,6 +140,7 @@ async def db_session() -> AsyncGenerator[AsyncSession, None]:
 async def client(db_session: AsyncSession) -> AsyncGenerator[AsyncClient, None]:
     """Фикстура для HTTP клиента"""
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_session_factory] = lambda: test_async_session
     
     async with AsyncClient(app=app, base_url="http://test") as ac:
         yield ac
@@ -156,6 +192,22 @@ def temp_upload_dir(tmp_path):
     return upload_dir
 
 
+@pytest.fixture(scope="function")
+def run_jobs(monkeypatch):
+    """Выполнить задачи из очереди, как это сделал бы воркер (без имитации задержек)"""
+    monkeypatch.setattr(settings, "transcription_mock_delay", 0)
+    monkeypatch.setattr(settings, "mis_submit_delay", 0)
+    pool = JobWorkerPool(session_factory=test_async_session)
+    
+    async def run() -> int:
+        executed = 0
+        while await pool.run_once("test-worker"):
+            executed += 1
+        return executed
+    
+    return run
+
+
 @pytest.fixture(scope="function", autouse=False)
 async def clean_db(db_session: AsyncSession):
     """Очистка БД перед тестом - удаляет все данные из таблиц
@@ -4,7 +4,7 @@ from httpx import AsyncClient
 from sqlalchemy.ext.asyncio import AsyncSession
 from io import BytesIO
 
-from app.models import Patient, Appointment, MedicalReport, AudioFile
+from app.models import Patient, Appointment, MedicalReport, AudioFile, ChronicDisease
 
 
 @pytest.mark.api
@@ -98,6 +98,43 @@ class TestAppointmentsAPI:
         response = await client.get("/api/appointments/999")
         assert response.status_code == 404
     
+    async def test_get_workspace(self, client: AsyncClient, sample_appointment: Appointment, db_session: AsyncSession):
+        """Тест получения данных карточки пациента одним запросом"""
+        db_session.add(ChronicDisease(patient_id=sample_appointment.patient_id, name="Гипертония"))
+        db_session.add(MedicalReport(appointment_id=sample_appointment.id, complaints="Головная боль"))
+        db_session.add(AudioFile(
+            appointment_id=sample_appointment.id,
+            filename="test.mp3",
+            filepath="/tmp/test.mp3",
+            file_size=5000,
+            mime_type="audio/mpeg"
+        ))
+        await db_session.commit()
+        
+        response = await client.get(f"/api/appointments/{sample_appointment.id}/workspace")
+        assert response.status_code == 200
+        data = response.json()
+        assert data["appointment"]["id"] == sample_appointment.id
+        assert data["patient"]["id"] == sample_appointment.patient_id
+        assert [d["name"] for d in data["patient"]["chronic_diseases"]] == ["Гипертония"]
+        assert data["report"]["complaints"] == "Головная боль"
+        assert data["audio"]["filename"] == "test.mp3"
+        assert data["mock_settings"]["duration"] >= 1
+    
+    async def test_get_workspace_without_report(self, client: AsyncClient, sample_appointment: Appointment):
+        """Тест карточки без отчёта и аудио"""
+        response = await client.get(f"/api/appointments/{sample_appointment.id}/workspace")
+        assert response.status_code == 200
+        data = response.json()
+        assert data["report"] is None
+        assert data["audio"] is None
+        assert data["patient"]["full_name"] == "Иванов Иван Петрович"
+    
+    async def test_get_workspace_not_found(self, client: AsyncClient):
+        """Тест карточки несуществующего приёма"""
+        response = await client.get("/api/appointments/999/workspace")
+        assert response.status_code == 404
+    
     async def test_create_medical_report(self, client: AsyncClient, sample_appointment: Appointment):
         """Тест создания медицинского отчёта"""
         report_data = {
@@ -165,8 +202,10 @@ class TestAppointmentsAPI:
         response = await client.get(f"/api/appointments/{sample_appointment.id}/report")
         assert response.status_code == 404
     
-    async def test_submit_to_mis(self, client: AsyncClient, sample_appointment: Appointment, db_session: AsyncSession):
-        """Тест отправки отчёта в МИС"""
+    async def test_submit_to_mis(
+        self, client: AsyncClient, sample_appointment: Appointment, db_session: AsyncSession, run_jobs
+    ):
+        """Тест отправки отчёта в МИС через фоновую задачу"""
         # Создаём отчёт
         report = MedicalReport(
             appointment_id=sample_appointment.id,
@@ -178,11 +217,25 @@ class TestAppointmentsAPI:
         await db_session.commit()
         
         response = await client.post(f"/api/appointments/{sample_appointment.id}/submit-to-mis")
-        assert response.status_code == 200
+        assert response.status_code == 202
         data = response.json()
         assert data["success"] == True
-        assert "Отчёт успешно передан в МИС" in data["message"]
-        assert "submitted_at" in data
+        assert "МИС" in data["message"]
+        
+        # Повторная отправка до выполнения возвращает ту же задачу
+        response = await client.post(f"/api/appointments/{sample_appointment.id}/submit-to-mis")
+        assert response.json()["job_id"] == data["job_id"]
+        
+        await run_jobs()
+        
+        response = await client.get(f"/api/jobs/{data['job_id']}")
+        assert response.json()["status"] == "completed"
+        assert "submitted_at" in response.json()["result"]
+        # Отчёт изменён воркером в другой сессии
+        appointment_id = sample_appointment.id
+        db_session.expire_all()
+        response = await client.get(f"/api/appointments/{appointment_id}/report")
+        assert response.json()["submitted_to_mis"] == True
     
     async def test_submit_to_mis_no_report(self, client: AsyncClient, sample_appointment: Appointment):
         """Тест отправки в МИС без отчёта"""
@@ -275,8 +328,10 @@ class TestAudioAPI:
         response = await client.get("/api/audio/999")
         assert response.status_code == 404
     
-    async def test_transcribe_audio(self, client: AsyncClient, sample_appointment: Appointment, db_session: AsyncSession):
-        """Тест транскрибации аудиофайла"""
+    async def test_transcribe_audio(
+        self, client: AsyncClient, sample_appointment: Appointment, db_session: AsyncSession, run_jobs
+    ):
+        """Тест транскрибации аудиофайла: 202 с задачей, результат - после выполнения воркером"""
         audio = AudioFile(
             appointment_id=sample_appointment.id,
             filename="test.mp3",
@@ -289,10 +344,23 @@ class TestAudioAPI:
         await db_session.refresh(audio)
         
         response = await client.post(f"/api/audio/{audio.id}/transcribe")
-        assert response.status_code == 200
+        assert response.status_code == 202
         data = response.json()
         assert data["success"] == True
-        assert "Транскрибация завершена" in data["message"]
+        assert data["status"] == "queued"
+        assert response.headers["location"] == f"/api/jobs/{data['job_id']}"
+        
+        response = await client.get(f"/api/audio/{audio.id}")
+        assert response.json()["transcription_status"] == "processing"
+        
+        await run_jobs()
+        
+        response = await client.get(f"/api/jobs/{data['job_id']}")
+        assert response.json()["status"] == "completed"
+        audio_id = audio.id
+        db_session.expire_all()
+        response = await client.get(f"/api/audio/{audio_id}")
+        data = response.json()
         assert data["transcription_status"] == "completed"
         assert data["transcription_text"] is not None
         assert len(data["transcription_text"]) > 0
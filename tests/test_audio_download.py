@@ -0,0 +1,122 @@
+"""Тесты отдачи аудиофайла: Range, условные запросы, X-Accel-Redirect"""
+import hashlib
+import os
+from io import BytesIO
+
+import pytest
+from httpx import AsyncClient
+
+from app.config import settings
+from app.file_responses import RangeNotSatisfiableError, parse_range_header
+from app.models import Appointment
+
+CONTENT = os.urandom(300_000)
+SHA256 = hashlib.sha256(CONTENT).hexdigest()
+
+
+class TestParseRange:
+    """Тесты разбора заголовка Range"""
+
+    @pytest.mark.parametrize("header, expected", [
+        ("bytes=0-99", (0, 99)),
+        ("bytes=100-", (100, 999)),
+        ("bytes=-10", (990, 999)),
+        ("bytes=-5000", (0, 999)),
+        ("bytes=900-5000", (900, 999)),
+        ("bytes=0-1,5-6", None),
+        ("items=0-1", None),
+        ("bytes=5-1", None),
+        ("bytes=abc", None),
+    ])
+    def test_parse(self, header, expected):
+        assert parse_range_header(header, 1000) == expected
+
+    def test_not_satisfiable(self):
+        with pytest.raises(RangeNotSatisfiableError):
+            parse_range_header("bytes=1000-", 1000)
+
+
+@pytest.mark.api
+class TestAudioDownload:
+    """Тесты эндпоинта скачивания аудио"""
+
+    @pytest.fixture
+    async def audio_url(self, client: AsyncClient, sample_appointment: Appointment, tmp_path, monkeypatch) -> str:
+        monkeypatch.setattr(settings, "upload_dir", str(tmp_path))
+        response = await client.post(
+            f"/api/audio/upload?appointment_id={sample_appointment.id}",
+            files={"file": ("visit.mp3", BytesIO(CONTENT), "audio/mpeg")}
+        )
+        assert response.status_code == 200
+        return f"/api/audio/{response.json()['id']}/download?v={SHA256}"
+
+    async def test_full_file(self, client: AsyncClient, audio_url: str):
+        """Файл целиком с ETag по SHA-256 и долгим кэшированием по ссылке с версией"""
+        response = await client.get(audio_url)
+
+        assert response.status_code == 200
+        assert response.content == CONTENT
+        assert response.headers["etag"] == f'"{SHA256}"'
+        assert response.headers["accept-ranges"] == "bytes"
+        assert "immutable" in response.headers["cache-control"]
+        assert response.headers["content-type"] == "audio/mpeg"
+
+    async def test_unversioned_revalidated(self, client: AsyncClient, audio_url: str):
+        """
+        Без версии или с чужой версией ответ сверяется по ETag: после удаления
+        записи тот же id достаётся новой загрузке
+        """
+        unversioned = audio_url.split("?")[0]
+        for url in (unversioned, f"{unversioned}?v={'0' * 64}"):
+            response = await client.get(url)
+            assert response.content == CONTENT
+            assert response.headers["cache-control"] == "private, no-cache"
+            assert response.headers["etag"] == f'"{SHA256}"'
+
+    async def test_range(self, client: AsyncClient, audio_url: str):
+        """Перемотка: отдаётся только запрошенный диапазон"""
+        response = await client.get(audio_url, headers={"Range": "bytes=1000-263143"})
+        assert response.status_code == 206
+        assert response.headers["content-range"] == f"bytes 1000-263143/{len(CONTENT)}"
+        assert response.content == CONTENT[1000:263144]
+
+        response = await client.get(audio_url, headers={"Range": "bytes=-100"})
+        assert response.status_code == 206
+        assert response.content == CONTENT[-100:]
+
+    async def test_range_not_satisfiable(self, client: AsyncClient, audio_url: str):
+        """Диапазон за концом файла - 416 с размером файла"""
+        response = await client.get(audio_url, headers={"Range": f"bytes={len(CONTENT)}-"})
+        assert response.status_code == 416
+        assert response.headers["content-range"] == f"bytes */{len(CONTENT)}"
+
+    async def test_if_none_match(self, client: AsyncClient, audio_url: str):
+        """Совпавший ETag - 304 без тела"""
+        response = await client.get(audio_url, headers={"If-None-Match": f'W/"other", "{SHA256}"'})
+        assert response.status_code == 304
+        assert response.content == b""
+        assert response.headers["etag"] == f'"{SHA256}"'
+
+    async def test_if_range(self, client: AsyncClient, audio_url: str):
+        """Диапазон по If-Range отдаётся, только если файл не изменился"""
+        response = await client.get(audio_url, headers={"Range": "bytes=0-9", "If-Range": f'"{SHA256}"'})
+        assert response.status_code == 206
+
+        response = await client.get(audio_url, headers={"Range": "bytes=0-9", "If-Range": '"stale"'})
+        assert response.status_code == 200
+        assert response.content == CONTENT
+
+    async def test_accel_redirect(self, client: AsyncClient, audio_url: str, monkeypatch):
+        """С настроенным nginx приложение отдаёт только заголовки"""
+        monkeypatch.setattr(settings, "audio_accel_redirect", "/protected-audio/")
+
+        response = await client.get(audio_url, headers={"Range": "bytes=0-9"})
+
+        assert response.status_code == 200
+        assert response.headers["x-accel-redirect"] == f"/protected-audio/{SHA256[:2]}/{SHA256[2:4]}/{SHA256}"
+        assert response.content == b""
+
+    async def test_missing_file(self, client: AsyncClient, audio_url: str, tmp_path):
+        """Файл пропал с диска - 404"""
+        os.remove(tmp_path / SHA256[:2] / SHA256[2:4] / SHA256)
+        assert (await client.get(audio_url)).status_code == 404
@@ -0,0 +1,180 @@
+"""Тесты извлечения метаданных и волновой формы записи"""
+import hashlib
+import io
+import math
+import struct
+from array import array
+from pathlib import Path
+
+import pytest
+from httpx import AsyncClient
+
+from app import audio_metadata
+from app.audio_metadata import WAVEFORM_PEAKS, PeakAccumulator, extract_metadata, parse_mp3_frame_header
+from app.config import settings
+from app.models import Appointment
+from tests.conftest import tone_pcm, wav_bytes
+
+RATE = 8000
+
+
+def tone_wav(seconds: float, channels: int = 1) -> bytes:
+    """WAV: полсекунды тишины, затем тон 400 Гц с амплитудой 16000"""
+    pcm = tone_pcm([(0.5, False), (seconds - 0.5, True)], RATE, frequency=400, amplitude=16000, channels=channels)
+    return wav_bytes(pcm, RATE, channels)
+
+
+# MPEG-1 Layer III, 128 кбит/с, 44.1 кГц, моно: кадр 417 байт, 1152 отсчёта
+MP3_HEADER = bytes([0xFF, 0xFB, 0x90, 0xC4])
+MP3_FRAME = MP3_HEADER + bytes(413)
+
+
+def id3_tag(size: int) -> bytes:
+    syncsafe = bytes([(size >> 21) & 0x7F, (size >> 14) & 0x7F, (size >> 7) & 0x7F, size & 0x7F])
+    return b"ID3\x04\x00\x00" + syncsafe + bytes(size)
+
+
+class TestExtractMetadata:
+    """Тесты разбора WAV и MP3"""
+
+    def test_wav(self, tmp_path: Path):
+        """Длительность и формат из заголовка; пики - тишина в начале, тон дальше"""
+        path = tmp_path / "visit.wav"
+        path.write_bytes(tone_wav(2.0, channels=2))
+
+        metadata = extract_metadata(path)
+        assert metadata.duration == pytest.approx(2.0)
+        assert (metadata.sample_rate, metadata.channels, metadata.bitrate) == (RATE, 2, RATE * 2 * 16)
+        peaks = metadata.waveform_peaks
+        assert len(peaks) == WAVEFORM_PEAKS
+        assert max(peaks[:WAVEFORM_PEAKS // 4 - 1]) == 0
+        assert min(peaks[WAVEFORM_PEAKS // 4 + 1:]) >= 120
+
+    def test_wav_extra_chunks_and_streaming_header(self, tmp_path: Path):
+        """Чанки перед data пропускаются; размер 0xFFFFFFFF - данные до конца файла"""
+        data = tone_wav(1.0)
+        fmt_end = data.index(b"data")
+        patched = (
+            data[:fmt_end] + b"LIST" + struct.pack("<I", 5) + b"INFO!\x00"
+            + b"data" + struct.pack("<I", 0xFFFFFFFF) + data[fmt_end + 8:]
+        )
+        path = tmp_path / "stream.wav"
+        path.write_bytes(patched)
+
+        metadata = extract_metadata(path, count=100)
+        assert metadata.duration == pytest.approx(1.0)
+        assert len(metadata.waveform_peaks) == 100
+
+    def test_mp3(self, tmp_path: Path):
+        """Кадры считаются по заголовкам; ID3, VBR-кадр Xing и мусор не входят в длительность"""
+        xing = MP3_HEADER + bytes(32) + b"Xing" + bytes(377)
+        path = tmp_path / "visit.mp3"
+        path.write_bytes(id3_tag(3000) + xing + MP3_FRAME * 50 + b"junk" + MP3_FRAME * 50 + b"TAG" + bytes(125))
+
+        metadata = extract_metadata(path)
+        assert metadata.duration == pytest.approx(100 * 1152 / 44100)
+        assert (metadata.sample_rate, metadata.channels) == (44100, 1)
+        assert metadata.bitrate == pytest.approx(128000, rel=0.01)
+
+    def test_frame_header(self):
+        assert parse_mp3_frame_header(MP3_HEADER) == (417, 1152, 44100, 1)
+        assert parse_mp3_frame_header(b"\xff\xfb\xf0\xc4") is None  # Запрещённый индекс битрейта
+        assert parse_mp3_frame_header(b"RIFF") is None
+
+    def test_unknown_format(self, tmp_path: Path):
+        """Нераспознанный формат - пустые метаданные, без ошибки"""
+        path = tmp_path / "noise.wav"
+        path.write_bytes(b"RIFF" + bytes(100))
+        metadata = extract_metadata(path)
+        assert metadata.duration is None
+        assert metadata.waveform_peaks is None
+
+
+class TestPeakAccumulator:
+    """Тесты пиков по отсчётам, поступающим блоками"""
+
+    def test_blocks_do_not_change_peaks(self):
+        samples = array("h", (int(20000 * math.sin(n / 50)) * (n % 7) // 6 for n in range(123_457)))
+        whole = PeakAccumulator(100)
+        whole.add(samples)
+        for size in (1, 999, 4096):
+            blocks = PeakAccumulator(100)
+            for offset in range(0, len(samples), size):
+                blocks.add(samples[offset:offset + size])
+            assert blocks.peaks() == whole.peaks()
+            assert blocks.samples == len(samples)
+        assert len(whole.peaks()) == 100
+
+    def test_peak_position_and_bounded_memory(self):
+        """Всплеск попадает на своё место (с точностью до участка); участков не больше 2 * count"""
+        accumulator = PeakAccumulator(100)
+        for block in range(100):
+            samples = array("h", bytes(20_000))
+            if block == 75:
+                samples[0] = 32767
+            accumulator.add(samples)
+            assert len(accumulator._peaks) <= 200
+        peaks = accumulator.peaks()
+        assert peaks[75] == 255
+        assert {index for index, peak in enumerate(peaks) if peak} <= {74, 75, 76}
+
+    def test_short_recording(self):
+        accumulator = PeakAccumulator(100)
+        accumulator.add(array("h", [0, 16000, -32767]))
+        assert accumulator.peaks() == bytes([0, 124, 255])
+
+    def test_decoded_format(self, tmp_path: Path, monkeypatch):
+        """Формат без разбора заголовка (WebM) - пики и длительность по декодированным блокам"""
+        def iter_pcm(path: Path):
+            for _ in range(30):
+                yield array("h", [1000] * 16000), 16000
+
+        monkeypatch.setattr(audio_metadata, "iter_pcm", iter_pcm)
+        path = tmp_path / "visit.webm"
+        path.write_bytes(b"\x1aE\xdf\xa3" + bytes(100))
+        metadata = extract_metadata(path, count=50)
+        assert metadata.duration == pytest.approx(30.0)
+        assert metadata.waveform_peaks == bytes([7]) * 50
+
+
+@pytest.mark.api
+class TestAudioPeaksEndpoint:
+    """Тесты /api/audio/{id}/peaks"""
+
+    async def test_upload_extracts_metadata(
+        self, client: AsyncClient, sample_appointment: Appointment, temp_upload_dir, monkeypatch
+    ):
+        """Метаданные и пики сохраняются при загрузке; пики отдаются отдельно от записи"""
+        monkeypatch.setattr(settings, "upload_dir", str(temp_upload_dir))
+        content = tone_wav(3.0)
+        response = await client.post(
+            f"/api/audio/upload?appointment_id={sample_appointment.id}",
+            files={"file": ("visit.wav", io.BytesIO(content), "audio/wav")}
+        )
+        audio_id = response.json()["id"]
+
+        info = (await client.get(f"/api/audio/{audio_id}")).json()
+        assert info["duration"] == pytest.approx(3.0)
+        assert info["sample_rate"] == RATE
+        assert info["channels"] == 1
+
+        response = await client.get(f"/api/audio/{audio_id}/peaks")
+        assert response.status_code == 200
+        # id переиспользуется после удаления записи - кэш сверяется по ETag
+        sha256 = hashlib.sha256(content).hexdigest()
+        assert response.headers["cache-control"] == "private, no-cache"
+        assert response.headers["etag"] == f'"{sha256}"'
+        waveform = response.json()
+        assert waveform["version"] == sha256
+        assert waveform["duration"] == pytest.approx(3.0)
+        assert len(waveform["peaks"]) == WAVEFORM_PEAKS
+        assert len(response.content) < len(content) / 10
+
+        response = await client.get(f"/api/audio/{audio_id}/peaks", headers={"If-None-Match": f'"{sha256}"'})
+        assert response.status_code == 304
+        assert response.content == b""
+        response = await client.get(f"/api/audio/{audio_id}/peaks", headers={"If-None-Match": '"stale"'})
+        assert response.status_code == 200
+
+    async def test_not_found(self, client: AsyncClient):
+        assert (await client.get("/api/audio/999999/peaks")).status_code == 404
@@ -0,0 +1,220 @@
+"""Тесты хранения загруженных аудиофайлов"""
+import hashlib
+import os
+from datetime import date
+from io import BytesIO
+
+import pytest
+from fastapi import FastAPI, Request
+from httpx import ASGITransport, AsyncClient
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import crud
+from app.audio_storage import blob_key, remove_file
+from app.config import settings
+from app.middleware import BodySizeLimitMiddleware
+from app.models import Appointment, AppointmentStatus, Patient
+from app.object_storage import get_storage
+
+
+class TestRemoveFile:
+    """Тесты удаления файлов"""
+
+    async def test_remove_file(self, tmp_path):
+        """Удаление файла и отсутствующего файла"""
+        path = tmp_path / "audio.mp3"
+        path.write_bytes(b"data")
+
+        assert await remove_file(str(path)) is True
+        assert not path.exists()
+        assert await remove_file(str(path)) is False
+
+
+@pytest.mark.api
+class TestUploadEndpoint:
+    """Тесты потокового приёма загрузки через API"""
+
+    async def test_upload_streamed_to_disk(
+        self, client: AsyncClient, sample_appointment: Appointment, tmp_path, monkeypatch
+    ):
+        """Файл из нескольких блоков сохраняется без искажений"""
+        monkeypatch.setattr(settings, "upload_dir", str(tmp_path))
+        monkeypatch.setattr(settings, "upload_chunk_size", 4096)
+        content = bytes(range(256)) * 1000
+
+        response = await client.post(
+            f"/api/audio/upload?appointment_id={sample_appointment.id}",
+            data={"comment": "до файла"},
+            files={"file": ("visit.mp3", BytesIO(content), "audio/mpeg")}
+        )
+
+        assert response.status_code == 200
+        assert response.json()["file_size"] == len(content)
+        stored = get_storage().local_path(blob_key(hashlib.sha256(content).hexdigest()))
+        assert stored.read_bytes() == content
+        assert [p for p in tmp_path.rglob("*") if p.is_file() and p.name != ".store.lock"] == [stored]
+
+    async def test_upload_too_large(
+        self, client: AsyncClient, sample_appointment: Appointment, tmp_path, monkeypatch
+    ):
+        """Слишком большой файл - 413, на диске ничего не остаётся"""
+        monkeypatch.setattr(settings, "upload_dir", str(tmp_path))
+        monkeypatch.setattr(settings, "max_upload_size", 1024)
+
+        response = await client.post(
+            f"/api/audio/upload?appointment_id={sample_appointment.id}",
+            files={"file": ("big.mp3", BytesIO(b"x" * 4096), "audio/mpeg")}
+        )
+
+        assert response.status_code == 413
+        assert list(tmp_path.iterdir()) == []
+
+    async def test_unsupported_extension(
+        self, client: AsyncClient, sample_appointment: Appointment, tmp_path, monkeypatch
+    ):
+        """Неподдерживаемый формат отклоняется до записи на диск"""
+        monkeypatch.setattr(settings, "upload_dir", str(tmp_path))
+
+        response = await client.post(
+            f"/api/audio/upload?appointment_id={sample_appointment.id}",
+            files={"file": ("notes.txt", BytesIO(b"text"), "text/plain")}
+        )
+
+        assert response.status_code == 400
+        assert list(tmp_path.iterdir()) == []
+
+    async def test_missing_file(self, client: AsyncClient, sample_appointment: Appointment):
+        """Запрос без файлового поля - 400"""
+        response = await client.post(
+            f"/api/audio/upload?appointment_id={sample_appointment.id}",
+            data={"comment": "без файла"},
+            files={"other": ("a.mp3", BytesIO(b"x"), "audio/mpeg")}
+        )
+        assert response.status_code == 400
+
+
+@pytest.mark.api
+class TestContentAddressedStore:
+    """Тесты хранилища по содержимому и подсчёта ссылок"""
+
+    @pytest.fixture
+    async def second_appointment(self, db_session: AsyncSession, sample_patient: Patient) -> Appointment:
+        appointment = Appointment(
+            patient_id=sample_patient.id,
+            appointment_date=date(2025, 10, 27),
+            appointment_time_start="11:00",
+            appointment_time_end="11:20",
+            status=AppointmentStatus.SCHEDULED,
+            is_active=False
+        )
+        db_session.add(appointment)
+        await db_session.commit()
+        await db_session.refresh(appointment)
+        return appointment
+
+    async def upload(self, client: AsyncClient, appointment_id: int, content: bytes):
+        return await client.post(
+            f"/api/audio/upload?appointment_id={appointment_id}",
+            files={"file": ("visit.mp3", BytesIO(content), "audio/mpeg")}
+        )
+
+    def test_blob_key(self, tmp_path, monkeypatch):
+        """Файл раскладывается по каталогам из первых байт хэша, без расширения"""
+        monkeypatch.setattr(settings, "upload_dir", str(tmp_path))
+        sha256 = hashlib.sha256(b"audio").hexdigest()
+
+        assert blob_key(sha256) == f"{sha256[:2]}/{sha256[2:4]}/{sha256}"
+        assert get_storage().local_path(blob_key(sha256)) == tmp_path / sha256[:2] / sha256[2:4] / sha256
+
+    async def test_duplicate_upload_shares_file(
+        self, client: AsyncClient, db_session: AsyncSession, sample_appointment: Appointment,
+        second_appointment: Appointment, tmp_path, monkeypatch
+    ):
+        """Повторная загрузка того же содержимого не создаёт второй файл; файл удаляется с последней ссылкой"""
+        monkeypatch.setattr(settings, "upload_dir", str(tmp_path))
+        content = os.urandom(50_000)
+        sha256 = hashlib.sha256(content).hexdigest()
+
+        assert (await self.upload(client, sample_appointment.id, content)).status_code == 200
+        assert (await self.upload(client, second_appointment.id, content)).status_code == 200
+
+        first = await crud.get_audio_file_by_appointment(db_session, sample_appointment.id)
+        second = await crud.get_audio_file_by_appointment(db_session, second_appointment.id)
+        assert first.sha256 == second.sha256 == sha256
+        assert first.filepath == second.filepath == blob_key(sha256)
+        assert len([p for p in tmp_path.rglob("*") if p.is_file() and p.name != ".store.lock"]) == 1
+
+        response = await client.delete(f"/api/audio/by-appointment/{sample_appointment.id}")
+        assert response.status_code == 200
+        assert get_storage().local_path(blob_key(sha256)).read_bytes() == content
+
+        response = await client.delete(f"/api/audio/by-appointment/{second_appointment.id}")
+        assert response.status_code == 200
+        assert not get_storage().local_path(blob_key(sha256)).exists()
+
+    async def test_legacy_file_removed(
+        self, client: AsyncClient, db_session: AsyncSession, sample_appointment: Appointment, tmp_path
+    ):
+        """Файл записи без хэша (загруженной до хранилища по содержимому) удаляется вместе с ней"""
+        legacy_path = tmp_path / "legacy.mp3"
+        legacy_path.write_bytes(b"legacy")
+        await crud.create_audio_file(
+            db_session,
+            appointment_id=sample_appointment.id,
+            filename="legacy.mp3",
+            filepath=str(legacy_path),
+            file_size=6,
+            mime_type="audio/mpeg"
+        )
+
+        response = await client.delete(f"/api/audio/by-appointment/{sample_appointment.id}")
+
+        assert response.status_code == 200
+        assert not legacy_path.exists()
+
+
+class TestBodySizeLimit:
+    """Тесты ограничения размера тела на уровне ASGI"""
+
+    @pytest.fixture
+    def limited_app(self):
+        app = FastAPI()
+        app.state.body_read = False
+
+        @app.post("/upload")
+        async def upload(request: Request):
+            body = b""
+            async for chunk in request.stream():
+                body += chunk
+            app.state.body_read = True
+            return {"size": len(body)}
+
+        app.add_middleware(BodySizeLimitMiddleware, limits=[(r"^/upload$", 1000)])
+        return app
+
+    async def request(self, app, **kwargs):
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+            return await client.post("/upload", **kwargs)
+
+    async def test_within_limit(self, limited_app):
+        """Тело в пределах лимита доходит до приложения"""
+        response = await self.request(limited_app, content=b"x" * 1000)
+        assert response.status_code == 200
+        assert response.json() == {"size": 1000}
+
+    async def test_content_length_rejected(self, limited_app):
+        """По Content-Length запрос отклоняется без чтения тела"""
+        response = await self.request(limited_app, content=b"x" * 1001)
+        assert response.status_code == 413
+        assert limited_app.state.body_read is False
+
+    async def test_streaming_body_cut_off(self, limited_app):
+        """Тело без Content-Length обрывается при превышении лимита"""
+        async def body():
+            for _ in range(10):
+                yield b"x" * 300
+
+        response = await self.request(limited_app, content=body())
+        assert response.status_code == 413
+        assert limited_app.state.body_read is False
@@ -0,0 +1,131 @@
+"""Тесты перекодирования загруженных записей в Opus"""
+import os
+from io import BytesIO
+from pathlib import Path
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import audio_transcode, crud, tasks
+from app.config import settings
+from app.models import Appointment, JobStatus
+
+WAV = b"RIFF" + os.urandom(200_000)
+OPUS = b"OggS" + os.urandom(5_000)
+
+
+@pytest.mark.api
+class TestAudioTranscode:
+    """Тесты задачи перекодирования (ffmpeg/ffprobe заменены имитацией)"""
+
+    @pytest.fixture(autouse=True)
+    def fake_ffmpeg(self, monkeypatch, temp_upload_dir):
+        monkeypatch.setattr(settings, "upload_dir", str(temp_upload_dir))
+        monkeypatch.setattr(audio_transcode, "is_available", lambda: True)
+        self.output = OPUS
+        self.durations = {}
+        self.job_sessions = []
+        rehydrate = tasks.rehydrate_audio
+
+        async def tracking_rehydrate(db, key):
+            self.job_sessions.append(db)
+            return await rehydrate(db, key)
+
+        async def transcode(source: Path, target: Path, bitrate: str) -> None:
+            assert bitrate == settings.audio_opus_bitrate
+            # ffmpeg работает без открытой транзакции (соединение и снимок WAL свободны)
+            assert not any(db.in_transaction() for db in self.job_sessions)
+            target.write_bytes(self.output)
+
+        async def probe(path: Path) -> float:
+            return self.durations.get(path.read_bytes()[:4], 12.0)
+
+        monkeypatch.setattr(audio_transcode, "transcode_to_opus", transcode)
+        monkeypatch.setattr(audio_transcode, "probe_duration", probe)
+        monkeypatch.setattr(tasks, "rehydrate_audio", tracking_rehydrate)
+
+    async def upload(self, client: AsyncClient, appointment: Appointment) -> int:
+        response = await client.post(
+            f"/api/audio/upload?appointment_id={appointment.id}",
+            files={"file": ("visit.wav", BytesIO(WAV), "audio/wav")}
+        )
+        assert response.status_code == 200
+        return response.json()["id"]
+
+    def stored_files(self, upload_dir: Path) -> list[Path]:
+        return [path for path in upload_dir.rglob("*") if path.is_file() and path.name != ".store.lock"]
+
+    async def test_replaced_with_opus(
+        self, client: AsyncClient, db_session: AsyncSession, sample_appointment: Appointment,
+        temp_upload_dir, run_jobs
+    ):
+        """После проверки запись заменяется перекодированной, исходный файл удаляется"""
+        audio_id = await self.upload(client, sample_appointment)
+        wav_sha256 = (await crud.get_audio_file(db_session, audio_id)).sha256
+        # До перекодирования содержимое сменится и по ссылке с версией
+        response = await client.get(f"/api/audio/{audio_id}/download?v={wav_sha256}")
+        assert response.content == WAV
+        assert "no-cache" in response.headers["cache-control"]
+
+        await run_jobs()
+
+        db_session.expire_all()
+        audio = await crud.get_audio_file(db_session, audio_id)
+        assert audio.mime_type == "audio/ogg"
+        assert audio.filename == "visit.ogg"
+        assert audio.file_size == len(OPUS)
+        assert audio.saved_bytes == len(WAV) - len(OPUS)
+        assert [path.read_bytes() for path in self.stored_files(temp_upload_dir)] == [OPUS]
+
+        response = await client.get(f"/api/audio/{audio_id}/download?v={audio.sha256}")
+        assert response.content == OPUS
+        assert response.headers["content-type"] == "audio/ogg"
+        assert "immutable" in response.headers["cache-control"]
+        assert (await client.get(f"/api/audio/{audio_id}")).json()["saved_bytes"] == len(WAV) - len(OPUS)
+
+    async def test_duration_mismatch_keeps_original(
+        self, client: AsyncClient, db_session: AsyncSession, sample_appointment: Appointment,
+        temp_upload_dir, run_jobs
+    ):
+        """Перекодированная запись короче исходной - исходная остаётся, задача повторяется"""
+        self.durations[b"OggS"] = 7.5
+        audio_id = await self.upload(client, sample_appointment)
+        await run_jobs()
+
+        db_session.expire_all()
+        job = await crud.get_active_job(db_session, "transcode_audio", f"transcode:{audio_id}")
+        assert job.status == JobStatus.QUEUED
+        assert "Длительность" in job.last_error
+        # Повтор не должен достаться задачам других тестов
+        await db_session.delete(job)
+        await db_session.commit()
+        audio = await crud.get_audio_file(db_session, audio_id)
+        assert audio.mime_type == "audio/wav"
+        assert audio.saved_bytes is None
+        assert [path.read_bytes() for path in self.stored_files(temp_upload_dir)] == [WAV]
+
+    async def test_larger_output_discarded(
+        self, client: AsyncClient, db_session: AsyncSession, sample_appointment: Appointment,
+        temp_upload_dir, run_jobs
+    ):
+        """Перекодирование не уменьшило файл - остаётся исходный, экономия 0"""
+        self.output = b"OggS" + os.urandom(len(WAV))
+        audio_id = await self.upload(client, sample_appointment)
+        await run_jobs()
+
+        db_session.expire_all()
+        audio = await crud.get_audio_file(db_session, audio_id)
+        assert audio.mime_type == "audio/wav"
+        assert audio.saved_bytes == 0
+        assert [path.read_bytes() for path in self.stored_files(temp_upload_dir)] == [WAV]
+
+    async def test_disabled(self, client: AsyncClient, db_session: AsyncSession, sample_appointment: Appointment, monkeypatch):
+        """Перекодирование выключено - задача не ставится, запись кэшируется как неизменяемая"""
+        monkeypatch.setattr(settings, "audio_transcode_enabled", False)
+        audio_id = await self.upload(client, sample_appointment)
+
+        assert await crud.get_active_job(db_session, "transcode_audio", f"transcode:{audio_id}") is None
+        audio = await crud.get_audio_file(db_session, audio_id)
+        response = await client.get(f"/api/audio/{audio_id}/download?v={audio.sha256}")
+        assert "immutable" in response.headers["cache-control"]
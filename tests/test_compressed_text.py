@@ -0,0 +1,80 @@
+"""Тесты сжатого хранения текстов"""
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import crud
+from app.compressed_text import FORMAT_PLAIN, FORMAT_ZLIB_V1, compress_text, decompress_text
+from app.models import Appointment, TranscriptionStatus
+
+TRANSCRIPT = (
+    "**Врач:** Здравствуйте! Проходите, присаживайтесь. Что вас беспокоит?\n"
+    "**Пациент:** Последние дни беспокоит головная боль и слабость.\n"
+) * 50
+
+
+class TestCompressionFormat:
+    """Тесты формата хранения"""
+
+    def test_roundtrip(self):
+        """Текст восстанавливается без изменений"""
+        for value in ["", "Кашель", TRANSCRIPT, "ё" * 10_000]:
+            assert decompress_text(compress_text(value)) == value
+
+    def test_version_byte(self):
+        """Короткие строки не сжимаются, длинные - сжимаются со словарём"""
+        assert compress_text("Кашель")[0] == FORMAT_PLAIN
+        packed = compress_text(TRANSCRIPT)
+        assert packed[0] == FORMAT_ZLIB_V1
+        assert len(packed) < len(TRANSCRIPT.encode("utf-8")) / 5
+
+    def test_legacy_text(self):
+        """Строка, сохранённая до сжатия, читается как есть"""
+        assert decompress_text("Старый текст") == "Старый текст"
+
+    def test_unknown_version(self):
+        """Неизвестная версия формата - ошибка, а не мусор"""
+        with pytest.raises(ValueError):
+            decompress_text(b"\x7fdata")
+
+
+class TestCompressedColumns:
+    """Тесты колонок со сжатием"""
+
+    async def test_stored_compressed(self, db_session: AsyncSession, sample_appointment: Appointment):
+        """В БД хранится сжатое значение, приложение видит строку"""
+        await crud.create_or_update_medical_report(db_session, sample_appointment.id, anamnesis=TRANSCRIPT)
+
+        raw = (await db_session.execute(
+            text("SELECT anamnesis FROM medical_reports WHERE appointment_id = :id"),
+            {"id": sample_appointment.id}
+        )).scalar_one()
+        assert isinstance(raw, bytes) and raw[0] == FORMAT_ZLIB_V1
+
+        db_session.expunge_all()
+        report = await crud.get_medical_report(db_session, sample_appointment.id, with_text=True)
+        assert report.anamnesis == TRANSCRIPT
+
+    async def test_legacy_rows(self, db_session: AsyncSession, sample_appointment: Appointment):
+        """Строки, записанные обычным TEXT, читаются и пересжимаются при сохранении"""
+        await db_session.execute(
+            text(
+                "INSERT INTO audio_files (appointment_id, filename, filepath, file_size, mime_type, "
+                "transcription_status, transcription_text, uploaded_at) "
+                "VALUES (:id, 'old.mp3', '', 0, 'audio/mpeg', 'COMPLETED', :text, CURRENT_TIMESTAMP)"
+            ),
+            {"id": sample_appointment.id, "text": "Старая транскрипция"}
+        )
+        await db_session.commit()
+
+        audio = await crud.get_audio_file_by_appointment(db_session, sample_appointment.id, with_text=True)
+        assert audio.transcription_text == "Старая транскрипция"
+
+        await crud.update_transcription(db_session, audio.id, TranscriptionStatus.COMPLETED, TRANSCRIPT)
+        raw = (await db_session.execute(
+            text("SELECT transcription_text FROM audio_files WHERE id = :id"), {"id": audio.id}
+        )).scalar_one()
+        assert raw[0] == FORMAT_ZLIB_V1
+        db_session.expunge_all()
+        audio = await crud.get_audio_file(db_session, audio.id, with_text=True)
+        assert audio.transcription_text == TRANSCRIPT
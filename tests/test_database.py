@@ -0,0 +1,63 @@
+"""Тесты настройки базы данных (профиль хранения SQLite)"""
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.config import settings
+from app.database import (
+    configure_sqlite_engine,
+    get_engine_options,
+    get_sqlite_pragmas,
+)
+
+
+class TestSQLiteProfile:
+    """Тесты применения PRAGMA к соединениям пула"""
+
+    async def test_pragmas_applied_to_every_connection(self, tmp_path):
+        """PRAGMA профиля применяются к каждому соединению пула"""
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'profile.db'}")
+        configure_sqlite_engine(engine)
+
+        try:
+            # Открываем два соединения одновременно, чтобы пул создал оба
+            async with engine.connect() as first, engine.connect() as second:
+                for conn in (first, second):
+                    journal_mode = (await conn.execute(text("PRAGMA journal_mode"))).scalar()
+                    synchronous = (await conn.execute(text("PRAGMA synchronous"))).scalar()
+                    busy_timeout = (await conn.execute(text("PRAGMA busy_timeout"))).scalar()
+                    cache_size = (await conn.execute(text("PRAGMA cache_size"))).scalar()
+                    temp_store = (await conn.execute(text("PRAGMA temp_store"))).scalar()
+
+                    assert journal_mode.upper() == settings.sqlite_journal_mode.upper()
+                    assert synchronous == 1  # NORMAL
+                    assert busy_timeout == settings.sqlite_busy_timeout
+                    assert cache_size == settings.sqlite_cache_size
+                    assert temp_store == 2  # MEMORY
+        finally:
+            await engine.dispose()
+
+    async def test_default_engine_without_profile(self, tmp_path):
+        """Без профиля SQLite работает в режиме по умолчанию (rollback journal)"""
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'plain.db'}")
+        try:
+            async with engine.connect() as conn:
+                journal_mode = (await conn.execute(text("PRAGMA journal_mode"))).scalar()
+                assert journal_mode.lower() == "delete"
+        finally:
+            await engine.dispose()
+
+    def test_pragmas_from_settings(self):
+        """Список PRAGMA строится из настроек"""
+        pragmas = get_sqlite_pragmas()
+        assert f"PRAGMA journal_mode={settings.sqlite_journal_mode}" in pragmas
+        assert f"PRAGMA mmap_size={settings.sqlite_mmap_size}" in pragmas
+
+    def test_pool_options(self):
+        """Параметры пула передаются для файловой БД и не передаются для :memory:"""
+        file_options = get_engine_options("sqlite+aiosqlite:///./elia.db")
+        assert file_options["pool_size"] == settings.db_pool_size
+        assert file_options["max_overflow"] == settings.db_max_overflow
+
+        memory_options = get_engine_options("sqlite+aiosqlite:///:memory:")
+        assert "pool_size" not in memory_options
@@ -0,0 +1,62 @@
+"""Тесты отложенной загрузки больших текстовых полей"""
+import pytest
+from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import crud
+from app.models import Appointment, AudioFile, TranscriptionStatus
+
+
+@pytest.fixture
+async def transcribed_audio(db_session: AsyncSession, sample_appointment: Appointment) -> int:
+    """Аудиофайл с длинной транскрипцией, возвращает его ID"""
+    audio = await crud.create_audio_file(
+        db_session,
+        appointment_id=sample_appointment.id,
+        filename="long.mp3",
+        filepath="",
+        file_size=1000,
+        mime_type="audio/mpeg"
+    )
+    await crud.update_transcription(
+        db_session, audio.id, TranscriptionStatus.COMPLETED, "Врач: Что вас беспокоит? " * 1000
+    )
+    db_session.expunge_all()
+    return audio.id
+
+
+class TestDeferredText:
+    """Текст загружается только по явному запросу"""
+
+    async def test_audio_text_not_loaded_by_default(self, db_session: AsyncSession, transcribed_audio: int):
+        """Проверки статуса не читают транскрипцию"""
+        audio = await crud.get_audio_file(db_session, transcribed_audio)
+        assert audio.transcription_status == TranscriptionStatus.COMPLETED
+        with pytest.raises(InvalidRequestError):
+            audio.transcription_text
+
+    async def test_audio_text_undeferred(self, db_session: AsyncSession, transcribed_audio: int):
+        """with_text=True догружает текст и для объекта, уже загруженного без него"""
+        await crud.get_audio_file(db_session, transcribed_audio)
+        audio = await crud.get_audio_file(db_session, transcribed_audio, with_text=True)
+        assert audio.transcription_text.startswith("Врач:")
+
+    async def test_report_text_group(self, db_session: AsyncSession, sample_appointment: Appointment):
+        """Текстовые поля отчёта загружаются одной группой"""
+        await crud.create_or_update_medical_report(db_session, sample_appointment.id, anamnesis="Анамнез")
+        db_session.expunge_all()
+
+        report = await crud.get_medical_report(db_session, sample_appointment.id)
+        with pytest.raises(InvalidRequestError):
+            report.anamnesis
+
+        db_session.expunge_all()
+        report = await crud.get_medical_report(db_session, sample_appointment.id, with_text=True)
+        assert report.anamnesis == "Анамнез"
+        assert report.purpose is None
+
+    async def test_workspace_loads_text(self, db_session: AsyncSession, transcribed_audio: int):
+        """Карточка пациента получает транскрипцию вместе с аудиофайлом"""
+        audio = await db_session.get(AudioFile, transcribed_audio)
+        appointment = await crud.get_appointment_workspace(db_session, audio.appointment_id)
+        assert appointment.audio_file.transcription_text.startswith("Врач:")
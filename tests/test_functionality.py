@@ -313,10 +313,10 @@ class TestMedicalReport:
             f"/api/appointments/{sample_appointment.id}/submit-to-mis"
         )
         
-        assert response.status_code == 200
+        assert response.status_code == 202
         data = response.json()
         assert data["success"] == True
-        assert "submitted_at" in data
+        assert "job_id" in data
 
 
 @pytest.mark.api
@@ -630,7 +630,7 @@ class TestFullWorkflow:
         response = await client.post(
             f"/api/appointments/{sample_appointment.id}/submit-to-mis"
         )
-        assert response.status_code == 200
+        assert response.status_code == 202
         
         # Шаг 6: Генерируем PDF
         response = await client.get(
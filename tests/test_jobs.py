@@ -0,0 +1,188 @@
+"""Тесты очереди фоновых задач"""
+import asyncio
+from datetime import datetime
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import crud
+from app.config import settings
+from app.jobs import JobWorkerPool, enqueue_job, job_handler, retry_delay
+from app.models import Appointment, AudioFile, Job, JobStatus, TranscriptionStatus
+from app.tasks import recover_stuck_transcriptions
+from tests.conftest import test_async_session as session_factory
+
+calls: dict[str, int] = {}
+failures: list[dict] = []
+
+
+async def record_failure(db: AsyncSession, payload: dict, error: str) -> None:
+    failures.append({**payload, "error": error})
+
+
+@job_handler("test_flaky", on_failure=record_failure)
+async def flaky_job(db: AsyncSession, payload: dict) -> dict:
+    """Падает первые payload["fail"] раз"""
+    name = payload["name"]
+    calls[name] = calls.get(name, 0) + 1
+    if calls[name] <= payload["fail"]:
+        raise RuntimeError(f"сбой {calls[name]}")
+    return {"calls": calls[name]}
+
+
+async def make_due(db: AsyncSession, job_id: int) -> None:
+    """Наступил срок повтора"""
+    await db.execute(update(Job).where(Job.id == job_id).values(run_at=datetime.utcnow()))
+    await db.commit()
+
+
+async def reload(db: AsyncSession, job_id: int) -> Job:
+    db.expire_all()
+    return await crud.get_job(db, job_id)
+
+
+class TestJobQueue:
+    """Тесты повторов, таймаута видимости и восстановления"""
+
+    @pytest.fixture
+    def pool(self, monkeypatch) -> JobWorkerPool:
+        monkeypatch.setattr(settings, "job_max_attempts", 3)
+        return JobWorkerPool(session_factory=session_factory)
+
+    def test_retry_delay(self, monkeypatch):
+        """Задержка удваивается с каждой попыткой и ограничена сверху"""
+        monkeypatch.setattr(settings, "job_retry_base_delay", 5.0)
+        monkeypatch.setattr(settings, "job_retry_max_delay", 30.0)
+        assert [retry_delay(n) for n in (1, 2, 3, 4, 5)] == [5.0, 10.0, 20.0, 30.0, 30.0]
+
+    async def test_retry_then_success(self, db_session: AsyncSession, pool: JobWorkerPool):
+        """Ошибка - повтор с задержкой, затем успешное выполнение"""
+        job = await enqueue_job(db_session, "test_flaky", {"name": "retry", "fail": 1})
+
+        while await pool.run_once("w1"):
+            pass
+        job = await reload(db_session, job.id)
+        assert job.status == JobStatus.QUEUED
+        assert job.attempts == 1
+        assert "сбой 1" in job.last_error
+        assert job.run_at > datetime.utcnow()
+
+        await make_due(db_session, job.id)
+        while await pool.run_once("w1"):
+            pass
+        job = await reload(db_session, job.id)
+        assert job.status == JobStatus.COMPLETED
+        assert job.result == {"calls": 2}
+
+    async def test_attempts_exhausted(self, db_session: AsyncSession, pool: JobWorkerPool):
+        """После max_attempts попыток - FAILED и вызов on_failure"""
+        job = await enqueue_job(db_session, "test_flaky", {"name": "exhausted", "fail": 10})
+
+        for _ in range(3):
+            await make_due(db_session, job.id)
+            while await pool.run_once("w1"):
+                pass
+
+        job = await reload(db_session, job.id)
+        assert job.status == JobStatus.FAILED
+        assert job.attempts == 3
+        assert failures[-1]["name"] == "exhausted"
+
+    async def test_visibility_timeout(self, db_session: AsyncSession, pool: JobWorkerPool):
+        """Задачу упавшего воркера забирает другой; прежний владелец её уже не завершит"""
+        job = await enqueue_job(db_session, "test_flaky", {"name": "crashed", "fail": 0})
+        # Другие задачи в общей тестовой БД не должны мешать
+        while await pool.run_once("drain"):
+            pass
+        await db_session.execute(
+            update(Job).where(Job.id == job.id).values(status=JobStatus.QUEUED, attempts=0, result=None)
+        )
+        await db_session.commit()
+
+        claimed = await crud.claim_job(db_session, "crashed-worker", visibility_timeout=-1)
+        assert claimed.id == job.id
+
+        reclaimed = await crud.claim_job(db_session, "w2", visibility_timeout=60)
+        assert reclaimed.id == job.id
+        assert reclaimed.attempts == 2
+        assert await crud.complete_job(db_session, job.id, "crashed-worker", None) is False
+        assert await crud.complete_job(db_session, job.id, "w2", None) is True
+
+    async def test_pool_processes_jobs(self, db_session: AsyncSession, pool: JobWorkerPool, monkeypatch):
+        """Запущенные воркеры выполняют задачу без участия запроса"""
+        monkeypatch.setattr(settings, "job_poll_interval", 0.05)
+        job = await enqueue_job(db_session, "test_flaky", {"name": "pool", "fail": 0})
+
+        await pool.start(2)
+        try:
+            for _ in range(100):
+                if (await reload(db_session, job.id)).status == JobStatus.COMPLETED:
+                    break
+                await asyncio.sleep(0.05)
+        finally:
+            await pool.stop()
+
+        assert (await reload(db_session, job.id)).status == JobStatus.COMPLETED
+
+
+@pytest.mark.api
+class TestTranscriptionJobs:
+    """Тесты задач транскрибации"""
+
+    async def test_recover_stuck_transcription(
+        self, client: AsyncClient, db_session: AsyncSession, sample_appointment: Appointment, run_jobs
+    ):
+        """Аудиофайл, оставшийся в PROCESSING после падения, снова ставится в очередь"""
+        audio = AudioFile(
+            appointment_id=sample_appointment.id,
+            filename="stuck.mp3",
+            filepath="",
+            file_size=1,
+            mime_type="audio/mpeg",
+            transcription_status=TranscriptionStatus.PROCESSING
+        )
+        db_session.add(audio)
+        await db_session.commit()
+
+        assert await recover_stuck_transcriptions(db_session) >= 1
+        # Повторный вызов не создаёт второй задачи
+        await recover_stuck_transcriptions(db_session)
+        assert (await crud.get_active_job(db_session, "transcribe_audio", f"audio:{audio.id}")) is not None
+        await run_jobs()
+
+        audio_id = audio.id
+        db_session.expire_all()
+        response = await client.get(f"/api/audio/{audio_id}")
+        assert response.json()["transcription_status"] == "completed"
+        assert await recover_stuck_transcriptions(db_session) == 0
+
+    async def test_repeated_request_reuses_job(
+        self, client: AsyncClient, db_session: AsyncSession, sample_appointment: Appointment, run_jobs
+    ):
+        """Повторный запрос, пока задача в очереди, возвращает её же, а не ставит вторую"""
+        audio = AudioFile(
+            appointment_id=sample_appointment.id,
+            filename="visit.mp3",
+            filepath="",
+            file_size=1,
+            mime_type="audio/mpeg"
+        )
+        db_session.add(audio)
+        await db_session.commit()
+        audio_id = audio.id
+
+        first = await client.post(f"/api/audio/{audio_id}/transcribe")
+        second = await client.post(f"/api/audio/{audio_id}/transcribe")
+        assert first.status_code == second.status_code == 202
+        assert second.json()["job_id"] == first.json()["job_id"]
+        assert second.headers["Location"] == f"/api/jobs/{first.json()['job_id']}"
+
+        await run_jobs()
+        db_session.expire_all()
+        assert (await client.post(f"/api/audio/{audio_id}/transcribe")).status_code == 400
+
+    async def test_job_not_found(self, client: AsyncClient):
+        """Статус несуществующей задачи - 404"""
+        assert (await client.get("/api/jobs/999999")).status_code == 404
@@ -0,0 +1,277 @@
+"""Тесты распознавания во время записи (WebSocket /api/audio/live)"""
+import asyncio
+import json
+import wave
+from pathlib import Path
+from urllib.parse import urlencode
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import crud, live_transcription, transcription
+from app.config import settings
+from app.database import get_db, get_session_factory
+from app.live_transcription import LiveTranscriptionSession
+from app.main import app
+from app.models import Appointment, AudioFile, TranscriptionStatus
+from app.object_storage import get_storage
+from app.transcription import TranscriptionEngine, TranscriptionResult
+from tests.conftest import override_get_db, test_engine, tone_pcm
+
+RATE = 16000
+
+
+class DurationEngine(TranscriptionEngine):
+    """Движок для тестов: "текст" - длительность фрагмента"""
+
+    name = "test-duration"
+
+    async def transcribe(self, path: Path) -> TranscriptionResult:
+        with wave.open(str(path)) as wav:
+            duration = wav.getnframes() / wav.getframerate()
+        return TranscriptionResult(text=f"речь {duration:.1f} с", duration=duration)
+
+
+def pieces(data: bytes, seconds: float) -> list[bytes]:
+    size = int(seconds * RATE) * 2 + 1  # Нечётный размер: отсчёт может разрываться между частями
+    return [data[offset:offset + size] for offset in range(0, len(data), size)]
+
+
+CONSULTATION = [(0.5, False), (1.5, True), (1.5, False), (2.0, True), (0.5, False)]
+
+
+class WebSocketSession:
+    """Минимальный ASGI-клиент WebSocket: приложение работает в том же event loop"""
+
+    def __init__(self, path: str, **params):
+        self.scope = {
+            "type": "websocket",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": urlencode(params).encode(),
+            "headers": [],
+            "scheme": "ws",
+            "server": ("test", 80),
+            "client": ("test", 50000),
+            "root_path": "",
+            "subprotocols": [],
+        }
+        self.incoming: asyncio.Queue = asyncio.Queue()
+        self.outgoing: asyncio.Queue = asyncio.Queue()
+        self.task = None
+
+    async def connect(self) -> dict:
+        self.task = asyncio.create_task(app(self.scope, self.incoming.get, self.outgoing.put))
+        await self.incoming.put({"type": "websocket.connect"})
+        return await self.outgoing.get()
+
+    async def send_bytes(self, data: bytes) -> None:
+        await self.incoming.put({"type": "websocket.receive", "bytes": data})
+
+    async def send_json(self, message: dict) -> None:
+        await self.incoming.put({"type": "websocket.receive", "text": json.dumps(message)})
+
+    async def receive(self) -> dict:
+        return await asyncio.wait_for(self.outgoing.get(), timeout=10)
+
+    async def disconnect(self) -> None:
+        await self.incoming.put({"type": "websocket.disconnect", "code": 1001})
+        await asyncio.wait_for(self.task, timeout=10)
+
+
+class TrackedSession(AsyncSession):
+    """Сессия, отмечающая закрытие"""
+    closed = False
+
+    async def close(self) -> None:
+        await super().close()
+        self.closed = True
+
+
+class TestLiveTranscriptionSession:
+    """Тесты инкрементального распознавания"""
+
+    async def test_final_segments_before_recording_ends(self, monkeypatch):
+        """Реплика, после которой прошла пауза, распознаётся окончательно ещё во время записи"""
+        monkeypatch.setattr(settings, "vad_padding_ms", 0)
+        session = LiveTranscriptionSession(DurationEngine())
+        timeline = []
+        for piece in pieces(tone_pcm(CONSULTATION), 0.5):
+            session.feed(piece)
+            timeline.append((session.duration, await session.process()))
+
+        finals = [(at, event) for at, events in timeline for event in events if event["type"] == "final"]
+        partials = [event for _, events in timeline for event in events if event["type"] == "partial"]
+        assert len(finals) == 1
+        assert finals[0][0] < 4.0
+        assert finals[0][1]["timestamp"] == "00:00"
+        assert finals[0][1]["text"] == "речь 1.5 с"
+        assert partials and partials[-1]["timestamp"] == "00:03"
+
+        events = await session.process(final=True)
+        assert [event["type"] for event in events] == ["final"]
+        assert session.duration == pytest.approx(6.0)
+        assert session.text == "00:00 - речь 1.5 с\n\n00:03 - речь 2.0 с"
+
+    async def test_engine_error_retried(self, monkeypatch):
+        """Ошибка распознавания не теряет речь: фрагмент распознаётся следующим проходом"""
+        engine = DurationEngine()
+        session = LiveTranscriptionSession(engine, partial_results=False)
+        session.feed(tone_pcm([(1.0, True), (1.0, False)]))
+
+        async def broken(path: Path) -> TranscriptionResult:
+            raise RuntimeError("движок недоступен")
+
+        monkeypatch.setattr(engine, "transcribe", broken)
+        with pytest.raises(RuntimeError):
+            await session.process()
+        monkeypatch.undo()
+
+        assert [event["type"] for event in await session.process()] == ["final"]
+
+    async def test_long_recording_memory_bounded(self, monkeypatch):
+        """Распознанное отбрасывается: в памяти только хвост записи и окно уровня шума"""
+        monkeypatch.setattr(live_transcription, "NOISE_WINDOW_SECONDS", 10)
+        session = LiveTranscriptionSession(DurationEngine(), partial_results=False)
+        phrase = tone_pcm([(1.0, True), (1.0, False)])
+        for _ in range(30):
+            session.feed(phrase)
+            await session.process()
+            assert len(session._samples) <= 2 * RATE
+            assert len(session._noise) <= 10 * 1000 // settings.vad_frame_ms
+
+        await session.process(final=True)
+        assert session.duration == pytest.approx(60.0)
+        assert len(session.segments) == 30
+        assert session.segments[-1].start == pytest.approx(58.0, abs=0.5)
+
+
+@pytest.mark.api
+class TestLiveTranscriptionEndpoint:
+    """Тесты WebSocket /api/audio/live"""
+
+    @pytest.fixture(autouse=True)
+    def live_settings(self, monkeypatch, temp_upload_dir):
+        monkeypatch.setattr(settings, "upload_dir", str(temp_upload_dir))
+        monkeypatch.setattr(settings, "live_step_seconds", 0.5)
+        monkeypatch.setattr(transcription, "_engine", DurationEngine())
+        app.dependency_overrides[get_db] = override_get_db
+        app.dependency_overrides[get_session_factory] = lambda: self.session_factory
+        self.sessions = []
+        yield
+        app.dependency_overrides.clear()
+
+    def session_factory(self) -> AsyncSession:
+        """Сессии эндпоинта запоминаются, чтобы проверить, что они не держатся всю запись"""
+        self.sessions.append(TrackedSession(test_engine, expire_on_commit=False))
+        return self.sessions[-1]
+
+    async def record(self, appointment: Appointment) -> WebSocketSession:
+        ws = WebSocketSession("/api/audio/live", appointment_id=appointment.id, format="pcm16")
+        assert (await ws.connect())["type"] == "websocket.accept"
+        for piece in pieces(tone_pcm(CONSULTATION), 0.5):
+            await ws.send_bytes(piece)
+        return ws
+
+    async def stop(self, ws: WebSocketSession) -> tuple[list[dict], dict]:
+        """Отправить stop; сообщения до закрытия и само закрытие"""
+        await ws.send_json({"type": "stop"})
+        messages = []
+        while (message := await ws.receive())["type"] == "websocket.send":
+            messages.append(json.loads(message["text"]))
+        await asyncio.wait_for(ws.task, timeout=10)
+        return messages, message
+
+    async def test_live_recording_persisted(self, db_session: AsyncSession, sample_appointment: Appointment):
+        """Фрагменты приходят во время записи; после stop запись и стенограмма сохранены"""
+        ws = WebSocketSession("/api/audio/live", appointment_id=sample_appointment.id, format="pcm16")
+        assert (await ws.connect())["type"] == "websocket.accept"
+
+        for piece in pieces(tone_pcm(CONSULTATION), 0.5):
+            await ws.send_bytes(piece)
+        first = json.loads((await ws.receive())["text"])
+        assert first["type"] in ("partial", "final")
+        # Во время записи соединение с БД не занято
+        assert len(self.sessions) == 1 and self.sessions[0].closed
+
+        await ws.send_json({"type": "stop"})
+        messages = [first]
+        while messages[-1].get("type") != "done":
+            message = await ws.receive()
+            assert message["type"] == "websocket.send"
+            messages.append(json.loads(message["text"]))
+        assert (await ws.receive())["type"] == "websocket.close"
+        await asyncio.wait_for(ws.task, timeout=10)
+
+        done = messages[-1]
+        finals = [m["text"] for m in messages if m["type"] == "final"]
+        assert len(finals) == 2
+        assert done["transcription_text"].count(" - речь ") == 2
+
+        audio = await crud.get_audio_file(db_session, done["audio_id"], with_text=True)
+        assert audio.transcription_status == TranscriptionStatus.COMPLETED
+        assert audio.transcription_text == done["transcription_text"]
+        assert audio.mime_type == "audio/wav"
+        assert audio.file_size == 44 + len(tone_pcm(CONSULTATION))
+        with wave.open(str(get_storage().local_path(audio.filepath))) as wav:
+            assert wav.getframerate() == RATE
+            assert wav.readframes(wav.getnframes()) == tone_pcm(CONSULTATION)
+
+    async def test_competing_upload_during_recording(
+        self, db_session: AsyncSession, sample_appointment: Appointment, temp_upload_dir
+    ):
+        """Пока шла запись, для приёма загрузили файл - стенограмма возвращается в ошибке"""
+        ws = await self.record(sample_appointment)
+        db_session.add(AudioFile(
+            appointment_id=sample_appointment.id, filename="other.mp3", filepath="", file_size=0, mime_type="audio/mpeg"
+        ))
+        await db_session.commit()
+
+        messages, close = await self.stop(ws)
+
+        error = messages[-1]
+        assert error["type"] == "error"
+        assert error["detail"] == "Аудиофайл уже загружен для этого приёма"
+        assert error["transcription_text"].count(" - речь ") == 2
+        assert close["code"] == 1008
+        assert all(session.closed for session in self.sessions)
+        assert not [path for path in temp_upload_dir.rglob("*") if path.is_file() and path.name != ".store.lock"]
+
+    async def test_insert_failure_returns_text(
+        self, sample_appointment: Appointment, temp_upload_dir, monkeypatch
+    ):
+        """Запись в БД не удалась и после проверки - стенограмма не теряется"""
+        async def failing(*args, **kwargs):
+            raise IntegrityError("INSERT INTO audio_files", {}, Exception("UNIQUE constraint failed"))
+
+        monkeypatch.setattr(crud, "create_audio_file", failing)
+        ws = await self.record(sample_appointment)
+
+        messages, close = await self.stop(ws)
+
+        assert messages[-1]["type"] == "error"
+        assert messages[-1]["transcription_text"].count(" - речь ") == 2
+        assert close["code"] == 1011
+        assert not [path for path in temp_upload_dir.rglob("*") if path.is_file() and path.name != ".store.lock"]
+
+    async def test_disconnect_discards_recording(
+        self, db_session: AsyncSession, sample_appointment: Appointment, temp_upload_dir
+    ):
+        """Обрыв соединения до stop отменяет запись"""
+        ws = WebSocketSession("/api/audio/live", appointment_id=sample_appointment.id, format="pcm16")
+        assert (await ws.connect())["type"] == "websocket.accept"
+        await ws.send_bytes(tone_pcm([(1.0, True)]))
+        await ws.disconnect()
+
+        assert await crud.get_audio_file_by_appointment(db_session, sample_appointment.id) is None
+        assert not [path for path in temp_upload_dir.rglob("*") if path.is_file() and path.name != ".store.lock"]
+
+    async def test_rejected_before_accept(self, sample_appointment: Appointment):
+        """Несуществующий приём или формат - соединение отклоняется"""
+        for params in ({"appointment_id": 999999}, {"appointment_id": sample_appointment.id, "format": "flac"}):
+            ws = WebSocketSession("/api/audio/live", **params)
+            message = await ws.connect()
+            assert message["type"] == "websocket.close"
+            assert message["code"] == 1008
+            await asyncio.wait_for(ws.task, timeout=10)
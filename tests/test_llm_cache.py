@@ -0,0 +1,166 @@
+"""Тесты кэша ответов модели (app/llm_cache.py)"""
+import json
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.llm_cache import LLMCache, cache_key, llm_cache
+from app.models import Appointment, AudioFile, LLMResponse, TranscriptionStatus
+from app.openai_service import openai_service
+
+TRANSCRIPT = "00:00 - Врач: Что беспокоит?\n00:05 - Пациент: Болит голова третий день."
+
+
+class FakeCompletions:
+    """chat.completions OpenAI: считает запросы и отвечает заданным JSON"""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def create(self, **params):
+        self.calls += 1
+        content = json.dumps({"purpose": "Головная боль", "complaints": f"Ответ {self.calls}", "anamnesis": "3 дня"})
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+@pytest.fixture
+async def fresh_cache(db_session: AsyncSession):
+    """Пустой кэш: таблица общая для всех прогонов тестов"""
+    await db_session.execute(delete(LLMResponse))
+    await db_session.commit()
+    llm_cache.clear()
+    yield
+    llm_cache.clear()
+
+
+class TestCacheKey:
+    """Тесты ключа кэша"""
+
+    def test_normalized_text(self):
+        """Пробелы и переводы строк не меняют ключ, текст и параметры запроса - меняют"""
+        key = cache_key("anamnesis", TRANSCRIPT, "1", "gpt-4", 0.3)
+        assert key == cache_key("anamnesis", "  " + TRANSCRIPT.replace("\n", "\r\n  ") + "\n", "1", "gpt-4", 0.3)
+        assert key != cache_key("anamnesis", TRANSCRIPT + " Тошнит.", "1", "gpt-4", 0.3)
+        assert key != cache_key("anamnesis", TRANSCRIPT, "2", "gpt-4", 0.3)
+        assert key != cache_key("anamnesis", TRANSCRIPT, "1", "gpt-4o", 0.3)
+        assert key != cache_key("anamnesis", TRANSCRIPT, "1", "gpt-4", 0.5)
+
+
+@pytest.mark.usefixtures("fresh_cache")
+class TestLLMCache:
+    """Тесты уровней кэша, срока жизни и вытеснения"""
+
+    async def test_memory_and_db_levels(self, db_session: AsyncSession):
+        cache = LLMCache(memory_entries=1, max_entries=10, ttl=3600)
+        assert await cache.get(db_session, "a") is None
+        await cache.put(db_session, "a", "anamnesis", "gpt-4", {"purpose": "a"})
+        await cache.put(db_session, "b", "anamnesis", "gpt-4", {"purpose": "b"})
+
+        # "a" вытеснен из памяти, но остался в БД
+        assert await cache.get(db_session, "b") == {"purpose": "b"}
+        assert await cache.get(db_session, "a") == {"purpose": "a"}
+        assert await cache.get(db_session, "a") == {"purpose": "a"}
+        assert cache.stats.as_dict() == {
+            "memory_hits": 2, "db_hits": 1, "misses": 1, "stores": 2, "evictions": 2, "hit_ratio": 0.75
+        }
+
+        # Изменение отданного ответа не портит кэш
+        (await cache.get(db_session, "a"))["purpose"] = "изменено"
+        assert await cache.get(db_session, "a") == {"purpose": "a"}
+
+    async def test_ttl(self, db_session: AsyncSession):
+        cache = LLMCache(memory_entries=10, max_entries=10, ttl=3600)
+        await cache.put(db_session, "old", "anamnesis", "gpt-4", {"purpose": "old"})
+        await db_session.execute(
+            update(LLMResponse)
+            .where(LLMResponse.key == "old")
+            .values(created_at=datetime.utcnow() - timedelta(hours=2))
+        )
+        await db_session.commit()
+
+        cache.clear()
+        assert await cache.get(db_session, "old") is None
+
+        # Просроченные удаляются из таблицы при следующем сохранении
+        await cache.put(db_session, "new", "anamnesis", "gpt-4", {"purpose": "new"})
+        keys = (await db_session.scalars(select(LLMResponse.key))).all()
+        assert keys == ["new"]
+        assert cache.stats.evictions == 1
+
+    async def test_size_eviction(self, db_session: AsyncSession):
+        """Сверх max_entries из таблицы удаляются самые старые ответы"""
+        cache = LLMCache(memory_entries=0, max_entries=2, ttl=0)
+        for key in ("a", "b", "c"):
+            await cache.put(db_session, key, "anamnesis", "gpt-4", {"purpose": key})
+
+        assert await cache.get(db_session, "a") is None
+        assert await cache.get(db_session, "b") == {"purpose": "b"}
+        assert await cache.get(db_session, "c") == {"purpose": "c"}
+        assert cache.stats.evictions == 1
+
+
+@pytest.mark.api
+@pytest.mark.usefixtures("fresh_cache")
+class TestAnamnesisExtractionCache:
+    """Повторное извлечение анамнеза без запроса к API"""
+
+    @pytest.fixture
+    def completions(self, monkeypatch) -> FakeCompletions:
+        completions = FakeCompletions()
+        monkeypatch.setattr(openai_service, "client", SimpleNamespace(chat=SimpleNamespace(completions=completions)))
+        monkeypatch.setattr(settings, "llm_cache_enabled", True)
+        return completions
+
+    @pytest.fixture
+    async def transcribed_audio(self, db_session: AsyncSession, sample_appointment: Appointment) -> AudioFile:
+        audio = AudioFile(
+            appointment_id=sample_appointment.id,
+            filename="visit.wav",
+            filepath="",
+            file_size=0,
+            mime_type="audio/wav",
+            transcription_status=TranscriptionStatus.COMPLETED,
+            transcription_text=TRANSCRIPT
+        )
+        db_session.add(audio)
+        await db_session.commit()
+        return audio
+
+    async def test_repeat_extraction(
+        self, client: AsyncClient, db_session: AsyncSession, transcribed_audio: AudioFile, completions: FakeCompletions
+    ):
+        first = await client.post(f"/api/audio/{transcribed_audio.id}/extract-anamnesis")
+        assert first.status_code == 200
+        second = await client.post(f"/api/audio/{transcribed_audio.id}/extract-anamnesis")
+        assert second.status_code == 200
+        assert completions.calls == 1
+        assert second.json()["complaints"] == first.json()["complaints"] == "Ответ 1"
+
+        # Новый процесс: ответ берётся из таблицы
+        llm_cache.clear()
+        assert (await client.post(f"/api/audio/{transcribed_audio.id}/extract-anamnesis")).status_code == 200
+        assert completions.calls == 1
+
+        # Стенограмма изменилась - новый запрос
+        await db_session.execute(
+            update(AudioFile)
+            .where(AudioFile.id == transcribed_audio.id)
+            .values(transcription_text=TRANSCRIPT + " Температуры нет.")
+        )
+        await db_session.commit()
+        response = await client.post(f"/api/audio/{transcribed_audio.id}/extract-anamnesis")
+        assert response.json()["complaints"] == "Ответ 2"
+        assert completions.calls == 2
+
+    async def test_cache_disabled(
+        self, client: AsyncClient, transcribed_audio: AudioFile, completions: FakeCompletions, monkeypatch
+    ):
+        monkeypatch.setattr(settings, "llm_cache_enabled", False)
+        for _ in range(2):
+            assert (await client.post(f"/api/audio/{transcribed_audio.id}/extract-anamnesis")).status_code == 200
+        assert completions.calls == 2
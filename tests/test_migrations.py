@@ -0,0 +1,89 @@
+"""Тесты миграций схемы БД"""
+import pytest
+from alembic.autogenerate import compare_metadata
+from alembic.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.database import (
+    SCHEMA_REVISION,
+    Base,
+    SchemaVersionError,
+    check_schema_version,
+    get_alembic_config,
+    get_schema_revision,
+    run_migrations,
+)
+from app.search import PATIENT_SEARCH_TABLE
+
+
+def _include_object(obj, name, type_, reflected, compare_to) -> bool:
+    return not (type_ == "table" and name.startswith(PATIENT_SEARCH_TABLE))
+
+
+@pytest.fixture
+async def temp_engine(tmp_path):
+    """Engine пустой БД во временном каталоге"""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'migrations.db'}")
+    yield engine
+    await engine.dispose()
+
+
+async def _schema_diff(engine) -> list:
+    def _compare(sync_conn):
+        context = MigrationContext.configure(sync_conn, opts={"include_object": _include_object})
+        return compare_metadata(context, Base.metadata)
+
+    async with engine.connect() as conn:
+        return await conn.run_sync(_compare)
+
+
+class TestMigrations:
+    """Тесты миграций и проверки ревизии при старте"""
+
+    def test_schema_revision_is_head(self):
+        """SCHEMA_REVISION обновлена вместе с последней миграцией"""
+        script = ScriptDirectory.from_config(get_alembic_config())
+        assert script.get_current_head() == SCHEMA_REVISION
+
+    async def test_upgrade_matches_models(self, temp_engine):
+        """Миграции создают схему, совпадающую с моделями"""
+        await run_migrations(temp_engine)
+
+        assert await get_schema_revision(temp_engine) == SCHEMA_REVISION
+        assert await _schema_diff(temp_engine) == []
+        async with temp_engine.connect() as conn:
+            result = await conn.execute(text(f"SELECT count(*) FROM {PATIENT_SEARCH_TABLE}"))
+            assert result.scalar() == 0
+
+    async def test_upgrade_legacy_database(self, temp_engine):
+        """БД, созданная через create_all до миграций, переводится на базовую ревизию"""
+        async with temp_engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.execute(text("DROP INDEX ix_appointments_date_time"))
+            # Столбцы и таблицы, добавленные миграциями после базовой ревизии
+            await conn.execute(text("DROP INDEX ix_audio_files_sha256"))
+            await conn.execute(text("DROP INDEX ix_audio_files_filepath"))
+            await conn.execute(text("ALTER TABLE audio_files DROP COLUMN sha256"))
+            await conn.execute(text("ALTER TABLE audio_files DROP COLUMN saved_bytes"))
+            for column in ("duration", "sample_rate", "channels", "bitrate", "waveform_peaks", "compacted_at"):
+                await conn.execute(text(f"ALTER TABLE audio_files DROP COLUMN {column}"))
+            await conn.execute(text("DROP TABLE jobs"))
+            await conn.execute(text("DROP TABLE llm_responses"))
+            await conn.execute(text("DROP TABLE storage_locks"))
+
+        await run_migrations(temp_engine)
+        # Повторный запуск ничего не делает
+        await run_migrations(temp_engine)
+
+        assert await get_schema_revision(temp_engine) == SCHEMA_REVISION
+        assert await _schema_diff(temp_engine) == []
+
+    async def test_check_schema_version(self, temp_engine):
+        """Старт без миграций завершается понятной ошибкой"""
+        with pytest.raises(SchemaVersionError, match="alembic upgrade head"):
+            await check_schema_version(temp_engine)
+
+        await run_migrations(temp_engine)
+        await check_schema_version(temp_engine)
@@ -0,0 +1,253 @@
+"""Тесты потоковой выдачи ответов модели (text/event-stream)"""
+import json
+from types import SimpleNamespace
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import crud, database
+from app.config import settings
+from app.database import get_db, get_session_factory
+from app.json_stream import JsonObjectStream
+from app.llm_cache import llm_cache
+from app.models import Appointment, AudioFile, LLMResponse, TranscriptionStatus
+from app.main import app
+from app.openai_service import openai_service
+from tests.conftest import test_engine
+
+ANAMNESIS_JSON = json.dumps(
+    {"purpose": "Головная боль", "complaints": "Давит в висках, \"как обруч\"", "anamnesis": "Три дня.\nАД 150/95"},
+    ensure_ascii=False
+)
+DIALOGUE = "00:00 - Врач: Здравствуйте!\n\n00:05 - Пациент: Голова болит.\n00:12 - Врач: Давно?"
+
+
+def parse_events(body: str) -> list[tuple[str, dict]]:
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+class ClosedCheckSession(AsyncSession):
+    """Сессия, запрещающая запросы после close()"""
+    closed = False
+
+    async def close(self) -> None:
+        await super().close()
+        self.closed = True
+
+    async def execute(self, *args, **kwargs):
+        assert not self.closed, "Запрос в закрытой сессии"
+        return await super().execute(*args, **kwargs)
+
+    async def scalars(self, *args, **kwargs):
+        assert not self.closed, "Запрос в закрытой сессии"
+        return await super().scalars(*args, **kwargs)
+
+
+class FakeStreamingCompletions:
+    """chat.completions OpenAI: ответ в потоковом режиме фрагментами по chunk символов"""
+
+    def __init__(self, content: str, chunk: int = 7):
+        self.content = content
+        self.chunk = chunk
+        self.calls = 0
+
+    async def create(self, stream: bool = False, **params):
+        self.calls += 1
+        assert stream
+
+        async def chunks():
+            for start in range(0, len(self.content), self.chunk):
+                delta = SimpleNamespace(content=self.content[start:start + self.chunk])
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)])
+            # Последний фрагмент потока OpenAI - без текста
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=None))])
+
+        return chunks()
+
+
+class TestJsonObjectStream:
+    """Тесты разбора JSON-объекта по частям"""
+
+    def test_fields_by_chunks(self):
+        for size in (1, 3, len(ANAMNESIS_JSON)):
+            parser = JsonObjectStream()
+            fields = []
+            for start in range(0, len(ANAMNESIS_JSON), size):
+                fields.extend(parser.feed(ANAMNESIS_JSON[start:start + size]))
+            assert dict(fields) == json.loads(ANAMNESIS_JSON)
+            assert parser.complete
+
+    def test_field_ready_when_value_ends(self):
+        parser = JsonObjectStream()
+        assert parser.feed('{"purpose": "Осмотр", "complaints": "Каш') == [("purpose", "Осмотр")]
+        assert parser.feed('ель"') == [("complaints", "Кашель")]
+        # Число может продолжиться - отдаётся после следующего символа
+        assert parser.feed(', "visits": 1') == []
+        assert parser.feed('2, "extra": {"a": [1') == [("visits", 12)]
+        assert parser.feed("]} }") == [("extra", {"a": [1]})]
+        assert parser.complete
+
+    def test_invalid(self):
+        with pytest.raises(ValueError):
+            JsonObjectStream().feed("[1, 2]")
+        with pytest.raises(ValueError):
+            JsonObjectStream().feed('{"a": 1 "b": 2}')
+
+
+@pytest.mark.api
+class TestStreamingEndpoints:
+    """Тесты эндпоинтов с Accept: text/event-stream"""
+
+    @pytest.fixture(autouse=True)
+    async def no_cache(self, db_session: AsyncSession, monkeypatch):
+        await db_session.execute(delete(LLMResponse))
+        await db_session.commit()
+        llm_cache.clear()
+        monkeypatch.setattr(settings, "llm_cache_enabled", True)
+        yield
+        llm_cache.clear()
+
+    def use_completions(self, monkeypatch, content: str) -> FakeStreamingCompletions:
+        completions = FakeStreamingCompletions(content)
+        monkeypatch.setattr(openai_service, "client", SimpleNamespace(chat=SimpleNamespace(completions=completions)))
+        return completions
+
+    @pytest.fixture
+    async def transcribed_audio(self, db_session: AsyncSession, sample_appointment: Appointment) -> AudioFile:
+        audio = AudioFile(
+            appointment_id=sample_appointment.id,
+            filename="generated_conversation.txt",
+            filepath="",
+            file_size=0,
+            mime_type="text/plain",
+            transcription_status=TranscriptionStatus.COMPLETED,
+            transcription_text=DIALOGUE
+        )
+        db_session.add(audio)
+        await db_session.commit()
+        return audio
+
+    async def test_conversation_lines(
+        self, client: AsyncClient, db_session: AsyncSession, sample_appointment: Appointment, monkeypatch
+    ):
+        self.use_completions(monkeypatch, DIALOGUE)
+
+        response = await client.post(
+            f"/api/audio/generate-mock-conversation?appointment_id={sample_appointment.id}",
+            headers={"Accept": "text/event-stream"}
+        )
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        assert response.headers["x-accel-buffering"] == "no"
+        events = parse_events(response.text)
+        assert events[:-1] == [
+            ("line", {"text": "00:00 - Врач: Здравствуйте!"}),
+            ("line", {"text": "00:05 - Пациент: Голова болит."}),
+            ("line", {"text": "00:12 - Врач: Давно?"}),
+        ]
+        event, done = events[-1]
+        assert event == "done"
+        assert done["transcription_status"] == "completed"
+        assert done["transcription_text"].splitlines()[-1] == "00:12 - Врач: Давно?"
+
+        appointment_id = sample_appointment.id
+        db_session.expire_all()
+        audio = await crud.get_audio_file_by_appointment(db_session, appointment_id)
+        assert (await crud.get_audio_file(db_session, audio.id, with_text=True)).transcription_text == done["transcription_text"]
+
+    async def test_anamnesis_fields(
+        self, client: AsyncClient, db_session: AsyncSession, sample_appointment: Appointment,
+        transcribed_audio: AudioFile, monkeypatch
+    ):
+        completions = self.use_completions(monkeypatch, ANAMNESIS_JSON)
+        expected = json.loads(ANAMNESIS_JSON)
+
+        response = await client.post(
+            f"/api/audio/extract-anamnesis-by-appointment?appointment_id={sample_appointment.id}",
+            headers={"Accept": "text/event-stream"}
+        )
+
+        events = parse_events(response.text)
+        assert events[:-1] == [("field", {"name": name, "value": value}) for name, value in expected.items()]
+        event, report = events[-1]
+        assert event == "done"
+        assert {name: report[name] for name in expected} == expected
+        appointment_id, audio_id = sample_appointment.id, transcribed_audio.id
+        db_session.expire_all()
+        saved = await crud.get_medical_report(db_session, appointment_id, with_text=True)
+        assert saved.complaints == expected["complaints"]
+
+        # Повтор - из кэша, все поля сразу
+        response = await client.post(
+            f"/api/audio/{audio_id}/extract-anamnesis",
+            headers={"Accept": "text/event-stream"}
+        )
+        assert [event for event, _ in parse_events(response.text)] == ["field"] * 3 + ["done"]
+        assert completions.calls == 1
+
+    async def test_anamnesis_broken_json(
+        self, client: AsyncClient, transcribed_audio: AudioFile, monkeypatch
+    ):
+        """Ответ оборван - событие error, отчёт не сохраняется"""
+        self.use_completions(monkeypatch, '{"purpose": "Головная боль", "complaints": "Дав')
+
+        response = await client.post(
+            f"/api/audio/{transcribed_audio.id}/extract-anamnesis",
+            headers={"Accept": "text/event-stream"}
+        )
+
+        events = parse_events(response.text)
+        assert events[0] == ("field", {"name": "purpose", "value": "Головная боль"})
+        assert events[-1] == ("error", {"detail": "Не удалось распарсить ответ от OpenAI"})
+
+    async def test_not_found_before_stream(self, client: AsyncClient):
+        response = await client.post(
+            "/api/audio/999999/extract-anamnesis",
+            headers={"Accept": "text/event-stream"}
+        )
+        assert response.status_code == 404
+
+    async def test_request_session_closed_before_stream(
+        self, client: AsyncClient, sample_appointment: Appointment, transcribed_audio: AudioFile, monkeypatch
+    ):
+        """
+        С настоящими get_db и get_session_factory: сессия запроса закрыта до
+        начала потока, стенограмма читается и отчёт сохраняется в своих
+        коротких сессиях, пока модель отвечает, открытых сессий нет
+        """
+        sessions = []
+
+        def session_factory() -> AsyncSession:
+            sessions.append(ClosedCheckSession(test_engine, expire_on_commit=False))
+            return sessions[-1]
+
+        class SessionCheckCompletions(FakeStreamingCompletions):
+            async def create(self, stream: bool = False, **params):
+                assert all(session.closed for session in sessions)
+                return await super().create(stream, **params)
+
+        monkeypatch.setattr(database, "async_session_maker", session_factory)
+        monkeypatch.delitem(app.dependency_overrides, get_db)
+        monkeypatch.delitem(app.dependency_overrides, get_session_factory)
+        completions = SessionCheckCompletions(ANAMNESIS_JSON)
+        monkeypatch.setattr(openai_service, "client", SimpleNamespace(chat=SimpleNamespace(completions=completions)))
+
+        response = await client.post(
+            f"/api/audio/extract-anamnesis-by-appointment?appointment_id={sample_appointment.id}",
+            headers={"Accept": "text/event-stream"}
+        )
+
+        events = parse_events(response.text)
+        assert events[-1][0] == "done"
+        assert events[-1][1]["complaints"] == json.loads(ANAMNESIS_JSON)["complaints"]
+        # Сессия get_db, чтение стенограммы и сохранение отчёта - все закрыты
+        assert completions.calls == 1
+        assert len(sessions) == 3
+        assert all(session.closed for session in sessions)
@@ -0,0 +1,114 @@
+"""Тесты keyset-пагинации списков приёмов и пациентов"""
+from datetime import date
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Appointment, AppointmentStatus, GenderEnum, Patient
+from app.pagination import InvalidCursorError, decode_cursor, encode_cursor
+
+
+@pytest.fixture
+async def many_appointments(clean_db, db_session: AsyncSession) -> list[Appointment]:
+    """Пациенты-однофамильцы и приёмы с совпадающими датой и временем"""
+    patients = [
+        Patient(
+            first_name=first_name,
+            last_name="Петров",
+            middle_name="Иванович",
+            date_of_birth=date(1970, 1, 1),
+            gender=GenderEnum.MALE,
+            medical_organization="ГБУЗ Поликлиника №1",
+            medical_area="Терапевтический 1",
+        )
+        for first_name in ["Андрей", "Борис", "Андрей", "Виктор", "Андрей"]
+    ]
+    db_session.add_all(patients)
+    await db_session.flush()
+
+    appointments = []
+    for i in range(7):
+        appointments.append(Appointment(
+            patient_id=patients[i % len(patients)].id,
+            appointment_date=date(2025, 3, 1 + i // 3),
+            appointment_time_start="10:00" if i % 2 else "09:00",
+            appointment_time_end="10:30",
+            status=AppointmentStatus.SCHEDULED,
+        ))
+    db_session.add_all(appointments)
+    await db_session.commit()
+    return appointments
+
+
+async def walk(client: AsyncClient, url: str, limit: int) -> list[dict]:
+    """Пройти список по курсорам и собрать все страницы"""
+    items = []
+    cursor = None
+    for _ in range(100):
+        params = {"limit": limit}
+        if cursor:
+            params["cursor"] = cursor
+        response = await client.get(url, params=params)
+        assert response.status_code == 200
+        items.extend(response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            return items
+    raise AssertionError("Обход по курсорам не завершился")
+
+
+class TestCursor:
+    """Тесты кодирования курсора"""
+
+    def test_roundtrip(self):
+        """Курсор восстанавливает значения ключа сортировки"""
+        cursor = encode_cursor(["Иванов", "Иван", "Петрович", 42])
+        assert decode_cursor(cursor, 4) == ["Иванов", "Иван", "Петрович", 42]
+
+    @pytest.mark.parametrize("cursor", ["не-base64", encode_cursor([1, 2]), encode_cursor({"a": 1})])
+    def test_invalid(self, cursor: str):
+        """Повреждённый курсор или курсор другой длины отклоняется"""
+        with pytest.raises(InvalidCursorError):
+            decode_cursor(cursor, 3)
+
+
+@pytest.mark.api
+class TestKeysetPagination:
+    """Тесты обхода списков по курсору"""
+
+    @pytest.mark.parametrize("limit", [1, 2, 3, 7])
+    async def test_appointments_walk(self, client: AsyncClient, many_appointments: list[Appointment], limit: int):
+        """Обход по курсорам совпадает с полным списком без пропусков и повторов"""
+        full = (await client.get("/api/appointments")).json()
+        assert len(full) == len(many_appointments)
+
+        walked = await walk(client, "/api/appointments", limit)
+        assert [a["id"] for a in walked] == [a["id"] for a in full]
+
+    @pytest.mark.parametrize("limit", [1, 2, 4])
+    async def test_patients_walk(self, client: AsyncClient, many_appointments: list[Appointment], limit: int):
+        """Однофамильцы с одинаковыми именами не теряются между страницами"""
+        full = (await client.get("/api/patients")).json()
+        walked = await walk(client, "/api/patients", limit)
+        assert [p["id"] for p in walked] == [p["id"] for p in full]
+
+    async def test_last_page_has_no_cursor(self, client: AsyncClient, many_appointments: list[Appointment]):
+        """Неполная страница не содержит курсора"""
+        response = await client.get("/api/appointments?limit=100")
+        assert "X-Next-Cursor" not in response.headers
+
+    async def test_skip_still_supported(self, client: AsyncClient, many_appointments: list[Appointment]):
+        """Параметр skip работает как раньше"""
+        full = (await client.get("/api/appointments")).json()
+        response = await client.get("/api/appointments?skip=2&limit=3")
+        assert [a["id"] for a in response.json()] == [a["id"] for a in full[2:5]]
+
+    @pytest.mark.parametrize("url", ["/api/appointments", "/api/patients"])
+    async def test_invalid_cursor(self, client: AsyncClient, url: str):
+        """Некорректный курсор - 400"""
+        response = await client.get(url, params={"cursor": "мусор"})
+        assert response.status_code == 400
+
+        response = await client.get(url, params={"cursor": encode_cursor(["не дата", "x", "y"])})
+        assert response.status_code == 400
@@ -0,0 +1,173 @@
+"""
+Регрессионные тесты планов запросов (EXPLAIN QUERY PLAN)
+
+Каждая функция чтения из app/crud.py выполняется на тестовой БД,
+все её SELECT перехватываются и прогоняются через EXPLAIN QUERY PLAN.
+Тест падает, если SQLite выбирает полный просмотр таблицы или
+сортировку во временном B-дереве вместо индекса.
+"""
+import re
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import crud
+from app.models import Appointment, Patient
+from tests.conftest import test_engine
+
+
+FULL_SCAN = re.compile(r"^SCAN (TABLE )?\w+$")
+TEMP_SORT = re.compile(r"USE TEMP B-TREE FOR .*ORDER BY")
+
+
+@contextmanager
+def capture_selects():
+    """Перехватить SELECT-запросы, выполненные через тестовый engine"""
+    statements: list[tuple[str, tuple]] = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    event.listen(test_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(test_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+
+
+async def explain(db: AsyncSession, statements: list[tuple[str, tuple]]) -> list[str]:
+    """Получить строки плана для всех перехваченных запросов"""
+    details = []
+    conn = await db.connection()
+    for statement, parameters in statements:
+        result = await conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+        details.extend(row[3] for row in result.fetchall())
+    return details
+
+
+async def assert_no_full_scan(
+    db: AsyncSession,
+    statements: list[tuple[str, tuple]],
+    allow_sort: bool = False
+) -> list[str]:
+    """
+    Проверить, что ни один запрос не просматривает таблицу целиком
+
+    allow_sort разрешает сортировку во временном B-дереве - для запросов,
+    где строки отбираются по индексу и сортируется только найденное.
+    """
+    assert statements, "Запросы не были перехвачены"
+    details = await explain(db, statements)
+    full_scans = [d for d in details if FULL_SCAN.match(d)]
+    assert not full_scans, f"Полный просмотр таблицы: {full_scans}\nПлан: {details}"
+    if not allow_sort:
+        temp_sorts = [d for d in details if TEMP_SORT.search(d)]
+        assert not temp_sorts, f"Сортировка без индекса: {temp_sorts}\nПлан: {details}"
+    return details
+
+
+class TestCrudQueryPlans:
+    """Планы запросов для чтений из app/crud.py"""
+
+    async def test_get_patient(self, db_session: AsyncSession, sample_patient: Patient):
+        """Пациент с хроническими/последними заболеваниями и показателями"""
+        with capture_selects() as statements:
+            await crud.get_patient(db_session, sample_patient.id)
+        await assert_no_full_scan(db_session, statements)
+
+    async def test_get_patients(self, db_session: AsyncSession, sample_patient: Patient):
+        """Список пациентов"""
+        with capture_selects() as statements:
+            await crud.get_patients(db_session, limit=50)
+        await assert_no_full_scan(db_session, statements)
+
+    async def test_get_patients_search(self, db_session: AsyncSession, sample_patient: Patient):
+        """Поиск пациентов по ФИО"""
+        with capture_selects() as statements:
+            await crud.get_patients(db_session, search="Иван", limit=50)
+        details = await assert_no_full_scan(db_session, statements, allow_sort=True)
+        assert any("patients_fts VIRTUAL TABLE" in d for d in details)
+
+    async def test_get_patients_cursor(self, db_session: AsyncSession, sample_patient: Patient):
+        """Страница пациентов по курсору начинается с позиции в индексе"""
+        cursor = crud.patient_cursor(sample_patient)
+        with capture_selects() as statements:
+            await crud.get_patients(db_session, cursor=cursor, limit=50)
+        details = await assert_no_full_scan(db_session, statements)
+        assert any(d.startswith("SEARCH patients USING") for d in details)
+
+    async def test_get_appointment(self, db_session: AsyncSession, sample_appointment: Appointment):
+        """Приём с пациентом"""
+        with capture_selects() as statements:
+            await crud.get_appointment(db_session, sample_appointment.id)
+        await assert_no_full_scan(db_session, statements)
+
+    async def test_get_appointments(self, db_session: AsyncSession, sample_appointment: Appointment):
+        """Список приёмов, отсортированный по дате и времени"""
+        with capture_selects() as statements:
+            await crud.get_appointments(db_session, limit=50)
+        await assert_no_full_scan(db_session, statements)
+
+    async def test_get_appointments_cursor(self, db_session: AsyncSession, sample_appointment: Appointment):
+        """Страница приёмов по курсору начинается с позиции в индексе"""
+        cursor = crud.appointment_cursor(sample_appointment)
+        with capture_selects() as statements:
+            await crud.get_appointments(db_session, cursor=cursor, limit=50)
+        details = await assert_no_full_scan(db_session, statements)
+        assert any(d.startswith("SEARCH appointments USING") for d in details)
+
+    async def test_get_appointments_search(self, db_session: AsyncSession, sample_appointment: Appointment):
+        """Список приёмов с поиском по ФИО пациента"""
+        with capture_selects() as statements:
+            await crud.get_appointments(db_session, search="Иван", limit=50)
+        details = await assert_no_full_scan(db_session, statements, allow_sort=True)
+        assert any("patients_fts VIRTUAL TABLE" in d for d in details)
+
+    async def test_get_appointment_workspace(self, db_session: AsyncSession, sample_appointment: Appointment):
+        """Карточка пациента: приём со всеми связанными данными"""
+        with capture_selects() as statements:
+            await crud.get_appointment_workspace(db_session, sample_appointment.id)
+        await assert_no_full_scan(db_session, statements)
+        # Приём + JOIN (пациент, показатели, отчёт, аудио) и два selectin для заболеваний
+        assert len(statements) == 3
+
+    async def test_get_medical_report(self, db_session: AsyncSession, sample_appointment: Appointment):
+        """Отчёт по приёму"""
+        with capture_selects() as statements:
+            await crud.get_medical_report(db_session, sample_appointment.id)
+        await assert_no_full_scan(db_session, statements)
+
+    async def test_get_audio_file(self, db_session: AsyncSession):
+        """Аудиофайл по ID"""
+        with capture_selects() as statements:
+            await crud.get_audio_file(db_session, 1)
+        await assert_no_full_scan(db_session, statements)
+
+    async def test_get_audio_file_by_appointment(self, db_session: AsyncSession, sample_appointment: Appointment):
+        """Аудиофайл по приёму"""
+        with capture_selects() as statements:
+            await crud.get_audio_file_by_appointment(db_session, sample_appointment.id)
+        await assert_no_full_scan(db_session, statements)
+
+    async def test_get_health_indicators(self, db_session: AsyncSession, sample_patient: Patient):
+        """Показатели здоровья пациента"""
+        with capture_selects() as statements:
+            await crud.get_health_indicators(db_session, sample_patient.id)
+        await assert_no_full_scan(db_session, statements)
+
+    async def test_get_test_data(self, db_session: AsyncSession):
+        """Тестовые данные по ключу"""
+        with capture_selects() as statements:
+            await crud.get_test_data(db_session, key="mock_transcription_duration")
+        await assert_no_full_scan(db_session, statements)
+
+
+def test_full_scan_pattern():
+    """Шаблон распознаёт полный просмотр и пропускает просмотр по индексу"""
+    assert FULL_SCAN.match("SCAN patients")
+    assert FULL_SCAN.match("SCAN TABLE patients")
+    assert not FULL_SCAN.match("SCAN patients USING COVERING INDEX ix_patients_full_name")
+    assert not FULL_SCAN.match("SEARCH appointments USING INDEX ix_appointments_patient_id (patient_id=?)")
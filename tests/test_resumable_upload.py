@@ -0,0 +1,236 @@
+"""Тесты возобновляемой загрузки аудио"""
+import asyncio
+import base64
+import fcntl
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import crud
+from app.api import audio as audio_api
+from app.config import settings
+from app.models import Appointment
+from app.object_storage import get_storage
+
+CONTENT = bytes(range(256)) * 400
+
+
+def metadata(**values: str) -> str:
+    return ",".join(f"{k} {base64.b64encode(v.encode()).decode()}" for k, v in values.items())
+
+
+def patch_headers(offset: int, **extra: str) -> dict:
+    return {"Content-Type": "application/offset+octet-stream", "Upload-Offset": str(offset), **extra}
+
+
+@pytest.fixture(autouse=True)
+def upload_dir(tmp_path, monkeypatch):
+    """Загрузки во временный каталог"""
+    monkeypatch.setattr(settings, "upload_dir", str(tmp_path))
+    return tmp_path
+
+
+@pytest.mark.api
+class TestResumableUpload:
+    """Тесты протокола возобновляемой загрузки"""
+
+    async def create(self, client: AsyncClient, appointment_id: int, **headers: str) -> str:
+        response = await client.post(f"/api/audio/uploads?appointment_id={appointment_id}", headers=headers)
+        assert response.status_code == 201, response.text
+        assert response.headers["Upload-Offset"] == "0"
+        return response.headers["Location"]
+
+    async def test_full_upload(
+        self, client: AsyncClient, sample_appointment: Appointment, db_session: AsyncSession, upload_dir
+    ):
+        """Создание, загрузка частями, фиксация создаёт AudioFile"""
+        location = await self.create(
+            client, sample_appointment.id,
+            **{"Upload-Length": str(len(CONTENT)), "Upload-Metadata": metadata(filename="visit.webm")}
+        )
+
+        offset = 0
+        for part in (CONTENT[:40_000], CONTENT[40_000:]):
+            response = await client.patch(location, content=part, headers=patch_headers(offset))
+            assert response.status_code == 204
+            offset = int(response.headers["Upload-Offset"])
+        assert offset == len(CONTENT)
+
+        # Пока нет фиксации, записи в БД нет
+        assert await crud.get_audio_file_by_appointment(db_session, sample_appointment.id) is None
+
+        response = await client.post(f"{location}/commit")
+        assert response.status_code == 200
+        assert response.json()["file_size"] == len(CONTENT)
+
+        audio = await crud.get_audio_file_by_appointment(db_session, sample_appointment.id)
+        assert audio.filename == "visit.webm"
+        with open(get_storage().local_path(audio.filepath), "rb") as f:
+            assert f.read() == CONTENT
+        assert list((upload_dir / "incoming").iterdir()) == []
+        assert (await client.head(location)).status_code == 404
+
+    async def test_resume_after_offset_mismatch(self, client: AsyncClient, sample_appointment: Appointment):
+        """После обрыва клиент узнаёт смещение через HEAD и продолжает с него"""
+        location = await self.create(client, sample_appointment.id, **{"Upload-Length": str(len(CONTENT))})
+        await client.patch(location, content=CONTENT[:1000], headers=patch_headers(0))
+
+        # Клиент думает, что ничего не отправлено
+        response = await client.patch(location, content=CONTENT, headers=patch_headers(0))
+        assert response.status_code == 409
+        assert response.headers["Upload-Offset"] == "1000"
+
+        response = await client.head(location)
+        assert response.status_code == 200
+        assert response.headers["Upload-Offset"] == "1000"
+        assert response.headers["Upload-Length"] == str(len(CONTENT))
+
+        response = await client.patch(location, content=CONTENT[1000:], headers=patch_headers(1000))
+        assert response.status_code == 204
+        assert (await client.post(f"{location}/commit")).status_code == 200
+
+    async def test_deferred_length(self, client: AsyncClient, sample_appointment: Appointment):
+        """Запись ещё идёт: размер передаётся в последнем PATCH"""
+        location = await self.create(client, sample_appointment.id, **{"Upload-Defer-Length": "1"})
+        await client.patch(location, content=CONTENT[:5000], headers=patch_headers(0))
+
+        response = await client.post(f"{location}/commit")
+        assert response.status_code == 409
+
+        response = await client.patch(
+            location, content=CONTENT[5000:], headers=patch_headers(5000, **{"Upload-Length": str(len(CONTENT))})
+        )
+        assert response.status_code == 204
+        assert response.headers["Upload-Length"] == str(len(CONTENT))
+        assert (await client.post(f"{location}/commit")).status_code == 200
+
+    async def test_length_exceeded(self, client: AsyncClient, sample_appointment: Appointment):
+        """Данные сверх заявленного размера отклоняются"""
+        location = await self.create(client, sample_appointment.id, **{"Upload-Length": "100"})
+        response = await client.patch(location, content=b"x" * 101, headers=patch_headers(0))
+        assert response.status_code == 413
+
+        response = await client.post(
+            f"/api/audio/uploads?appointment_id={sample_appointment.id}",
+            headers={"Upload-Length": str(settings.max_upload_size + 1)}
+        )
+        assert response.status_code == 413
+
+    async def test_validation(self, client: AsyncClient, sample_appointment: Appointment):
+        """Ошибки создания и запросов к несуществующей сессии"""
+        response = await client.post(f"/api/audio/uploads?appointment_id={sample_appointment.id}")
+        assert response.status_code == 400
+
+        response = await client.post(
+            f"/api/audio/uploads?appointment_id={sample_appointment.id}",
+            headers={"Upload-Length": "10", "Upload-Metadata": metadata(filename="notes.txt")}
+        )
+        assert response.status_code == 400
+
+        response = await client.post("/api/audio/uploads?appointment_id=999", headers={"Upload-Length": "10"})
+        assert response.status_code == 404
+
+        assert (await client.head("/api/audio/uploads/../../etc")).status_code == 404
+        assert (await client.head(f"/api/audio/uploads/{'0' * 32}")).status_code == 404
+
+        location = await self.create(client, sample_appointment.id, **{"Upload-Length": "10"})
+        response = await client.patch(location, content=b"x", headers={"Upload-Offset": "0"})
+        assert response.status_code == 415
+
+    async def test_delete(self, client: AsyncClient, sample_appointment: Appointment, upload_dir):
+        """Прерванная загрузка удаляет принятые данные"""
+        location = await self.create(client, sample_appointment.id, **{"Upload-Length": str(len(CONTENT))})
+        await client.patch(location, content=CONTENT[:100], headers=patch_headers(0))
+
+        assert (await client.delete(location)).status_code == 204
+        assert (await client.head(location)).status_code == 404
+        assert list((upload_dir / "incoming").iterdir()) == []
+
+    async def upload(self, client: AsyncClient, appointment_id: int) -> str:
+        location = await self.create(client, appointment_id, **{"Upload-Length": str(len(CONTENT))})
+        response = await client.patch(location, content=CONTENT, headers=patch_headers(0))
+        assert response.status_code == 204
+        return location
+
+    async def test_commit_retry_after_store_error(
+        self, client: AsyncClient, sample_appointment: Appointment, db_session: AsyncSession, monkeypatch
+    ):
+        """Ошибка хранилища при фиксации - 500, сессия остаётся, повтор создаёт запись"""
+        location = await self.upload(client, sample_appointment.id)
+        store_blob = audio_api.store_blob
+
+        async def failing_store_blob(partial_path, sha256):
+            raise OSError("хранилище недоступно")
+
+        monkeypatch.setattr(audio_api, "store_blob", failing_store_blob)
+        response = await client.post(f"{location}/commit")
+        assert response.status_code == 500
+        assert (await client.head(location)).headers["Upload-Offset"] == str(len(CONTENT))
+
+        monkeypatch.setattr(audio_api, "store_blob", store_blob)
+        response = await client.post(f"{location}/commit")
+        assert response.status_code == 200
+        audio = await crud.get_audio_file_by_appointment(db_session, sample_appointment.id)
+        assert audio.file_size == len(CONTENT)
+
+    async def test_commit_conflicting_record(
+        self, client: AsyncClient, sample_appointment: Appointment, monkeypatch, upload_dir
+    ):
+        """Запись для приёма создана между проверкой и вставкой - 400, сессия удаляется"""
+        first = await self.upload(client, sample_appointment.id)
+        second = await self.upload(client, sample_appointment.id)
+        assert (await client.post(f"{first}/commit")).status_code == 200
+
+        async def allow_upload(db, appointment_id):
+            pass
+
+        monkeypatch.setattr(audio_api, "check_audio_upload_allowed", allow_upload)
+        response = await client.post(f"{second}/commit")
+        assert response.status_code == 400
+        assert (await client.head(second)).status_code == 404
+        assert list((upload_dir / "incoming").iterdir()) == []
+
+    async def test_session_locked_during_commit(
+        self, client: AsyncClient, sample_appointment: Appointment, monkeypatch
+    ):
+        """Пока идёт фиксация, PATCH и повторная фиксация получают 423, после неё - 404"""
+        location = await self.upload(client, sample_appointment.id)
+        store_blob = audio_api.store_blob
+        storing = asyncio.Event()
+        release = asyncio.Event()
+
+        async def slow_store_blob(partial_path, sha256):
+            storing.set()
+            await release.wait()
+            return await store_blob(partial_path, sha256)
+
+        monkeypatch.setattr(audio_api, "store_blob", slow_store_blob)
+        commit = asyncio.create_task(client.post(f"{location}/commit"))
+        await storing.wait()
+
+        assert (await client.post(f"{location}/commit")).status_code == 423
+        response = await client.patch(location, content=b"x", headers=patch_headers(len(CONTENT)))
+        assert response.status_code == 423
+
+        release.set()
+        assert (await commit).status_code == 200
+        assert (await client.post(f"{location}/commit")).status_code == 404
+
+    async def test_session_locked_by_other_worker(
+        self, client: AsyncClient, sample_appointment: Appointment, upload_dir
+    ):
+        """flock .part-файла другим процессом - PATCH, фиксация и удаление получают 423"""
+        location = await self.create(client, sample_appointment.id, **{"Upload-Length": str(len(CONTENT))})
+        part_path = upload_dir / "incoming" / f"{location.rsplit('/', 1)[-1]}.part"
+
+        with open(part_path, "rb") as other_worker:
+            fcntl.flock(other_worker, fcntl.LOCK_EX)
+            response = await client.patch(location, content=CONTENT, headers=patch_headers(0))
+            assert response.status_code == 423
+            assert (await client.delete(location)).status_code == 423
+        assert part_path.stat().st_size == 0
+
+        response = await client.patch(location, content=CONTENT, headers=patch_headers(0))
+        assert response.status_code == 204
+        assert (await client.post(f"{location}/commit")).status_code == 200
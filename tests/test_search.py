@@ -0,0 +1,117 @@
+"""Тесты полнотекстового поиска пациентов"""
+from datetime import date
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import crud
+from app.models import Appointment, GenderEnum, Patient
+from app.search import build_match_expression, normalize_search_text, transliterate
+
+
+class TestSearchQuery:
+    """Тесты нормализации и построения запроса MATCH"""
+
+    def test_normalize_cyrillic(self):
+        """Регистр кириллицы сворачивается, "ё" заменяется на "е" """
+        assert normalize_search_text("СЕМЁНОВ") == "семенов"
+
+    @pytest.mark.parametrize("latin, cyrillic", [
+        ("ivanov", "иванов"),
+        ("petrova", "петрова"),
+        ("zhukov", "жуков"),
+        ("shchukin", "щукин"),
+        ("dmitriy", "дмитрий"),
+        ("kryukov", "крюков"),
+    ])
+    def test_transliterate(self, latin: str, cyrillic: str):
+        """Транслитерация латиницы в кириллицу"""
+        assert transliterate(latin) == cyrillic
+
+    def test_match_expression(self):
+        """Слова объединяются через AND, латиница дополняется транслитерацией"""
+        assert build_match_expression("Иванов Пётр", transliterate_latin=True) == '("иванов") AND ("петр")'
+        assert build_match_expression("ivanov", transliterate_latin=True) == '("ivanov" OR "иванов")'
+        assert build_match_expression("ivanov", transliterate_latin=False) == '("ivanov")'
+
+    def test_match_expression_short_query(self):
+        """Слова короче трёх символов не попадают в триграммный запрос"""
+        assert build_match_expression("Ив") is None
+        assert build_match_expression("Иванов И") == '("иванов")'
+
+    def test_match_expression_escapes_quotes(self):
+        """Кавычки в запросе экранируются"""
+        assert build_match_expression('ab"c', transliterate_latin=False) == '("ab""c")'
+
+
+@pytest.mark.api
+class TestPatientSearch:
+    """Тесты поиска пациентов через API"""
+
+    async def test_search_case_insensitive_cyrillic(self, client: AsyncClient, clean_db, sample_patient: Patient):
+        """Поиск не зависит от регистра кириллицы"""
+        response = await client.get("/api/patients?search=иванов")
+        assert response.status_code == 200
+        assert [p["id"] for p in response.json()] == [sample_patient.id]
+
+    async def test_search_substring_and_several_words(self, client: AsyncClient, clean_db, sample_patient: Patient):
+        """Поиск по подстроке и по нескольким словам ФИО"""
+        response = await client.get("/api/patients?search=ВАНОВ петрович")
+        assert [p["id"] for p in response.json()] == [sample_patient.id]
+
+        response = await client.get("/api/patients?search=Иванов Сергеевич")
+        assert response.json() == []
+
+    async def test_search_transliterated(self, client: AsyncClient, clean_db, sample_patient: Patient):
+        """Запрос латиницей находит пациента по транслитерации"""
+        response = await client.get("/api/patients?search=Ivanov")
+        assert [p["id"] for p in response.json()] == [sample_patient.id]
+
+    async def test_search_short_query_fallback(self, client: AsyncClient, clean_db, sample_patient: Patient):
+        """Короткий запрос обрабатывается без полнотекстового индекса"""
+        response = await client.get("/api/patients?search=Ив")
+        assert [p["id"] for p in response.json()] == [sample_patient.id]
+
+    async def test_index_follows_updates(
+        self,
+        client: AsyncClient,
+        clean_db,
+        db_session: AsyncSession,
+        sample_patient: Patient
+    ):
+        """Индекс обновляется при изменении ФИО"""
+        sample_patient.last_name = "Семёнов"
+        await db_session.commit()
+
+        response = await client.get("/api/patients?search=семенов")
+        assert [p["id"] for p in response.json()] == [sample_patient.id]
+
+        response = await client.get("/api/patients?search=Иванов")
+        assert response.json() == []
+
+    async def test_appointments_search(
+        self,
+        client: AsyncClient,
+        clean_db,
+        db_session: AsyncSession,
+        sample_appointment: Appointment
+    ):
+        """Список приёмов фильтруется через индекс пациентов"""
+        other = Patient(
+            first_name="Анна",
+            last_name="Смирнова",
+            middle_name="Олеговна",
+            date_of_birth=date(1990, 1, 1),
+            gender=GenderEnum.FEMALE,
+            medical_organization="ГБУЗ Поликлиника №1",
+            medical_area="Терапевтический 5",
+        )
+        db_session.add(other)
+        await db_session.commit()
+
+        response = await client.get("/api/appointments?search=иванов")
+        assert [a["id"] for a in response.json()] == [sample_appointment.id]
+
+        patients = await crud.get_patients(db_session, search="smirnova")
+        assert [p.id for p in patients] == [other.id]
@@ -0,0 +1,216 @@
+"""Тесты обслуживания хранилища: осиротевшие файлы, срок хранения, холодный уровень"""
+import hashlib
+import io
+import os
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import crud, resumable_uploads
+from app.audio_storage import blob_key
+from app.config import settings
+from app.models import Appointment, AppointmentStatus, AudioFile, Patient, TranscriptionStatus
+from app.object_storage import get_storage
+from app.storage_lifecycle import cold_key, sweep_storage
+from tests.conftest import tone_pcm, wav_bytes
+
+OLD = time.time() - 2 * 86400
+
+
+def stored_path(sha256: str) -> Path:
+    """Файл с данным SHA-256 в локальном хранилище"""
+    return get_storage().local_path(blob_key(sha256))
+
+
+def tone_wav(seconds: float = 2.0, rate: int = 8000) -> bytes:
+    """
+    WAV с тоном - сжимается xz с дельта-фильтром
+
+    БД тестов общая: у каждого теста своя длительность, чтобы записи других
+    тестов не ссылались на тот же файл.
+    """
+    return wav_bytes(tone_pcm([(seconds, True)], rate), rate)
+
+
+def write_old(path, content: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(content)
+    os.utime(path, (OLD, OLD))
+
+
+async def age_audio(db: AsyncSession, audio_id: int, days: int) -> None:
+    await db.execute(
+        update(AudioFile)
+        .where(AudioFile.id == audio_id)
+        .values(uploaded_at=datetime.utcnow() - timedelta(days=days))
+    )
+    await db.commit()
+
+
+@pytest.mark.api
+class TestStorageSweep:
+    """Тесты sweep_storage с локальным хранилищем"""
+
+    @pytest.fixture(autouse=True)
+    def storage_settings(self, temp_upload_dir, monkeypatch):
+        monkeypatch.setattr(settings, "upload_dir", str(temp_upload_dir))
+        monkeypatch.setattr(settings, "audio_transcode_enabled", False)
+        monkeypatch.setattr(settings, "storage_orphan_grace", 3600)
+        monkeypatch.setattr(settings, "audio_retention_days", 0)
+        monkeypatch.setattr(settings, "audio_cold_after_days", 0)
+
+    @pytest.fixture
+    async def second_appointment(self, db_session: AsyncSession, sample_patient: Patient) -> Appointment:
+        appointment = Appointment(
+            patient_id=sample_patient.id,
+            appointment_date=date(2025, 10, 27),
+            appointment_time_start="11:00",
+            appointment_time_end="11:20",
+            status=AppointmentStatus.SCHEDULED,
+            is_active=False
+        )
+        db_session.add(appointment)
+        await db_session.commit()
+        await db_session.refresh(appointment)
+        return appointment
+
+    async def upload(self, client: AsyncClient, appointment_id: int, content: bytes) -> int:
+        response = await client.post(
+            f"/api/audio/upload?appointment_id={appointment_id}",
+            files={"file": ("visit.wav", io.BytesIO(content), "audio/wav")}
+        )
+        assert response.status_code == 200
+        return response.json()["id"]
+
+    async def test_orphans_and_stale_uploads(
+        self, client: AsyncClient, db_session: AsyncSession, sample_appointment: Appointment, temp_upload_dir
+    ):
+        """Удаляются только старые файлы без ссылок и брошенные загрузки"""
+        content = tone_wav()
+        await self.upload(client, sample_appointment.id, content)
+        referenced = stored_path(hashlib.sha256(content).hexdigest())
+        os.utime(referenced, (OLD, OLD))
+
+        orphan = stored_path(hashlib.sha256(b"orphan").hexdigest())
+        write_old(orphan, b"orphan")
+        young_orphan = stored_path(hashlib.sha256(b"young").hexdigest())
+        young_orphan.parent.mkdir(parents=True, exist_ok=True)
+        young_orphan.write_bytes(b"young")
+        legacy = temp_upload_dir / "legacy.mp3"
+        write_old(legacy, b"legacy")
+        write_old(temp_upload_dir / ".crashed.part", b"partial")
+        (temp_upload_dir / ".active.part").write_bytes(b"active")
+        session = await resumable_uploads.create_session(sample_appointment.id, "visit.webm", "audio/webm", 100)
+        for path in (session.data_path, session.info_path):
+            os.utime(path, (OLD, OLD))
+
+        stats = await sweep_storage(db_session)
+
+        assert (stats.orphan_files, stats.orphan_bytes) == (1, len(b"orphan"))
+        assert stats.stale_uploads == 2
+        assert not orphan.exists()
+        assert referenced.exists() and young_orphan.exists() and legacy.exists()
+        assert (temp_upload_dir / ".active.part").exists()
+        assert not (temp_upload_dir / ".crashed.part").exists()
+        assert await resumable_uploads.get_session(session.id) is None
+        assert stats.as_dict()["reclaimed_bytes"] == stats.reclaimed_bytes >= len(b"orphan") + len(b"partial")
+
+    async def test_retention_keeps_transcript(
+        self, client: AsyncClient, db_session: AsyncSession, sample_appointment: Appointment,
+        second_appointment: Appointment, monkeypatch
+    ):
+        """Файл удаляется с истечением срока последней ссылающейся на него записи"""
+        monkeypatch.setattr(settings, "audio_retention_days", 30)
+        content = tone_wav(2.5)
+        path = stored_path(hashlib.sha256(content).hexdigest())
+        first_id = await self.upload(client, sample_appointment.id, content)
+        second_id = await self.upload(client, second_appointment.id, content)
+        await crud.update_transcription(db_session, first_id, TranscriptionStatus.COMPLETED, text="стенограмма")
+
+        await age_audio(db_session, first_id, 31)
+        stats = await sweep_storage(db_session)
+        assert stats.expired_recordings >= 1
+        assert stats.expired_bytes == 0
+        assert path.exists()
+
+        db_session.expire_all()
+        audio = await crud.get_audio_file(db_session, first_id, with_text=True)
+        assert audio.filepath == ""
+        assert audio.transcription_text == "стенограмма"
+        assert (await client.get(f"/api/audio/{first_id}/download")).status_code == 404
+
+        await age_audio(db_session, second_id, 31)
+        stats = await sweep_storage(db_session)
+        assert stats.expired_bytes == len(content)
+        assert not path.exists()
+
+    async def test_cold_tier_and_rehydration(
+        self, client: AsyncClient, db_session: AsyncSession, sample_appointment: Appointment,
+        temp_upload_dir, monkeypatch
+    ):
+        """Старый WAV сжимается в холодный уровень и восстанавливается при скачивании"""
+        monkeypatch.setattr(settings, "audio_cold_after_days", 30)
+        content = tone_wav(3.0)
+        sha256 = hashlib.sha256(content).hexdigest()
+        audio_id = await self.upload(client, sample_appointment.id, content)
+        await age_audio(db_session, audio_id, 31)
+
+        stats = await sweep_storage(db_session)
+
+        cold_path = temp_upload_dir / cold_key(blob_key(sha256))
+        assert stats.compacted_recordings == 1
+        assert stats.compacted_bytes == len(content) - cold_path.stat().st_size > len(content) // 2
+        assert not stored_path(sha256).exists()
+        db_session.expire_all()
+        audio = await crud.get_audio_file(db_session, audio_id)
+        assert audio.filepath == cold_key(blob_key(sha256))
+        assert audio.compacted_at is not None
+
+        response = await client.get(f"/api/audio/{audio_id}/download")
+        assert response.status_code == 200
+        assert response.content == content
+        assert response.headers["etag"] == f'"{sha256}"'
+
+        db_session.expire_all()
+        audio = await crud.get_audio_file(db_session, audio_id)
+        assert audio.filepath == blob_key(sha256)
+        assert not cold_path.exists()
+        # Восстановленная запись повторно не сжимается
+        assert (await sweep_storage(db_session)).compacted_recordings == 0
+
+    async def test_incompressible_recording_left_hot(
+        self, client: AsyncClient, db_session: AsyncSession, sample_appointment: Appointment, monkeypatch
+    ):
+        monkeypatch.setattr(settings, "audio_cold_after_days", 30)
+        content = os.urandom(50_000)
+        audio_id = await self.upload(client, sample_appointment.id, content)
+        await age_audio(db_session, audio_id, 31)
+
+        stats = await sweep_storage(db_session)
+
+        assert stats.compacted_recordings == 0
+        db_session.expire_all()
+        audio = await crud.get_audio_file(db_session, audio_id)
+        assert audio.filepath == blob_key(hashlib.sha256(content).hexdigest())
+        assert audio.compacted_at is not None
+
+    async def test_sweep_job(self, client: AsyncClient, run_jobs, temp_upload_dir):
+        """Обслуживание запускается задачей; повторный запрос не ставит вторую"""
+        write_old(stored_path(hashlib.sha256(b"orphan").hexdigest()), b"orphan")
+
+        response = await client.post("/api/jobs/storage-sweep")
+        assert response.status_code == 202
+        job_id = response.json()["job_id"]
+        assert (await client.post("/api/jobs/storage-sweep")).json()["job_id"] == job_id
+
+        await run_jobs()
+
+        job = (await client.get(f"/api/jobs/{job_id}")).json()
+        assert job["status"] == "completed"
+        assert job["result"]["orphan_files"] == 1
+        assert job["result"]["reclaimed_bytes"] >= len(b"orphan")
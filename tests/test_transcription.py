@@ -0,0 +1,237 @@
+"""Тесты движков распознавания речи"""
+import asyncio
+import importlib.util
+import os
+import time
+import wave
+from pathlib import Path
+from typing import Callable
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import crud, tasks, transcription
+from app.audio_segmentation import group_regions, split_recording
+from app.models import Appointment, TranscriptionStatus
+from app.tasks import enqueue_transcription
+from app.transcription import (
+    MOCK_TRANSCRIPTION,
+    ProcessPoolEngine,
+    TranscriptionEngine,
+    TranscriptionEngineError,
+    TranscriptionResult,
+    TranscriptionSegment,
+    create_engine,
+    format_segments,
+    get_engine,
+)
+from tests.conftest import tone_pcm, wav_bytes
+
+
+def _recognize_wav(path: str) -> TranscriptionResult:
+    """Распознаватель для тестов: длительность WAV, PID процесса и занятое ядро"""
+    with wave.open(path) as wav:
+        duration = wav.getnframes() / wav.getframerate()
+    time.sleep(0.3)
+    return TranscriptionResult(text=str(os.getpid()), duration=duration)
+
+
+def _recognize_length(path: str) -> TranscriptionResult:
+    """Распознаватель для тестов: "текст" - длительность фрагмента"""
+    with wave.open(path) as wav:
+        duration = wav.getnframes() / wav.getframerate()
+    return TranscriptionResult(text=f"{duration:.1f} с", duration=duration)
+
+
+class WavEngine(ProcessPoolEngine):
+    name = "test-wav"
+
+    def recognizer(self) -> Callable[[str], TranscriptionResult]:
+        return _recognize_wav
+
+
+class LengthEngine(ProcessPoolEngine):
+    name = "test-length"
+
+    def recognizer(self) -> Callable[[str], TranscriptionResult]:
+        return _recognize_length
+
+
+class StaticEngine(TranscriptionEngine):
+    name = "test-static"
+
+    async def transcribe(self, path: Path) -> TranscriptionResult:
+        segments = [TranscriptionSegment(0, 2, "Добрый день"), TranscriptionSegment(65, 67, path.name)]
+        return TranscriptionResult(text=format_segments(segments), duration=67)
+
+
+def write_wav(path: Path, pattern: list[tuple[float, bool]]) -> Path:
+    """WAV 16 кГц из участков "речи" (тон 300 Гц) и тишины: [(секунды, речь?)]"""
+    path.write_bytes(wav_bytes(tone_pcm(pattern)))
+    return path
+
+
+class TestTranscriptionEngines:
+    """Тесты выбора движка и пула процессов"""
+
+    def test_format_segments(self):
+        """Фрагменты - строки с метками MM:SS, пустые пропускаются"""
+        segments = [
+            TranscriptionSegment(0.4, 3.0, "Здравствуйте"),
+            TranscriptionSegment(5.0, 6.0, ""),
+            TranscriptionSegment(3725.9, 3727.0, "До свидания"),
+        ]
+        assert format_segments(segments) == "00:00 - Здравствуйте\n\n62:05 - До свидания"
+        segments[0].speaker = "Врач"
+        assert format_segments(segments).startswith("00:00 - Врач: Здравствуйте")
+
+    def test_unknown_engine(self):
+        """Неизвестное имя движка - понятная ошибка"""
+        with pytest.raises(TranscriptionEngineError, match="mock"):
+            create_engine("cloud")
+
+    @pytest.mark.skipif(importlib.util.find_spec("faster_whisper") is not None, reason="faster-whisper установлен")
+    def test_faster_whisper_not_installed(self):
+        """Без пакета faster-whisper движок не создаётся, а подсказывает установку"""
+        with pytest.raises(TranscriptionEngineError, match="pip install faster-whisper"):
+            create_engine("faster-whisper")
+
+    async def test_mock_engine(self, monkeypatch):
+        """Движок по умолчанию - фиктивный диалог"""
+        monkeypatch.setattr(transcription.settings, "transcription_mock_delay", 0)
+        monkeypatch.setattr(transcription, "_engine", None)
+
+        engine = get_engine()
+        assert engine.name == "mock"
+        assert (await engine.transcribe(Path("missing.mp3"))).text == MOCK_TRANSCRIPTION
+        transcription.shutdown_engine()
+
+    async def test_process_pool_does_not_block_loop(self, tmp_path):
+        """Распознавание идёт в другом процессе, параллельно, не останавливая event loop"""
+        engine = WavEngine(processes=2)
+        files = [write_wav(tmp_path / f"{n}.wav", [(1.5, False)]) for n in range(2)]
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticking = asyncio.create_task(ticker())
+        try:
+            results = await asyncio.gather(*(engine.transcribe(path) for path in files))
+        finally:
+            ticking.cancel()
+            engine.close()
+
+        assert [result.duration for result in results] == [1.5, 1.5]
+        assert all(int(result.text) != os.getpid() for result in results)
+        # Пока процессы заняты, event loop продолжает работу
+        assert ticks >= 10
+
+
+class TestSegmentation:
+    """Тесты разбиения записи на фрагменты речи"""
+
+    def test_split_trims_silence(self, tmp_path):
+        """Паузы отбрасываются, длинная пауза разделяет фрагменты, короткая - нет"""
+        path = write_wav(tmp_path / "visit.wav", [
+            (1.0, False), (1.0, True), (0.3, False), (1.0, True), (4.0, False), (1.5, True), (1.0, False),
+        ])
+        chunks, duration = split_recording(str(path), str(tmp_path), padding_ms=100)
+
+        assert duration == pytest.approx(9.8)
+        assert len(chunks) == 2
+        assert chunks[0].start == pytest.approx(0.9, abs=0.05)
+        assert chunks[0].end == pytest.approx(3.4, abs=0.05)
+        assert chunks[1].start == pytest.approx(7.2, abs=0.05)
+        assert chunks[1].end == pytest.approx(8.9, abs=0.05)
+        assert all(chunk.path.exists() for chunk in chunks)
+
+    def test_split_silent_recording(self, tmp_path):
+        """В тишине нет фрагментов"""
+        path = write_wav(tmp_path / "silence.wav", [(3.0, False)])
+        assert split_recording(str(path), str(tmp_path)) == ([], 3.0)
+
+    def test_group_regions(self):
+        """Близкие участки объединяются, длинные режутся по максимальной длине"""
+        assert group_regions([(0, 10), (12, 20), (40, 45)], max_samples=30, max_gap=5) == [(0, 20), (40, 45)]
+        assert group_regions([(0, 70)], max_samples=30, max_gap=5) == [(0, 30), (30, 60), (60, 70)]
+
+    async def test_recording_stitched_with_offsets(self, tmp_path, monkeypatch):
+        """Фрагменты распознаются параллельно, метки времени - от начала записи"""
+        monkeypatch.setattr(transcription.settings, "vad_padding_ms", 0)
+        path = write_wav(tmp_path / "visit.wav", [
+            (2.5, False), (1.2, True), (5.0, False), (2.0, True), (61.0, False), (0.9, True),
+        ])
+        engine = LengthEngine(processes=2)
+        try:
+            result = await engine.transcribe_recording(path)
+        finally:
+            engine.close()
+
+        assert result.duration == pytest.approx(72.6)
+        assert result.text == "00:02 - 1.2 с\n\n00:08 - 2.0 с\n\n01:11 - 0.9 с"
+        assert not list(tmp_path.glob("elia-vad-*"))
+
+
+@pytest.mark.api
+class TestTranscriptionJob:
+    """Задача транскрибации использует движок из настроек"""
+
+    async def test_job_uses_configured_engine(
+        self, db_session: AsyncSession, sample_appointment: Appointment, run_jobs, monkeypatch
+    ):
+        monkeypatch.setattr(transcription, "_engine", StaticEngine())
+        audio = await crud.create_audio_file(
+            db_session,
+            appointment_id=sample_appointment.id,
+            filename="visit.mp3",
+            filepath="static/uploads/visit.mp3",
+            file_size=1,
+            mime_type="audio/mpeg",
+        )
+        audio_id = audio.id
+        await enqueue_transcription(db_session, audio_id)
+        await run_jobs()
+
+        db_session.expire_all()
+        audio = await crud.get_audio_file(db_session, audio_id, with_text=True)
+        assert audio.transcription_status == TranscriptionStatus.COMPLETED
+        assert audio.transcription_text == "00:00 - Добрый день\n\n01:05 - visit.mp3"
+
+    async def test_job_releases_transaction_during_transcription(
+        self, db_session: AsyncSession, sample_appointment: Appointment, run_jobs, monkeypatch
+    ):
+        """Во время распознавания сессия задачи не держит транзакцию (соединение и снимок WAL)"""
+        sessions = []
+        rehydrate = tasks.rehydrate_audio
+
+        async def tracking_rehydrate(db, key):
+            sessions.append(db)
+            return await rehydrate(db, key)
+
+        class TransactionCheckEngine(StaticEngine):
+            async def transcribe(self, path: Path) -> TranscriptionResult:
+                assert not sessions[0].in_transaction()
+                return await super().transcribe(path)
+
+        monkeypatch.setattr(tasks, "rehydrate_audio", tracking_rehydrate)
+        monkeypatch.setattr(transcription, "_engine", TransactionCheckEngine())
+        audio = await crud.create_audio_file(
+            db_session,
+            appointment_id=sample_appointment.id,
+            filename="visit.mp3",
+            filepath="static/uploads/visit.mp3",
+            file_size=1,
+            mime_type="audio/mpeg",
+        )
+        audio_id = audio.id
+        await enqueue_transcription(db_session, audio_id)
+        await run_jobs()
+
+        db_session.expire_all()
+        audio = await crud.get_audio_file(db_session, audio_id)
+        assert sessions
+        assert audio.transcription_status == TranscriptionStatus.COMPLETED
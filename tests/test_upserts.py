@@ -0,0 +1,94 @@
+"""Тесты записей одним запросом (INSERT ... ON CONFLICT ... RETURNING)"""
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import crud
+from app.models import Appointment, AudioFile, Patient, TranscriptionStatus
+from tests.conftest import test_engine
+
+
+@contextmanager
+def capture_statements():
+    """Перехватить все SQL-запросы, выполненные через тестовый engine"""
+    statements: list[str] = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement.lstrip().split()[0].upper())
+
+    event.listen(test_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(test_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+
+
+class TestUpserts:
+    """Каждое сохранение - один запрос без SELECT до и после"""
+
+    async def test_medical_report_single_statement(self, db_session: AsyncSession, sample_appointment: Appointment):
+        """Создание и обновление отчёта"""
+        with capture_statements() as statements:
+            report = await crud.create_or_update_medical_report(
+                db_session, sample_appointment.id, purpose="Осмотр", complaints="Кашель"
+            )
+        assert statements == ["INSERT"]
+        assert report.id is not None
+        assert report.submitted_to_mis is False
+
+        with capture_statements() as statements:
+            updated = await crud.create_or_update_medical_report(
+                db_session, sample_appointment.id, complaints="Кашель, температура"
+            )
+        assert statements == ["INSERT"]
+        assert updated.id == report.id
+        # Поля, не переданные при обновлении, сохраняются
+        assert updated.purpose == "Осмотр"
+        assert updated.complaints == "Кашель, температура"
+        assert updated.updated_at >= report.created_at
+
+    async def test_blood_pressure_keeps_pulse(self, db_session: AsyncSession, sample_patient: Patient):
+        """Пульс не затирается, если не передан"""
+        await crud.update_blood_pressure(db_session, sample_patient.id, 120, 80, pulse=70)
+        with capture_statements() as statements:
+            indicators = await crud.update_blood_pressure(db_session, sample_patient.id, 130, 85, source="photo")
+        assert statements == ["INSERT"]
+        assert (indicators.systolic_pressure, indicators.diastolic_pressure) == (130, 85)
+        assert indicators.pulse == 70
+        assert indicators.bp_source == "photo"
+
+    async def test_test_data(self, db_session: AsyncSession):
+        """Тестовые данные по ключу"""
+        first = await crud.create_or_update_test_data(db_session, "10", key="upsert_test")
+        with capture_statements() as statements:
+            second = await crud.create_or_update_test_data(db_session, "20", key="upsert_test")
+        assert statements == ["INSERT"]
+        assert second.id == first.id
+        assert second.content == "20"
+
+    async def test_update_transcription(self, db_session: AsyncSession, sample_appointment: Appointment):
+        """Статус и текст транскрипции - одним UPDATE ... RETURNING"""
+        audio = AudioFile(
+            appointment_id=sample_appointment.id,
+            filename="test.mp3",
+            filepath="/tmp/test.mp3",
+            file_size=1000,
+            mime_type="audio/mpeg"
+        )
+        db_session.add(audio)
+        await db_session.commit()
+
+        with capture_statements() as statements:
+            updated = await crud.update_transcription(
+                db_session, audio.id, TranscriptionStatus.COMPLETED, "Текст стенограммы"
+            )
+        assert statements == ["UPDATE"]
+        assert updated.transcription_text == "Текст стенограммы"
+        assert updated.transcribed_at is not None
+
+    async def test_update_transcription_not_found(self, db_session: AsyncSession):
+        """Несуществующий аудиофайл"""
+        with pytest.raises(ValueError):
+            await crud.update_transcription(db_session, 999999, TranscriptionStatus.FAILED)
@@ -0,0 +1,187 @@
+"""Тесты очереди записи с групповым коммитом"""
+import asyncio
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import crud, database
+from app import write_queue as write_queue_module
+from app.database import get_db
+from app.main import app
+from app.models import Patient, TestData
+from app.write_queue import WriteQueue
+from tests.conftest import TEST_DATABASE_URL, test_async_session
+
+
+@pytest.fixture
+async def queue():
+    """Очередь записи, работающая с тестовой БД"""
+    wq = WriteQueue(TEST_DATABASE_URL, max_batch=16, batch_window_ms=5)
+    await wq.start()
+    yield wq
+    await wq.stop()
+
+
+@pytest.fixture
+async def clean_queue_data(db_session: AsyncSession):
+    """Удалить тестовые данные очереди до и после теста"""
+    await db_session.execute(delete(TestData).where(TestData.key.like("wq-%")))
+    await db_session.commit()
+    yield
+    await db_session.execute(delete(TestData).where(TestData.key.like("wq-%")))
+    await db_session.commit()
+
+
+def make_insert_unit(key: str, content: str):
+    """Единица записи, добавляющая строку test_data"""
+    async def unit(session: AsyncSession) -> TestData:
+        item = TestData(key=key, content=content)
+        session.add(item)
+        return item
+    return unit
+
+
+class TestWriteQueue:
+    """Тесты сериализации и группового коммита"""
+
+    async def test_concurrent_writes_are_grouped(self, queue: WriteQueue, db_session: AsyncSession, clean_queue_data):
+        """Конкурентные записи выполняются группами и каждая получает свой результат"""
+        results = await asyncio.gather(*(
+            queue.submit(make_insert_unit(f"wq-{i}", str(i))) for i in range(40)
+        ))
+
+        assert [r.content for r in results] == [str(i) for i in range(40)]
+        assert all(r.id is not None for r in results)
+        assert queue.units_committed == 40
+        assert queue.batches_committed < 40
+
+        stored = await db_session.execute(select(TestData).where(TestData.key.like("wq-%")))
+        assert len(stored.scalars().all()) == 40
+
+    async def test_failed_unit_does_not_abort_batch(self, queue: WriteQueue, db_session: AsyncSession, clean_queue_data):
+        """Ошибка одной единицы возвращается её вызывающему, остальные фиксируются"""
+        async def failing_unit(session: AsyncSession):
+            session.add(TestData(key="wq-failed", content="x"))
+            await session.flush()
+            raise ValueError("ошибка единицы")
+
+        results = await asyncio.gather(
+            queue.submit(make_insert_unit("wq-a", "a")),
+            queue.submit(failing_unit),
+            queue.submit(make_insert_unit("wq-b", "b")),
+            return_exceptions=True
+        )
+
+        assert isinstance(results[1], ValueError)
+        assert results[0].key == "wq-a"
+        assert results[2].key == "wq-b"
+
+        stored = await db_session.execute(select(TestData.key).where(TestData.key.like("wq-%")))
+        assert sorted(stored.scalars().all()) == ["wq-a", "wq-b"]
+
+    async def test_submit_requires_running_queue(self):
+        """Нельзя отправить запись в остановленную очередь"""
+        wq = WriteQueue(TEST_DATABASE_URL)
+        with pytest.raises(RuntimeError):
+            await wq.submit(make_insert_unit("wq-x", "x"))
+
+    async def test_crud_writes_use_running_queue(
+        self,
+        queue: WriteQueue,
+        db_session: AsyncSession,
+        sample_patient: Patient,
+        monkeypatch
+    ):
+        """CRUD-операции записи идут через очередь, если она запущена"""
+        monkeypatch.setattr(write_queue_module, "write_queue", queue)
+        patient_id = sample_patient.id
+
+        indicators = await asyncio.gather(*(
+            crud.update_blood_pressure(db_session, patient_id, systolic=120 + i, diastolic=80)
+            for i in range(10)
+        ))
+
+        assert queue.units_committed == 10
+        assert {i.patient_id for i in indicators} == {patient_id}
+
+        # Записанное писателем видно в сессии вызывающего кода
+        stored = await crud.get_health_indicators(db_session, patient_id)
+        assert stored is not None
+        assert 120 <= stored.systolic_pressure < 130
+        assert all(indicator is stored for indicator in indicators)
+
+    async def test_submit_rejected_while_stopping(self, db_session: AsyncSession, clean_queue_data):
+        """После начала остановки единицы не принимаются, принятые до неё выполняются"""
+        wq = WriteQueue(TEST_DATABASE_URL)
+        await wq.start()
+        release = asyncio.Event()
+
+        async def blocking_unit(session: AsyncSession) -> TestData:
+            await release.wait()
+            return await make_insert_unit("wq-blocking", "x")(session)
+
+        first = asyncio.create_task(wq.submit(blocking_unit))
+        await asyncio.sleep(0.05)
+        queued = asyncio.create_task(wq.submit(make_insert_unit("wq-queued", "y")))
+        await asyncio.sleep(0)
+        stopping = asyncio.create_task(wq.stop())
+        await asyncio.sleep(0)
+
+        assert not wq.is_running
+        with pytest.raises(RuntimeError):
+            await wq.submit(make_insert_unit("wq-late", "z"))
+
+        release.set()
+        await asyncio.wait_for(stopping, timeout=5)
+        assert (await first).key == "wq-blocking"
+        assert (await queued).key == "wq-queued"
+        stored = await db_session.execute(select(TestData.key).where(TestData.key.like("wq-%")))
+        assert sorted(stored.scalars().all()) == ["wq-blocking", "wq-queued"]
+
+    async def test_writer_crash_fails_pending_units(self, monkeypatch):
+        """Писатель упал (BaseException) - ожидающие единицы получают ошибку, а не зависают"""
+        class WriterCrash(BaseException):
+            pass
+
+        wq = WriteQueue(TEST_DATABASE_URL)
+
+        async def crash(batch: list) -> None:
+            raise WriterCrash()
+
+        monkeypatch.setattr(wq, "_commit_batch", crash)
+        await wq.start()
+        results = await asyncio.wait_for(asyncio.gather(
+            *(wq.submit(make_insert_unit(f"wq-{i}", str(i))) for i in range(3)),
+            return_exceptions=True
+        ), timeout=5)
+
+        assert all(isinstance(result, RuntimeError) for result in results)
+        assert not wq.is_running
+        await asyncio.wait_for(wq.stop(), timeout=5)
+
+
+@pytest.mark.api
+class TestWriteQueueRequests:
+    """Запросы к API с запущенной очередью записи (WRITE_QUEUE_ENABLED)"""
+
+    async def test_read_after_write_between_requests(
+        self, client: AsyncClient, queue: WriteQueue, sample_patient: Patient, monkeypatch
+    ):
+        """Записи запросов идут через писателя; следующий запрос видит записанное"""
+        monkeypatch.setattr(write_queue_module, "write_queue", queue)
+        # Как в приложении: у каждого запроса своя сессия get_db
+        monkeypatch.setattr(database, "async_session_maker", test_async_session)
+        monkeypatch.delitem(app.dependency_overrides, get_db)
+        url = f"/api/patients/{sample_patient.id}"
+
+        for systolic in (125, 140):
+            response = await client.post(f"{url}/blood-pressure", json={"systolic": systolic, "diastolic": 85})
+            assert response.status_code == 200
+            assert response.json()["systolic_pressure"] == systolic
+
+            portrait = (await client.get(f"{url}/digital-portrait")).json()
+            assert portrait["health_indicators"]["systolic_pressure"] == systolic
+
+        assert queue.units_committed == 2